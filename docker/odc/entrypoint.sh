@@ -3,6 +3,9 @@ set -e
 
 # Generate datacube.conf from template with environment variables
 if [ -f /home/odc/.datacube.conf.template ]; then
+    export ODC_DB_HOST="${ODC_DB_HOST:-${POSTGRES_HOST:-postgres}}"
+    export ODC_DB_PORT="${ODC_DB_PORT:-${POSTGRES_PORT:-5432}}"
+    export ODC_DB_CONNECTION_TIMEOUT="${ODC_DB_CONNECTION_TIMEOUT:-60}"
     envsubst < /home/odc/.datacube.conf.template > /home/odc/.datacube.conf
     echo "Generated datacube.conf from environment variables"
 fi
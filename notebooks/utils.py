@@ -1,3 +1,28 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+# Shared between kernels when set, e.g. /home/jovyan/work/data/.query-cache
+QUERY_CACHE_DIR_ENV = "PIKSEL_QUERY_CACHE_DIR"
+
+# Written by ``make catalogue-snapshot`` (python -m piksel_core.catalogue)
+CATALOGUE_DIR_ENV = "PIKSEL_CATALOGUE_DIR"
+DEFAULT_CATALOGUE_DIR = "/home/jovyan/work/data/catalogue"
+
+# Written by ``make overviews`` (python -m piksel_core.overviews)
+OVERVIEW_DIR_ENV = "PIKSEL_OVERVIEW_DIR"
+DEFAULT_OVERVIEW_DIR = "/home/jovyan/work/data/overviews"
+
+_MISSING = object()
+
+
 def patch_usgs_landsat(url: str) -> str:
     """
     Patch the USGS Landsat URL to use S3:// instead of HTTPS://.
@@ -9,3 +34,654 @@ def patch_usgs_landsat(url: str) -> str:
         str: The patched URL.
     """
     return url.replace("https://landsatlook.usgs.gov/data", "s3://usgs-landsat")
+
+
+def _key_value(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return [_key_value(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _key_value(v) for k, v in sorted(value.items())}
+    if hasattr(value, "geobox") and value.geobox is not None:
+        # xarray objects passed as like=
+        value = value.geobox
+    if hasattr(value, "json") and hasattr(value, "crs"):
+        # odc-geo Geometry
+        return {"geometry": value.json, "crs": str(value.crs)}
+    return repr(value)
+
+
+def search_key(call: str, search: dict) -> str:
+    """
+    A stable cache key for a datacube call and its search arguments.
+
+    Args:
+        call (str): The method name, e.g. ``find_datasets``.
+        search (dict): The keyword arguments of the call.
+
+    Returns:
+        str: Canonical JSON of the call and its arguments.
+    """
+    return json.dumps({"call": call, "search": _key_value(search)}, sort_keys=True)
+
+
+class QueryCache:
+    """
+    Two-tier cache of query results, each stored with the index *stamp* it was read at.
+
+    A cached result is only returned while the stamp it was stored with is
+    still current; anything written to the index since then changes the stamp
+    and the entry is read again. The memory tier is an LRU of ``maxsize``
+    entries. With ``cache_dir`` set, results are also pickled to that
+    directory, so kernels sharing it reuse each other's queries.
+
+    Args:
+        maxsize (int): Entries kept in memory.
+        cache_dir (str | None): Directory of the on-disk tier, None for memory only.
+    """
+
+    def __init__(self, maxsize: int = 128, cache_dir: str | None = None):
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode()).hexdigest() + ".pkl")
+
+    def get(self, key: str, stamp):
+        """The value cached for ``key`` at ``stamp``, or ``None`` when there is none."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+        value = self._read(key, stamp)
+        with self._lock:
+            if value is _MISSING:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, stamp, value)
+        return value
+
+    def put(self, key: str, stamp, value) -> None:
+        """Cache ``value`` for ``key`` as read at ``stamp``."""
+        with self._lock:
+            self._remember(key, stamp, value)
+        if self.cache_dir:
+            # Write then rename, so other kernels never read a partial file
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((key, stamp, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+
+    def clear(self) -> None:
+        """Drop every cached entry, in memory and on disk."""
+        with self._lock:
+            self._memory.clear()
+        if self.cache_dir:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".pkl"):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def _remember(self, key: str, stamp, value) -> None:
+        self._memory[key] = (stamp, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def _read(self, key: str, stamp):
+        if not self.cache_dir:
+            return _MISSING
+        try:
+            with open(self._path(key), "rb") as f:
+                stored_key, stored_stamp, value = pickle.load(f)
+        except Exception:  # pylint:disable=broad-except
+            # Unreadable, partial or written by another datacube version: read it again
+            return _MISSING
+        if stored_key != key or stored_stamp != stamp:
+            return _MISSING
+        return value
+
+
+class CachedDatacube:
+    """
+    A ``Datacube`` whose ``find_datasets``, ``list_products`` and ``list_measurements`` are cached.
+
+    Results are reused until the product changes in the index: every lookup
+    compares the product's dataset count and newest ``added``/``updated``/
+    ``archived`` timestamps (one small query, itself reused for
+    ``stamp_ttl`` seconds) with those the result was read at. Searches
+    without a product, or with a ``dataset_predicate``, are not cached.
+    Everything else (``load``, ``index``, ...) is passed to the wrapped
+    ``Datacube``. Products with a current search table (``make search-tables``)
+    are searched on time, lon/lat, ``cloud_cover``, ``region_code`` and
+    ``platform`` in that table, and only the matching datasets read from the index.
+
+        dc = CachedDatacube(app="S2_l2a_Loading_and_Plotting")
+        datasets = dc.find_datasets(product="s2_l2a", lon=(106.7, 107.0), lat=(-6.4, -6.1))
+        data = dc.load(datasets=datasets, measurements=["red"])
+
+    Args:
+        dc (Datacube | None): Datacube to wrap, None to open one for ``env``.
+        env (str | None): Datacube environment name, None for the default.
+        app (str): Application name reported to the database.
+        maxsize (int): Query results kept in memory.
+        cache_dir (str | None): Directory of the on-disk tier shared between
+            kernels (default: ``$PIKSEL_QUERY_CACHE_DIR``, unset for memory only).
+        stamp_ttl (float): Seconds an index stamp is trusted before it is read again.
+        search_tables (bool): Use the per-product search tables where they are current.
+    """
+
+    def __init__(self, dc=None, env: str | None = None, app: str = "piksel-notebook",
+                 maxsize: int = 128, cache_dir: str | None = None, stamp_ttl: float = 30.0,
+                 search_tables: bool = True):
+        if dc is None:
+            from datacube import Datacube
+
+            dc = Datacube(env=env, app=app)
+        self.dc = dc
+        self.cache = QueryCache(maxsize, cache_dir or os.environ.get(QUERY_CACHE_DIR_ENV))
+        self.stamp_ttl = stamp_ttl
+        self.search_tables = search_tables
+        self._env = env
+        self._app = app
+        self._connection = None
+        self._stamps: dict = {}
+
+    def __getattr__(self, name):
+        return getattr(self.dc, name)
+
+    def _cursor(self):
+        from piksel_core.db import connect
+
+        if self._connection is None or self._connection.closed:
+            self._connection = connect(self._env, application_name=self._app)
+            # No transaction left open on the shared database between cells
+            self._connection.autocommit = True
+        return self._connection.cursor()
+
+    def _stamp(self, product: str | None = None) -> tuple:
+        """The stamp of one product's datasets, or of the product table for None."""
+        cached = self._stamps.get(product)
+        if cached is not None and time.monotonic() - cached[0] < self.stamp_ttl:
+            return cached[1]
+        from piksel_core.db import ODC_SCHEMA
+
+        query = f"SELECT count(*), max(added), max(updated) FROM {ODC_SCHEMA}.product"
+        params: tuple = ()
+        if product is not None:
+            # Archiving only sets dataset.archived, so the dataset stamp includes it
+            query = (
+                f"SELECT count(*), max(added), max(updated), max(archived) FROM {ODC_SCHEMA}.dataset "
+                f"WHERE product_ref = (SELECT id FROM {ODC_SCHEMA}.product WHERE name = %s)"
+            )
+            params = (product,)
+        with self._cursor() as cur:
+            cur.execute(query, params)
+            stamp = tuple(str(v) for v in cur.fetchone())
+        self._stamps[product] = (time.monotonic(), stamp)
+        return stamp
+
+    def _products_stamp(self) -> tuple:
+        return self._stamp()
+
+    def _datasets_stamp(self, products) -> tuple | None:
+        if isinstance(products, str):
+            products = [products]
+        if not products or not all(isinstance(p, str) for p in products):
+            return None
+        return tuple(self._stamp(p) for p in sorted(products)) + (self._products_stamp(),)
+
+    def _cached(self, call: str, stamp, kwargs: dict, read):
+        from piksel_core import telemetry
+
+        key = search_key(call, kwargs)
+        value = self.cache.get(key, stamp)
+        telemetry.count("query_cache", call=call, result="miss" if value is None else "hit")
+        if value is None:
+            value = read()
+            self.cache.put(key, stamp, value)
+        # A kernel lives for a whole class; make its queries visible to perf-report as it goes
+        telemetry.flush_if_due()
+        return value
+
+    def _find(self, search: dict):
+        """Search the product's search table if it can answer, datacube otherwise."""
+        from piksel_core import telemetry
+
+        product = search.get("product")
+        if self.search_tables and isinstance(product, str):
+            from piksel_core.search_tables import SEARCH_KEYS
+            from piksel_core.search_tables import search as table_search
+
+            if not set(search) - SEARCH_KEYS:
+                terms = dict(search)
+                if terms.get("time") is not None:
+                    start, end = _time_range(terms["time"])
+                    terms["time"] = (start.to_pydatetime(warn=False), end.to_pydatetime(warn=False))
+                with telemetry.timer("find_datasets", product=product, source="search_table"):
+                    with self._cursor() as cur:
+                        ids = table_search(cur, **terms)
+                    datasets = None if ids is None else list(self.dc.index.datasets.bulk_get(ids))
+                if datasets is not None:
+                    return datasets
+        with telemetry.timer("find_datasets", product=product, source="index"):
+            return self.dc.find_datasets(**search)
+
+    def find_datasets(self, **search):
+        """``Datacube.find_datasets``, reused while the product is unchanged in the index."""
+        stamp = self._datasets_stamp(search.get("product"))
+        if stamp is None or search.get("dataset_predicate") is not None:
+            return self.dc.find_datasets(**search)
+        return self._cached("find_datasets", stamp, search, lambda: self._find(search))
+
+    def list_products(self, **kwargs):
+        """``Datacube.list_products``, reused while no product was added or changed."""
+        if kwargs.get("dataset_count"):
+            return self.dc.list_products(**kwargs)
+        return self._cached("list_products", self._products_stamp(), kwargs,
+                            lambda: self.dc.list_products(**kwargs))
+
+    def list_measurements(self, **kwargs):
+        """``Datacube.list_measurements``, reused while no product was added or changed."""
+        return self._cached("list_measurements", self._products_stamp(), kwargs,
+                            lambda: self.dc.list_measurements(**kwargs))
+
+    def close(self) -> None:
+        """Close the stamp connection and the wrapped ``Datacube``."""
+        if self._connection is not None:
+            self._connection.close()
+        self.dc.close()
+
+
+def _time_range(time) -> tuple:
+    """``(start, end)`` timestamps for a ``time=`` search value, as ``dc.load`` reads them."""
+    import pandas as pd
+
+    def bounds(value):
+        if isinstance(value, str):
+            period = pd.Period(value)
+            return pd.Timestamp(period.start_time, tz="UTC"), pd.Timestamp(period.end_time, tz="UTC")
+        value = pd.Timestamp(value)
+        value = value.tz_localize("UTC") if value.tzinfo is None else value.tz_convert("UTC")
+        return value, value
+
+    if isinstance(time, (list, tuple)):
+        return bounds(time[0])[0], bounds(time[-1])[1]
+    return bounds(time)
+
+
+class CatalogueSnapshot:
+    """
+    Search the GeoParquet snapshot of the dataset catalogue without the database.
+
+    Filters on time, bounding box and the ``cloud_cover``, ``region_code`` and
+    ``platform`` fields are evaluated by pyarrow over the snapshot's year
+    partitions and row-group statistics, so scanning hundreds of thousands of
+    footprints takes milliseconds and no connection. Only the selected datasets
+    are read from the index when loading.
+
+        catalogue = CatalogueSnapshot()
+        frame = catalogue.search(product="s2_l2a", lon=(106.7, 107.0), lat=(-6.4, -6.1),
+                                 time=("2023-01", "2023-06"), cloud_cover=20)
+        data = catalogue.load(dc, frame, measurements=["red"], output_crs="EPSG:32748", resolution=20)
+
+    The snapshot is as fresh as its last ``make catalogue-snapshot``.
+
+    Args:
+        path (str | None): Snapshot directory (default: ``$PIKSEL_CATALOGUE_DIR``
+            or the shared data directory).
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path or os.environ.get(CATALOGUE_DIR_ENV, DEFAULT_CATALOGUE_DIR)
+        self._dataset = None
+
+    @property
+    def dataset(self):
+        """The snapshot as a ``pyarrow.dataset.Dataset``, partitioned by product and year."""
+        if self._dataset is None:
+            import pyarrow.dataset as ds
+
+            self._dataset = ds.dataset(
+                self.path, format="parquet", partitioning="hive", ignore_prefixes=[".", "_"]
+            )
+        return self._dataset
+
+    def products(self) -> list[str]:
+        """The products in the snapshot."""
+        return sorted(
+            entry.partition("=")[2] for entry in os.listdir(self.path) if entry.startswith("product=")
+        )
+
+    def filter(self, product=None, lon=None, lat=None, time=None, cloud_cover=None,
+               region_code=None, platform=None):
+        """
+        The pyarrow filter expression for a search, None to select everything.
+
+        Args:
+            product (str | list[str] | None): Product name(s).
+            lon (tuple | None): ``(min, max)`` longitude the footprint must overlap.
+            lat (tuple | None): ``(min, max)`` latitude the footprint must overlap.
+            time: A date string (``"2023"``, ``"2023-05"``), a datetime, or a
+                ``(start, end)`` pair of those, as for ``dc.load``.
+            cloud_cover (float | tuple | None): Maximum, or ``(min, max)``.
+            region_code (str | list[str] | None): Region code(s).
+            platform (str | list[str] | None): Platform(s).
+
+        Returns:
+            pyarrow.compute.Expression | None: The filter.
+        """
+        import pyarrow.compute as pc
+
+        conditions = []
+        for name, value in (("product", product), ("region_code", region_code), ("platform", platform)):
+            if value is not None:
+                conditions.append(pc.field(name).isin([value] if isinstance(value, str) else list(value)))
+        if time is not None:
+            start, end = _time_range(time)
+            # Datasets are partitioned by the year they start
+            conditions.append(pc.field("year") <= end.year)
+            conditions.append(pc.field("time_start") <= end.to_pydatetime())
+            conditions.append(pc.field("time_end") >= start.to_pydatetime())
+        if lon is not None:
+            conditions.append(pc.field("bbox", "xmax") >= min(lon))
+            conditions.append(pc.field("bbox", "xmin") <= max(lon))
+        if lat is not None:
+            conditions.append(pc.field("bbox", "ymax") >= min(lat))
+            conditions.append(pc.field("bbox", "ymin") <= max(lat))
+        if cloud_cover is not None:
+            low, high = cloud_cover if isinstance(cloud_cover, (list, tuple)) else (None, cloud_cover)
+            if low is not None:
+                conditions.append(pc.field("cloud_cover") >= low)
+            conditions.append(pc.field("cloud_cover") <= high)
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    def search(self, geopolygon=None, columns: list[str] | None = None, **search):
+        """
+        The datasets matching a search, as a ``pandas.DataFrame`` sorted by time.
+
+        Args:
+            geopolygon: Optional shapely or odc-geo geometry; footprints must
+                intersect it exactly (its bounds are used when ``lon``/``lat``
+                are not given).
+            columns (list[str] | None): Columns to read (default: all).
+            **search: ``product``, ``lon``, ``lat``, ``time``, ``cloud_cover``,
+                ``region_code`` and ``platform``, see ``filter``.
+
+        Returns:
+            pandas.DataFrame: One row per dataset; ``geometry`` holds WKB in EPSG:4326.
+        """
+        shape = None
+        if geopolygon is not None:
+            shape = geopolygon.to_crs("EPSG:4326").geom if hasattr(geopolygon, "to_crs") else geopolygon
+            xmin, ymin, xmax, ymax = shape.bounds
+            search.setdefault("lon", (xmin, xmax))
+            search.setdefault("lat", (ymin, ymax))
+        if shape is not None and columns is not None and "geometry" not in columns:
+            columns = [*columns, "geometry"]
+        table = self.dataset.to_table(columns=columns, filter=self.filter(**search))
+        if "time_start" in table.column_names:
+            table = table.sort_by("time_start")
+        frame = table.to_pandas()
+        if shape is not None:
+            import shapely
+
+            frame = frame[shapely.intersects(shapely.from_wkb(frame["geometry"].to_numpy()), shape)]
+        return frame.reset_index(drop=True)
+
+    def load(self, dc, frame, **kwargs):
+        """
+        ``dc.load`` the datasets of a ``search`` result.
+
+        Args:
+            dc (Datacube): Datacube to read the datasets and data from.
+            frame (pandas.DataFrame): Rows returned by ``search``.
+            **kwargs: Passed to ``dc.load``, e.g. ``measurements``, ``output_crs``.
+
+        Returns:
+            xarray.Dataset: The loaded data.
+        """
+        datasets = list(dc.index.datasets.bulk_get(list(frame["id"])))
+        if "product" not in kwargs and "product" in frame:
+            products = frame["product"].unique()
+            if len(products) == 1:
+                kwargs["product"] = str(products[0])
+        return dc.load(datasets=datasets, **kwargs)
+
+
+# Landsat Collection 2 Level-2 products, oldest sensor first (products/lsX_c2l2_*.odc-product.yaml)
+LANDSAT_PRODUCTS = {
+    "sr": ("ls5_c2l2_sr", "ls7_c2l2_sr", "ls8_c2l2_sr", "ls9_c2l2_sr"),
+    "st": ("ls5_c2l2_st", "ls7_c2l2_st", "ls8_c2l2_st", "ls9_c2l2_st"),
+}
+
+# Landsat 5 and 7 bands loaded under their Landsat 8/9 name
+LANDSAT_BAND_NAMES = {"lwir": "lwir11"}
+
+# dc.load arguments that are not search terms
+_LOAD_OPTIONS = ("output_crs", "resolution", "align", "resampling", "group_by", "fuse_func",
+                 "skip_broken_datasets", "progress_cbk", "like")
+
+
+def landsat_bands(definitions: dict, measurements=None) -> dict:
+    """
+    Each product's bands to load, under the name they get in the merged dataset.
+
+    A requested name matches a product's band by its name, its Landsat 8/9
+    name (``LANDSAT_BAND_NAMES``) or one of its aliases, so ``lwir11`` and
+    ``surface_temperature`` select ``lwir`` of Landsat 5 and 7.
+
+    Args:
+        definitions (dict): Product name to its definition's ``measurements`` list.
+        measurements (list[str] | None): Names to load (default: the bands every
+            product has, in the order of the newest product).
+
+    Returns:
+        dict: Product name to ``{band: name}``, in the order of ``measurements``.
+    """
+    if measurements is None:
+        names = [[LANDSAT_BAND_NAMES.get(m["name"], m["name"]) for m in bands] for bands in definitions.values()]
+        measurements = [name for name in names[-1] if all(name in other for other in names)]
+    bands = {}
+    for product, definition in definitions.items():
+        selected = {}
+        for name in measurements:
+            band = next((m["name"] for m in definition
+                         if name in (m["name"], LANDSAT_BAND_NAMES.get(m["name"]), *m.get("aliases", ()))), None)
+            if band is None:
+                raise ValueError(f"{product} has no band {name!r}; pass products= without it")
+            selected[band] = name
+        bands[product] = selected
+    return bands
+
+
+def load_landsat(dc, measurements=None, kind: str = "sr", products=None, dask_chunks=None,
+                 workers: int | None = None, **search):
+    """
+    One lazy time series of every Landsat sensor's datasets, sorted by time.
+
+    The per-product searches run concurrently; each product is then loaded
+    with ``dask_chunks`` onto one common grid, its bands renamed as in
+    ``landsat_bands`` and its nodata set to that of the newest product,
+    and the products are concatenated along ``time``. Nothing is read until
+    the result is computed, e.g. a slice at a time with ``stream``. A
+    ``product`` coordinate along ``time`` tells the sensors apart.
+
+        data = load_landsat(dc, ["red", "nir08", "qa_pixel"], lon=(106.7, 107.0), lat=(-6.4, -6.1),
+                            time=("1990", "2024"), output_crs="EPSG:32748", resolution=30)
+        for block in stream(data):
+            ...
+
+    Args:
+        dc (Datacube | CachedDatacube): Datacube to search and load with.
+        measurements (list[str] | None): Band names (default: the bands every product has).
+        kind (str): ``"sr"`` for surface reflectance, ``"st"`` for surface temperature.
+        products (Iterable[str] | None): Products to load (default: every sensor of ``kind``).
+        dask_chunks (dict | None): Chunks of the result (default: one time step
+            and 2048 pixels square).
+        workers (int | None): Concurrent searches (default: one per product).
+        **search: Search terms (``lon``, ``lat``, ``time``, ``geopolygon``,
+            ``cloud_cover``, ...) and ``dc.load`` options (``output_crs``,
+            ``resolution``, ``align``, ``like``, ``group_by``, ``resampling``, ...).
+
+    Returns:
+        xarray.Dataset: The dask-backed time series.
+    """
+    import xarray as xr
+    from datacube.api.core import output_geobox
+
+    products = list(products or LANDSAT_PRODUCTS[kind])
+    load = {name: search.pop(name) for name in _LOAD_OPTIONS if name in search}
+    with ThreadPoolExecutor(max_workers=workers or len(products)) as pool:
+        found = dict(zip(products, pool.map(lambda p: list(dc.find_datasets(product=p, **search)), products)))
+    found = {product: datasets for product, datasets in found.items() if datasets}
+    if not found:
+        raise ValueError(f"No datasets of {', '.join(products)} match the search")
+
+    definitions = {p: dc.index.products.get_by_name(p).definition["measurements"] for p in found}
+    bands = landsat_bands(definitions, measurements)
+    newest = {m["name"]: m for m in definitions[list(found)[-1]]}
+    nodata = {name: newest[band]["nodata"] for band, name in bands[list(found)[-1]].items()}
+
+    geobox = output_geobox(
+        like=load.pop("like", None), output_crs=load.pop("output_crs", None),
+        resolution=load.pop("resolution", None), align=load.pop("align", None),
+        datasets=[d for datasets in found.values() for d in datasets], **search,
+    )
+    parts = []
+    for product, datasets in found.items():
+        part = dc.load(
+            datasets=datasets, measurements=list(bands[product]), like=geobox,
+            dask_chunks=dask_chunks or {"time": 1, "x": 2048, "y": 2048},
+            patch_url=patch_usgs_landsat, **load,
+        ).rename(bands[product])
+        for name, value in nodata.items():
+            if part[name].attrs.get("nodata") != value:
+                part[name] = part[name].where(part[name] != part[name].attrs.get("nodata"), value).assign_attrs(
+                    part[name].attrs, nodata=value)
+        parts.append(part.assign_coords(product=("time", [product] * part.sizes["time"])))
+    return xr.concat(parts, dim="time", combine_attrs="override").sortby("time")
+
+
+def stream(data, dim: str = "time", size: int | None = None):
+    """
+    Compute ``data`` one slice along ``dim`` at a time.
+
+    Each slice is computed by dask on all cores, and only one is in memory,
+    so a time series much larger than memory can be reduced block by block.
+
+    Args:
+        data (xarray.Dataset | xarray.DataArray): Dask-backed data, e.g. from ``load_landsat``.
+        dim (str): Dimension to slice.
+        size (int | None): Steps per slice (default: the dask chunks along ``dim``).
+
+    Yields:
+        The computed slices, in order.
+    """
+    total = data.sizes[dim]
+    if size is None:
+        chunks = data.chunksizes.get(dim) or (total,)
+    else:
+        chunks = [size] * (total // size) + ([total % size] if total % size else [])
+    start = 0
+    for step in chunks:
+        yield data.isel({dim: slice(start, start + step)}).compute()
+        start += step
+
+
+class OverviewPyramid:
+    """
+    Read an annual product at map scales from its Zarr overview pyramid.
+
+    ``load`` opens the coarsest level whose resolution is still at least as
+    fine as the one requested, so a country-wide map reads a few hundred
+    chunks instead of every full-resolution COG. Resolutions finer than the
+    pyramid's level 0 are loaded from the COGs with ``dc``.
+
+        pyramid = OverviewPyramid()
+        data = pyramid.load(2023, resolution=1000, lon=(105.0, 115.0), lat=(-9.0, -5.0),
+                            measurements=["red", "green", "blue"])
+
+    The pyramid is as fresh as its last ``make overviews``.
+
+    Args:
+        product (str): Annual product with a pyramid.
+        path (str | None): Overview directory (default: ``$PIKSEL_OVERVIEW_DIR``
+            or the shared data directory).
+    """
+
+    def __init__(self, product: str = "s2_geomad_annual", path: str | None = None):
+        self.product = product
+        self.path = os.path.join(path or os.environ.get(OVERVIEW_DIR_ENV, DEFAULT_OVERVIEW_DIR), product)
+
+    def _store(self, year: int) -> str:
+        return os.path.join(self.path, f"{year}.zarr")
+
+    def years(self) -> list[int]:
+        """The years with a pyramid."""
+        return sorted(int(name[:-5]) for name in os.listdir(self.path)
+                      if name.endswith(".zarr") and name[:-5].isdigit())
+
+    def attrs(self, year: int) -> dict:
+        """The root attributes of a year's pyramid: ``grid``, ``resolutions``, ``measurements``, ..."""
+        import zarr
+
+        return dict(zarr.open_group(self._store(year), mode="r").attrs)
+
+    def level(self, year: int, resolution: float) -> int | None:
+        """The coarsest level at least as fine as ``resolution``, None if level 0 is coarser."""
+        levels = [i for i, r in enumerate(self.attrs(year)["resolutions"]) if r <= resolution]
+        return levels[-1] if levels else None
+
+    def load(self, year: int, resolution: float, lon=None, lat=None, measurements=None, dc=None, **kwargs):
+        """
+        One year of the product at ``resolution`` or the closest finer level.
+
+        Args:
+            year (int): Year to load.
+            resolution (float): Wanted pixel size, in the product's CRS units (metres).
+            lon (tuple | None): ``(min, max)`` longitude (default: the whole pyramid).
+            lat (tuple | None): ``(min, max)`` latitude.
+            measurements (list[str] | None): Bands (default: all).
+            dc (Datacube | None): Datacube to load finer resolutions from the COGs.
+            **kwargs: Passed to ``dc.load`` when loading from the COGs.
+
+        Returns:
+            xarray.Dataset: Dask-backed bands on the level's grid, with its CRS.
+        """
+        attrs = self.attrs(year)
+        crs = attrs["grid"]["crs"]
+        level = self.level(year, resolution)
+        if level is None:
+            if dc is None:
+                raise ValueError(f"{resolution} is finer than the pyramid's {attrs['resolutions'][0]}; "
+                                 "pass dc= to load it from the COGs")
+            return dc.load(product=self.product, time=str(year), lon=lon, lat=lat, measurements=measurements,
+                           output_crs=crs, resolution=resolution, **kwargs)
+
+        import xarray as xr
+        from odc.geo.geom import box
+        from odc.geo.xr import assign_crs
+
+        data = xr.open_zarr(self._store(year), group=str(level), consolidated=False, mask_and_scale=False)
+        if measurements is not None:
+            data = data[list(measurements)]
+        if lon is not None or lat is not None:
+            lon, lat = lon or (-180.0, 180.0), lat or (-90.0, 90.0)
+            left, bottom, right, top = box(min(lon), min(lat), max(lon), max(lat), "EPSG:4326").to_crs(crs).boundingbox
+            data = data.sel(x=slice(left, right), y=slice(top, bottom))
+        return assign_crs(data, crs)
@@ -0,0 +1,6 @@
+"""
+Piksel-core operational tooling for the ODC index.
+
+The modules in this package run inside the odc image and are exposed as
+sub-commands of ``python -m piksel_core`` (see ``piksel_core.cli``).
+"""
@@ -0,0 +1,4 @@
+from piksel_core.cli import cli
+
+if __name__ == "__main__":
+    cli()
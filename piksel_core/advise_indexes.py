@@ -0,0 +1,200 @@
+"""
+``advise-indexes``: create (or drop) targeted indexes for ODC search fields
+and report ``dc.index.datasets.count(...)`` latency before and after.
+
+By default the planned statements are only printed; ``--apply`` runs them with
+``CREATE/DROP INDEX CONCURRENTLY`` so searches are never blocked.
+"""
+
+import statistics
+import time
+from collections import Counter
+from datetime import timedelta
+
+import click
+import psycopg2
+from datacube import Datacube
+from datacube.drivers.postgis._api import get_dataset_fields
+from datacube.ui.click import environment_option, pass_config
+from sqlalchemy.dialects import postgresql
+
+from piksel_core.advisor import (
+    SEARCH_TABLES,
+    IndexAction,
+    expression_index_name,
+    expression_index_sql,
+    field_usage,
+    plan_partial_indexes,
+    search_fields,
+)
+from piksel_core.db import connect
+
+
+def _fetch(connection, query, params=()):
+    with connection.cursor() as cur:
+        cur.execute(query, params)
+        rows = cur.fetchall()
+    connection.commit()
+    return rows
+
+
+def _statement_usage(connection) -> Counter | None:
+    try:
+        rows = _fetch(
+            connection,
+            "SELECT query, calls FROM pg_stat_statements WHERE query LIKE %s",
+            ("%dataset_search_%",),
+        )
+    except psycopg2.errors.UndefinedTable:
+        connection.rollback()
+        return None
+    return field_usage(rows)
+
+
+def _document_expression(definition: dict, field: str) -> str:
+    """The SQL datacube evaluates for an unindexed field, with literal offsets."""
+    expression = get_dataset_fields(definition)[field].alchemy_expression
+    compiled = expression.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    return str(compiled).replace("odc.dataset.", "")
+
+
+def _probe_value(connection, field, product_id: int, expression: str | None):
+    """A representative filter value for ``field``, taken from the data itself."""
+    if expression is not None:
+        rows = _fetch(connection, f"SELECT {expression} FROM odc.dataset "
+                                  f"WHERE product_ref = %s AND ({expression}) IS NOT NULL LIMIT 1",
+                      (product_id,))
+        return rows[0][0] if rows else None
+    table = SEARCH_TABLES[field.kind]
+    if field.kind == "string":
+        rows = _fetch(connection, f"SELECT search_val FROM odc.{table} WHERE search_key = %s "
+                                  "GROUP BY search_val ORDER BY count(*) DESC LIMIT 1", (field.name,))
+        return rows[0][0] if rows else None
+    if field.kind == "datetime":
+        rows = _fetch(connection, f"SELECT max(upper(search_val)) FROM odc.{table} "
+                                  "WHERE search_key = %s", (field.name,))
+        latest = rows[0][0]
+        return (latest - timedelta(days=30), latest) if latest else None
+    rows = _fetch(connection, f"SELECT min(lower(search_val)), percentile_disc(0.2) "
+                              f"WITHIN GROUP (ORDER BY lower(search_val)) FROM odc.{table} "
+                              "WHERE search_key = %s", (field.name,))
+    low, high = rows[0]
+    return (float(low), float(high)) if low is not None else None
+
+
+def _time_probe(dc: Datacube, product: str, field: str, value, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        dc.index.datasets.count(product=product, **{field: value})
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+@click.command("advise-indexes")
+@environment_option
+@pass_config
+@click.option("--products", type=str, default=None,
+              help="Comma separated products to consider (default: all).")
+@click.option("--field", "extra_fields", multiple=True,
+              help="Treat a field as queried even without pg_stat_statements; "
+                   "PRODUCT:FIELD requests an expression index for an unindexed field.")
+@click.option("--min-calls", type=int, default=10, show_default=True,
+              help="Only index fields used by at least this many recorded calls.")
+@click.option("--brin", "brin_fields", multiple=True,
+              help="Datetime field to index with BRIN instead of GiST, e.g. time.")
+@click.option("--drop-unused", is_flag=True, default=False,
+              help="Drop advisor indexes that no query has scanned.")
+@click.option("--apply", "apply_", is_flag=True, default=False,
+              help="Run the statements and measure latency before and after.")
+@click.option("--probe-runs", type=int, default=3, show_default=True,
+              help="Timed runs per probe query (median reported).")
+def cli(cfg_env, products, extra_fields, min_calls, brin_fields, drop_unused, apply_, probe_runs):
+    """
+    Plan per-field indexes from the metadata types and the recorded query mix.
+    """
+    connection = connect(cfg_env, application_name="piksel-advise-indexes")
+    catalogue = _fetch(
+        connection,
+        "SELECT p.id, p.name, m.definition FROM odc.product p "
+        "JOIN odc.metadata_type m ON m.id = p.metadata_type_ref ORDER BY p.name",
+    )
+    if products:
+        wanted = set(products.split(","))
+        catalogue = [row for row in catalogue if row[1] in wanted]
+    fields = {}
+    for _, _, definition in catalogue:
+        fields.update(search_fields(definition))
+
+    usage = _statement_usage(connection)
+    if usage is None:
+        print("pg_stat_statements is not installed, using --field only")
+        usage = Counter()
+    expression_requests = []
+    for entry in extra_fields:
+        product, _, field = entry.rpartition(":")
+        if product:
+            expression_requests.append((product, field))
+        else:
+            usage[field] += min_calls
+    for name, calls in usage.most_common():
+        if name in fields:
+            print(f"{name}: {calls} calls")
+
+    existing = {row[0] for row in _fetch(
+        connection, "SELECT indexname FROM pg_indexes WHERE schemaname = 'odc'")}
+    index_scans = dict(_fetch(
+        connection, "SELECT indexrelname, idx_scan FROM pg_stat_user_indexes WHERE schemaname = 'odc'"))
+    actions = plan_partial_indexes(fields, usage, existing, index_scans, min_calls,
+                                   brin_fields, drop_unused)
+
+    by_name = {row[1]: row for row in catalogue}
+    for product, field in expression_requests:
+        if product not in by_name or field not in fields:
+            raise click.BadParameter(f"Unknown product or field: {product}:{field}")
+        if fields[field].indexed:
+            raise click.BadParameter(f"{field} is in the search tables; pass it without a product")
+        name = expression_index_name(product, field)
+        if name not in existing:
+            product_id, _, definition = by_name[product]
+            expression = _document_expression(definition, field)
+            actions.append(IndexAction(
+                "create", name, expression_index_sql(product, product_id, field, expression),
+                f"unindexed field {field} filtered on {product}", field=field, product=product,
+            ))
+
+    if not actions:
+        print("No index changes proposed")
+        return
+    for action in actions:
+        print(f"-- {action.action} {action.name}: {action.reason}\n{action.sql};")
+    if not apply_:
+        print("Dry run: pass --apply to run these statements")
+        return
+
+    dc = Datacube(env=cfg_env, app="piksel-advise-indexes")
+    probes = []
+    for action in actions:
+        if action.action != "create":
+            continue
+        targets = [by_name[action.product]] if action.product else [
+            row for row in catalogue if action.field in search_fields(row[2])]
+        for product_id, product, definition in targets:
+            expression = _document_expression(definition, action.field) if action.product else None
+            value = _probe_value(connection, fields[action.field], product_id, expression)
+            if value is not None:
+                probes.append((product, action.field, value))
+    before = [_time_probe(dc, *probe, probe_runs) for probe in probes]
+
+    connection.autocommit = True
+    with connection.cursor() as cur:
+        for action in actions:
+            print(f"Running {action.action} {action.name}...")
+            cur.execute(action.sql)
+        for table in ("dataset", *SEARCH_TABLES.values()):
+            cur.execute(f"ANALYZE odc.{table}")
+    connection.autocommit = False
+
+    after = [_time_probe(dc, *probe, probe_runs) for probe in probes]
+    for (product, field, value), ms_before, ms_after in zip(probes, before, after):
+        print(f"{product} {field}={value!r}: {ms_before:.1f} ms -> {ms_after:.1f} ms")
@@ -0,0 +1,165 @@
+"""
+Plan targeted indexes for ODC search fields.
+
+The postgis driver keeps every search field of every product in three shared
+tables (``dataset_search_string``, ``_num`` and ``_datetime``) whose only
+search indexes cover all keys at once. A query on ``cloud_cover`` therefore
+scans the GiST entries of every numeric field of every product. The planner
+here reads the search fields from the metadata type, weighs them by how often
+they appear in real queries, and proposes:
+
+* a partial index per used field on its search table
+  (``WHERE search_key = '<field>'``; GiST for ranges, btree for strings, or
+  BRIN for datetime fields of append-mostly tables), and
+* per-product expression indexes on ``odc.dataset`` for fields declared
+  ``indexed: false``, which datacube queries straight from the JSON document.
+
+Datacube names the joined search table ``"dataset_search_num-cloud_cover"``,
+so field usage can be read from ``pg_stat_statements`` even though the
+query constants are normalised away.
+"""
+
+import re
+from collections import Counter
+from collections.abc import Iterable, Mapping
+from typing import NamedTuple
+
+from piksel_core.bulk import SEARCH_TABLE_KINDS
+
+# Indexes created by the advisor; only these are ever dropped by it.
+PARTIAL_PREFIX = "pix_"
+
+SEARCH_TABLES = {
+    "string": "dataset_search_string",
+    "numeric": "dataset_search_num",
+    "datetime": "dataset_search_datetime",
+}
+
+_ALIAS = re.compile(r'"dataset_search_(string|num|datetime)-([A-Za-z0-9_]+)"')
+_ALIAS_KINDS = {"string": "string", "num": "numeric", "datetime": "datetime"}
+
+
+class SearchField(NamedTuple):
+    name: str
+    type_name: str
+    indexed: bool
+
+    @property
+    def kind(self) -> str:
+        return SEARCH_TABLE_KINDS[self.type_name]
+
+
+class IndexAction(NamedTuple):
+    """A ``CREATE`` or ``DROP`` statement and why it is proposed."""
+
+    action: str
+    name: str
+    sql: str
+    reason: str
+    field: str | None = None
+    product: str | None = None
+
+
+def search_fields(metadata_type: Mapping) -> dict[str, SearchField]:
+    """The search fields a metadata type definition declares."""
+    fields = {}
+    for name, spec in (metadata_type.get("dataset", {}).get("search_fields") or {}).items():
+        fields[name] = SearchField(name, spec.get("type", "string"), spec.get("indexed", True))
+    return fields
+
+
+def field_usage(statements: Iterable[tuple[str, int]]) -> Counter:
+    """
+    Count calls per search field from ``(query, calls)`` rows of ``pg_stat_statements``.
+
+    Returns:
+        Counter: Calls keyed by field name.
+    """
+    usage: Counter = Counter()
+    for query, calls in statements:
+        for _, field in set(_ALIAS.findall(query)):
+            usage[field] += calls
+    return usage
+
+
+def partial_index_name(field: SearchField, brin: bool = False) -> str:
+    suffix = "_brin" if brin else ""
+    return f"{PARTIAL_PREFIX}{field.kind[:3]}_{field.name}{suffix}"
+
+
+def partial_index_sql(field: SearchField, brin: bool = False) -> str:
+    table = SEARCH_TABLES[field.kind]
+    name = partial_index_name(field, brin)
+    if field.kind == "string":
+        method = "btree (search_val)"
+    elif brin:
+        method = "brin (search_val range_inclusion_ops)"
+    else:
+        method = "gist (search_val)"
+    return (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON odc.{table} "
+        f"USING {method} WHERE search_key = '{field.name}'"
+    )
+
+
+def expression_index_name(product: str, field: str) -> str:
+    return f"dix_{product}_{field}"
+
+
+def expression_index_sql(product: str, product_id: int, field: str, expression: str) -> str:
+    """A partial expression index matching datacube's query on an unindexed field."""
+    return (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {expression_index_name(product, field)} "
+        f"ON odc.dataset (({expression})) WHERE product_ref = {product_id} AND archived IS NULL"
+    )
+
+
+def plan_partial_indexes(
+    fields: Mapping[str, SearchField],
+    usage: Mapping[str, int],
+    existing: Iterable[str],
+    index_scans: Mapping[str, int] | None = None,
+    min_calls: int = 1,
+    brin_fields: Iterable[str] = (),
+    drop_unused: bool = False,
+) -> list[IndexAction]:
+    """
+    Propose partial search-table indexes for the fields queries actually use.
+
+    Args:
+        fields (Mapping[str, SearchField]): Search fields of the metadata types.
+        usage (Mapping[str, int]): Calls per field, see ``field_usage``.
+        existing (Iterable[str]): Names of the indexes already in the ``odc`` schema.
+        index_scans (Mapping[str, int] | None): ``idx_scan`` per existing index.
+        min_calls (int): Fields used fewer times are not indexed.
+        brin_fields (Iterable[str]): Datetime fields to index with BRIN instead of GiST.
+        drop_unused (bool): Also drop advisor indexes no query has used.
+
+    Returns:
+        list[IndexAction]: Statements to run, creates first.
+    """
+    existing = set(existing)
+    index_scans = index_scans or {}
+    brin_fields = set(brin_fields)
+    actions = []
+    wanted = set()
+    for field in sorted(fields.values()):
+        calls = usage.get(field.name, 0)
+        if not field.indexed or calls < min_calls:
+            continue
+        brin = field.kind == "datetime" and field.name in brin_fields
+        name = partial_index_name(field, brin)
+        wanted.add(name)
+        if name not in existing:
+            actions.append(IndexAction(
+                "create", name, partial_index_sql(field, brin),
+                f"{calls} calls filter on {field.name}", field=field.name,
+            ))
+    if drop_unused:
+        for name in sorted(existing):
+            if name.startswith(PARTIAL_PREFIX) and name not in wanted and not index_scans.get(name):
+                actions.append(IndexAction(
+                    "drop", name, f"DROP INDEX CONCURRENTLY IF EXISTS odc.{name}",
+                    "no query uses it",
+                ))
+    return actions
@@ -0,0 +1,129 @@
+"""
+On-disk layout of a product archive (``export-product`` / ``import-product``).
+
+An archive is a directory holding ``manifest.json`` and one compressed
+``COPY ... (FORMAT binary)`` stream per table: the product's ``odc.dataset``
+rows, their search, lineage and home rows, and their rows in every
+``spatial_<srid>`` table. The manifest carries the product and metadata type
+definitions, so an archive can be imported into an index that does not know
+the product yet, and the row count of each file.
+
+Streams are compressed with the ``zstd`` command (multi-threaded) when it is
+installed, otherwise with gzip at its fastest level.
+"""
+
+import gzip
+import json
+import os
+import shutil
+import subprocess
+from collections.abc import Mapping
+from datetime import datetime, timezone
+from typing import BinaryIO
+
+ARCHIVE_VERSION = 1
+MANIFEST = "manifest.json"
+
+ZSTD_SUFFIX = ".zst"
+GZIP_SUFFIX = ".gz"
+
+
+def default_suffix() -> str:
+    return ZSTD_SUFFIX if shutil.which("zstd") else GZIP_SUFFIX
+
+
+def table_file(table: str, suffix: str) -> str:
+    """File name of the stream holding ``table``."""
+    return f"{table}.copy{suffix}"
+
+
+class _ZstdStream:
+    """File-like end of a ``zstd`` process compressing into, or decompressing from, ``path``."""
+
+    def __init__(self, path: str, mode: str, level: int = 3):
+        if mode == "wb":
+            args = ["zstd", "-q", "-f", "-T0", f"-{level}", "-o", path]
+            self._process = subprocess.Popen(args, stdin=subprocess.PIPE)
+            self._file = self._process.stdin
+        else:
+            self._process = subprocess.Popen(["zstd", "-q", "-d", "-c", path], stdout=subprocess.PIPE)
+            self._file = self._process.stdout
+
+    def write(self, data) -> int:
+        return self._file.write(data)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def readline(self, size: int = -1) -> bytes:
+        return self._file.readline(size)
+
+    def close(self) -> None:
+        self._file.close()
+        if self._process.wait() != 0:
+            raise OSError(f"zstd exited with status {self._process.returncode}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_stream(path: str, mode: str = "rb") -> BinaryIO:
+    """Open a table stream for binary ``mode`` ``"rb"`` or ``"wb"``, compressed according to its suffix."""
+    if path.endswith(ZSTD_SUFFIX):
+        return _ZstdStream(path, mode)
+    if path.endswith(GZIP_SUFFIX):
+        return gzip.open(path, mode, compresslevel=1)
+    return open(path, mode)
+
+
+def write_manifest(
+    directory: str,
+    product: Mapping,
+    metadata_type: Mapping,
+    files: Mapping[str, str],
+    rows: Mapping[str, int],
+) -> dict:
+    """
+    Write ``manifest.json`` for the streams in ``directory``.
+
+    Args:
+        directory (str): The archive directory.
+        product (Mapping): The product definition document.
+        metadata_type (Mapping): The definition of the product's metadata type.
+        files (Mapping[str, str]): Stream file name per table.
+        rows (Mapping[str, int]): Rows copied per table.
+
+    Returns:
+        dict: The manifest.
+    """
+    manifest = {
+        "version": ARCHIVE_VERSION,
+        "product": product["name"],
+        "exported": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "product_definition": dict(product),
+        "metadata_type_definition": dict(metadata_type),
+        "tables": {table: {"file": files[table], "rows": rows[table]} for table in files},
+    }
+    with open(os.path.join(directory, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2, default=str)
+    return manifest
+
+
+def read_manifest(directory: str) -> dict:
+    """
+    The manifest of the archive in ``directory``.
+
+    Raises:
+        ValueError: If it is missing a stream or was written by a newer version.
+    """
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != ARCHIVE_VERSION:
+        raise ValueError(f"{directory}: unsupported archive version {manifest.get('version')}")
+    for table, entry in manifest["tables"].items():
+        if not os.path.exists(os.path.join(directory, entry["file"])):
+            raise ValueError(f"{directory}: {entry['file']} for {table} is missing")
+    return manifest
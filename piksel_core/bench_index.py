@@ -0,0 +1,183 @@
+"""
+Indexing throughput benchmark, offline.
+
+Serves recorded (``--items-file``) or synthetic STAC items from local
+stand-ins (``piksel_core.standin``) and runs the real dc-tools indexers
+against them: ``stac-to-dc`` searches a local STAC API, ``s3-to-dc --stac``
+lists and fetches ``*.stac-item.json`` objects from a local S3 endpoint, and
+so does ``piksel_core index-s3`` with concurrent fetches. Each
+tool runs in a child process wrapped by ``piksel_core.roundtrips``, so the
+results record items/s, database round trips per item and the peak resident
+memory of the indexer. The time includes the tool's start-up (imports and
+connecting to the index), as it does for a ``make`` target.
+
+Datasets are written to the configured index and removed again afterwards,
+unless ``--keep`` is given. Run it against a local PostGIS only.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import click
+from datacube import Datacube
+from datacube.ui.click import environment_option, pass_config
+
+from piksel_core.db import connect
+from piksel_core.definitions import PRODUCTS_DIR
+from piksel_core.delete_product import delete_by_location
+from piksel_core.indexbench import RESULTS_VERSION, read_items, relabel, throughput_summary, tool_counts
+from piksel_core.roundtrips import ROUNDTRIPS_FILE_ENV
+from piksel_core.s3_discovery import forget_etags
+from piksel_core.standin import S3Standin, StacStandin
+from piksel_core.synth_datasets import load_product_definitions
+from piksel_core.synthetic import stac_item, synthetic_documents
+
+TOOLS = ("stac-to-dc", "s3-to-dc", "index-s3")
+BENCH_BUCKET = "piksel-bench"
+
+
+def _run_tool(argv: list[str], env: dict[str, str]) -> tuple[int, str, float, dict, int]:
+    """Run ``argv`` under the round-trip counter, return exit code, output, time, counts and max RSS (KB)."""
+    with tempfile.NamedTemporaryFile(suffix=".json") as counts_file:
+        env = {**os.environ, **env, ROUNDTRIPS_FILE_ENV: counts_file.name}
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "piksel_core.roundtrips", *argv],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, env=env,
+        )
+        output = process.stdout.read()
+        _, status, usage = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - started
+        process.returncode = os.waitstatus_to_exitcode(status)
+        process.stdout.close()
+        with open(counts_file.name) as f:
+            text = f.read()
+    return process.returncode, output, seconds, json.loads(text) if text else {}, usage.ru_maxrss
+
+
+def _stac_to_dc(items: list[dict], product: str, page_size: int) -> tuple[list[str], dict, str, StacStandin]:
+    standin = StacStandin(items, page_size=page_size, self_links=True).start()
+    argv = ["stac-to-dc", f"--catalog-href={standin.url}", f"--collections={product}",
+            f"--rename-product={product}"]
+    return argv, {}, standin.url, standin
+
+
+def _s3_objects(items: list[dict], product: str, prefix: str) -> dict[str, bytes]:
+    objects = {}
+    for item in items:
+        key = f"{prefix}/{product}/{item['properties'].get('odc:region_code', 'x')}/{item['id']}.stac-item.json"
+        item["links"].append({"rel": "self", "href": f"s3://{BENCH_BUCKET}/{key}",
+                              "type": "application/geo+json"})
+        objects[key] = json.dumps(item).encode()
+    return objects
+
+
+def _s3_to_dc(items: list[dict], product: str, run: str) -> tuple[list[str], dict, str, S3Standin]:
+    standin = S3Standin(_s3_objects(items, product, run), bucket=BENCH_BUCKET).start()
+    argv = ["s3-to-dc", "--stac", "--no-sign-request",
+            f"--rename-product={product}", f"s3://{BENCH_BUCKET}/{run}/**/*.stac-item.json", product]
+    return argv, standin.environment(), f"s3://{BENCH_BUCKET}/{run}/", standin
+
+
+def _index_s3(items: list[dict], product: str, run: str) -> tuple[list[str], dict, str, S3Standin]:
+    standin = S3Standin(_s3_objects(items, product, run), bucket=BENCH_BUCKET).start()
+    argv = ["piksel_core", "index-s3", "--no-sign-request", f"s3://{BENCH_BUCKET}/{run}/**/*.stac-item.json",
+            product]
+    return argv, standin.environment(), f"s3://{BENCH_BUCKET}/{run}/", standin
+
+
+@click.command("bench-index")
+@environment_option
+@pass_config
+@click.option("--product", type=str, required=True, help="Product to index into.")
+@click.option("--products-dir", type=click.Path(exists=True, file_okay=False), default=PRODUCTS_DIR,
+              show_default=True, help="Directory of product definition YAMLs (for synthetic items).")
+@click.option("--items", "n_items", type=int, default=1000, show_default=True,
+              help="Synthetic items to index per tool.")
+@click.option("--items-file", type=click.File("r"), default=None,
+              help="Index recorded STAC items instead (FeatureCollection or one item per line).")
+@click.option("--datetime", "datetime_range", type=str, default="2023-01-01/2023-12-31", show_default=True,
+              help="Date range of the synthetic acquisitions.")
+@click.option("--tool", "tools", type=click.Choice(TOOLS), multiple=True, default=TOOLS,
+              show_default=True, help="Indexers to benchmark.")
+@click.option("--page-size", type=int, default=100, show_default=True,
+              help="Items per page of the STAC stand-in.")
+@click.option("--seed", type=int, default=0, show_default=True, help="Random seed.")
+@click.option("--keep", is_flag=True, default=False, help="Keep the indexed datasets.")
+@click.option("--output", type=click.File("w"), default=None,
+              help="Write the results as JSON to this file ('-' for stdout).")
+def cli(cfg_env, product, products_dir, n_items, items_file, datetime_range, tools, page_size, seed, keep, output):
+    """
+    Measure items/s, DB round trips per item and peak memory of stac-to-dc and s3-to-dc.
+    """
+    started_at = datetime.now(timezone.utc)
+    run = f"bench-{started_at:%Y%m%dT%H%M%S}"
+    dc = Datacube(env=cfg_env, app="piksel-bench-index")
+    indexed = dc.index.products.get_by_name(product)
+    if indexed is None:
+        raise click.ClickException(f"Product {product} is not in the index, run `make all-products`")
+
+    if items_file:
+        source = list(read_items(items_file))
+    else:
+        definitions = load_product_definitions(products_dir)
+        if product not in definitions:
+            raise click.ClickException(f"No definition for {product} in {products_dir}")
+        source = [stac_item(doc, uri) for uri, doc in
+                  synthetic_documents(definitions[product], datetime_range, n_items, seed=seed)]
+
+    connection = connect(cfg_env, application_name="piksel-bench-index")
+    # Forward only an --env the user passed; the tools resolve the default environment themselves
+    env_name = click.get_current_context().obj.get("config_environment")
+    results = []
+    for tool in tools:
+        items = relabel(source, f"{run}/{tool}", product)
+        if tool == "stac-to-dc":
+            argv, env, location, standin = _stac_to_dc(items, product, page_size)
+        elif tool == "s3-to-dc":
+            argv, env, location, standin = _s3_to_dc(items, product, run)
+        else:
+            argv, env, location, standin = _index_s3(items, product, f"{run}/{tool}")
+        if env_name:
+            # After the subcommand for python -m piksel_core
+            argv.insert(2 if argv[0] == "piksel_core" else 1, f"--env={env_name}")
+        click.echo(f"{tool}: indexing {len(items)} items into {product}", err=True)
+        try:
+            exit_code, tool_output, seconds, round_trips, max_rss_kb = _run_tool(argv, env)
+        finally:
+            standin.stop()
+        counts = tool_counts(tool_output)
+        result = {
+            "tool": tool,
+            "product": product,
+            "items": len(items),
+            **counts,
+            **throughput_summary(counts["added"], seconds, round_trips, max_rss_kb),
+            "standin_requests": standin.pages_served if tool == "stac-to-dc" else standin.requests,
+            "exit_code": exit_code,
+        }
+        results.append(result)
+        if exit_code or counts["added"] < len(items):
+            click.echo("\n".join(tool_output.splitlines()[-20:]), err=True)
+        click.echo(
+            f"{tool}: added {counts['added']}, failed {counts['failed']}, skipped {counts['skipped']} "
+            f"in {result['seconds']:.1f}s ({result['items_per_s']:.1f} items/s), "
+            f"{result['round_trips_per_item']:.1f} round trips/item, peak {result['peak_rss_mb']:.0f} MB",
+            err=True,
+        )
+        if not keep:
+            deleted = delete_by_location(connection, indexed.id, location)
+            if tool == "index-s3":
+                forget_etags(connection, location)
+            click.echo(f"{tool}: removed {deleted} benchmark datasets", err=True)
+    connection.close()
+
+    if output:
+        json.dump({"version": RESULTS_VERSION, "started": started_at.isoformat(), "results": results},
+                  output, indent=2)
+        output.write("\n")
@@ -0,0 +1,116 @@
+"""
+Ingestion benchmark: per-row ``index_update_dataset`` against bulk ``COPY``.
+
+A sample of STAC items is fetched once and indexed through each path under
+fresh item ids (so every run inserts new datasets), and the datasets written
+are purged afterwards. Run it against a local PostGIS, never production.
+"""
+
+import time
+from collections import Counter
+
+import click
+from datacube import Datacube
+from datacube.ui.click import environment_option, pass_config
+from odc.apps.dc_tools.utils import bbox, item_to_meta_uri, rename_product, url_string_replace
+from pystac import Item
+
+from piksel_core.bulk_indexing import bulk_index_items
+from piksel_core.db import connect
+from piksel_core.indexing import index_items
+from piksel_core.stac import rewrite_item_assets, search_items
+
+MODES = ("per-row", "bulk")
+
+
+def _clone(docs: list[dict], suffix: str) -> list[Item]:
+    items = []
+    for doc in docs:
+        item = Item.from_dict(doc)
+        item.id = f"{item.id}-{suffix}"
+        items.append(item)
+    return items
+
+
+@click.command("bench-ingest")
+@environment_option
+@pass_config
+@click.option("--catalog-href", type=str, required=True, help="URL of the STAC API to sample.")
+@click.option("--collections", type=str, required=True,
+              help="Comma separated list of collections to sample.")
+@bbox
+@click.option("--datetime", type=str, default=None, help="Date range to sample.")
+@rename_product
+@url_string_replace
+@click.option("--items", "n_items", type=int, default=1000, show_default=True,
+              help="Number of items indexed per mode.")
+@click.option("--workers", type=int, default=16, show_default=True,
+              help="Writer threads for the per-row path.")
+@click.option("--batch-size", type=int, default=5000, show_default=True,
+              help="Datasets per transaction for the bulk path.")
+@click.option("--mode", "modes", type=click.Choice(MODES), multiple=True, default=MODES,
+              show_default=True, help="Paths to benchmark.")
+@click.option("--keep", is_flag=True, default=False,
+              help="Keep the benchmark datasets instead of purging them.")
+def cli(
+    cfg_env,
+    catalog_href,
+    collections,
+    bbox,
+    datetime,
+    rename_product,
+    url_string_replace,
+    n_items,
+    workers,
+    batch_size,
+    modes,
+    keep,
+):
+    """
+    Report datasets/sec for the per-row and bulk COPY ingestion paths.
+    """
+    if not rename_product:
+        raise click.BadParameter("--rename-product is required")
+    if url_string_replace:
+        url_string_replace = tuple(url_string_replace.split(","))
+    docs = [
+        rewrite_item_assets(item, url_string_replace or None).to_dict(transform_hrefs=False)
+        for item in search_items(
+            catalog_href,
+            collections.split(","),
+            bbox=list(map(float, bbox.split(","))) if bbox else None,
+            datetime=datetime,
+            max_items=n_items,
+        )
+    ]
+    print(f"Sampled {len(docs)} items from {catalog_href}")
+
+    dc = Datacube(env=cfg_env, app="piksel-bench-ingest")
+    connection = connect(cfg_env, application_name="piksel-bench-ingest")
+    run_id = int(time.time())
+    rates = {}
+    for mode in modes:
+        suffix = f"bench-{mode}-{run_id}"
+        ids = [item_to_meta_uri(item, dc, rename_product=rename_product)[0].id
+               for item in _clone(docs, suffix)]
+        routed = ((rename_product, item) for item in _clone(docs, suffix))
+
+        started = time.monotonic()
+        if mode == "bulk":
+            counts = bulk_index_items(dc, connection, routed, batch_size=batch_size)
+        else:
+            counts = index_items(dc, routed, workers=workers)
+        elapsed = time.monotonic() - started
+
+        totals: Counter = Counter()
+        for (_, status), n in counts.items():
+            totals[status] += n
+        rates[mode] = totals["added"] / elapsed if elapsed else 0.0
+        print(f"{mode}: added {totals['added']}, failed {totals['failed']}, "
+              f"skipped {totals['skipped']} in {elapsed:.1f}s ({rates[mode]:.1f} datasets/s)")
+
+        if not keep:
+            dc.index.datasets.purge(ids, allow_delete_active=True)
+
+    if len(rates) == 2 and rates["per-row"]:
+        print(f"bulk/per-row speed-up: {rates['bulk'] / rates['per-row']:.1f}x")
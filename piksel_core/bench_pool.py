@@ -0,0 +1,247 @@
+"""
+Connection-pool load test: many notebook kernels against one database.
+
+Every kernel is a separate process that opens its own ``Datacube`` (and with
+it a SQLAlchemy connection pool), as notebook kernels and dask worker
+processes do, then runs the ``piksel_core.querybench`` queries for
+``--seconds``. Each kernel count is run twice: connecting to the server
+directly, and through the transaction-pooling proxy (``--pool``). While the
+kernels query, server-side client backends are counted over a direct
+connection, so the JSON results show both how many connections each setup
+costs the server and the query latency kernels saw.
+"""
+
+import json
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from queue import Empty
+
+import click
+import datacube
+from datacube import Datacube
+from datacube.api.query import Query
+from datacube.ui.click import environment_option, pass_config
+
+from piksel_core.db import ODC_SCHEMA, connect, datacube_url, with_host
+from piksel_core.poolbench import (
+    MODES,
+    RESULTS_VERSION,
+    compare_modes,
+    connection_summary,
+    parse_counts,
+    parse_target,
+    run_summary,
+)
+from piksel_core.querybench import queries_for
+
+QUERY_MODES = ("count", "find")
+
+_BENCH_ENV = "bench"
+
+
+def _run(dc: Datacube, mode: str, search: dict) -> int:
+    if mode == "find":
+        return len(dc.find_datasets(**search))
+    return dc.index.datasets.count(**Query(index=dc.index, **search).search_terms)
+
+
+def _error(e: Exception) -> str:
+    lines = str(e).strip().splitlines()
+    return f"{type(e).__name__}: {lines[0]}" if lines else type(e).__name__
+
+
+def _kernel(environment: dict, searches: list, mode: str, threads: int, seconds: float,
+            think: float, start, results) -> None:
+    """One simulated kernel; runs in its own process and puts (connects, timings, errors) on ``results``."""
+    connects, timings, errors = [], [], []
+    start.wait()
+    stop = time.monotonic() + seconds
+    try:
+        started = time.perf_counter()
+        dc = Datacube(raw_config={_BENCH_ENV: environment}, env=_BENCH_ENV, app="piksel-bench-pool")
+        _run(dc, mode, searches[0])
+        connects.append(time.perf_counter() - started)
+    except Exception as e:
+        results.put(([], [], [_error(e)]))
+        return
+
+    def query(offset: int) -> None:
+        i = offset
+        while time.monotonic() < stop:
+            search = searches[i % len(searches)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                _run(dc, mode, search)
+            except Exception as e:
+                errors.append(_error(e))
+            else:
+                timings.append(time.perf_counter() - started)
+            time.sleep(think)
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(query, range(threads)))
+    dc.close()
+    results.put((connects, timings, errors))
+
+
+def _client_backends(cursor) -> int:
+    cursor.execute(
+        "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() "
+        "AND backend_type = 'client backend' AND pid <> pg_backend_pid()"
+    )
+    return cursor.fetchone()[0]
+
+
+def _load(environment: dict, searches: list, mode: str, kernels: int, threads: int,
+          seconds: float, think: float, interval: float, sampler):
+    """Run ``kernels`` kernels against ``environment``, sampling connections every ``interval``."""
+    context = multiprocessing.get_context("spawn")
+    start = context.Barrier(kernels + 1)
+    results = context.Queue()
+    processes = [
+        context.Process(target=_kernel, args=(environment, searches, mode, threads, seconds, think, start, results),
+                        daemon=True)
+        for _ in range(kernels)
+    ]
+    for process in processes:
+        process.start()
+
+    with sampler.cursor() as cur:
+        baseline = _client_backends(cur)
+        # Kernels import datacube before the barrier, so startup is not timed
+        start.wait(timeout=300)
+        started = time.monotonic()
+        samples, connects, timings, errors = [], [], [], []
+        received = 0
+        while received < kernels:
+            samples.append(_client_backends(cur))
+            try:
+                kernel_connects, kernel_timings, kernel_errors = results.get(timeout=interval)
+            except Empty:
+                if not any(process.is_alive() for process in processes) and results.empty():
+                    errors.append(f"{kernels - received} kernels exited without results")
+                    break
+                continue
+            received += 1
+            connects += kernel_connects
+            timings += kernel_timings
+            errors += kernel_errors
+        elapsed = time.monotonic() - started
+    for process in processes:
+        process.join()
+    return connects, timings, errors, connection_summary(samples, baseline), min(elapsed, seconds)
+
+
+def _products(connection, products: str | None) -> list[str]:
+    if products:
+        return products.split(",")
+    with connection.cursor() as cur:
+        cur.execute(
+            f"SELECT p.name FROM {ODC_SCHEMA}.product p WHERE EXISTS ("
+            f"SELECT 1 FROM {ODC_SCHEMA}.dataset d WHERE d.product_ref = p.id AND d.archived IS NULL) "
+            "ORDER BY p.name"
+        )
+        return [row[0] for row in cur.fetchall()]
+
+
+@click.command("bench-pool")
+@environment_option
+@pass_config
+@click.option("--kernels", type=str, default="10,50,100", show_default=True,
+              help="Comma separated numbers of concurrent kernels to run.")
+@click.option("--threads", type=int, default=1, show_default=True,
+              help="Querying threads per kernel, sharing the kernel's Datacube.")
+@click.option("--seconds", type=float, default=30, show_default=True, help="How long each kernel queries.")
+@click.option("--think", type=float, default=0.1, show_default=True,
+              help="Pause in seconds between a thread's queries.")
+@click.option("--mode", type=click.Choice(QUERY_MODES), default="count", show_default=True,
+              help="count: dc.index.datasets.count, find: dc.find_datasets.")
+@click.option("--products", type=str, default=None,
+              help="Comma separated products (default: every product with datasets).")
+@click.option("--pool", type=str, default="pgbouncer:6432", show_default=True,
+              help="host[:port] of the connection pool.")
+@click.option("--target", "targets", type=click.Choice(MODES), multiple=True, default=MODES,
+              show_default=True, help="direct: the database server, pooled: through --pool.")
+@click.option("--sample-interval", type=float, default=0.25, show_default=True,
+              help="Seconds between connection counts.")
+@click.option("--output", type=click.File("w"), default=None,
+              help="Write the results as JSON to this file ('-' for stdout).")
+def cli(cfg_env, kernels, threads, seconds, think, mode, products, pool, targets, sample_interval, output):
+    """
+    Compare server connections and query latency of N concurrent kernels, with and without the pool.
+    """
+    try:
+        counts = parse_counts(kernels)
+        pool_host, pool_port = parse_target(pool)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    started_at = datetime.now(timezone.utc).isoformat()
+    direct = datacube_url(cfg_env)
+    urls = {"direct": direct, "pooled": with_host(direct, pool_host, pool_port)}
+
+    sampler = connect(cfg_env, application_name="piksel-bench-pool")
+    sampler.autocommit = True
+    with sampler.cursor() as cur:
+        cur.execute("SHOW server_version")
+        server_version = cur.fetchone()[0]
+        cur.execute("SHOW max_connections")
+        max_connections = int(cur.fetchone()[0])
+
+    dc = Datacube(env=cfg_env, app="piksel-bench-pool")
+    searches = []
+    for name in _products(sampler, products):
+        product = dc.index.products.get_by_name(name)
+        if product is None:
+            raise click.ClickException(f"Product {name} does not exist")
+        searches += [query.search for query in queries_for(product.definition)]
+    dc.close()
+    if not searches:
+        raise click.ClickException("No products with datasets to query")
+
+    results = []
+    for count in counts:
+        for target in targets:
+            environment = {
+                "index_driver": cfg_env.index_driver,
+                "db_url": urls[target],
+                "db_connection_timeout": cfg_env.db_connection_timeout,
+            }
+            connects, timings, errors, connections, elapsed = _load(
+                environment, searches, mode, count, threads, seconds, think, sample_interval, sampler
+            )
+            netloc = urls[target].split("@")[-1].split("/")[0]
+            result = run_summary(target, netloc, count, threads, elapsed, connects, timings, errors, connections)
+            results.append(result)
+            latency = result["latency"] or {}
+            click.echo(
+                f"{target} {count} kernels: {result['queries']} queries, "
+                f"p50 {latency.get('p50_ms', float('nan')):.1f} ms, p95 {latency.get('p95_ms', float('nan')):.1f} ms, "
+                f"{connections['added_peak']} server connections at peak, {result['errors']} errors"
+                + (f" ({result['first_error']})" if result["first_error"] else ""),
+                err=True,
+            )
+    sampler.close()
+
+    for line in compare_modes(results):
+        click.echo(line, err=True)
+
+    if output:
+        json.dump({
+            "version": RESULTS_VERSION,
+            "started": started_at,
+            "environment": {
+                "datacube": datacube.__version__,
+                "postgres": server_version,
+                "max_connections": max_connections,
+                "pool": f"{pool_host}:{pool_port}",
+                "mode": mode,
+                "seconds": seconds,
+                "think": think,
+            },
+            "results": results,
+        }, output, indent=2)
+        output.write("\n")
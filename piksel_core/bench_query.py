@@ -0,0 +1,174 @@
+"""
+Query-latency benchmark for the ODC index.
+
+Runs the fixed query set of ``piksel_core.querybench`` against every product
+with datasets, as ``dc.find_datasets`` (search and ``Dataset`` construction,
+the first step of ``dc.load``) and as ``dc.index.datasets.count`` (the SQL
+alone). Each query is timed ``--runs`` times after a warm-up, and the SQL
+datacube sent is captured and explained, so the JSON results record both
+p50/p95/p99 latency and the plan shape. ``--baseline`` compares against an
+earlier results file and exits non-zero on regressions.
+
+Fill a local index with ``synth-datasets`` first to benchmark at archive scale.
+"""
+
+import json
+import sys
+import time
+from datetime import datetime, timezone
+
+import click
+import datacube
+import psycopg2
+from datacube import Datacube
+from datacube.api.query import Query
+from datacube.ui.click import environment_option, pass_config
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from piksel_core.db import ODC_SCHEMA, connect
+from piksel_core.querybench import (
+    RESULTS_VERSION,
+    compare_results,
+    latency_summary,
+    plan_summary,
+    queries_for,
+)
+
+MODES = ("find", "count")
+
+
+class _SqlCapture:
+    """Record the dataset queries datacube sends while active."""
+
+    def __init__(self):
+        self.statements: list[tuple[str, object]] = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and f"{ODC_SCHEMA}.dataset" in statement:
+            self.statements.append((statement, parameters))
+
+    def __enter__(self) -> "_SqlCapture":
+        event.listen(Engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(Engine, "before_cursor_execute", self)
+
+
+def _explain(connection, statement: str, parameters) -> dict | None:
+    try:
+        with connection, connection.cursor() as cur:
+            cur.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+            return plan_summary(cur.fetchone()[0])
+    except psycopg2.Error as e:
+        click.echo(f"  could not explain query: {e}", err=True)
+        return None
+
+
+def _run(dc: Datacube, mode: str, search: dict) -> int:
+    if mode == "find":
+        return len(dc.find_datasets(**search))
+    return dc.index.datasets.count(**Query(index=dc.index, **search).search_terms)
+
+
+def _environment(connection) -> dict:
+    with connection, connection.cursor() as cur:
+        cur.execute("SHOW server_version")
+        server_version = cur.fetchone()[0]
+        cur.execute(
+            f"SELECT p.name, count(d.id) FROM {ODC_SCHEMA}.product p "
+            f"LEFT JOIN {ODC_SCHEMA}.dataset d ON d.product_ref = p.id AND d.archived IS NULL "
+            "GROUP BY p.name ORDER BY p.name"
+        )
+        datasets = dict(cur.fetchall())
+        cur.execute(f"SELECT srid FROM {ODC_SCHEMA}.spatial_indicies ORDER BY srid")
+        spatial = [row[0] for row in cur.fetchall()]
+        cur.execute("SELECT indexname FROM pg_indexes WHERE schemaname = %s ORDER BY indexname",
+                    (ODC_SCHEMA,))
+        indexes = [row[0] for row in cur.fetchall()]
+    return {
+        "datacube": datacube.__version__,
+        "postgres": server_version,
+        "spatial_indexes": spatial,
+        "indexes": indexes,
+        "datasets": datasets,
+    }
+
+
+@click.command("bench-query")
+@environment_option
+@pass_config
+@click.option("--products", type=str, default=None,
+              help="Comma separated products (default: every product with datasets).")
+@click.option("--runs", type=int, default=20, show_default=True, help="Timed runs per query.")
+@click.option("--warmup", type=int, default=2, show_default=True, help="Untimed runs per query.")
+@click.option("--mode", "modes", type=click.Choice(MODES), multiple=True, default=MODES,
+              show_default=True, help="find: dc.find_datasets, count: dc.index.datasets.count.")
+@click.option("--output", type=click.File("w"), default=None,
+              help="Write the results as JSON to this file ('-' for stdout).")
+@click.option("--baseline", type=click.File("r"), default=None,
+              help="Results of an earlier run to compare against.")
+@click.option("--threshold", type=float, default=1.25, show_default=True,
+              help="p95 slow-down factor reported as a regression.")
+def cli(cfg_env, products, runs, warmup, modes, output, baseline, threshold):
+    """
+    Measure p50/p95/p99 latency and plan shapes of a fixed set of index queries.
+    """
+    started_at = datetime.now(timezone.utc).isoformat()
+    dc = Datacube(env=cfg_env, app="piksel-bench-query")
+    connection = connect(cfg_env, application_name="piksel-bench-query")
+    environment = _environment(connection)
+    if products:
+        names = products.split(",")
+    else:
+        names = [name for name, n in environment["datasets"].items() if n]
+
+    results = []
+    for name in names:
+        product = dc.index.products.get_by_name(name)
+        if product is None:
+            raise click.ClickException(f"Product {name} does not exist")
+        for query in queries_for(product.definition):
+            for mode in modes:
+                for _ in range(warmup):
+                    _run(dc, mode, query.search)
+                timings = []
+                with _SqlCapture() as capture:
+                    for _ in range(runs):
+                        started = time.perf_counter()
+                        count = _run(dc, mode, query.search)
+                        timings.append(time.perf_counter() - started)
+                plan = _explain(connection, *capture.statements[-1]) if capture.statements else None
+                result = {
+                    "product": name,
+                    "query": query.name,
+                    "mode": mode,
+                    "datasets": count,
+                    **latency_summary(timings),
+                    "plan": plan,
+                }
+                results.append(result)
+                click.echo(
+                    f"{name} {query.name} {mode}: {count} datasets, p50 {result['p50_ms']:.1f} ms, "
+                    f"p95 {result['p95_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms"
+                    + (f", seq scans on {', '.join(plan['seq_scans'])}" if plan and plan["seq_scans"] else ""),
+                    err=True,
+                )
+    connection.close()
+
+    if output:
+        json.dump({
+            "version": RESULTS_VERSION,
+            "started": started_at,
+            "environment": environment,
+            "results": results,
+        }, output, indent=2)
+        output.write("\n")
+
+    if baseline:
+        regressions = compare_results(json.load(baseline)["results"], results, threshold)
+        for line in regressions:
+            click.echo(f"REGRESSION {line}", err=True)
+        if regressions:
+            sys.exit(1)
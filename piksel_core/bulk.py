@@ -0,0 +1,122 @@
+"""
+Row formatting for the bulk ``COPY`` ingestion path.
+
+Search-table values are rendered exactly as the postgis index driver stores
+them: scalar fields become closed ``[v,v]`` ranges in ``dataset_search_num``
+and ``dataset_search_datetime``, range fields become ``[low,high]`` ranges,
+strings go to ``dataset_search_string`` and NaNs are not indexed.
+"""
+
+import io
+import json
+import math
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from datetime import datetime, timezone
+from typing import Any
+
+# Search table per field type, as datacube.drivers.postgis._schema.search_field_map.
+SEARCH_TABLE_KINDS = {
+    "string": "string",
+    "numeric": "numeric",
+    "double": "numeric",
+    "integer": "numeric",
+    "boolean": "numeric",
+    "numeric-range": "numeric",
+    "double-range": "numeric",
+    "integer-range": "numeric",
+    "float-range": "numeric",
+    "datetime": "datetime",
+    "datetime-range": "datetime",
+}
+
+
+def _bound(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, datetime):
+        # Naive datetimes are UTC, as in datacube's tz_as_utc.
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        value = value.astimezone(timezone.utc).isoformat()
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def range_literal(low: Any, high: Any) -> str:
+    """A closed PostgreSQL range literal; None bounds are unbounded."""
+    return f"[{_bound(low)},{_bound(high)}]"
+
+
+def _is_nan(value: Any) -> bool:
+    return isinstance(value, float) and math.isnan(value)
+
+
+def search_value(type_name: str, value: Any) -> tuple[str, str | None] | None:
+    """
+    Render one search field value for its search table.
+
+    Args:
+        type_name (str): The datacube field type, e.g. ``double-range``.
+        value (Any): The value extracted from the dataset document.
+
+    Returns:
+        tuple[str, str | None] | None: ``(kind, literal)`` where kind is
+        ``string``, ``numeric`` or ``datetime``, or None if the value is not
+        indexable.
+    """
+    kind = SEARCH_TABLE_KINDS[type_name]
+    if kind == "string":
+        return kind, None if value is None else str(value)
+    if type_name.endswith("-range"):
+        if value is None:
+            return None
+        low, high = value
+        if _is_nan(low) or _is_nan(high):
+            return None
+        return kind, range_literal(low, high)
+    if _is_nan(value):
+        return None
+    return kind, range_literal(value, value)
+
+
+def search_rows(
+    dataset_id: Any, doc: Mapping, fields: Mapping[str, Any]
+) -> Iterator[tuple[str, Any, str, str | None]]:
+    """
+    Yield ``(kind, dataset_id, search_key, literal)`` for every search field.
+
+    ``fields`` maps names to driver field objects (anything with
+    ``type_name`` and ``extract(doc)``), as ``non_native_fields`` returns.
+    """
+    for name, field in fields.items():
+        rendered = search_value(field.type_name, field.extract(doc))
+        if rendered is not None:
+            kind, literal = rendered
+            yield kind, dataset_id, name, literal
+
+
+def copy_text(value: Any) -> str:
+    """Encode one value for ``COPY ... FROM STDIN`` in text format."""
+    if value is None:
+        return r"\N"
+    if isinstance(value, dict | list):
+        value = json.dumps(value, separators=(",", ":"))
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_buffer(rows: Iterable[Sequence[Any]]) -> io.StringIO:
+    """Render rows as a ``COPY`` text-format buffer."""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(copy_text(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,299 @@
+"""
+Bulk ``COPY`` dataset writer for the postgis index driver.
+
+``index_update_dataset`` adds one dataset per transaction, with separate
+inserts into ``odc.dataset``, each search table and each ``spatial_<epsg>``
+table. For backfills this writer converts items with the same dc-tools helpers,
+stages a whole batch with ``COPY`` into temporary tables, and fills the ODC
+tables set-wise from them in one transaction per batch.
+
+Datasets already in the index (or duplicated within a batch, or carrying
+lineage) fall back to ``index_update_dataset`` one at a time, so
+``--update-if-exists``/``--allow-unsafe`` behave exactly as in the per-row path.
+"""
+
+import logging
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from typing import NamedTuple
+
+import psycopg2
+from datacube import Datacube
+from datacube.drivers.postgis._api import non_native_fields
+from datacube.drivers.postgis._spatial import (
+    extract_geometry_from_eo3_projection,
+    generate_dataset_spatial_values,
+)
+from datacube.model import Dataset
+from datacube.utils import jsonify_document
+from datacube.utils.uris import split_uri
+from odc.apps.dc_tools.utils import DatasetExists, index_update_dataset, item_to_meta_uri
+from odc.geo import CRS
+from psycopg2 import sql
+from pystac import Item
+
+from piksel_core import telemetry
+from piksel_core.bulk import copy_buffer, search_rows
+from piksel_core.db import ODC_SCHEMA
+
+_LOG = logging.getLogger(__name__)
+
+_STAGING_TABLES = """
+CREATE TEMP TABLE IF NOT EXISTS bulk_dataset (
+    id uuid, metadata_type_ref smallint, product_ref smallint, metadata jsonb,
+    uri_scheme text, uri_body text
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS bulk_search (
+    kind text, dataset_ref uuid, search_key text, search_val text
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS bulk_spatial (
+    srid integer, dataset_ref uuid, extent text
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS bulk_added (id uuid PRIMARY KEY) ON COMMIT DELETE ROWS;
+"""
+
+_INSERT_DATASETS = """
+WITH added AS (
+    INSERT INTO odc.dataset (id, metadata_type_ref, product_ref, metadata, uri_scheme, uri_body)
+    SELECT id, metadata_type_ref, product_ref, metadata, uri_scheme, uri_body FROM bulk_dataset
+    ON CONFLICT (id) DO NOTHING
+    RETURNING id
+)
+INSERT INTO bulk_added SELECT id FROM added
+"""
+
+_INSERT_SEARCH = {
+    "string": ("dataset_search_string", "search_val"),
+    "numeric": ("dataset_search_num", "search_val::numrange"),
+    "datetime": ("dataset_search_datetime", "search_val::tstzrange"),
+}
+
+
+class SpatialTable(NamedTuple):
+    crs: CRS
+    srid: int
+    table: str
+
+
+class _Staged(NamedTuple):
+    product: str
+    dataset: Dataset
+    uri: str
+
+
+def spatial_tables(connection) -> list[SpatialTable]:
+    """The spatial index tables registered in ``odc.spatial_indicies``."""
+    with connection.cursor() as cur:
+        cur.execute(f"SELECT srid, table_name FROM {ODC_SCHEMA}.spatial_indicies ORDER BY srid")
+        rows = cur.fetchall()
+    connection.commit()
+    return [SpatialTable(CRS(f"EPSG:{srid}"), srid, table) for srid, table in rows]
+
+
+class _Batch:
+    def __init__(self, spatial: list[SpatialTable], field_cache: dict):
+        self.spatial = spatial
+        self.field_cache = field_cache
+        self.staged: dict[str, _Staged] = {}
+        self.deferred: list[_Staged] = []
+        self.datasets: list[tuple] = []
+        self.search: list[tuple] = []
+        self.extents: list[tuple] = []
+
+    def __len__(self) -> int:
+        return len(self.staged) + len(self.deferred)
+
+    def add(self, entry: _Staged) -> None:
+        dataset = entry.dataset
+        doc = jsonify_document(dataset.metadata_doc_without_lineage())
+        key = str(dataset.id)
+        if key in self.staged or dataset.metadata_doc.get("lineage"):
+            self.deferred.append(entry)
+            return
+
+        metadata_type = dataset.product.metadata_type
+        fields = self.field_cache.get(metadata_type.name)
+        if fields is None:
+            fields = self.field_cache[metadata_type.name] = non_native_fields(metadata_type.definition)
+        search = list(search_rows(key, doc, fields))
+
+        extents = []
+        extent = extract_geometry_from_eo3_projection(doc["grid_spatial"]["projection"])
+        if extent is not None:
+            for spatial in self.spatial:
+                values = generate_dataset_spatial_values(key, spatial.crs, extent)
+                if values is not None:
+                    extents.append((spatial.srid, key, values["extent"]))
+
+        scheme, body = split_uri(entry.uri)
+        self.staged[key] = entry
+        self.datasets.append((key, metadata_type.id, dataset.product.id, doc, scheme, body))
+        self.search.extend(search)
+        self.extents.extend(extents)
+
+    def load(self, connection) -> set[str]:
+        """Write the staged datasets in one transaction and return the ids added, counting rows per table."""
+        rows: Counter = Counter()
+        with connection, connection.cursor() as cur:
+            cur.execute(_STAGING_TABLES)
+            cur.copy_expert("COPY bulk_dataset FROM STDIN", copy_buffer(self.datasets))
+            cur.copy_expert("COPY bulk_search FROM STDIN", copy_buffer(self.search))
+            cur.copy_expert("COPY bulk_spatial FROM STDIN", copy_buffer(self.extents))
+            cur.execute(_INSERT_DATASETS)
+            rows[f"{ODC_SCHEMA}.dataset"] += cur.rowcount
+            for kind, (table, value) in _INSERT_SEARCH.items():
+                cur.execute(
+                    sql.SQL(
+                        "INSERT INTO {table} (dataset_ref, search_key, search_val) "
+                        "SELECT s.dataset_ref, s.search_key, {value} FROM bulk_search s "
+                        "JOIN bulk_added a ON a.id = s.dataset_ref WHERE s.kind = %s"
+                    ).format(table=sql.Identifier(ODC_SCHEMA, table), value=sql.SQL(value)),
+                    (kind,),
+                )
+                rows[f"{ODC_SCHEMA}.{table}"] += cur.rowcount
+            for spatial in self.spatial:
+                cur.execute(
+                    sql.SQL(
+                        "INSERT INTO {table} (dataset_ref, extent) "
+                        "SELECT s.dataset_ref, s.extent::geometry FROM bulk_spatial s "
+                        "JOIN bulk_added a ON a.id = s.dataset_ref WHERE s.srid = %s"
+                    ).format(table=sql.Identifier(ODC_SCHEMA, spatial.table)),
+                    (spatial.srid,),
+                )
+                rows[f"{ODC_SCHEMA}.{spatial.table}"] += cur.rowcount
+            cur.execute("SELECT id::text FROM bulk_added")
+            added = {row[0] for row in cur.fetchall()}
+        telemetry.count_by("rows", rows, "table")
+        return added
+
+
+def _index_one(dc: Datacube, entry: _Staged, update_if_exists: bool, allow_unsafe: bool, counts: Counter):
+    try:
+        with telemetry.timer("db_insert", product=entry.product):
+            index_update_dataset(
+                entry.dataset,
+                entry.uri,
+                dc,
+                None,
+                update_if_exists=update_if_exists,
+                allow_unsafe=allow_unsafe,
+            )
+        counts[entry.product, "added"] += 1
+    except DatasetExists:
+        counts[entry.product, "skipped"] += 1
+    except Exception:  # pylint:disable=broad-except
+        _LOG.exception("Failed to handle dataset %s", entry.dataset.id)
+        counts[entry.product, "failed"] += 1
+
+
+def _flush(
+    dc: Datacube, connection, batch: _Batch, update_if_exists: bool, allow_unsafe: bool, counts: Counter
+) -> None:
+    deferred = list(batch.deferred)
+    if batch.staged:
+        try:
+            with telemetry.timer("db_insert_batch", log=True, datasets=len(batch.staged)):
+                added = batch.load(connection)
+        except psycopg2.Error:
+            _LOG.exception("Bulk load of %d datasets failed, indexing them one by one",
+                           len(batch.staged))
+            added = set()
+        for key, entry in batch.staged.items():
+            if key in added:
+                counts[entry.product, "added"] += 1
+            else:
+                deferred.append(entry)
+    for entry in deferred:
+        _index_one(dc, entry, update_if_exists, allow_unsafe, counts)
+
+
+def bulk_index_datasets(
+    dc: Datacube,
+    connection,
+    datasets: Iterable[tuple[str, Dataset, str]],
+    update_if_exists: bool = False,
+    allow_unsafe: bool = False,
+    batch_size: int = 5000,
+    counts: Counter | None = None,
+) -> Counter:
+    """
+    Index ``(product, dataset, uri)`` triples in ``COPY`` batches of ``batch_size``.
+
+    Args:
+        dc (Datacube): Used for the per-row fallback.
+        connection: A psycopg2 connection to the same database (see ``piksel_core.db``).
+        datasets (Iterable[tuple[str, Dataset, str]]): Prepared datasets with
+            their product name and location.
+        update_if_exists (bool): Update datasets that are already indexed.
+        allow_unsafe (bool): Allow unsafe changes when updating.
+        batch_size (int): Datasets per transaction.
+        counts (Counter | None): Add the outcome to these counts.
+
+    Returns:
+        Counter: Counts keyed by ``(product, "added" | "skipped" | "failed")``,
+        as ``piksel_core.indexing.index_items`` returns.
+    """
+    counts = Counter() if counts is None else counts
+    before = Counter(counts)
+    spatial = spatial_tables(connection)
+    field_cache: dict = {}
+    batch = _Batch(spatial, field_cache)
+    for product, dataset, uri in datasets:
+        try:
+            batch.add(_Staged(product, dataset, uri))
+        except Exception:  # pylint:disable=broad-except
+            _LOG.exception("Failed to handle dataset %s", dataset.id)
+            counts[product, "failed"] += 1
+        if len(batch) >= batch_size:
+            _flush(dc, connection, batch, update_if_exists, allow_unsafe, counts)
+            batch = _Batch(spatial, field_cache)
+    _flush(dc, connection, batch, update_if_exists, allow_unsafe, counts)
+    telemetry.count_by("datasets", counts - before, "product", "status")
+    return counts
+
+
+def _converted(
+    dc: Datacube, routed: Iterable[tuple[str, Item]], counts: Counter
+) -> Iterator[tuple[str, Dataset, str]]:
+    for product, item in routed:
+        try:
+            with telemetry.timer("eo3_convert", product=product):
+                dataset, uri, _ = item_to_meta_uri(item, dc, rename_product=product)
+            if uri is None:
+                raise ValueError(f"The links field did not contain a self-reference for item {item}")
+        except DatasetExists:
+            counts[product, "skipped"] += 1
+            continue
+        except Exception:  # pylint:disable=broad-except
+            _LOG.exception("Failed to handle item %s", item.id)
+            counts[product, "failed"] += 1
+            continue
+        yield product, dataset, uri
+
+
+def bulk_index_items(
+    dc: Datacube,
+    connection,
+    routed: Iterable[tuple[str, Item]],
+    update_if_exists: bool = False,
+    allow_unsafe: bool = False,
+    batch_size: int = 5000,
+) -> Counter:
+    """
+    Index ``(product, item)`` pairs in ``COPY`` batches of ``batch_size``.
+
+    Args:
+        dc (Datacube): Used for item conversion and the per-row fallback.
+        connection: A psycopg2 connection to the same database (see ``piksel_core.db``).
+        routed (Iterable[tuple[str, Item]]): Items with their target product.
+        update_if_exists (bool): Update datasets that are already indexed.
+        allow_unsafe (bool): Allow unsafe changes when updating.
+        batch_size (int): Datasets per transaction.
+
+    Returns:
+        Counter: Counts keyed by ``(product, "added" | "skipped" | "failed")``,
+        as ``piksel_core.indexing.index_items`` returns.
+    """
+    counts: Counter = Counter()
+    return bulk_index_datasets(dc, connection, _converted(dc, routed, counts), update_if_exists,
+                               allow_unsafe, batch_size, counts)
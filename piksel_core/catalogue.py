@@ -0,0 +1,344 @@
+"""
+GeoParquet snapshot of the dataset catalogue, for searching without the database.
+
+    python -m piksel_core.catalogue --output /home/jovyan/work/data/catalogue
+
+Each product's active datasets are written to
+``<output>/product=<name>/year=<year>/part-0.parquet`` (GeoParquet 1.1, WKB
+footprints in EPSG:4326 with a ``bbox`` covering column), sorted by time so
+row-group statistics prune temporal and spatial filters. Besides the id and
+URI, every row carries the ``time`` range and the ``cloud_cover``,
+``region_code`` and ``platform`` search fields where the product's metadata
+type defines them. ``CatalogueSnapshot`` in ``notebooks/utils.py`` reads it.
+
+Refreshes are incremental. ``_state.json`` in each product directory records
+a watermark on ``odc.dataset.updated`` (see ``piksel_core.db.transaction_cutoff``).
+Datasets changed since then, and datasets added or removed (compared by id),
+are applied to the affected year partitions only, and each partition is
+replaced atomically.
+
+It runs where pyarrow is installed, i.e. the Jupyter image, and needs no
+datacube index driver, only the database connection.
+"""
+
+import json
+import os
+import shutil
+import time
+from collections import defaultdict
+from collections.abc import Iterable, Sequence
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+import click
+import pyarrow as pa
+import pyarrow.parquet as pq
+from datacube.ui.click import environment_option, pass_config
+from psycopg2 import sql
+
+from piksel_core.db import ODC_SCHEMA, connect, transaction_cutoff
+
+CATALOGUE_DIR_ENV = "PIKSEL_CATALOGUE_DIR"
+DEFAULT_CATALOGUE_DIR = "/home/jovyan/work/data/catalogue"
+
+SNAPSHOT_VERSION = 1
+STATE_FILE = "_state.json"
+PART_FILE = "part-0.parquet"
+# Datasets without a time range
+NO_YEAR = 0
+
+_TIMESTAMP = pa.timestamp("us", tz="UTC")
+_BBOX = pa.struct([(name, pa.float64()) for name in ("xmin", "ymin", "xmax", "ymax")])
+
+SCHEMA = pa.schema(
+    [
+        ("id", pa.string()),
+        ("uri", pa.string()),
+        ("time_start", _TIMESTAMP),
+        ("time_end", _TIMESTAMP),
+        ("cloud_cover", pa.float64()),
+        ("region_code", pa.string()),
+        ("platform", pa.string()),
+        ("updated", _TIMESTAMP),
+        ("bbox", _BBOX),
+        ("geometry", pa.binary()),
+    ]
+)
+
+# Datasets fetched per query when refreshing by id
+_FETCH_BATCH = 10000
+
+
+class RefreshReport(NamedTuple):
+    """Outcome of refreshing one product's snapshot."""
+
+    product: str
+    datasets: int
+    written: int
+    dropped: int
+    partitions: int
+    seconds: float
+
+    def __str__(self) -> str:
+        return (
+            f"{self.product}: {self.datasets} datasets, {self.written} written, {self.dropped} dropped, "
+            f"{self.partitions} partitions rewritten in {self.seconds:.1f}s"
+        )
+
+
+def plan_refresh(snapshot: set[str], active: set[str], changed: set[str]) -> tuple[set[str], set[str]]:
+    """
+    Which datasets to (re)write and which to drop from a product's snapshot.
+
+    Args:
+        snapshot (set[str]): Ids in the snapshot.
+        active (set[str]): Ids of the product's unarchived datasets in the index.
+        changed (set[str]): Ids updated (including archived) since the watermark.
+
+    Returns:
+        tuple[set[str], set[str]]: Ids to fetch and write, ids to remove.
+    """
+    fetch = (active - snapshot) | (changed & active)
+    drop = (snapshot - active) | (changed & snapshot)
+    return fetch, drop
+
+
+def year_of(time_start: datetime | None) -> int:
+    return time_start.year if time_start is not None else NO_YEAR
+
+
+def geo_metadata(table: pa.Table) -> dict:
+    """GeoParquet 1.1 file metadata for ``table``."""
+    bounds = [None] * 4
+    if table.num_rows:
+        bbox = table.column("bbox").combine_chunks()
+        for i, (name, fn) in enumerate((("xmin", min), ("ymin", min), ("xmax", max), ("ymax", max))):
+            values = [v for v in bbox.field(name).to_pylist() if v is not None]
+            bounds[i] = fn(values) if values else None
+    column = {
+        "encoding": "WKB",
+        "geometry_types": ["Polygon", "MultiPolygon"],
+        "covering": {"bbox": {name: ["bbox", name] for name in ("xmin", "ymin", "xmax", "ymax")}},
+    }
+    if None not in bounds:
+        column["bbox"] = bounds
+    return {"version": "1.1.0", "primary_column": "geometry", "columns": {"geometry": column}}
+
+
+def rows_table(rows: Sequence[tuple]) -> pa.Table:
+    """
+    A snapshot table from database rows.
+
+    Args:
+        rows (Sequence[tuple]): ``(id, uri, time_start, time_end, cloud_cover,
+            region_code, platform, updated, xmin, ymin, xmax, ymax, wkb)``.
+    """
+    columns = list(zip(*rows)) if rows else [()] * 13
+    bbox = pa.StructArray.from_arrays(
+        [pa.array(columns[i], pa.float64()) for i in range(8, 12)], fields=list(_BBOX)
+    )
+    arrays = [pa.array(columns[i], SCHEMA.field(i).type) for i in range(8)]
+    geometry = pa.array([bytes(g) if g is not None else None for g in columns[12]], pa.binary())
+    return pa.Table.from_arrays([*arrays, bbox, geometry], schema=SCHEMA)
+
+
+def write_partition(directory: str, table: pa.Table) -> None:
+    """Replace the partition file in ``directory`` with ``table`` sorted by time, or remove it if empty."""
+    path = os.path.join(directory, PART_FILE)
+    if table.num_rows == 0:
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        return
+    os.makedirs(directory, exist_ok=True)
+    table = table.sort_by([("time_start", "ascending"), ("id", "ascending")])
+    metadata = {**(table.schema.metadata or {}), b"geo": json.dumps(geo_metadata(table)).encode()}
+    tmp = os.path.join(directory, f".{PART_FILE}.{os.getpid()}")
+    pq.write_table(table.replace_schema_metadata(metadata), tmp, compression="zstd", row_group_size=10000)
+    os.replace(tmp, path)
+
+
+def read_partitions(product_dir: str) -> dict[int, pa.Table]:
+    """The partitions of one product's snapshot by year."""
+    partitions = {}
+    if not os.path.isdir(product_dir):
+        return partitions
+    for entry in os.listdir(product_dir):
+        path = os.path.join(product_dir, entry, PART_FILE)
+        if entry.startswith("year=") and os.path.exists(path):
+            partitions[int(entry.partition("=")[2])] = pq.read_table(path, schema=SCHEMA)
+    return partitions
+
+
+def read_state(product_dir: str) -> dict | None:
+    try:
+        with open(os.path.join(product_dir, STATE_FILE)) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    return state if state.get("version") == SNAPSHOT_VERSION else None
+
+
+def write_state(product_dir: str, high_water: datetime, datasets: int) -> None:
+    os.makedirs(product_dir, exist_ok=True)
+    tmp = os.path.join(product_dir, f".{STATE_FILE}.{os.getpid()}")
+    with open(tmp, "w") as f:
+        json.dump(
+            {
+                "version": SNAPSHOT_VERSION,
+                "high_water": high_water.isoformat(),
+                "datasets": datasets,
+                "refreshed": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            },
+            f,
+        )
+    os.replace(tmp, os.path.join(product_dir, STATE_FILE))
+
+
+def _footprint_table(cur) -> str | None:
+    """The spatial index table to take footprints from, EPSG:4326 if there is one."""
+    cur.execute(f"SELECT srid, table_name FROM {ODC_SCHEMA}.spatial_indicies ORDER BY srid <> 4326, srid")
+    row = cur.fetchone()
+    return row[1] if row else None
+
+
+def _rows_query(footprints: str | None, by_id: bool) -> sql.Composed:
+    envelope = sql.SQL(
+        "ST_MakeEnvelope((d.metadata #>> '{extent,lon,begin}')::float8, (d.metadata #>> '{extent,lat,begin}')::float8, "
+        "(d.metadata #>> '{extent,lon,end}')::float8, (d.metadata #>> '{extent,lat,end}')::float8, 4326)"
+    )
+    if footprints:
+        spatial_join = sql.SQL("LEFT JOIN {} s ON s.dataset_ref = d.id").format(sql.Identifier(ODC_SCHEMA, footprints))
+        geometry = sql.SQL("COALESCE(ST_Transform(s.extent, 4326), {})").format(envelope)
+    else:
+        spatial_join, geometry = sql.SQL(""), envelope
+    return sql.SQL(
+        """
+        SELECT d.id::text, d.uri_scheme || ':' || d.uri_body, lower(t.search_val), upper(t.search_val),
+               lower(c.search_val)::float8, r.search_val, p.search_val, d.updated,
+               ST_XMin(g.geom), ST_YMin(g.geom), ST_XMax(g.geom), ST_YMax(g.geom), ST_AsBinary(g.geom)
+        FROM {dataset} d
+        {spatial_join}
+        CROSS JOIN LATERAL (SELECT {geometry} AS geom) g
+        LEFT JOIN {datetime} t ON t.dataset_ref = d.id AND t.search_key = 'time'
+        LEFT JOIN {num} c ON c.dataset_ref = d.id AND c.search_key = 'cloud_cover'
+        LEFT JOIN {string} r ON r.dataset_ref = d.id AND r.search_key = 'region_code'
+        LEFT JOIN {string} p ON p.dataset_ref = d.id AND p.search_key = 'platform'
+        WHERE d.product_ref = %s AND d.archived IS NULL {by_id}
+        """
+    ).format(
+        dataset=sql.Identifier(ODC_SCHEMA, "dataset"),
+        spatial_join=spatial_join,
+        geometry=geometry,
+        datetime=sql.Identifier(ODC_SCHEMA, "dataset_search_datetime"),
+        num=sql.Identifier(ODC_SCHEMA, "dataset_search_num"),
+        string=sql.Identifier(ODC_SCHEMA, "dataset_search_string"),
+        by_id=sql.SQL("AND d.id = ANY(%s::uuid[])" if by_id else ""),
+    )
+
+
+def _fetch(cur, product_id: int, footprints: str | None, ids: Iterable[str] | None) -> list[tuple]:
+    if ids is None:
+        cur.execute(_rows_query(footprints, by_id=False), (product_id,))
+        return cur.fetchall()
+    ids, rows = sorted(ids), []
+    for start in range(0, len(ids), _FETCH_BATCH):
+        cur.execute(_rows_query(footprints, by_id=True), (product_id, ids[start:start + _FETCH_BATCH]))
+        rows.extend(cur.fetchall())
+    return rows
+
+
+def refresh_product(connection, root: str, product: str, full: bool = False) -> RefreshReport:
+    """
+    Bring one product's snapshot under ``root`` up to date with the index.
+
+    Args:
+        connection: psycopg2 connection to the ODC database.
+        root (str): Snapshot directory.
+        product (str): Product name.
+        full (bool): Rewrite the whole product instead of applying changes.
+
+    Returns:
+        RefreshReport: What was rewritten.
+    """
+    started = time.monotonic()
+    product_dir = os.path.join(root, f"product={product}")
+    state = None if full else read_state(product_dir)
+    with connection, connection.cursor() as cur:
+        cutoff = transaction_cutoff(cur)
+        cur.execute(f"SELECT id FROM {ODC_SCHEMA}.product WHERE name = %s", (product,))
+        row = cur.fetchone()
+        if row is None:
+            raise ValueError(f"Product {product} does not exist")
+        product_id = row[0]
+        footprints = _footprint_table(cur)
+        cur.execute(
+            f"SELECT id::text FROM {ODC_SCHEMA}.dataset WHERE product_ref = %s AND archived IS NULL", (product_id,)
+        )
+        active = {r[0] for r in cur.fetchall()}
+
+        if state is None:
+            partitions: dict[int, pa.Table] = {}
+            if os.path.exists(product_dir):
+                shutil.rmtree(product_dir)
+            drop: set[str] = set()
+            fetched = _fetch(cur, product_id, footprints, None)
+        else:
+            partitions = read_partitions(product_dir)
+            snapshot = {i for table in partitions.values() for i in table.column("id").to_pylist()}
+            cur.execute(
+                f"SELECT id::text FROM {ODC_SCHEMA}.dataset WHERE product_ref = %s AND updated >= %s",
+                (product_id, datetime.fromisoformat(state["high_water"])),
+            )
+            changed = {r[0] for r in cur.fetchall()}
+            fetch, drop = plan_refresh(snapshot, active, changed)
+            fetched = _fetch(cur, product_id, footprints, fetch) if fetch else []
+
+    by_year: dict[int, list[tuple]] = defaultdict(list)
+    for r in fetched:
+        by_year[year_of(r[2])].append(r)
+    affected = set(by_year)
+    for year, table in partitions.items():
+        if drop and any(i in drop for i in table.column("id").to_pylist()):
+            affected.add(year)
+    for year in affected:
+        table = partitions.get(year)
+        if table is not None and drop:
+            keep = pa.array([i not in drop for i in table.column("id").to_pylist()])
+            table = table.filter(keep)
+        new = rows_table(by_year.get(year, []))
+        table = pa.concat_tables([table, new]) if table is not None else new
+        write_partition(os.path.join(product_dir, f"year={year}"), table)
+    write_state(product_dir, cutoff, len(active))
+    return RefreshReport(product, len(active), len(fetched), len(drop), len(affected), time.monotonic() - started)
+
+
+@click.command("catalogue-snapshot")
+@environment_option
+@pass_config
+@click.option("--output", type=click.Path(file_okay=False), envvar=CATALOGUE_DIR_ENV,
+              default=DEFAULT_CATALOGUE_DIR, show_default=True, help=f"Snapshot directory (also ${CATALOGUE_DIR_ENV}).")
+@click.option("--products", type=str, default=None, help="Comma separated products (default: all).")
+@click.option("--full", is_flag=True, default=False, help="Rewrite the snapshots instead of refreshing them.")
+def cli(cfg_env, output, products, full):
+    """
+    Write or refresh the GeoParquet snapshot of each product's datasets.
+    """
+    connection = connect(cfg_env, application_name="piksel-catalogue")
+    if products:
+        names = [p.strip() for p in products.split(",") if p.strip()]
+    else:
+        with connection, connection.cursor() as cur:
+            cur.execute(f"SELECT name FROM {ODC_SCHEMA}.product ORDER BY name")
+            names = [r[0] for r in cur.fetchall()]
+    try:
+        for name in names:
+            try:
+                print(refresh_product(connection, output, name, full))
+            except ValueError as e:
+                raise click.ClickException(str(e)) from e
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    cli()
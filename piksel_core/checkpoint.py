@@ -0,0 +1,184 @@
+"""
+Per-product indexing checkpoints.
+
+A checkpoint records the high-water mark of an item timestamp (``datetime`` or
+``updated``) already indexed for one product, collection, bbox and requested
+date range. Searches
+are sorted ascending on that field, so once a page has been indexed everything
+at or below its newest timestamp is in the index. The checkpoint is committed
+after every page: later runs only fetch newer items, and an interrupted run
+resumes from the last committed page. A backfill of an older date range keeps
+its own checkpoint, so it neither starts from nor moves the nightly one.
+
+Checkpoints are stored in ``piksel.index_checkpoint`` in the ODC database.
+"""
+
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from typing import NamedTuple
+
+from pystac import Item
+
+from piksel_core.tiling import parse_datetime
+
+CHECKPOINT_FIELDS = ("datetime", "updated")
+
+CREATE_CHECKPOINT_TABLE = """
+CREATE TABLE IF NOT EXISTS piksel.index_checkpoint (
+    product text NOT NULL,
+    collection text NOT NULL,
+    bbox text NOT NULL,
+    datetime_range text NOT NULL DEFAULT '*',
+    field text NOT NULL,
+    high_water timestamptz NOT NULL,
+    items_indexed bigint NOT NULL DEFAULT 0,
+    updated timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (product, collection, bbox, datetime_range, field)
+)
+"""
+
+# Tables created before checkpoints were kept per date range; their rows become the "*" (all dates) range
+ADD_DATETIME_RANGE = """
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'piksel' AND table_name = 'index_checkpoint' AND column_name = 'datetime_range'
+    ) THEN
+        ALTER TABLE piksel.index_checkpoint ADD COLUMN datetime_range text NOT NULL DEFAULT '*';
+        ALTER TABLE piksel.index_checkpoint DROP CONSTRAINT index_checkpoint_pkey;
+        ALTER TABLE piksel.index_checkpoint
+            ADD PRIMARY KEY (product, collection, bbox, datetime_range, field);
+    END IF;
+END $$
+"""
+
+
+class CheckpointKey(NamedTuple):
+    product: str
+    collection: str
+    bbox: str
+    datetime_range: str
+    field: str
+
+
+def _iso(when: datetime) -> str:
+    return when.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _range_key(datetime_range: str | None) -> str:
+    start, slash, end = (datetime_range or "").partition("/")
+    if not slash:
+        end = start
+    bounds = [
+        ".." if bound in ("", "..") else _iso(parse_datetime(bound, end=is_end))
+        for bound, is_end in ((start, False), (end, True))
+    ]
+    return "*" if bounds == ["..", ".."] else "/".join(bounds)
+
+
+def checkpoint_key(
+    product: str, collection: str, bbox: Iterable[float] | None, datetime_range: str | None, field: str
+) -> CheckpointKey:
+    """Build a key with the bbox and date range normalised so equal requests share a checkpoint."""
+    bbox_str = ",".join(f"{float(v):g}" for v in bbox) if bbox else "*"
+    return CheckpointKey(product, collection, bbox_str, _range_key(datetime_range), field)
+
+
+def item_timestamp(item: Item, field: str) -> datetime:
+    """The value of the checkpoint field for an item, as a UTC datetime."""
+    if field == "updated":
+        return parse_datetime(item.properties["updated"])
+    if item.datetime is not None:
+        return parse_datetime(item.datetime.isoformat())
+    return parse_datetime(item.properties["start_datetime"])
+
+
+def incremental_search(
+    datetime_range: str | None, field: str, high_water: datetime | None
+) -> tuple[str | None, dict | None]:
+    """
+    Narrow a search to items at or after the checkpoint.
+
+    The lower bound is inclusive: items stamped exactly at the high-water mark
+    are fetched again and skipped by the indexer as already present, so items
+    sharing a timestamp across a page boundary are never lost.
+
+    Returns:
+        tuple[str | None, dict | None]: The STAC ``datetime`` interval and the
+        extra ``query`` filter to search with.
+    """
+    if high_water is None:
+        return datetime_range, None
+    if field == "updated":
+        return datetime_range, {"updated": {"gte": _iso(high_water)}}
+
+    start, _, end = (datetime_range or "..").partition("/")
+    if not end and start != "..":
+        end = start
+    if start not in ("", "..") and parse_datetime(start) > high_water:
+        return datetime_range, None
+    return f"{_iso(high_water)}/{end or '..'}", None
+
+
+def checkpointed_pages(
+    pages: Iterable[list[Item]], field: str
+) -> Iterator[tuple[list[Item], datetime | None]]:
+    """Pair every page with the newest checkpoint-field value it contains."""
+    for items in pages:
+        stamps = [item_timestamp(item, field) for item in items]
+        yield items, max(stamps) if stamps else None
+
+
+class CheckpointStore:
+    """
+    Read and advance checkpoints through an open DB-API connection.
+
+    Every ``commit`` is its own transaction, so a checkpoint is durable as soon
+    as the page it covers has been indexed.
+    """
+
+    def __init__(self, connection):
+        self._conn = connection
+        with self._conn.cursor() as cur:
+            cur.execute("CREATE SCHEMA IF NOT EXISTS piksel")
+            cur.execute(CREATE_CHECKPOINT_TABLE)
+            cur.execute(ADD_DATETIME_RANGE)
+        self._conn.commit()
+
+    def get(self, key: CheckpointKey) -> datetime | None:
+        with self._conn.cursor() as cur:
+            cur.execute(
+                "SELECT high_water FROM piksel.index_checkpoint "
+                "WHERE product = %s AND collection = %s AND bbox = %s AND datetime_range = %s AND field = %s",
+                key,
+            )
+            row = cur.fetchone()
+        self._conn.commit()
+        return row[0] if row else None
+
+    def commit(self, key: CheckpointKey, high_water: datetime, items_indexed: int) -> None:
+        """Advance the checkpoint; it never moves backwards."""
+        with self._conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO piksel.index_checkpoint
+                    (product, collection, bbox, datetime_range, field, high_water, items_indexed)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (product, collection, bbox, datetime_range, field) DO UPDATE SET
+                    high_water = GREATEST(index_checkpoint.high_water, EXCLUDED.high_water),
+                    items_indexed = index_checkpoint.items_indexed + EXCLUDED.items_indexed,
+                    updated = now()
+                """,
+                (*key, high_water, items_indexed),
+            )
+        self._conn.commit()
+
+    def reset(self, key: CheckpointKey) -> None:
+        with self._conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM piksel.index_checkpoint "
+                "WHERE product = %s AND collection = %s AND bbox = %s AND datetime_range = %s AND field = %s",
+                key,
+            )
+        self._conn.commit()
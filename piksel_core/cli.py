@@ -0,0 +1,54 @@
+"""Command line entry point: ``python -m piksel_core <command>``."""
+
+import click
+
+from piksel_core import telemetry
+from piksel_core.advise_indexes import cli as advise_indexes
+from piksel_core.bench_index import cli as bench_index
+from piksel_core.bench_ingest import cli as bench_ingest
+from piksel_core.bench_pool import cli as bench_pool
+from piksel_core.bench_query import cli as bench_query
+from piksel_core.delete_product import cli as delete_product
+from piksel_core.explorer_pending import cli as explorer_pending
+from piksel_core.export_product import cli as export_product
+from piksel_core.import_product import cli as import_product
+from piksel_core.index_incremental import cli as index_incremental
+from piksel_core.index_landsat import cli as index_landsat
+from piksel_core.index_s3 import cli as index_s3
+from piksel_core.index_tiled import cli as index_tiled
+from piksel_core.perf_report import cli as perf_report
+from piksel_core.reconcile_command import cli as reconcile
+from piksel_core.search_tables_update import cli as search_tables
+from piksel_core.serve import cli as serve
+from piksel_core.spindex_update import cli as spindex_update
+from piksel_core.synth_datasets import cli as synth_datasets
+from piksel_core.sync_products import cli as sync_products
+
+
+@click.group(help="Piksel-core ODC indexing and maintenance commands.")
+@click.pass_context
+def cli(ctx):
+    # Metrics are attributed to the subcommand (see piksel_core.telemetry)
+    telemetry.start(ctx.invoked_subcommand)
+
+
+cli.add_command(advise_indexes)
+cli.add_command(bench_index)
+cli.add_command(bench_ingest)
+cli.add_command(bench_pool)
+cli.add_command(bench_query)
+cli.add_command(delete_product)
+cli.add_command(explorer_pending)
+cli.add_command(export_product)
+cli.add_command(import_product)
+cli.add_command(index_incremental)
+cli.add_command(index_landsat)
+cli.add_command(index_s3)
+cli.add_command(index_tiled)
+cli.add_command(perf_report)
+cli.add_command(reconcile)
+cli.add_command(search_tables)
+cli.add_command(serve)
+cli.add_command(spindex_update)
+cli.add_command(synth_datasets)
+cli.add_command(sync_products)
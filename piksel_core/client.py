@@ -0,0 +1,140 @@
+"""
+Thin client of the warm ODC command server (``python -m piksel_core serve``).
+
+    python -m piksel_core.client datacube product list
+    python -m piksel_core.client piksel_core spindex-update
+    python -m piksel_core.client --ping
+
+The command runs in a process forked from the server, which already has
+datacube, SQLAlchemy, GDAL and the dc-tools imported, so it starts in
+milliseconds instead of seconds. The client passes its own stdin, stdout and
+stderr to that process, so output, progress bars and prompts behave as if the
+command ran here; Ctrl-C is forwarded and the command's exit status is
+returned. Only the standard library is imported, so the client itself starts
+fast. If no server is listening the command is executed directly.
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import sys
+
+SOCKET_ENV = "PIKSEL_ODC_SOCKET"
+DEFAULT_SOCKET = "/tmp/piksel-odc.sock"
+
+# The server's own ``python -m piksel_core`` commands
+PIKSEL_CORE = "piksel_core"
+
+
+def socket_path() -> str:
+    return os.environ.get(SOCKET_ENV, DEFAULT_SOCKET)
+
+
+def send_message(sock: socket.socket, message: dict, fds: list[int] = ()) -> None:
+    """Send one JSON line, with ``fds`` attached to it."""
+    data = json.dumps(message).encode() + b"\n"
+    if fds:
+        socket.send_fds(sock, [data], list(fds))
+    else:
+        sock.sendall(data)
+
+
+def read_messages(sock: socket.socket):
+    """The JSON lines received until the connection closes."""
+    with sock.makefile("rb") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _connect(path: str) -> socket.socket | None:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        sock.close()
+        return None
+    return sock
+
+
+def run(argv: list[str], path: str | None = None) -> int | None:
+    """
+    Run ``argv`` in the server with this process's stdio.
+
+    Args:
+        argv (list[str]): A console script (``datacube``, ``stac-to-dc``, ...)
+            or ``piksel_core`` and its arguments.
+        path (str | None): Server socket, default from ``PIKSEL_ODC_SOCKET``.
+
+    Returns:
+        int | None: The command's exit status, None if no server is listening.
+    """
+    sock = _connect(path or socket_path())
+    if sock is None:
+        return None
+    with sock:
+        request = {"op": "run", "argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)}
+        send_message(sock, request, [sys.stdin.fileno(), sys.stdout.fileno(), sys.stderr.fileno()])
+        pid = None
+        replies = sock.makefile("rb")
+        while True:
+            try:
+                line = replies.readline()
+            except KeyboardInterrupt:
+                if pid is not None:
+                    os.kill(pid, signal.SIGINT)
+                continue
+            if not line:
+                print("piksel-core server closed the connection", file=sys.stderr)
+                return 1
+            message = json.loads(line)
+            if "pid" in message:
+                pid = message["pid"]
+            if "exit" in message:
+                return message["exit"]
+
+
+def ping(path: str | None = None) -> dict | None:
+    """The server's status, None if it is not listening."""
+    sock = _connect(path or socket_path())
+    if sock is None:
+        return None
+    with sock:
+        send_message(sock, {"op": "ping"})
+        return next(read_messages(sock), None)
+
+
+def _exec_directly(argv: list[str]) -> None:
+    if argv[0] == PIKSEL_CORE:
+        argv = [sys.executable, "-m", PIKSEL_CORE, *argv[1:]]
+    os.execvp(argv[0], argv)
+
+
+def main(args: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m piksel_core.client", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--socket", default=None, help=f"Server socket (default: ${SOCKET_ENV} or {DEFAULT_SOCKET}).")
+    parser.add_argument("--ping", action="store_true", help="Check the server and its database connection.")
+    parser.add_argument("--no-fallback", action="store_true", help="Fail instead of running without the server.")
+    parser.add_argument("argv", nargs=argparse.REMAINDER, help="Command and arguments.")
+    options = parser.parse_args(args)
+
+    if options.ping:
+        status = ping(options.socket)
+        if status is None:
+            sys.exit("piksel-core server is not running")
+        print(json.dumps(status))
+        sys.exit(0 if status.get("ok") else 1)
+    if not options.argv:
+        parser.error("no command given")
+
+    code = run(options.argv, options.socket)
+    if code is None:
+        if options.no_fallback:
+            sys.exit("piksel-core server is not running")
+        _exec_directly(options.argv)
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
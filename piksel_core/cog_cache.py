@@ -0,0 +1,535 @@
+"""
+Persistent byte-range cache for remote COG reads, shared between notebook kernels.
+
+GDAL's ``/vsicurl`` and ``/vsis3`` readers only cache in memory, per process,
+so every kernel and every session downloads the same COG headers and tiles
+again. ``enable()`` makes ``rasterio.open`` (and so ``dc.load``, with either
+the default or the ``rio`` driver) read remote ``.tif``/``.tiff`` files
+through a ``RangeCache`` instead: files are read in aligned blocks, each
+stored once on disk under a key of the URL, the object's ETag and the block's
+byte range. A cached block is served until its object's ETag changes. The
+ETags are looked up again after ``metadata_ttl`` seconds. The least recently
+used blocks are evicted once the cache is over its size. The block index and
+the hit/miss counters are kept in a SQLite database next to the blocks, so
+kernels in every jupyter container that mounts the directory share them.
+
+    from piksel_core import cog_cache
+
+    cog_cache.enable()  # $PIKSEL_COG_CACHE_DIR, at most $PIKSEL_COG_CACHE_SIZE
+    data = dc.load(product="s2_l2a", ...)
+    print(cog_cache.enable().stats())
+
+Sidecar files (``.aux.xml``, ``.msk``, ...) are reported missing without a
+request, as with ``GDAL_DISABLE_READDIR_ON_OPEN=EMPTY_DIR``. ``s3://`` objects
+are read with boto3, honouring ``AWS_NO_SIGN_REQUEST`` and
+``AWS_REQUEST_PAYER`` as GDAL does; ``http(s)://`` objects with ranged GETs.
+With dask distributed, call ``client.run(cog_cache.enable)`` so the workers
+read through the cache too.
+"""
+
+import hashlib
+import io
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import NamedTuple
+
+import click
+
+from piksel_core import telemetry
+
+COG_CACHE_DIR_ENV = "PIKSEL_COG_CACHE_DIR"
+COG_CACHE_SIZE_ENV = "PIKSEL_COG_CACHE_SIZE"
+DEFAULT_COG_CACHE_DIR = os.path.expanduser("~/.cache/piksel-cog")
+DEFAULT_MAX_BYTES = 20 * 1024**3
+DEFAULT_BLOCK_SIZE = 256 * 1024
+# Same as CPL_VSIL_CURL_ALLOWED_EXTENSIONS in the odc image
+ALLOWED_EXTENSIONS = (".tif", ".tiff")
+REMOTE_SCHEMES = ("s3://", "http://", "https://")
+
+# Eviction stops once the cache is back under this fraction of its size
+_LOW_WATER = 0.9
+# Blocks a CachedFile keeps in memory; GDAL reads a TIFF header in many small pieces
+_FILE_BLOCKS = 8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS object (
+    url text PRIMARY KEY,
+    etag text NOT NULL,
+    size integer NOT NULL,
+    checked real NOT NULL
+);
+CREATE TABLE IF NOT EXISTS block (
+    key text PRIMARY KEY,
+    url text NOT NULL,
+    size integer NOT NULL,
+    last_used real NOT NULL
+);
+CREATE INDEX IF NOT EXISTS block_last_used ON block (last_used);
+CREATE TABLE IF NOT EXISTS counter (
+    name text PRIMARY KEY,
+    value integer NOT NULL
+);
+"""
+
+COUNTERS = ("hits", "misses", "bytes_served", "bytes_fetched", "evicted", "size")
+
+
+class ObjectInfo(NamedTuple):
+    """A remote object's ETag and size in bytes."""
+
+    etag: str
+    size: int
+
+
+class CacheStats(NamedTuple):
+    """Block hits and misses of every kernel sharing the cache since it was created or cleared."""
+
+    hits: int
+    misses: int
+    bytes_served: int
+    bytes_fetched: int
+    evicted: int
+    blocks: int
+    size: int
+    max_bytes: int
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.blocks} blocks, {self.size / 1024**2:.1f} of {self.max_bytes / 1024**2:.0f} MiB; "
+            f"{self.hits} hits, {self.misses} misses ({self.hit_ratio:.1%}); "
+            f"{self.bytes_served / 1024**2:.1f} MiB served from disk, "
+            f"{self.bytes_fetched / 1024**2:.1f} MiB fetched; {self.evicted} blocks evicted"
+        )
+
+
+def parse_size(value: str | int) -> int:
+    """Bytes in a size such as ``20G``, ``512M`` or ``1048576``."""
+    if isinstance(value, int):
+        return value
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*", value, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Not a size: {value!r}")
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** " KMGT".index(unit.upper() or " "))
+
+
+def block_key(url: str, etag: str, start: int, end: int) -> str:
+    """The key of the bytes ``[start, end)`` of one version of an object."""
+    return hashlib.sha256(f"{url}\n{etag}\n{start}-{end}".encode()).hexdigest()
+
+
+def is_cacheable(url: str) -> bool:
+    """Whether ``url`` is a remote raster read through the cache."""
+    return url.startswith(REMOTE_SCHEMES) and url.split("?", 1)[0].lower().endswith(ALLOWED_EXTENSIONS)
+
+
+class RemoteFetcher:
+    """
+    Ranged reads of ``s3://`` objects with boto3 and of ``http(s)://`` objects with urllib.
+
+    Args:
+        timeout (float): Seconds before an HTTP request fails.
+    """
+
+    def __init__(self, timeout: float = 60.0):
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _s3(self):
+        client = getattr(self._local, "s3", None)
+        if client is None:
+            import boto3
+            from botocore import UNSIGNED
+            from botocore.config import Config
+
+            unsigned = os.environ.get("AWS_NO_SIGN_REQUEST", "").upper() in ("YES", "TRUE", "1")
+            config = Config(signature_version=UNSIGNED) if unsigned else None
+            # boto3 clients are thread safe but sessions are not
+            client = self._local.s3 = boto3.session.Session().client(
+                "s3", config=config, endpoint_url=os.environ.get("AWS_ENDPOINT_URL_S3")
+            )
+        return client
+
+    @staticmethod
+    def _s3_args(url: str) -> dict:
+        bucket, _, key = url[len("s3://"):].partition("/")
+        args = {"Bucket": bucket, "Key": key}
+        if os.environ.get("AWS_REQUEST_PAYER"):
+            args["RequestPayer"] = os.environ["AWS_REQUEST_PAYER"]
+        return args
+
+    def head(self, url: str) -> ObjectInfo:
+        """The current ETag and size of ``url``; raises ``FileNotFoundError`` if it does not exist."""
+        if url.startswith("s3://"):
+            from botocore.exceptions import ClientError
+
+            try:
+                response = self._s3().head_object(**self._s3_args(url))
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                    raise FileNotFoundError(url) from e
+                raise
+            return ObjectInfo(response["ETag"].strip('"'), response["ContentLength"])
+        request = urllib.request.Request(url, method="HEAD")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                headers = response.headers
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                raise FileNotFoundError(url) from e
+            raise
+        # Without an ETag, the modification time and size identify the version
+        etag = headers.get("ETag") or f"{headers.get('Last-Modified')}/{headers.get('Content-Length')}"
+        return ObjectInfo(etag.strip('"'), int(headers["Content-Length"]))
+
+    def get(self, url: str, start: int, end: int) -> bytes:
+        """The bytes ``[start, end)`` of ``url``."""
+        byte_range = f"bytes={start}-{end - 1}"
+        if url.startswith("s3://"):
+            response = self._s3().get_object(Range=byte_range, **self._s3_args(url))
+            return response["Body"].read()
+        request = urllib.request.Request(url, headers={"Range": byte_range})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            data = response.read()
+        # A server that ignores Range sends the whole object
+        return data[start:end] if response.status == 200 else data
+
+
+class RangeCache:
+    """
+    Size-bounded on-disk cache of remote objects' byte ranges, shared between processes.
+
+    Args:
+        directory (str | None): Cache directory (default: ``$PIKSEL_COG_CACHE_DIR``
+            or ``~/.cache/piksel-cog``).
+        max_bytes (int | str | None): Size of the cached blocks before the least
+            recently used are evicted (default: ``$PIKSEL_COG_CACHE_SIZE`` or 20G).
+        block_size (int): Bytes per cached block; reads are aligned to blocks.
+        metadata_ttl (float): Seconds an object's ETag is trusted before it is looked up again.
+        fetcher: Object with ``head(url) -> ObjectInfo`` and ``get(url, start, end) -> bytes``
+            (default: ``RemoteFetcher``).
+    """
+
+    def __init__(self, directory: str | None = None, max_bytes: int | str | None = None,
+                 block_size: int = DEFAULT_BLOCK_SIZE, metadata_ttl: float = 24 * 3600, fetcher=None):
+        self.directory = directory or os.environ.get(COG_CACHE_DIR_ENV) or DEFAULT_COG_CACHE_DIR
+        self.max_bytes = parse_size(max_bytes or os.environ.get(COG_CACHE_SIZE_ENV) or DEFAULT_MAX_BYTES)
+        self.block_size = block_size
+        self.metadata_ttl = metadata_ttl
+        self.fetcher = fetcher or RemoteFetcher()
+        self._local = threading.local()
+        os.makedirs(os.path.join(self.directory, "blocks"), exist_ok=True)
+        self._db().executescript(SCHEMA)
+        with self._transaction() as db:
+            db.executemany("INSERT OR IGNORE INTO counter (name, value) VALUES (?, 0)", [(c,) for c in COUNTERS])
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(os.path.join(self.directory, "index.sqlite"), timeout=60, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._db()
+        # Take the write lock up front, so concurrent kernels wait instead of failing to upgrade
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, "blocks", key[:2], key)
+
+    def stat(self, url: str) -> ObjectInfo:
+        """The ETag and size of ``url``, from the cache while they are younger than ``metadata_ttl``."""
+        row = self._db().execute("SELECT etag, size, checked FROM object WHERE url = ?", (url,)).fetchone()
+        if row and time.time() - row[2] < self.metadata_ttl:
+            return ObjectInfo(row[0], row[1])
+        info = self.fetcher.head(url)
+        with self._transaction() as db:
+            db.execute(
+                "INSERT INTO object (url, etag, size, checked) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (url) DO UPDATE SET etag = excluded.etag, size = excluded.size, checked = excluded.checked",
+                (url, info.etag, info.size, time.time()),
+            )
+        return info
+
+    def _block_range(self, info: ObjectInfo, index: int) -> tuple[int, int]:
+        start = index * self.block_size
+        return start, min(start + self.block_size, info.size)
+
+    def _read_block(self, url: str, info: ObjectInfo, index: int) -> bytes | None:
+        key = block_key(url, info.etag, *self._block_range(info, index))
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def blocks(self, url: str, info: ObjectInfo, first: int, last: int) -> list[bytes]:
+        """
+        Blocks ``first`` to ``last`` (inclusive) of ``url``, fetching the missing ones.
+
+        Consecutive missing blocks are fetched with one ranged request.
+        """
+        found = {i: self._read_block(url, info, i) for i in range(first, last + 1)}
+        hits = [i for i, data in found.items() if data is not None]
+        missing = [i for i, data in found.items() if data is None]
+        runs: list[list[int]] = []
+        for i in missing:
+            if runs and runs[-1][-1] == i - 1:
+                runs[-1].append(i)
+            else:
+                runs.append([i])
+        fetched = 0
+        for run in runs:
+            start, end = self._block_range(info, run[0])[0], self._block_range(info, run[-1])[1]
+            with telemetry.timer("cog_fetch"):
+                data = self.fetcher.get(url, start, end)
+            if len(data) != end - start:
+                raise OSError(f"Short read of {url} bytes {start}-{end}: {len(data)} bytes")
+            fetched += len(data)
+            for i in run:
+                block_start, block_end = self._block_range(info, i)
+                found[i] = data[block_start - start:block_end - start]
+        self._record(url, info, found, hits, missing, fetched)
+        telemetry.count("cog_cache_blocks", len(hits), result="hit")
+        telemetry.count("cog_cache_blocks", len(missing), result="miss")
+        return [found[i] for i in range(first, last + 1)]
+
+    def _record(self, url: str, info: ObjectInfo, found: dict, hits: list[int], missing: list[int],
+                fetched: int) -> None:
+        """Store the fetched blocks, touch the hit ones and count both."""
+        written = []
+        for i in missing:
+            key = block_key(url, info.etag, *self._block_range(info, i))
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename, so other kernels never read a partial block
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(found[i])
+            os.replace(tmp, path)
+            written.append((key, len(found[i])))
+        now = time.time()
+        touched = [block_key(url, info.etag, *self._block_range(info, i)) for i in hits]
+        with self._transaction() as db:
+            added = 0
+            for key, size in written:
+                # Another kernel may have stored the same block meanwhile
+                if db.execute("INSERT OR IGNORE INTO block (key, url, size, last_used) VALUES (?, ?, ?, ?)",
+                              (key, url, size, now)).rowcount:
+                    added += size
+                else:
+                    touched.append(key)
+            db.executemany("UPDATE block SET last_used = ? WHERE key = ?", [(now, key) for key in touched])
+            size = self._count(db, hits=len(hits), misses=len(missing), bytes_fetched=fetched,
+                               bytes_served=sum(len(found[i]) for i in hits), size=added)
+            evicted = self._evict(db) if size > self.max_bytes else []
+        self._remove(evicted)
+
+    @staticmethod
+    def _count(db: sqlite3.Connection, **increments: int) -> int:
+        """Add to the counters; returns the cached bytes."""
+        for name, value in increments.items():
+            if value:
+                db.execute("UPDATE counter SET value = value + ? WHERE name = ?", (value, name))
+        return db.execute("SELECT value FROM counter WHERE name = 'size'").fetchone()[0]
+
+    def _remove(self, keys: list[str]) -> None:
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _evict(self, db: sqlite3.Connection) -> list[str]:
+        """Delete the least recently used blocks' rows until the cache is under its low-water mark."""
+        size = db.execute("SELECT value FROM counter WHERE name = 'size'").fetchone()[0]
+        target = size - int(self.max_bytes * _LOW_WATER)
+        evicted, freed = [], 0
+        for key, block_size in db.execute("SELECT key, size FROM block ORDER BY last_used"):
+            if freed >= target:
+                break
+            evicted.append(key)
+            freed += block_size
+        db.executemany("DELETE FROM block WHERE key = ?", [(k,) for k in evicted])
+        self._count(db, size=-freed, evicted=len(evicted))
+        return evicted
+
+    def read(self, url: str, start: int, length: int) -> bytes:
+        """Up to ``length`` bytes of ``url`` from ``start``."""
+        info = self.stat(url)
+        end = min(start + length, info.size)
+        if end <= start:
+            return b""
+        first, last = start // self.block_size, (end - 1) // self.block_size
+        data = b"".join(self.blocks(url, info, first, last))
+        offset = first * self.block_size
+        return data[start - offset:end - offset]
+
+    def open(self, url: str, mode: str = "rb") -> "CachedFile":
+        """A read-only file object of ``url``; usable as a ``rasterio.open`` opener."""
+        if "r" not in mode or "+" in mode or "w" in mode:
+            raise OSError(f"The COG cache is read-only: {url} ({mode})")
+        if not is_cacheable(url):
+            # Sidecars GDAL probes for; reported missing without a request
+            raise FileNotFoundError(url)
+        return CachedFile(self, url, self.stat(url))
+
+    def stats(self) -> CacheStats:
+        """The counters shared by every process using the cache."""
+        db = self._db()
+        counters = dict(db.execute("SELECT name, value FROM counter").fetchall())
+        blocks = db.execute("SELECT count(*) FROM block").fetchone()[0]
+        return CacheStats(*(counters[c] for c in COUNTERS[:5]), blocks, counters["size"], self.max_bytes)
+
+    def trim(self, max_bytes: int | None = None) -> int:
+        """Evict down to ``max_bytes`` (default: the cache size); returns the blocks evicted."""
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        with self._transaction() as db:
+            size = self._count(db)
+            evicted = self._evict(db) if size > self.max_bytes else []
+        self._remove(evicted)
+        return len(evicted)
+
+    def clear(self) -> None:
+        """Drop every cached block and object, and reset the counters."""
+        with self._transaction() as db:
+            keys = [row[0] for row in db.execute("SELECT key FROM block")]
+            db.execute("DELETE FROM block")
+            db.execute("DELETE FROM object")
+            db.execute("UPDATE counter SET value = 0")
+        self._remove(keys)
+
+
+class CachedFile(io.RawIOBase):
+    """A seekable read-only view of a remote object, read through a ``RangeCache``."""
+
+    def __init__(self, cache: RangeCache, url: str, info: ObjectInfo):
+        super().__init__()
+        self.cache = cache
+        self.url = url
+        self.info = info
+        self._position = 0
+        self._blocks: OrderedDict[int, bytes] = OrderedDict()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self.info.size}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        end = min(self._position + len(buffer), self.info.size)
+        if end <= self._position:
+            return 0
+        size = self.cache.block_size
+        first, last = self._position // size, (end - 1) // size
+        missing = [i for i in range(first, last + 1) if i not in self._blocks]
+        if missing:
+            for i, data in zip(range(missing[0], missing[-1] + 1),
+                               self.cache.blocks(self.url, self.info, missing[0], missing[-1])):
+                self._blocks[i] = data
+        data = b"".join(self._blocks[i] for i in range(first, last + 1))
+        for i in range(first, last + 1):
+            self._blocks.move_to_end(i)
+        while len(self._blocks) > max(_FILE_BLOCKS, last - first + 1):
+            self._blocks.popitem(last=False)
+        offset = self._position - first * size
+        n = end - self._position
+        buffer[:n] = data[offset:offset + n]
+        self._position = end
+        return n
+
+
+_CACHE: RangeCache | None = None
+_RASTERIO_OPEN = None
+
+
+def enable(directory: str | None = None, max_bytes: int | str | None = None, **kwargs) -> RangeCache:
+    """
+    Read remote ``.tif``/``.tiff`` files opened by ``rasterio.open`` through the shared cache.
+
+    Calling it again returns the enabled cache. Arguments are those of ``RangeCache``.
+
+    Returns:
+        RangeCache: The cache, e.g. for ``stats()``.
+    """
+    global _CACHE, _RASTERIO_OPEN
+    if _CACHE is not None:
+        return _CACHE
+    import rasterio
+
+    cache = RangeCache(directory, max_bytes, **kwargs)
+    original = rasterio.open
+
+    def cached_open(fp, mode="r", *args, **open_kwargs):
+        if mode == "r" and isinstance(fp, str) and "opener" not in open_kwargs and is_cacheable(fp):
+            open_kwargs["opener"] = cache.open
+        return original(fp, mode, *args, **open_kwargs)
+
+    # datacube and odc-loader call rasterio.open through the module attribute
+    rasterio.open = cached_open
+    _CACHE, _RASTERIO_OPEN = cache, original
+    return cache
+
+
+def disable() -> None:
+    """Let ``rasterio.open`` read remote files directly again."""
+    global _CACHE, _RASTERIO_OPEN
+    if _RASTERIO_OPEN is not None:
+        import rasterio
+
+        rasterio.open = _RASTERIO_OPEN
+    _CACHE = _RASTERIO_OPEN = None
+
+
+@click.command("cog-cache")
+@click.option("--directory", type=click.Path(file_okay=False), envvar=COG_CACHE_DIR_ENV,
+              default=DEFAULT_COG_CACHE_DIR, show_default=True, help=f"Cache directory (also ${COG_CACHE_DIR_ENV}).")
+@click.option("--trim", "trim_to", type=str, default=None, help="Evict down to this size, e.g. 5G.")
+@click.option("--clear", is_flag=True, default=False, help="Drop every cached block and reset the counters.")
+def cli(directory, trim_to, clear):
+    """
+    Show the hit/miss statistics of the shared COG byte-range cache, or trim or clear it.
+    """
+    cache = RangeCache(directory)
+    if clear:
+        cache.clear()
+    elif trim_to:
+        print(f"Evicted {cache.trim(parse_size(trim_to))} blocks")
+    print(cache.stats())
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,120 @@
+"""
+Direct PostgreSQL access for piksel-core commands.
+
+The connection URL is resolved through datacube's own configuration (the
+``ODC_<ENV>_DB_*`` variables or ``datacube.conf``), so these commands talk to
+exactly the same database as ``datacube``/``stac-to-dc``. Tables owned by
+piksel-core live in their own ``piksel`` schema, next to the ``odc`` schema.
+
+When datacube clients go through the transaction-pooling proxy,
+``PIKSEL_DIRECT_DB_HOSTNAME``/``PIKSEL_DIRECT_DB_PORT`` point these
+connections at the server itself: maintenance commands rely on session state
+(temporary tables, exported snapshots, ``CREATE INDEX CONCURRENTLY``) that a
+pooled server connection does not keep between transactions.
+"""
+
+import os
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+import psycopg2
+from datacube.cfg import ODCConfig, ODCEnvironment
+from datacube.cfg.opt import psql_url_from_config
+
+ODC_SCHEMA = "odc"
+PIKSEL_SCHEMA = "piksel"
+
+# Lets incremental scans on odc.dataset.updated use an index range instead of reading the table
+UPDATED_INDEX = "ix_dataset_updated"
+
+DIRECT_HOSTNAME_ENV = "PIKSEL_DIRECT_DB_HOSTNAME"
+DIRECT_PORT_ENV = "PIKSEL_DIRECT_DB_PORT"
+
+
+def with_host(url: str, hostname: str | None = None, port: int | str | None = None) -> str:
+    """``url`` with its host and/or port replaced, keeping credentials and database."""
+    if not hostname and not port:
+        return url
+    parts = urlsplit(url)
+    userinfo, at, _ = parts.netloc.rpartition("@")
+    netloc = f"{userinfo}{at}{hostname or parts.hostname or ''}"
+    if port or parts.port:
+        netloc += f":{port or parts.port}"
+    return urlunsplit(parts._replace(netloc=netloc))
+
+
+def environment(env: ODCEnvironment | str | None = None) -> ODCEnvironment:
+    """
+    The datacube environment ``env``.
+
+    Commands decorated with ``datacube.ui.click.pass_config`` receive the
+    ``ODCEnvironment`` itself, already read from the ``--config`` files; a
+    name (or None for the default) is looked up in the default configuration.
+    """
+    if isinstance(env, ODCEnvironment):
+        return env
+    return ODCConfig()[env]
+
+
+def environment_name(env: ODCEnvironment | str | None) -> str | None:
+    """
+    The name of ``env``, to open the same environment in another process.
+
+    ``ODCEnvironment`` objects cannot be pickled, so worker processes are
+    given the name and look the environment up again.
+    """
+    if isinstance(env, ODCEnvironment):
+        # datacube's own pass_config logs the name from the same attribute
+        return env._name
+    return env
+
+
+def datacube_url(env: ODCEnvironment | str | None = None) -> str:
+    """Return the SQLAlchemy URL of the datacube environment ``env``, bypassing any connection pool."""
+    url = psql_url_from_config(environment(env))
+    return with_host(url, os.environ.get(DIRECT_HOSTNAME_ENV), os.environ.get(DIRECT_PORT_ENV))
+
+
+def database_url(env: ODCEnvironment | str | None = None) -> str:
+    """Return a libpq URL for the datacube environment ``env``, bypassing any connection pool."""
+    return re.sub(r"^postgresql\+psycopg2?://", "postgresql://", datacube_url(env))
+
+
+def connect(env: ODCEnvironment | str | None = None, application_name: str = "piksel-core"):
+    """
+    Open a psycopg2 connection to the ODC database.
+
+    Args:
+        env (ODCEnvironment | str | None): Datacube environment, as ``pass_config``
+            passes it, or its name; None for the default.
+        application_name (str): Reported in ``pg_stat_activity``.
+
+    Returns:
+        psycopg2.extensions.connection: A new connection (not in autocommit).
+    """
+    return psycopg2.connect(database_url(env), application_name=application_name)
+
+
+def ensure_piksel_schema(cursor) -> None:
+    """Create the ``piksel`` schema if it does not exist yet."""
+    cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {PIKSEL_SCHEMA}")
+
+
+def ensure_updated_index(cursor) -> None:
+    """Create the ``odc.dataset.updated`` index if missing; the cursor's connection must be in autocommit."""
+    cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {UPDATED_INDEX} ON {ODC_SCHEMA}.dataset (updated)")
+
+
+def transaction_cutoff(cursor):
+    """
+    The start of the oldest transaction that may still commit rows, or now.
+
+    Rows changed by transactions that are still open get an ``updated`` stamp
+    before this time but only become visible later, so a watermark for
+    incremental scans must not move past it.
+    """
+    cursor.execute(
+        "SELECT least(now(), min(xact_start)) FROM pg_stat_activity "
+        "WHERE xact_start IS NOT NULL AND pid <> pg_backend_pid() AND backend_type = 'client backend'"
+    )
+    return cursor.fetchone()[0]
@@ -0,0 +1,88 @@
+"""
+Loading the metadata type and product definitions shipped with the repository.
+
+Definition files may hold several YAML documents (``lsX_c2l2_sr`` defines four
+Landsat products), so documents are keyed by their ``name`` rather than by
+file. ``products.csv`` lists every product with the URL of its definition and
+is checked against the files, so the two cannot drift apart unnoticed.
+"""
+
+import csv
+import glob
+import os
+from collections.abc import Iterable, Mapping
+from typing import NamedTuple
+from urllib.parse import urlparse
+
+import yaml
+
+# Where the ODC container mounts the repository's definitions
+PRODUCTS_DIR = "/home/venv/products"
+METADATA_DIR = "/home/venv/metadata"
+PRODUCTS_CSV = "/home/venv/products.csv"
+
+
+class Definition(NamedTuple):
+    """One named definition document and the file it came from."""
+
+    name: str
+    path: str
+    doc: dict
+
+
+def load_documents(paths: Iterable[str]) -> list[Definition]:
+    """Every named YAML document in ``paths``, in file order."""
+    definitions = []
+    for path in paths:
+        with open(path) as f:
+            for doc in yaml.safe_load_all(f):
+                if doc:
+                    definitions.append(Definition(doc["name"], path, doc))
+    return definitions
+
+
+def load_definitions(directory: str, pattern: str = "*.yaml") -> dict[str, Definition]:
+    """
+    The definitions in the files of ``directory`` matching ``pattern``, by name.
+
+    Raises:
+        ValueError: If two documents share a name.
+    """
+    definitions: dict[str, Definition] = {}
+    for definition in load_documents(sorted(glob.glob(os.path.join(directory, pattern)))):
+        if definition.name in definitions:
+            raise ValueError(
+                f"{definition.name} is defined in both {definitions[definition.name].path} and {definition.path}"
+            )
+        definitions[definition.name] = definition
+    return definitions
+
+
+def read_products_csv(path: str) -> dict[str, str]:
+    """
+    Product names of ``products.csv`` mapped to the file name of their definition.
+
+    Several products sharing a definition are listed ``;``-separated in one row.
+    """
+    listing = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            filename = os.path.basename(urlparse(row["definition"].strip()).path)
+            for name in row["product"].split(";"):
+                if name.strip():
+                    listing[name.strip()] = filename
+    return listing
+
+
+def check_products_csv(listing: Mapping[str, str], products: Mapping[str, Definition]) -> list[str]:
+    """Disagreements between ``products.csv`` and the product definition files."""
+    problems = []
+    for name, filename in sorted(listing.items()):
+        definition = products.get(name)
+        if definition is None:
+            problems.append(f"{name} is listed in products.csv but not defined")
+        elif os.path.basename(definition.path) != filename:
+            problems.append(f"{name} is listed with {filename} but defined in {os.path.basename(definition.path)}")
+    for name in sorted(set(products) - set(listing)):
+        problems.append(f"{name} is defined in {os.path.basename(products[name].path)} but not in products.csv")
+    return problems
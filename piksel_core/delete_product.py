@@ -0,0 +1,213 @@
+"""
+Delete a product and its datasets in small, independent transactions.
+
+``datacube product delete`` (and the ``delete_odc_product.sql`` script this
+replaces) remove every dataset of a product in a few huge statements, holding locks for the whole run
+and writing one large burst of WAL. Here each batch of datasets is removed
+from the search tables, every ``spatial_*`` table, lineage and
+``odc.dataset`` in its own short transaction, with a lock timeout, so the
+deletion can run next to live Jupyter and Explorer traffic. Every committed
+batch is final: an interrupted deletion resumes by running the command again.
+"""
+
+import sys
+import time
+
+import click
+import psycopg2
+from datacube.ui.click import environment_option, pass_config
+from psycopg2 import sql
+
+from piksel_core.db import ODC_SCHEMA, PIKSEL_SCHEMA, connect
+from piksel_core.explorer import ensure_tables, record_deleted
+from piksel_core.s3_discovery import forget_product_etags
+from piksel_core.search_tables import drop_table, table_name
+
+SEARCH_TABLES = ("dataset_search_string", "dataset_search_num", "dataset_search_datetime")
+
+# (table, column) rows referencing the datasets being deleted.
+_DEPENDENT_ROWS = [(table, "dataset_ref") for table in SEARCH_TABLES] + [
+    ("dataset_lineage", "derived_dataset_ref"),
+    ("dataset_home", "dataset_ref"),
+]
+
+
+def _spatial_tables(cur) -> list[str]:
+    cur.execute(f"SELECT table_name FROM {ODC_SCHEMA}.spatial_indicies ORDER BY srid")
+    return [row[0] for row in cur.fetchall()]
+
+
+def _product_id(cur, product: str) -> int | None:
+    cur.execute(f"SELECT id FROM {ODC_SCHEMA}.product WHERE name = %s", (product,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def delete_batch(
+    cur, product_id: int, spatial_tables: list[str], batch_size: int, uri_prefix: str | None = None
+) -> int:
+    """
+    Delete up to ``batch_size`` datasets of a product and everything referencing them.
+
+    Must run inside a transaction; returns the number of datasets deleted.
+    With ``uri_prefix`` only datasets whose location starts with it are deleted.
+    """
+    cur.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS delete_batch (id uuid PRIMARY KEY) ON COMMIT DELETE ROWS"
+    )
+    condition, params = "", (product_id,)
+    if uri_prefix is not None:
+        scheme, _, body = uri_prefix.partition(":")
+        condition, params = " AND uri_scheme = %s AND uri_body LIKE %s", (product_id, scheme, f"{body}%")
+    cur.execute(
+        f"INSERT INTO delete_batch SELECT id FROM {ODC_SCHEMA}.dataset "
+        f"WHERE product_ref = %s{condition} LIMIT %s FOR UPDATE SKIP LOCKED",
+        (*params, batch_size),
+    )
+    if cur.rowcount == 0:
+        return 0
+    tables = _DEPENDENT_ROWS + [(table, "dataset_ref") for table in spatial_tables]
+    for table, column in tables:
+        cur.execute(
+            sql.SQL("DELETE FROM {table} t USING delete_batch b WHERE t.{column} = b.id").format(
+                table=sql.Identifier(ODC_SCHEMA, table), column=sql.Identifier(column)
+            )
+        )
+    cur.execute(f"DELETE FROM {ODC_SCHEMA}.dataset d USING delete_batch b WHERE d.id = b.id")
+    return cur.rowcount
+
+
+def delete_by_location(connection, product_id: int, uri_prefix: str, batch_size: int = 5000) -> int:
+    """
+    Delete the datasets of a product located under ``uri_prefix``, batch by batch.
+
+    Their months are recorded for a forced Explorer refresh first.
+
+    Returns:
+        How many datasets were deleted.
+    """
+    with connection, connection.cursor() as cur:
+        spatial_tables = _spatial_tables(cur)
+    # cubedash cannot see hard deleted datasets in the timestamps it refreshes from
+    ensure_tables(connection)
+    record_deleted(connection, product_id, uri_prefix)
+    deleted = 0
+    while True:
+        with connection, connection.cursor() as cur:
+            n = delete_batch(cur, product_id, spatial_tables, batch_size, uri_prefix=uri_prefix)
+        if n == 0:
+            return deleted
+        deleted += n
+
+
+def drop_dynamic_objects(connection, product: str) -> list[str]:
+    """
+    Drop the ``dv_<product>_dataset`` view, ``dix_<product>_*`` indexes and
+    the product's ``piksel.ds_<product>`` search table.
+
+    Indexes are dropped ``CONCURRENTLY`` so readers are never blocked.
+
+    Returns:
+        list[str]: The objects dropped.
+    """
+    dropped = []
+    index_pattern = "dix\\_" + product.replace("_", "\\_") + "\\_%"
+    previous, connection.autocommit = connection.autocommit, True
+    try:
+        with connection.cursor() as cur:
+            cur.execute(
+                "SELECT schemaname, viewname FROM pg_views WHERE viewname = %s",
+                (f"dv_{product}_dataset",),
+            )
+            for schema, view in cur.fetchall():
+                cur.execute(sql.SQL("DROP VIEW IF EXISTS {}").format(sql.Identifier(schema, view)))
+                dropped.append(f"{schema}.{view}")
+            cur.execute(
+                "SELECT schemaname, indexname FROM pg_indexes WHERE indexname LIKE %s",
+                (index_pattern,),
+            )
+            for schema, index in cur.fetchall():
+                cur.execute(
+                    sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(sql.Identifier(schema, index))
+                )
+                dropped.append(f"{schema}.{index}")
+            if drop_table(cur, product):
+                dropped.append(f"{PIKSEL_SCHEMA}.{table_name(product)}")
+    finally:
+        connection.autocommit = previous
+    return dropped
+
+
+@click.command("delete-product")
+@environment_option
+@pass_config
+@click.argument("product")
+@click.option("--batch-size", type=int, default=5000, show_default=True,
+              help="Datasets deleted per transaction.")
+@click.option("--lock-timeout", type=str, default="5s", show_default=True,
+              help="Give up waiting for a lock after this long and retry the batch.")
+@click.option("--pause", type=float, default=0.0, show_default=True,
+              help="Seconds to sleep between batches to limit IO and WAL rate.")
+@click.option("--keep-product", is_flag=True, default=False,
+              help="Delete the datasets but keep the product definition.")
+@click.option("--dry-run", is_flag=True, default=False,
+              help="Only report how many datasets would be deleted.")
+def cli(cfg_env, product, batch_size, lock_timeout, pause, keep_product, dry_run):
+    """
+    Delete PRODUCT, its datasets, search and spatial index rows in bounded batches.
+    """
+    connection = connect(cfg_env, application_name="piksel-delete-product")
+    with connection, connection.cursor() as cur:
+        product_id = _product_id(cur, product)
+        if product_id is None:
+            raise click.ClickException(f"Product {product} does not exist")
+        spatial_tables = _spatial_tables(cur)
+        cur.execute(f"SELECT count(*) FROM {ODC_SCHEMA}.dataset WHERE product_ref = %s", (product_id,))
+        total = cur.fetchone()[0]
+    print(f"{product}: {total} datasets, spatial tables {', '.join(spatial_tables) or 'none'}")
+    if dry_run:
+        return
+
+    deleted = 0
+    retries = 0
+    started = time.monotonic()
+    while True:
+        try:
+            with connection, connection.cursor() as cur:
+                cur.execute("SET LOCAL lock_timeout = %s", (lock_timeout,))
+                n = delete_batch(cur, product_id, spatial_tables, batch_size)
+        except psycopg2.errors.LockNotAvailable:
+            retries += 1
+            if retries > 10:
+                raise click.ClickException("Gave up after 10 lock timeouts in a row; "
+                                           "run again to resume")
+            print(f"Lock timeout, retrying batch ({retries}/10)")
+            time.sleep(min(30, 2 ** retries))
+            continue
+        retries = 0
+        if n == 0:
+            break
+        deleted += n
+        elapsed = time.monotonic() - started
+        print(f"Deleted {deleted}/{total} datasets ({deleted / elapsed:.0f}/s)")
+        if pause:
+            time.sleep(pause)
+
+    with connection, connection.cursor() as cur:
+        cur.execute(f"SELECT count(*) FROM {ODC_SCHEMA}.dataset WHERE product_ref = %s", (product_id,))
+        remaining = cur.fetchone()[0]
+    if remaining:
+        # Rows locked by concurrent writers were skipped; a rerun picks them up.
+        print(f"{remaining} datasets are still locked by other sessions, run again to finish")
+        sys.exit(1)
+    with connection, connection.cursor() as cur:
+        # Documents skipped by index-s3 as already indexed must be indexed again
+        forget_product_etags(cur, product)
+
+    if not keep_product:
+        with connection, connection.cursor() as cur:
+            cur.execute(f"DELETE FROM {ODC_SCHEMA}.product WHERE id = %s", (product_id,))
+        for name in drop_dynamic_objects(connection, product):
+            print(f"Dropped {name}")
+        print(f"Deleted product {product}")
+    connection.close()
@@ -0,0 +1,210 @@
+"""
+Which Explorer (cubedash) summaries are out of date.
+
+``cubedash-gen --all`` walks every product. Instead, after each indexing run
+the datasets changed since the previous run (``odc.dataset.updated``, the same
+watermark scheme as ``piksel_core.spindex``) are grouped by product and by the
+month of their ``time`` and recorded in ``piksel.explorer_pending``.
+``make explorer-update`` claims the pending products, runs ``cubedash-gen``
+for only those, in parallel, and releases them when it succeeds; cubedash then
+regenerates just the months whose datasets changed. A period recorded again
+while its product is being regenerated is not released, so the next run picks
+it up.
+
+cubedash finds those months from the datasets' ``updated`` and ``added``
+timestamps, so it cannot see datasets imported with their original
+timestamps or removed by a hard delete. Such periods are recorded with
+``force`` set, and their products are regenerated with ``--force-refresh``.
+"""
+
+from collections import defaultdict
+from collections.abc import Iterable, Sequence
+from datetime import date
+from typing import NamedTuple
+
+from piksel_core.db import ODC_SCHEMA, PIKSEL_SCHEMA, ensure_piksel_schema, ensure_updated_index, transaction_cutoff
+
+CREATE_PENDING_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {PIKSEL_SCHEMA}.explorer_pending (
+    product text NOT NULL,
+    period date NOT NULL,
+    datasets bigint NOT NULL DEFAULT 0,
+    force boolean NOT NULL DEFAULT false,
+    recorded timestamptz NOT NULL DEFAULT now(),
+    claimed timestamptz,
+    PRIMARY KEY (product, period)
+)
+"""
+
+ADD_FORCE_COLUMN = f"""
+ALTER TABLE {PIKSEL_SCHEMA}.explorer_pending ADD COLUMN IF NOT EXISTS force boolean NOT NULL DEFAULT false
+"""
+
+CREATE_WATERMARK_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {PIKSEL_SCHEMA}.explorer_watermark (
+    singleton boolean PRIMARY KEY DEFAULT true CHECK (singleton),
+    high_water timestamptz NOT NULL,
+    updated timestamptz NOT NULL DEFAULT now()
+)
+"""
+
+# A period recorded again after it was claimed is pending again, forced only if its new changes need it
+_UPSERT = """
+ON CONFLICT (product, period) DO UPDATE SET
+    datasets = explorer_pending.datasets + EXCLUDED.datasets,
+    force = EXCLUDED.force OR (explorer_pending.force AND explorer_pending.claimed IS NULL),
+    recorded = now(),
+    claimed = NULL
+"""
+
+
+class PendingPeriod(NamedTuple):
+    """Months of one product waiting for their Explorer summary."""
+
+    product: str
+    period: date
+    datasets: int
+
+
+def ensure_tables(connection) -> None:
+    """Create the pending and watermark tables and the ``odc.dataset.updated`` index if missing."""
+    previous = connection.autocommit
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cur:
+            ensure_piksel_schema(cur)
+            cur.execute(CREATE_PENDING_TABLE)
+            cur.execute(ADD_FORCE_COLUMN)
+            cur.execute(CREATE_WATERMARK_TABLE)
+            ensure_updated_index(cur)
+    finally:
+        connection.autocommit = previous
+
+
+def _record(cur, condition: str, params: tuple, force: bool = False) -> int:
+    """Add the product months of the datasets matching ``condition`` (on ``d``, ``p``) to the pending table."""
+    cur.execute(
+        f"""
+        INSERT INTO {PIKSEL_SCHEMA}.explorer_pending (product, period, datasets, force)
+        SELECT p.name, date_trunc('month', lower(t.search_val))::date, count(*), %s
+        FROM {ODC_SCHEMA}.dataset d
+        JOIN {ODC_SCHEMA}.product p ON p.id = d.product_ref
+        JOIN {ODC_SCHEMA}.dataset_search_datetime t ON t.dataset_ref = d.id AND t.search_key = 'time'
+        WHERE {condition}
+        GROUP BY 1, 2
+        {_UPSERT}
+        """,
+        (force, *params),
+    )
+    return cur.rowcount
+
+
+def record_changes(connection) -> int:
+    """
+    Record the product months of the datasets changed since the previous call.
+
+    The first call records every month of every product.
+
+    Returns:
+        int: Product months recorded.
+    """
+    with connection, connection.cursor() as cur:
+        cutoff = transaction_cutoff(cur)
+        cur.execute(f"SELECT high_water FROM {PIKSEL_SCHEMA}.explorer_watermark FOR UPDATE")
+        row = cur.fetchone()
+        recorded = _record(cur, "d.updated >= %s", (row[0],)) if row else _record(cur, "true", ())
+        cur.execute(
+            f"""
+            INSERT INTO {PIKSEL_SCHEMA}.explorer_watermark (high_water) VALUES (%s)
+            ON CONFLICT (singleton) DO UPDATE SET
+                high_water = GREATEST(explorer_watermark.high_water, EXCLUDED.high_water), updated = now()
+            """,
+            (cutoff,),
+        )
+    return recorded
+
+
+def record_product(connection, product: str, force: bool = False) -> int:
+    """
+    Record every month of ``product``.
+
+    Pass ``force`` after importing it with its original timestamps, which
+    cubedash would take as unchanged.
+    """
+    with connection, connection.cursor() as cur:
+        return _record(cur, "p.name = %s", (product,), force)
+
+
+def record_deleted(connection, product_id: int, uri_prefix: str) -> int:
+    """Record, forced, the months of a product's datasets under ``uri_prefix`` before they are hard deleted."""
+    scheme, _, body = uri_prefix.partition(":")
+    with connection, connection.cursor() as cur:
+        return _record(
+            cur, "d.product_ref = %s AND d.uri_scheme = %s AND d.uri_body LIKE %s",
+            (product_id, scheme, f"{body}%"), force=True,
+        )
+
+
+def pending(connection) -> list[PendingPeriod]:
+    """The pending product months, dropping those of products no longer in the index."""
+    with connection, connection.cursor() as cur:
+        cur.execute(
+            f"DELETE FROM {PIKSEL_SCHEMA}.explorer_pending e WHERE NOT EXISTS "
+            f"(SELECT 1 FROM {ODC_SCHEMA}.product p WHERE p.name = e.product)"
+        )
+        cur.execute(
+            f"SELECT product, period, datasets FROM {PIKSEL_SCHEMA}.explorer_pending ORDER BY product, period"
+        )
+        return [PendingPeriod(*row) for row in cur.fetchall()]
+
+
+def claim(connection) -> tuple[list[str], list[str]]:
+    """
+    Mark every pending period as being regenerated.
+
+    Returns:
+        tuple[list[str], list[str]]: The products cubedash can update from the
+        dataset timestamps, and those it must regenerate with ``--force-refresh``.
+    """
+    with connection, connection.cursor() as cur:
+        cur.execute(f"UPDATE {PIKSEL_SCHEMA}.explorer_pending SET claimed = now() RETURNING product, force")
+        rows = cur.fetchall()
+    forced = {product for product, force in rows if force}
+    return sorted({product for product, _ in rows} - forced), sorted(forced)
+
+
+def release(connection, products: Iterable[str]) -> int:
+    """Forget the claimed periods of ``products`` once their summaries were regenerated."""
+    with connection, connection.cursor() as cur:
+        cur.execute(
+            f"DELETE FROM {PIKSEL_SCHEMA}.explorer_pending WHERE claimed IS NOT NULL AND product = ANY(%s)",
+            (list(products),),
+        )
+        return cur.rowcount
+
+
+def month_ranges(periods: Sequence[date]) -> str:
+    """Consecutive months collapsed, e.g. ``2023-01..2023-03, 2023-07``."""
+    def index(period: date) -> int:
+        return period.year * 12 + period.month - 1
+
+    ranges: list[list[date]] = []
+    for period in sorted(periods):
+        if ranges and index(period) == index(ranges[-1][1]) + 1:
+            ranges[-1][1] = period
+        else:
+            ranges.append([period, period])
+    return ", ".join(
+        f"{start:%Y-%m}" if start == end else f"{start:%Y-%m}..{end:%Y-%m}" for start, end in ranges
+    )
+
+
+def summarise(periods: Iterable[PendingPeriod]) -> list[str]:
+    """One line per product: datasets changed and the months to regenerate."""
+    by_product = defaultdict(list)
+    for period in periods:
+        by_product[period.product].append(period)
+    return [
+        f"{product}: {sum(p.datasets for p in rows)} changed datasets in {month_ranges([p.period for p in rows])}"
+        for product, rows in sorted(by_product.items())
+    ]
@@ -0,0 +1,57 @@
+"""
+Track the Explorer summaries that indexing made stale (see ``piksel_core.explorer``).
+
+Run after every indexing target to record the product months touched since
+the previous run, and by ``make explorer-update`` to claim the products to
+pass to ``cubedash-gen`` (``--claim``) and release them afterwards
+(``--release``). ``--claim`` prints two lines of space separated products:
+those ``cubedash-gen`` updates from the dataset timestamps, then those it must
+regenerate with ``--force-refresh``.
+"""
+
+import sys
+
+import click
+from datacube.ui.click import environment_option, pass_config
+
+from piksel_core.db import connect
+from piksel_core.explorer import claim, ensure_tables, pending, record_changes, record_product, release, summarise
+
+
+@click.command("explorer-pending")
+@environment_option
+@pass_config
+@click.option("--product", "products", type=str, multiple=True,
+              help="Also record every month of this product for a forced refresh (repeatable), "
+                   "e.g. after import-product.")
+@click.option("--claim", "claim_products", is_flag=True, default=False,
+              help="Mark the pending products as being regenerated and print their names, "
+                   "those needing --force-refresh on a second line.")
+@click.option("--release", "release_products", type=str, default=None,
+              help="Space or comma separated products whose summaries were regenerated.")
+@click.option("--quiet", is_flag=True, default=False, help="Do not list the pending months.")
+def cli(cfg_env, products, claim_products, release_products, quiet):
+    """
+    Record which product months changed since the last run, for incremental Explorer summaries.
+    """
+    connection = connect(cfg_env, application_name="piksel-explorer-pending")
+    try:
+        ensure_tables(connection)
+        if release_products is not None:
+            names = release_products.replace(",", " ").split()
+            print(f"Released {release(connection, names)} product months", file=sys.stderr)
+            return
+        recorded = record_changes(connection)
+        for product in products:
+            recorded += record_product(connection, product, force=True)
+        periods = pending(connection)
+        if not quiet:
+            print(f"Recorded {recorded} changed product months, {len(periods)} pending", file=sys.stderr)
+            for line in summarise(periods):
+                print(f"  {line}", file=sys.stderr)
+        if claim_products:
+            products, forced = claim(connection)
+            print(" ".join(products))
+            print(" ".join(forced))
+    finally:
+        connection.close()
@@ -0,0 +1,37 @@
+"""
+``export-product``: write one product's datasets, search and spatial index
+rows to an archive directory (see ``piksel_core.product_archive``).
+"""
+
+import os
+import time
+from datetime import datetime
+
+import click
+from datacube.ui.click import environment_option, pass_config
+
+from piksel_core.product_archive import export_product
+
+
+@click.command("export-product")
+@environment_option
+@pass_config
+@click.argument("product")
+@click.option("--output", type=click.Path(file_okay=False), default=None,
+              help="Archive directory [default: ./<product>_<timestamp>].")
+@click.option("--jobs", type=int, default=4, show_default=True, help="Tables copied concurrently.")
+def cli(cfg_env, product, output, jobs):
+    """
+    Export PRODUCT's rows of the index to an archive for import-product.
+    """
+    output = output or f"{product}_{datetime.now():%Y%m%d_%H%M%S}"
+    if os.path.exists(output) and os.listdir(output):
+        raise click.ClickException(f"{output} is not empty")
+    started = time.monotonic()
+    try:
+        manifest = export_product(cfg_env, product, output, jobs)
+    except ValueError as e:
+        raise click.ClickException(str(e)) from e
+    for table, entry in manifest["tables"].items():
+        print(f"{table}: {entry['rows']} rows")
+    print(f"Exported {product} to {output} in {time.monotonic() - started:.1f}s")
@@ -0,0 +1,287 @@
+"""
+Hot-spot ranking for ``perf-report``.
+
+Stage timings and counters come from the metric files written by
+``piksel_core.telemetry``; statement timings from ``pg_stat_statements``;
+table and index sizes and dead space from the statistics views and
+``pgstattuple``. Stages and statements are ranked together by total time.
+A statement's time is also part of the stage that ran it, so the ranking
+shows where time went rather than adding up to the wall time.
+"""
+
+import math
+from collections import Counter
+from collections.abc import Iterable, Mapping, Sequence
+
+from piksel_core.telemetry import ELAPSED_METRIC, PREFIX, STAGE_METRIC, START_METRIC, Sample
+
+REPORT_VERSION = 1
+
+# B-tree leaf pages are filled to 90% by default; density below that is bloat
+BTREE_FILL = 90.0
+
+_PROCESS_LABELS = ("command", "host", "pid")
+
+
+def histogram_quantile(buckets: Iterable[tuple[float, float]], q: float) -> float | None:
+    """
+    Estimate a quantile from cumulative ``(upper bound, count)`` buckets, as Prometheus does.
+
+    The value is interpolated linearly within its bucket; one in the ``+Inf``
+    bucket is reported as the highest finite bound.
+    """
+    buckets = sorted(buckets)
+    if not buckets or not buckets[-1][1]:
+        return None
+    rank = q * buckets[-1][1]
+    lower, below = 0.0, 0.0
+    for bound, cumulative in buckets:
+        if cumulative >= rank:
+            if math.isinf(bound):
+                return lower
+            if cumulative == below:
+                return bound
+            return lower + (bound - lower) * (rank - below) / (cumulative - below)
+        lower, below = bound, cumulative
+    return lower
+
+
+def stage_summary(samples: Iterable[Sample], by: Sequence[str] = ("command", "stage")) -> list[dict]:
+    """Total, mean and p95 time per stage, across processes and other labels, slowest first."""
+    groups: dict[tuple, dict] = {}
+    for sample in samples:
+        if not sample.name.startswith(STAGE_METRIC):
+            continue
+        key = tuple(sample.labels.get(label, "") for label in by)
+        group = groups.setdefault(key, {"seconds": 0.0, "calls": 0, "buckets": Counter()})
+        suffix = sample.name[len(STAGE_METRIC):]
+        if suffix == "_sum":
+            group["seconds"] += sample.value
+        elif suffix == "_count":
+            group["calls"] += int(sample.value)
+        elif suffix == "_bucket":
+            group["buckets"][float(sample.labels["le"])] += sample.value
+    stages = []
+    for key, group in groups.items():
+        p95 = histogram_quantile(group["buckets"].items(), 0.95)
+        stages.append({
+            **dict(zip(by, key)),
+            "seconds": round(group["seconds"], 3),
+            "calls": group["calls"],
+            "mean_ms": round(1000 * group["seconds"] / group["calls"], 2) if group["calls"] else None,
+            "p95_ms": round(1000 * p95, 2) if p95 is not None else None,
+        })
+    return sorted(stages, key=lambda stage: -stage["seconds"])
+
+
+def busy_seconds(intervals: Iterable[tuple[float, float]]) -> float:
+    """Length of the union of ``(start, end)`` intervals."""
+    total, current = 0.0, None
+    for start, end in sorted(intervals):
+        if current is None or start > current[1]:
+            if current is not None:
+                total += current[1] - current[0]
+            current = [start, end]
+        else:
+            current[1] = max(current[1], end)
+    if current is not None:
+        total += current[1] - current[0]
+    return total
+
+
+def throughput(samples: Iterable[Sample]) -> list[dict]:
+    """
+    Datasets and rows written per command, and datasets per second of the time its processes ran.
+
+    Processes of one command that ran at the same time (tile workers, kernels)
+    count their overlap once.
+    """
+    starts, elapsed = {}, {}
+    datasets: dict[str, Counter] = {}
+    rows: dict[str, Counter] = {}
+    for sample in samples:
+        process = tuple(sample.labels.get(label, "") for label in _PROCESS_LABELS)
+        command = sample.labels.get("command", "")
+        if sample.name == START_METRIC:
+            starts[process] = sample.value
+        elif sample.name == ELAPSED_METRIC:
+            elapsed[process] = sample.value
+        elif sample.name == f"{PREFIX}datasets_total":
+            datasets.setdefault(command, Counter())[sample.labels.get("status", "")] += sample.value
+        elif sample.name == f"{PREFIX}rows_total":
+            rows.setdefault(command, Counter())[sample.labels.get("table", "")] += sample.value
+    commands = []
+    for command in sorted(set(datasets) | set(rows)):
+        seconds = busy_seconds(
+            (start, start + elapsed[process]) for process, start in starts.items()
+            if process[0] == command and process in elapsed
+        )
+        handled = sum(datasets.get(command, Counter()).values())
+        commands.append({
+            "command": command,
+            "seconds": round(seconds, 3),
+            "datasets": {status: int(n) for status, n in sorted(datasets.get(command, Counter()).items())},
+            "datasets_per_second": round(handled / seconds, 2) if seconds else None,
+            "rows": {table: int(n) for table, n in rows.get(command, Counter()).most_common()},
+        })
+    return commands
+
+
+def cache_summary(samples: Iterable[Sample]) -> list[dict]:
+    """Hits and misses of every counter with a ``result="hit"|"miss"`` label."""
+    caches: dict[str, Counter] = {}
+    for sample in samples:
+        result = sample.labels.get("result")
+        if result in ("hit", "miss") and sample.name.endswith("_total"):
+            name = sample.name[len(PREFIX):-len("_total")]
+            caches.setdefault(name, Counter())[result] += sample.value
+    return [
+        {
+            "cache": name,
+            "hits": int(counts["hit"]),
+            "misses": int(counts["miss"]),
+            "hit_ratio": round(counts["hit"] / (counts["hit"] + counts["miss"]), 3),
+        }
+        for name, counts in sorted(caches.items())
+    ]
+
+
+def table_bloat(rows: Iterable[Mapping]) -> list[dict]:
+    """
+    Estimate the space dead tuples take in each table, most wasted first.
+
+    Args:
+        rows (Iterable[Mapping]): ``table``, ``bytes``, ``live`` and ``dead``
+            per table, as ``pg_stat_user_tables`` and ``pg_table_size`` report them.
+    """
+    tables = []
+    for row in rows:
+        tuples = row["live"] + row["dead"]
+        dead = row["dead"] / tuples if tuples else 0.0
+        tables.append({**row, "dead_ratio": round(dead, 3), "wasted_bytes": int(row["bytes"] * dead)})
+    return sorted(tables, key=lambda table: -table["wasted_bytes"])
+
+
+def index_bloat(rows: Iterable[Mapping]) -> list[dict]:
+    """
+    Estimate the space lost to sparse leaf pages in each index, most wasted first.
+
+    Args:
+        rows (Iterable[Mapping]): ``index``, ``bytes``, ``scans`` and, for
+            B-trees ``pgstatindex`` could read, ``leaf_density`` (percent).
+    """
+    indexes = []
+    for row in rows:
+        density = row.get("leaf_density")
+        wasted = None
+        if density is not None and not math.isnan(density):
+            wasted = int(row["bytes"] * max(0.0, 1 - density / BTREE_FILL))
+        indexes.append({**row, "wasted_bytes": wasted})
+    return sorted(indexes, key=lambda index: (-(index["wasted_bytes"] or 0), -index["bytes"]))
+
+
+def slowest_events(events: Iterable[Mapping], top: int = 10) -> list[dict]:
+    """The ``top`` logged stage events that took longest."""
+    timed = [event for event in events if isinstance(event.get("seconds"), (int, float))]
+    return sorted(timed, key=lambda event: -event["seconds"])[:top]
+
+
+def _statement_name(query: str, width: int = 100) -> str:
+    query = " ".join(query.split())
+    return query if len(query) <= width else query[:width - 3] + "..."
+
+
+def rank_hotspots(stages: Iterable[Mapping], statements: Iterable[Mapping], top: int = 20) -> list[dict]:
+    """
+    Stages and SQL statements ranked together by total seconds.
+
+    Args:
+        stages (Iterable[Mapping]): ``stage_summary`` entries.
+        statements (Iterable[Mapping]): ``query``, ``calls``, ``total_ms`` and
+            ``mean_ms`` per ``pg_stat_statements`` entry.
+        top (int): Entries returned.
+    """
+    spots = [
+        {
+            "kind": "stage",
+            "name": " ".join(str(stage[k]) for k in ("command", "stage") if stage.get(k)),
+            "seconds": stage["seconds"],
+            "calls": stage["calls"],
+            "mean_ms": stage["mean_ms"],
+            "p95_ms": stage.get("p95_ms"),
+        }
+        for stage in stages
+    ]
+    spots += [
+        {
+            "kind": "sql",
+            "name": _statement_name(statement["query"]),
+            "seconds": round(statement["total_ms"] / 1000, 3),
+            "calls": statement["calls"],
+            "mean_ms": round(statement["mean_ms"], 2),
+            "p95_ms": None,
+        }
+        for statement in statements
+    ]
+    return sorted(spots, key=lambda spot: -spot["seconds"])[:top]
+
+
+def _size(n: float) -> str:
+    if n < 1024:
+        return f"{n:.0f} B"
+    for unit in ("KiB", "MiB", "GiB"):
+        n /= 1024
+        if n < 1024 or unit == "GiB":
+            break
+    return f"{n:.1f} {unit}"
+
+
+def format_report(report: Mapping, top: int = 20) -> list[str]:
+    """The report as lines of text."""
+    lines = ["Hot spots (statement time is also part of the stage that ran it):"]
+    for rank, spot in enumerate(report["hotspots"], 1):
+        p95 = f", p95 {spot['p95_ms']:.1f} ms" if spot["p95_ms"] is not None else ""
+        mean = f", mean {spot['mean_ms']:.1f} ms" if spot["mean_ms"] is not None else ""
+        lines.append(f"{rank:3d}. {spot['seconds']:10.1f}s  {spot['kind']:5s} {spot['name']} "
+                     f"({spot['calls']} calls{mean}{p95})")
+    if not report["hotspots"]:
+        lines.append("  no telemetry or pg_stat_statements entries")
+    if report["throughput"]:
+        lines.append("Throughput:")
+        for command in report["throughput"]:
+            datasets = ", ".join(f"{status} {n}" for status, n in command["datasets"].items()) or "none"
+            rate = command["datasets_per_second"]
+            lines.append(f"  {command['command']}: datasets {datasets} in {command['seconds']:.1f}s"
+                         + (f", {rate:.1f} datasets/s" if rate is not None else ""))
+            if command["rows"]:
+                lines.append("    rows: " + ", ".join(f"{table} {n}" for table, n in command["rows"].items()))
+    if report["caches"]:
+        lines.append("Caches:")
+        for cache in report["caches"]:
+            lines.append(f"  {cache['cache']}: {cache['hits']} hits, {cache['misses']} misses "
+                         f"({100 * cache['hit_ratio']:.1f}% hit)")
+    if report["slowest"]:
+        lines.append("Slowest logged stages:")
+        for event in report["slowest"]:
+            labels = ", ".join(f"{k}={v}" for k, v in event.items()
+                               if k not in ("event", "seconds", "time", "host", "pid"))
+            lines.append(f"  {event['seconds']:8.2f}s  {event['event']} at {event['time']} ({labels})")
+    tables = [table for table in report["tables"] if table["wasted_bytes"]][:top]
+    if tables:
+        lines.append("Table bloat (dead tuples):")
+        for table in tables:
+            lines.append(f"  {table['table']}: {_size(table['bytes'])}, ~{_size(table['wasted_bytes'])} dead "
+                         f"({100 * table['dead_ratio']:.0f}% of tuples)")
+    indexes = [index for index in report["indexes"] if index["wasted_bytes"]][:top]
+    if indexes:
+        lines.append(f"Index bloat (leaf density below {BTREE_FILL:.0f}%):")
+        for index in indexes:
+            scans = f", {index['scans']} scans" if index["scans"] is not None else ""
+            lines.append(f"  {index['index']}: {_size(index['bytes'])}, ~{_size(index['wasted_bytes'])} sparse, "
+                         f"leaf density {index['leaf_density']:.0f}%{scans}")
+    unused = [index for index in report["indexes"] if index["scans"] == 0][:top]
+    if unused:
+        lines.append("Indexes never scanned since statistics were reset:")
+        for index in unused:
+            lines.append(f"  {index['index']}: {_size(index['bytes'])}")
+    return lines
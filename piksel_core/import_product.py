@@ -0,0 +1,48 @@
+"""
+``import-product``: load an ``export-product`` archive into the index in one
+transaction (see ``piksel_core.product_archive``).
+"""
+
+import time
+
+import click
+from datacube import Datacube
+from datacube.ui.click import environment_option, pass_config
+
+from piksel_core.db import connect
+from piksel_core.explorer import ensure_tables, record_product
+from piksel_core.product_archive import import_product
+
+
+@click.command("import-product")
+@environment_option
+@pass_config
+@click.argument("archive", type=click.Path(exists=True, file_okay=False))
+@click.option("--replace", is_flag=True, default=False,
+              help="Delete the product's datasets in the index before importing.")
+def cli(cfg_env, archive, replace):
+    """
+    Import the product archived in ARCHIVE, adding the product if it is missing.
+    """
+    dc = Datacube(env=cfg_env, app="piksel-import-product")
+    connection = connect(cfg_env, application_name="piksel-import-product")
+    started = time.monotonic()
+    try:
+        report = import_product(dc, connection, archive, replace)
+        # Imported datasets keep their original timestamps, which cubedash takes as unchanged
+        ensure_tables(connection)
+        record_product(connection, report.product, force=True)
+    except ValueError as e:
+        raise click.ClickException(str(e)) from e
+    finally:
+        connection.close()
+        dc.close()
+    if report.deleted:
+        print(f"Deleted {report.deleted} existing datasets")
+    for table, rows in report.inserted.items():
+        print(f"{table}: {rows} rows inserted")
+    for table in report.skipped:
+        print(f"{table}: no such spatial index here, skipped")
+    if report.skipped:
+        print(f"Run `make spindex-check Product={report.product} Fix=1` after creating the missing spatial indexes")
+    print(f"Imported {report.product} in {time.monotonic() - started:.1f}s")
@@ -0,0 +1,107 @@
+"""
+Single-pass Landsat indexer.
+
+``make index-landsat`` used to run ``stac-to-dc`` once per platform and product
+(eight sweeps of LandsatLook). This command searches each collection once per
+date window, routes every item to its ``lsX_c2l2_{sr,st}`` product from the item
+platform, rewrites asset URLs to ``s3://usgs-landsat`` in-stream and writes the
+datasets to the index from a thread pool.
+"""
+
+import sys
+from collections.abc import Iterable
+
+import click
+from datacube import Datacube
+from datacube.ui.click import environment_option, pass_config
+from odc.apps.dc_tools.utils import allow_unsafe, bbox, limit, update_if_exists_flag
+
+from piksel_core.bulk_indexing import bulk_index_items
+from piksel_core.db import connect
+from piksel_core.indexing import index_items, summarise
+from piksel_core.landsat import (
+    LANDSAT_COLLECTIONS,
+    LANDSAT_PLATFORMS,
+    LANDSATLOOK_STAC,
+    plan_scans,
+    scan_landsat,
+)
+
+
+def _parse_platform_datetimes(values: Iterable[str]) -> dict[str, str]:
+    parsed = {}
+    for value in values:
+        platform, _, window = value.partition("=")
+        if not window:
+            raise click.BadParameter(f"Expected PLATFORM=DATETIME, got {value!r}")
+        parsed[platform.upper()] = window
+    return parsed
+
+
+@click.command("index-landsat")
+@environment_option
+@pass_config
+@limit
+@update_if_exists_flag
+@allow_unsafe
+@click.option("--catalog-href", type=str, default=LANDSATLOOK_STAC, show_default=True,
+              help="URL of the LandsatLook STAC API (or a stand-in).")
+@click.option("--collections", type=str, default=",".join(LANDSAT_COLLECTIONS),
+              show_default=True, help="Comma separated LandsatLook collections.")
+@click.option("--platforms", type=str, default=",".join(LANDSAT_PLATFORMS),
+              show_default=True, help="Comma separated platforms to index.")
+@bbox
+@click.option("--datetime", type=str, default=None,
+              help="Date window for all platforms, e.g. 2024-01-01/2024-05-31.")
+@click.option("--platform-datetime", multiple=True,
+              help="Per-platform date window, e.g. LANDSAT_5=2000-01-01/2000-07-31.")
+@click.option("--page-size", type=int, default=100, show_default=True,
+              help="Items requested per STAC page.")
+@click.option("--workers", type=int, default=16, show_default=True,
+              help="Concurrent index writers.")
+@click.option("--bulk", is_flag=True, default=False,
+              help="Load datasets with COPY in large batches (for backfills).")
+@click.option("--batch-size", type=int, default=5000, show_default=True,
+              help="Datasets per transaction with --bulk.")
+def cli(
+    cfg_env,
+    limit,
+    update_if_exists,
+    allow_unsafe,
+    catalog_href,
+    collections,
+    platforms,
+    bbox,
+    datetime,
+    platform_datetime,
+    page_size,
+    workers,
+    bulk,
+    batch_size,
+):
+    """
+    Index LandsatLook SR/ST items into the lsX_c2l2_* products in one pass per collection.
+    """
+    scans = plan_scans(
+        collections.split(","),
+        [p.upper() for p in platforms.split(",")],
+        datetime,
+        _parse_platform_datetimes(platform_datetime),
+    )
+    dc = Datacube(env=cfg_env, app="piksel-index-landsat")
+    routed = scan_landsat(
+        catalog_href,
+        scans,
+        bbox=list(map(float, bbox.split(","))) if bbox else None,
+        page_size=page_size,
+        limit=limit,
+    )
+    sys.stdout.write(f"\rIndexing Landsat with {len(scans)} catalog scans...\n")
+    if bulk:
+        connection = connect(cfg_env, application_name="piksel-index-landsat")
+        counts = bulk_index_items(dc, connection, routed, update_if_exists, allow_unsafe, batch_size)
+    else:
+        counts = index_items(dc, routed, update_if_exists, allow_unsafe, workers)
+    totals = summarise(counts)
+    if totals["failed"] > 0:
+        sys.exit(totals["failed"])
@@ -0,0 +1,148 @@
+"""
+``index-s3``: index STAC item documents from S3, fetching only new and changed ones
+(see ``piksel_core.s3_discovery``).
+
+    python -m piksel_core index-s3 --no-sign-request \\
+        's3://piksel-staging-public-data/geomad_s2/1.0.0/**/*.stac-item.json' s2_geomad_annual
+
+Takes the same glob and product as ``s3-to-dc --stac --rename-product``.
+Documents are fetched by ``odc.aio.S3Fetcher`` (``--concurrency`` requests in
+flight) and written by ``--workers`` concurrent index writers; a document
+whose ETag changed updates its dataset.
+"""
+
+import json
+import logging
+import os
+import sys
+from collections import Counter
+
+import click
+from datacube import Datacube
+from datacube.ui.click import environment_option, pass_config
+from odc.aio import S3Fetcher
+from odc.apps.dc_tools.utils import allow_unsafe, get_self_link, no_sign_request, url_string_replace
+from pystac import Item
+
+from piksel_core import telemetry
+from piksel_core.db import connect
+from piksel_core.indexing import index_items, summarise
+from piksel_core.s3_discovery import (
+    S3Object,
+    ensure_etag_table,
+    indexed_etags,
+    list_objects,
+    matching,
+    plan_fetch,
+    read_manifest,
+    record_etags,
+    split_glob,
+    write_manifest,
+)
+from piksel_core.stac import rewrite_item_assets
+
+_LOG = logging.getLogger(__name__)
+
+# Indexed documents whose ETags are committed together
+_RECORD_BATCH = 500
+
+
+@click.command("index-s3")
+@environment_option
+@pass_config
+@allow_unsafe
+@no_sign_request
+@url_string_replace
+@click.option("--manifest", type=click.Path(dir_okay=False), default=None,
+              help="Read the keys from this manifest or S3 Inventory CSV; written from a listing if missing.")
+@click.option("--refresh-manifest", is_flag=True, default=False,
+              help="List the bucket again and rewrite --manifest.")
+@click.option("--force", is_flag=True, default=False,
+              help="Fetch every document, ignoring the recorded ETags.")
+@click.option("--concurrency", type=int, default=32, show_default=True,
+              help="S3 requests in flight.")
+@click.option("--workers", type=int, default=16, show_default=True,
+              help="Concurrent index writers.")
+@click.argument("url", type=str)
+@click.argument("product", type=str)
+def cli(cfg_env, allow_unsafe, no_sign_request, url_string_replace, manifest, refresh_manifest, force,
+        concurrency, workers, url, product):
+    """
+    Index the STAC item documents matching the s3:// glob URL into PRODUCT, skipping unchanged ones.
+    """
+    if url_string_replace:
+        url_string_replace = tuple(url_string_replace.split(","))
+        if len(url_string_replace) != 2:
+            raise click.BadParameter("--url-string-replace must be two strings separated by a comma")
+    try:
+        bucket, prefix = split_glob(url)
+    except ValueError as e:
+        raise click.BadParameter(str(e)) from e
+
+    dc = Datacube(env=cfg_env, app="piksel-index-s3")
+    if dc.index.products.get_by_name(product) is None:
+        raise click.ClickException(f"Product {product} is not in the index, run `make all-products`")
+    connection = connect(cfg_env, application_name="piksel-index-s3")
+    ensure_etag_table(connection)
+    fetcher = S3Fetcher(nconcurrent=concurrency, aws_unsigned=no_sign_request or None)
+    try:
+        if manifest and os.path.exists(manifest) and not refresh_manifest:
+            objects = read_manifest(manifest, bucket)
+            print(f"Read {len(objects)} keys from {manifest}", file=sys.stderr)
+        else:
+            objects = list_objects(fetcher, bucket, prefix)
+            print(f"Listed {len(objects)} keys under s3://{bucket}/{prefix}", file=sys.stderr)
+            if manifest:
+                write_manifest(manifest, objects)
+        objects = list(matching(objects, url))
+        indexed = {} if force else indexed_etags(connection, product, f"s3://{bucket}/{prefix}")
+        fetch, unchanged = plan_fetch(objects, indexed)
+        print(f"{len(objects)} documents match, {unchanged} unchanged since indexed, fetching {len(fetch)}",
+              file=sys.stderr)
+
+        etags = {obj.url: obj.etag for obj in fetch}
+        # Keyed by id(item); each entry keeps its item alive until it is indexed
+        sources: dict[int, tuple[Item, S3Object]] = {}
+        done: list[S3Object] = []
+        counts: Counter = Counter()
+
+        def documents():
+            for result in telemetry.timed(fetcher(obj.url for obj in fetch), "s3_fetch", product=product):
+                if result.data is None:
+                    _LOG.error("Failed to fetch %s: %s", result.url, result.error)
+                    counts[product, "failed"] += 1
+                    continue
+                try:
+                    item = Item.from_dict(json.loads(result.data))
+                except Exception:  # pylint:disable=broad-except
+                    _LOG.exception("Failed to parse %s", result.url)
+                    counts[product, "failed"] += 1
+                    continue
+                if get_self_link(item) is None:
+                    item.set_self_href(result.url)
+                item = rewrite_item_assets(item, url_string_replace)
+                sources[id(item)] = (item, S3Object(result.url, etags[result.url]))
+                yield product, item
+
+        def on_result(_, item, status):
+            _, source = sources.pop(id(item))
+            if status != "failed":
+                done.append(source)
+            if len(done) >= _RECORD_BATCH:
+                record_etags(connection, product, done)
+                done.clear()
+
+        counts.update(index_items(
+            dc, documents(), update_if_exists=True, allow_unsafe=allow_unsafe, workers=workers,
+            on_result=on_result,
+        ))
+        record_etags(connection, product, done)
+    finally:
+        fetcher.close()
+        connection.close()
+
+    if unchanged:
+        counts[product, "skipped"] += unchanged
+    totals = summarise(counts)
+    if totals["failed"] > 0:
+        sys.exit(totals["failed"])
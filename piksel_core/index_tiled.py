@@ -0,0 +1,293 @@
+"""
+Tiled, multi-process STAC indexing.
+
+A large bbox/datetime request is split into a grid of tiles and time windows
+(see ``piksel_core.tiling``). Each tile/window is searched and indexed by a
+worker process with its own ``Datacube`` connection, and items that several
+tiles return are indexed only by the tile that owns them. No ``--limit`` is
+applied, so an archipelago-wide request is never silently truncated.
+"""
+
+import json
+import logging
+import multiprocessing
+import sys
+import time
+from collections import Counter
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import NamedTuple
+
+import click
+from datacube import Datacube
+from datacube.ui.click import environment_option, pass_config
+from odc.apps.dc_tools.utils import (
+    allow_unsafe,
+    bbox,
+    rename_product,
+    update_if_exists_flag,
+    url_string_replace,
+)
+from pystac import Item
+
+from piksel_core import telemetry
+from piksel_core.bulk_indexing import bulk_index_items
+from piksel_core.db import connect, environment_name
+from piksel_core.indexing import index_items
+from piksel_core.landsat import LANDSAT_URL_REWRITE, landsat_product
+from piksel_core.stac import rewrite_item_assets, search_items
+from piksel_core.tiling import BBox, Tile, Window, owner_point, owns, parse_datetime, split_bbox, split_datetime
+
+_LOG = logging.getLogger(__name__)
+
+# One Datacube (and, with --bulk, one COPY connection) per worker process,
+# created by the pool initializer.
+_DC: Datacube | None = None
+_CONN = None
+
+
+class TiledRun(NamedTuple):
+    """Settings shared by every tile task (must be picklable)."""
+
+    catalog_href: str
+    collections: tuple[str, ...]
+    search_bbox: BBox
+    tile_size: float
+    query: dict | None
+    rename_product: str | None
+    landsat: bool
+    url_string_replace: tuple[str, str] | None
+    update_if_exists: bool
+    allow_unsafe: bool
+    threads: int
+    page_size: int
+    bulk: bool = False
+    batch_size: int = 5000
+
+
+class TileReport(NamedTuple):
+    """Outcome and throughput of one tile/window."""
+
+    tile: str
+    window: str
+    matched: int
+    owned: int
+    added: int
+    skipped: int
+    failed: int
+    seconds: float
+
+    @property
+    def rate(self) -> float:
+        return self.owned / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.tile} {self.window}: matched {self.matched}, owned {self.owned}, "
+            f"added {self.added}, skipped {self.skipped}, failed {self.failed} "
+            f"in {self.seconds:.1f}s ({self.rate:.1f} items/s)"
+        )
+
+
+def _init_worker(env: str | None, bulk: bool = False) -> None:
+    """Open the worker's index connections for the environment named ``env``."""
+    global _DC, _CONN
+    telemetry.start("index-tiled")
+    _DC = Datacube(env=env, app="piksel-index-tiled")
+    if bulk:
+        _CONN = connect(env, application_name="piksel-index-tiled")
+
+
+def _item_datetime(item: Item):
+    if item.datetime is not None:
+        return item.datetime
+    return parse_datetime(item.properties["start_datetime"])
+
+
+def _routed(
+    run: TiledRun, tile: Tile, window: Window, last_window: bool, seen: Counter
+) -> Iterator[tuple[str | None, Item]]:
+    for item in search_items(
+        run.catalog_href,
+        run.collections,
+        bbox=tile.bbox,
+        datetime=window.stac_datetime,
+        query=run.query,
+        page_size=run.page_size,
+    ):
+        seen["matched"] += 1
+        point = owner_point(item.geometry, tuple(item.bbox) if item.bbox else None, run.search_bbox)
+        if point is None:
+            _LOG.warning("Item %s has neither a geometry nor a bbox, skipping", item.id)
+            continue
+        if not owns(tile, window, point, _item_datetime(item), run.search_bbox, run.tile_size, last_window):
+            continue
+        seen["owned"] += 1
+        if run.landsat:
+            product = landsat_product(item)
+            if product is None:
+                _LOG.warning("No Landsat product for item %s, skipping", item.id)
+                continue
+            yield product, rewrite_item_assets(item, LANDSAT_URL_REWRITE)
+        else:
+            yield run.rename_product, rewrite_item_assets(item, run.url_string_replace)
+
+
+def run_tile(run: TiledRun, tile: Tile, window: Window, last_window: bool) -> TileReport:
+    """Search and index one tile/window in the current worker process."""
+    started = time.monotonic()
+    seen: Counter = Counter()
+    routed = _routed(run, tile, window, last_window, seen)
+    try:
+        if run.bulk:
+            counts = bulk_index_items(
+                _DC,
+                _CONN,
+                routed,
+                update_if_exists=run.update_if_exists,
+                allow_unsafe=run.allow_unsafe,
+                batch_size=run.batch_size,
+            )
+        else:
+            counts = index_items(
+                _DC,
+                routed,
+                update_if_exists=run.update_if_exists,
+                allow_unsafe=run.allow_unsafe,
+                workers=run.threads,
+            )
+    finally:
+        # Pool workers exit without running atexit handlers
+        telemetry.flush()
+    totals: Counter = Counter()
+    for (_, status), n in counts.items():
+        totals[status] += n
+    return TileReport(
+        tile.label,
+        window.stac_datetime,
+        seen["matched"],
+        seen["owned"],
+        totals["added"],
+        totals["skipped"],
+        totals["failed"],
+        time.monotonic() - started,
+    )
+
+
+@click.command("index-tiled")
+@environment_option
+@pass_config
+@update_if_exists_flag
+@allow_unsafe
+@click.option("--catalog-href", type=str, required=True, help="URL of the STAC API to search.")
+@click.option("--collections", type=str, required=True,
+              help="Comma separated list of collections to search.")
+@bbox
+@click.option("--datetime", type=str, required=True,
+              help="Inclusive date range to search, e.g. 2020-01-01/2024-12-31.")
+@click.option("--query", type=str, default=None,
+              help='STAC query extension filter as JSON, e.g. \'{"eo:cloud_cover": {"lt": 50}}\'.')
+@rename_product
+@url_string_replace
+@click.option("--landsat", is_flag=True, default=False,
+              help="Route LandsatLook items to lsX_c2l2_* products by platform.")
+@click.option("--tile-size", type=float, default=1.0, show_default=True,
+              help="Tile edge length in degrees.")
+@click.option("--time-window", type=str, default="month", show_default=True,
+              help="Time window per task: year, month or <N>d.")
+@click.option("--processes", type=int, default=multiprocessing.cpu_count(),
+              show_default="cpu count", help="Worker processes (one DB connection pool each).")
+@click.option("--threads", type=int, default=4, show_default=True,
+              help="Index writer threads per worker process.")
+@click.option("--page-size", type=int, default=100, show_default=True,
+              help="Items requested per STAC page.")
+@click.option("--bulk", is_flag=True, default=False,
+              help="Load datasets with COPY in large batches (for backfills).")
+@click.option("--batch-size", type=int, default=5000, show_default=True,
+              help="Datasets per transaction with --bulk.")
+def cli(
+    cfg_env,
+    update_if_exists,
+    allow_unsafe,
+    catalog_href,
+    collections,
+    bbox,
+    datetime,
+    query,
+    rename_product,
+    url_string_replace,
+    landsat,
+    tile_size,
+    time_window,
+    processes,
+    threads,
+    page_size,
+    bulk,
+    batch_size,
+):
+    """
+    Index a large bbox/datetime request as parallel tile and time-window tasks.
+    """
+    if not bbox:
+        raise click.BadParameter("--bbox is required for tiled indexing")
+    search_bbox = tuple(map(float, bbox.split(",")))
+    if url_string_replace:
+        url_string_replace = tuple(url_string_replace.split(","))
+        if len(url_string_replace) != 2:
+            raise click.BadParameter("--url-string-replace must be two strings separated by a comma")
+
+    run = TiledRun(
+        catalog_href=catalog_href,
+        collections=tuple(collections.split(",")),
+        search_bbox=search_bbox,
+        tile_size=tile_size,
+        query=json.loads(query) if query else None,
+        rename_product=rename_product,
+        landsat=landsat,
+        url_string_replace=url_string_replace or None,
+        update_if_exists=update_if_exists,
+        allow_unsafe=allow_unsafe,
+        threads=threads,
+        page_size=page_size,
+        bulk=bulk,
+        batch_size=batch_size,
+    )
+    tiles = split_bbox(search_bbox, tile_size)
+    windows = split_datetime(datetime, time_window)
+    print(f"Indexing {len(tiles)} tiles x {len(windows)} windows on {processes} processes")
+
+    started = time.monotonic()
+    totals: Counter = Counter()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=processes, mp_context=context,
+        # The ODCEnvironment cannot be pickled; spawned workers look it up by name
+        initializer=_init_worker, initargs=(environment_name(cfg_env), bulk),
+    ) as pool:
+        futures = {
+            pool.submit(run_tile, run, tile, window, i == len(windows) - 1): (tile, window)
+            for tile in tiles
+            for i, window in enumerate(windows)
+        }
+        for future in as_completed(futures):
+            tile, window = futures[future]
+            try:
+                report = future.result()
+            except Exception:  # pylint:disable=broad-except
+                _LOG.exception("Tile %s %s failed", tile.label, window.stac_datetime)
+                totals["failed_tiles"] += 1
+                continue
+            print(report)
+            for key in ("matched", "owned", "added", "skipped", "failed"):
+                totals[key] += getattr(report, key)
+
+    elapsed = time.monotonic() - started
+    print(
+        f"Added {totals['added']} Datasets, failed {totals['failed']} Datasets, "
+        f"skipped {totals['skipped']} Datasets "
+        f"({totals['owned']} unique of {totals['matched']} matched, "
+        f"{totals['owned'] / elapsed if elapsed else 0:.1f} items/s overall)"
+    )
+    failed = totals["failed"] + totals["failed_tiles"]
+    if failed > 0:
+        sys.exit(failed)
@@ -0,0 +1,117 @@
+"""
+Concurrent dataset writer shared by the piksel-core indexing commands.
+
+Items are converted with the same ``odc-apps-dc-tools`` helpers ``stac-to-dc``
+uses, so datasets indexed here are indistinguishable from those it writes.
+"""
+
+import concurrent.futures
+import logging
+from collections import Counter
+from collections.abc import Callable, Iterable
+
+from datacube import Datacube
+from odc.apps.dc_tools.utils import DatasetExists, index_update_dataset, item_to_meta_uri
+from pystac import Item
+
+from piksel_core import telemetry
+
+_LOG = logging.getLogger(__name__)
+
+
+def index_item(
+    dc: Datacube,
+    item: Item,
+    product: str,
+    update_if_exists: bool = False,
+    allow_unsafe: bool = False,
+) -> None:
+    """Index a single STAC item into ``product``."""
+    with telemetry.timer("eo3_convert", product=product):
+        dataset, uri, _ = item_to_meta_uri(item, dc, rename_product=product)
+    if uri is None:
+        raise ValueError(f"The links field did not contain a self-reference for item {item}")
+    with telemetry.timer("db_insert", product=product):
+        index_update_dataset(
+            dataset,
+            uri,
+            dc,
+            None,
+            update_if_exists=update_if_exists,
+            allow_unsafe=allow_unsafe,
+        )
+
+
+def index_items(
+    dc: Datacube,
+    routed: Iterable[tuple[str, Item]],
+    update_if_exists: bool = False,
+    allow_unsafe: bool = False,
+    workers: int = 16,
+    on_result: Callable[[str, Item, str], None] | None = None,
+) -> Counter:
+    """
+    Index ``(product, item)`` pairs concurrently.
+
+    At most ``2 * workers`` items are in flight, so the search keeps paging
+    while earlier items are written, without holding the whole result set.
+    ``on_result(product, item, status)`` is called in this thread as each
+    item finishes.
+
+    Returns:
+        Counter: Counts keyed by ``(product, "added" | "skipped" | "failed")``.
+    """
+    counts: Counter = Counter()
+    pending: dict[concurrent.futures.Future, tuple[str, Item]] = {}
+
+    def _collect(done):
+        for future in done:
+            product, item = pending.pop(future)
+            try:
+                future.result()
+                status = "added"
+            except DatasetExists:
+                status = "skipped"
+            except Exception:  # pylint:disable=broad-except
+                _LOG.exception("Failed to handle item %s", item.id)
+                status = "failed"
+            counts[product, status] += 1
+            telemetry.count("datasets", product=product, status=status)
+            if on_result is not None:
+                on_result(product, item, status)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for product, item in routed:
+            future = executor.submit(
+                index_item, dc, item, product, update_if_exists, allow_unsafe
+            )
+            pending[future] = (product, item)
+            if len(pending) >= 2 * workers:
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                _collect(done)
+        _collect(concurrent.futures.wait(pending).done)
+    return counts
+
+
+def summarise(counts: Counter) -> Counter:
+    """
+    Print per-product results and the ``stac-to-dc`` style summary line.
+
+    Returns:
+        Counter: Totals keyed by status.
+    """
+    for product in sorted({product for product, _ in counts}):
+        print(
+            f"{product}: added {counts[product, 'added']}, "
+            f"failed {counts[product, 'failed']}, skipped {counts[product, 'skipped']}"
+        )
+    totals: Counter = Counter()
+    for (_, status), n in counts.items():
+        totals[status] += n
+    print(
+        f"Added {totals['added']} Datasets, failed {totals['failed']} Datasets, "
+        f"skipped {totals['skipped']} Datasets"
+    )
+    return totals
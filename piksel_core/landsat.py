@@ -0,0 +1,115 @@
+"""
+LandsatLook routing: map Collection 2 Level-2 STAC items to the
+``lsX_c2l2_{sr,st}`` products and plan the catalog scans that feed them.
+"""
+
+import logging
+from collections.abc import Iterable, Iterator
+from typing import NamedTuple
+
+from pystac import Item
+
+from piksel_core.stac import item_platform, rewrite_item_assets, search_items
+
+LANDSATLOOK_STAC = "https://landsatlook.usgs.gov/stac-server/"
+
+# Same rewrite as ``notebooks/utils.patch_usgs_landsat``: LandsatLook assets are
+# published over HTTPS but read from the requester-pays ``usgs-landsat`` bucket.
+LANDSAT_URL_REWRITE = ("https://landsatlook.usgs.gov/data", "s3://usgs-landsat")
+
+# STAC collection -> ODC product suffix (see products/lsX_c2l2_*.odc-product.yaml)
+LANDSAT_COLLECTIONS = {
+    "landsat-c2l2-sr": "sr",
+    "landsat-c2l2-st": "st",
+}
+
+LANDSAT_PLATFORMS = ("LANDSAT_5", "LANDSAT_7", "LANDSAT_8", "LANDSAT_9")
+
+_LOG = logging.getLogger(__name__)
+
+
+class Scan(NamedTuple):
+    """One paginated search of a collection covering one or more platforms."""
+
+    collection: str
+    datetime: str | None
+    platforms: tuple[str, ...]
+
+
+def landsat_product(item: Item) -> str | None:
+    """
+    Map a LandsatLook STAC item to its ``lsX_c2l2_{sr,st}`` ODC product name.
+
+    Args:
+        item (Item): A STAC item from a ``landsat-c2l2-sr``/``-st`` collection.
+
+    Returns:
+        str | None: The product name, or None if the collection or platform
+        has no matching product definition.
+    """
+    suffix = LANDSAT_COLLECTIONS.get(item.collection_id)
+    platform = item_platform(item)
+    if suffix is None or platform not in LANDSAT_PLATFORMS:
+        return None
+    number = platform.rsplit("_", 1)[1]
+    return f"ls{number}_c2l2_{suffix}"
+
+
+def plan_scans(
+    collections: Iterable[str],
+    platforms: Iterable[str],
+    datetime: str | None,
+    platform_datetimes: dict[str, str] | None = None,
+) -> list[Scan]:
+    """
+    Group platforms that share a date window into a single search per collection.
+
+    Args:
+        collections (Iterable[str]): LandsatLook collections to search.
+        platforms (Iterable[str]): Platforms to index, e.g. ``LANDSAT_8``.
+        datetime (str | None): Default date window for every platform.
+        platform_datetimes (dict[str, str] | None): Per-platform overrides.
+
+    Returns:
+        list[Scan]: One scan per collection and distinct date window.
+    """
+    platform_datetimes = platform_datetimes or {}
+    windows: dict[str | None, list[str]] = {}
+    for platform in platforms:
+        windows.setdefault(platform_datetimes.get(platform, datetime), []).append(platform)
+    return [
+        Scan(collection, window, tuple(window_platforms))
+        for collection in collections
+        for window, window_platforms in windows.items()
+    ]
+
+
+def scan_landsat(
+    catalog_href: str,
+    scans: Iterable[Scan],
+    bbox: list[float] | None = None,
+    page_size: int = 100,
+    limit: int | None = None,
+) -> Iterator[tuple[str, Item]]:
+    """
+    Stream ``(product_name, item)`` pairs from the planned scans.
+
+    Asset hrefs are rewritten to ``s3://usgs-landsat`` as items arrive. Items
+    whose platform has no matching product are logged and dropped.
+    """
+    for scan in scans:
+        _LOG.info("Searching %s %s for %s", scan.collection, scan.datetime, scan.platforms)
+        for item in search_items(
+            catalog_href,
+            [scan.collection],
+            bbox=bbox,
+            datetime=scan.datetime,
+            query={"platform": {"in": list(scan.platforms)}},
+            page_size=page_size,
+            max_items=limit,
+        ):
+            product = landsat_product(item)
+            if product is None:
+                _LOG.warning("No Landsat product for item %s, skipping", item.id)
+                continue
+            yield product, rewrite_item_assets(item, LANDSAT_URL_REWRITE)
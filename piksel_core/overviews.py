@@ -0,0 +1,449 @@
+"""
+Chunk-aligned Zarr overview pyramids of annual products, for maps at province and country scale.
+
+    python -m piksel_core.overviews --product s2_geomad_annual --workers 8
+
+A map of ``s2_geomad_annual`` across Indonesia reads every 10 m COG it
+covers. Instead, each year is resampled once into
+``<output>/<product>/<year>.zarr``. Level ``0`` is at ``--resolution`` (80 m
+by default), and each level after it halves the resolution, down to
+``--levels``. Every level is one group with an array per band, on a grid in
+the product's CRS (EPSG:6933) whose origin and extent are multiples of the
+coarsest level's chunk footprint. So each chunk of level ``n + 1`` covers
+exactly 2 x 2 chunks of level ``n``, and grids of different years line up.
+
+Level 0 chunks are read from the COGs (``dc.load`` with ``average``
+resampling, which reads the COG overviews) by ``--workers`` processes. Each
+coarser chunk is the nodata-aware 2 x 2 mean of the four chunks below it,
+read back from the pyramid. Refreshes are incremental. ``_state.json`` in
+the product directory records a watermark on ``odc.dataset.updated`` (see
+``piksel_core.db.transaction_cutoff``), and only the level 0 chunks under
+the footprints of datasets changed since then are rendered again, together
+with their parents. All-nodata chunks are not stored.
+
+``OverviewPyramid`` in ``notebooks/utils.py`` reads the coarsest level that
+still meets a requested resolution. Like ``piksel_core.catalogue`` it runs in
+the Jupyter image, where xarray and zarr are installed.
+"""
+
+import json
+import os
+import shutil
+import time
+from collections.abc import Iterable, Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+import click
+import numpy as np
+import xarray as xr
+import zarr
+from datacube.ui.click import environment_option, pass_config
+
+from piksel_core.db import ODC_SCHEMA, connect, environment_name, transaction_cutoff
+
+OVERVIEW_DIR_ENV = "PIKSEL_OVERVIEW_DIR"
+DEFAULT_OVERVIEW_DIR = "/home/jovyan/work/data/overviews"
+DEFAULT_PRODUCT = "s2_geomad_annual"
+
+PYRAMID_VERSION = 1
+STATE_FILE = "_state.json"
+DEFAULT_RESOLUTION = 80.0
+DEFAULT_LEVELS = 6
+DEFAULT_CHUNK = 512
+# Indonesia with its outer islands, in lon/lat; the pyramid covers it whatever is indexed
+INDONESIA_BBOX = (94.0, -11.5, 141.5, 6.5)
+
+
+class PyramidGrid(NamedTuple):
+    """The level 0 grid of a pyramid; coarser levels halve its resolution."""
+
+    crs: str
+    left: float
+    top: float
+    width: int
+    height: int
+    resolution: float
+    levels: int
+    chunk: int
+
+    def level_resolution(self, level: int) -> float:
+        return self.resolution * 2**level
+
+    def level_shape(self, level: int) -> tuple[int, int]:
+        """``(height, width)`` in pixels of ``level``."""
+        return self.height >> level, self.width >> level
+
+    def level_chunks(self, level: int) -> tuple[int, int]:
+        """``(rows, cols)`` of chunks of ``level``."""
+        height, width = self.level_shape(level)
+        return height // self.chunk, width // self.chunk
+
+    def chunk_bounds(self, level: int, col: int, row: int) -> tuple[float, float, float, float]:
+        """``(left, bottom, right, top)`` of one chunk of ``level``."""
+        size = self.chunk * self.level_resolution(level)
+        left, top = self.left + col * size, self.top - row * size
+        return left, top - size, left + size, top
+
+    def chunks_for_bounds(self, bounds: Sequence[float]) -> set[tuple[int, int]]:
+        """The level 0 ``(col, row)`` chunks that ``(left, bottom, right, top)`` overlaps."""
+        size = self.chunk * self.resolution
+        rows, cols = self.level_chunks(0)
+        first_col = max(int((bounds[0] - self.left) // size), 0)
+        last_col = min(int(np.ceil((bounds[2] - self.left) / size)) - 1, cols - 1)
+        first_row = max(int((self.top - bounds[3]) // size), 0)
+        last_row = min(int(np.ceil((self.top - bounds[1]) / size)) - 1, rows - 1)
+        return {(c, r) for c in range(first_col, last_col + 1) for r in range(first_row, last_row + 1)}
+
+    def coords(self, level: int) -> tuple[np.ndarray, np.ndarray]:
+        """Pixel centre ``(y, x)`` coordinates of ``level``."""
+        resolution = self.level_resolution(level)
+        height, width = self.level_shape(level)
+        return (self.top - (np.arange(height) + 0.5) * resolution,
+                self.left + (np.arange(width) + 0.5) * resolution)
+
+
+def pyramid_grid(bounds: Sequence[float], crs: str, resolution: float = DEFAULT_RESOLUTION,
+                 levels: int = DEFAULT_LEVELS, chunk: int = DEFAULT_CHUNK) -> PyramidGrid:
+    """
+    The pyramid grid covering ``(left, bottom, right, top)`` in ``crs``.
+
+    The bounds are snapped outwards to multiples of the coarsest level's chunk
+    footprint, measured from the CRS origin, so every level is a whole number
+    of chunks and chunks nest between levels.
+    """
+    step = chunk * resolution * 2 ** (levels - 1)
+    left, bottom = np.floor(bounds[0] / step) * step, np.floor(bounds[1] / step) * step
+    right, top = np.ceil(bounds[2] / step) * step, np.ceil(bounds[3] / step) * step
+    return PyramidGrid(crs, float(left), float(top), round((right - left) / resolution),
+                       round((top - bottom) / resolution), resolution, levels, chunk)
+
+
+def product_measurements(definition: Mapping) -> dict:
+    """
+    ``dtype`` and ``nodata`` of each measurement of a stored product definition.
+
+    datacube stores a ``.nan`` nodata as the string ``"NaN"``, so nodata is
+    converted to a number of the measurement's kind.
+    """
+    measurements = {}
+    for m in definition["measurements"]:
+        nodata = m.get("nodata", 0)
+        nodata = float(nodata) if np.issubdtype(np.dtype(m["dtype"]), np.floating) else int(nodata)
+        measurements[m["name"]] = {"dtype": m["dtype"], "nodata": nodata}
+    return measurements
+
+
+def downsample(data: np.ndarray, nodata) -> np.ndarray:
+    """
+    Halve a 2-D array's resolution with the mean of each 2 x 2 block's valid pixels.
+
+    Blocks without a valid pixel are ``nodata``.
+    """
+    height, width = data.shape
+    blocks = data.reshape(height // 2, 2, width // 2, 2)
+    valid = blocks != nodata if nodata is not None and not np.isnan(nodata) else ~np.isnan(blocks)
+    count = valid.sum(axis=(1, 3))
+    total = np.where(valid, blocks, 0).sum(axis=(1, 3), dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+    if np.issubdtype(data.dtype, np.integer):
+        mean = np.rint(mean)
+    return np.where(count > 0, mean, nodata).astype(data.dtype)
+
+
+def parents(chunks: Iterable[tuple[int, int]]) -> set[tuple[int, int]]:
+    """The chunks of the next level covering ``chunks``."""
+    return {(col // 2, row // 2) for col, row in chunks}
+
+
+def _empty_level(grid: PyramidGrid, level: int, measurements: dict) -> xr.Dataset:
+    import dask.array as da
+
+    y, x = grid.coords(level)
+    shape = grid.level_shape(level)
+    return xr.Dataset(
+        {name: (("y", "x"), da.full(shape, m["nodata"], dtype=m["dtype"], chunks=grid.chunk),
+                {"nodata": m["nodata"]})
+         for name, m in measurements.items()},
+        coords={"y": y, "x": x},
+        attrs={"crs": grid.crs, "resolution": grid.level_resolution(level), "level": level},
+    )
+
+
+def create_pyramid(path: str, grid: PyramidGrid, product: str, year: int, measurements: dict) -> None:
+    """Write the metadata of an empty pyramid, replacing ``path``; its chunks are all nodata until rendered."""
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    for level in range(grid.levels):
+        dataset = _empty_level(grid, level, measurements)
+        encoding = {name: {"chunks": (grid.chunk, grid.chunk), "fill_value": m["nodata"]}
+                    for name, m in measurements.items()}
+        dataset.to_zarr(path, group=str(level), mode="w", compute=False, encoding=encoding, consolidated=False)
+    root = zarr.open_group(path, mode="a")
+    root.attrs.update({
+        "version": PYRAMID_VERSION,
+        "product": product,
+        "year": year,
+        "grid": grid._asdict(),
+        "resolutions": [grid.level_resolution(level) for level in range(grid.levels)],
+        "measurements": list(measurements),
+    })
+
+
+def read_grid(path: str) -> tuple[PyramidGrid, dict] | None:
+    """The grid and root attributes of an existing pyramid, None if it is missing or outdated."""
+    try:
+        attrs = dict(zarr.open_group(path, mode="r").attrs)
+    except FileNotFoundError:
+        return None
+    if attrs.get("version") != PYRAMID_VERSION:
+        return None
+    return PyramidGrid(**attrs["grid"]), attrs
+
+
+def _write_chunk(path: str, grid: PyramidGrid, level: int, col: int, row: int, data: dict) -> None:
+    region = {"y": slice(row * grid.chunk, (row + 1) * grid.chunk),
+              "x": slice(col * grid.chunk, (col + 1) * grid.chunk)}
+    chunk = xr.Dataset({name: (("y", "x"), values) for name, values in data.items()})
+    chunk.to_zarr(path, group=str(level), region=region, consolidated=False)
+
+
+_DC = None
+
+
+def _init_worker(env: str | None) -> None:
+    from datacube import Datacube
+
+    global _DC
+    _DC = Datacube(env=env, app="piksel-overviews")
+
+
+def _render_base(args) -> bool:
+    """Read one level 0 chunk from the COGs and store it; returns whether it has data."""
+    from odc.geo.geobox import GeoBox
+    from odc.geo.geom import BoundingBox
+
+    path, grid, product, year, measurements, col, row = args
+    bounds = BoundingBox(*grid.chunk_bounds(0, col, row), crs=grid.crs)
+    geobox = GeoBox.from_bbox(bounds, crs=grid.crs, resolution=grid.resolution)
+    loaded = _DC.load(product=product, time=str(year), like=geobox, measurements=list(measurements),
+                      resampling="average", group_by="solar_day")
+    data = {}
+    for name, m in measurements.items():
+        if name in loaded.data_vars and loaded.sizes.get("time"):
+            data[name] = loaded[name].isel(time=0).values.astype(m["dtype"])
+        else:
+            data[name] = np.full((grid.chunk, grid.chunk), m["nodata"], dtype=m["dtype"])
+    _write_chunk(path, grid, 0, col, row, data)
+    return bool(loaded.data_vars) and bool(loaded.sizes.get("time"))
+
+
+def _render_level(args) -> None:
+    """Build one chunk of ``level`` from the 2 x 2 chunks below it."""
+    path, grid, level, measurements, col, row = args
+    below = xr.open_zarr(path, group=str(level - 1), consolidated=False)
+    size = grid.chunk * 2
+    block = below.isel(y=slice(row * size, (row + 1) * size), x=slice(col * size, (col + 1) * size))
+    data = {name: downsample(block[name].values, m["nodata"]) for name, m in measurements.items()}
+    _write_chunk(path, grid, level, col, row, data)
+
+
+class BuildReport(NamedTuple):
+    """Outcome of building or refreshing one year's pyramid."""
+
+    product: str
+    year: int
+    datasets: int
+    chunks: int
+    with_data: int
+    seconds: float
+
+    def __str__(self) -> str:
+        return (
+            f"{self.product} {self.year}: {self.datasets} changed datasets, {self.chunks} level 0 chunks "
+            f"rendered ({self.with_data} with data) in {self.seconds:.1f}s"
+        )
+
+
+def changed_footprints(connection, product: str, since: datetime | None = None,
+                       year: int | None = None) -> tuple[datetime, dict]:
+    """
+    The lon/lat bounds of ``product``'s datasets changed since ``since`` (all if None), by year.
+
+    Archived datasets count as changed, so their chunks are rendered without them.
+
+    Returns:
+        tuple[datetime, dict]: The new watermark, and ``{year: [(lon_min, lat_min, lon_max, lat_max), ...]}``.
+    """
+    with connection, connection.cursor() as cur:
+        cutoff = transaction_cutoff(cur)
+        cur.execute(
+            f"""
+            SELECT extract(year FROM lower(t.search_val))::int,
+                   (d.metadata #>> '{{extent,lon,begin}}')::float8, (d.metadata #>> '{{extent,lat,begin}}')::float8,
+                   (d.metadata #>> '{{extent,lon,end}}')::float8, (d.metadata #>> '{{extent,lat,end}}')::float8
+            FROM {ODC_SCHEMA}.dataset d
+            JOIN {ODC_SCHEMA}.product p ON p.id = d.product_ref
+            JOIN {ODC_SCHEMA}.dataset_search_datetime t ON t.dataset_ref = d.id AND t.search_key = 'time'
+            WHERE p.name = %(product)s
+              AND (%(since)s::timestamptz IS NULL OR d.updated >= %(since)s)
+              AND (%(year)s::int IS NULL OR extract(year FROM lower(t.search_val)) = %(year)s)
+            """,
+            {"product": product, "since": since, "year": year},
+        )
+        rows = cur.fetchall()
+    by_year: dict[int, list[tuple]] = {}
+    for row_year, *bounds in rows:
+        if None not in bounds:
+            by_year.setdefault(row_year, []).append(tuple(bounds))
+    return cutoff, by_year
+
+
+def read_state(product_dir: str) -> dict | None:
+    try:
+        with open(os.path.join(product_dir, STATE_FILE)) as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return state if state.get("version") == PYRAMID_VERSION else None
+
+
+def write_state(product_dir: str, high_water: datetime) -> None:
+    os.makedirs(product_dir, exist_ok=True)
+    tmp = os.path.join(product_dir, f".{STATE_FILE}.{os.getpid()}")
+    with open(tmp, "w") as f:
+        json.dump(
+            {
+                "version": PYRAMID_VERSION,
+                "high_water": high_water.isoformat(),
+                "refreshed": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            },
+            f,
+        )
+    os.replace(tmp, os.path.join(product_dir, STATE_FILE))
+
+
+def _to_grid_bounds(lonlat: Sequence[float], crs: str) -> tuple[float, float, float, float]:
+    from odc.geo.geom import box
+
+    return tuple(box(*lonlat, crs="EPSG:4326").to_crs(crs).boundingbox)
+
+
+def build_year(path: str, grid: PyramidGrid, product: str, year: int, measurements: dict,
+               chunks: set[tuple[int, int]], workers: int, env: str | None) -> tuple[int, int]:
+    """
+    Render ``chunks`` of level 0 and rebuild their parents on every coarser level.
+
+    Returns:
+        tuple[int, int]: Level 0 chunks rendered, and how many of them have data.
+    """
+    ordered = sorted(chunks, key=lambda c: (c[1], c[0]))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(env,)) as pool:
+        with_data = sum(pool.map(
+            _render_base, [(path, grid, product, year, measurements, col, row) for col, row in ordered]
+        ))
+        level_chunks: set[tuple[int, int]] = set(chunks)
+        for level in range(1, grid.levels):
+            level_chunks = parents(level_chunks)
+            list(pool.map(_render_level, [(path, grid, level, measurements, col, row)
+                                          for col, row in sorted(level_chunks)]))
+    return len(ordered), with_data
+
+
+def refresh_product(connection, root: str, product: str, years: Iterable[int] | None = None,
+                    full: bool = False, workers: int = 4, env: str | None = None,
+                    resolution: float = DEFAULT_RESOLUTION, levels: int = DEFAULT_LEVELS,
+                    chunk: int = DEFAULT_CHUNK) -> list[BuildReport]:
+    """
+    Bring the pyramids of ``product`` under ``root`` up to date with the index.
+
+    Args:
+        connection: psycopg2 connection to the ODC database.
+        root (str): Overview directory.
+        product (str): Product name.
+        years (Iterable[int] | None): Only refresh these years; the watermark then stays
+            put, so the other years' changes are picked up by the next full run.
+        full (bool): Rebuild the pyramids instead of refreshing them.
+        workers (int): Processes rendering chunks.
+        env (str | None): Name of the datacube environment of the workers.
+        resolution (float): Level 0 resolution of new pyramids, in CRS units.
+        levels (int): Levels of new pyramids.
+        chunk (int): Chunk size in pixels of new pyramids.
+
+    Returns:
+        list[BuildReport]: One report per refreshed year.
+    """
+    from datacube import Datacube
+
+    dc = Datacube(env=env, app="piksel-overviews")
+    try:
+        definition = dc.index.products.get_by_name(product)
+    finally:
+        dc.close()
+    if definition is None:
+        raise ValueError(f"Product {product} does not exist")
+    crs = str(definition.default_crs or "EPSG:6933")
+    measurements = product_measurements(definition.definition)
+
+    product_dir = os.path.join(root, product)
+    state = None if full else read_state(product_dir)
+    since = datetime.fromisoformat(state["high_water"]) if state else None
+    cutoff, changed = changed_footprints(connection, product, since)
+
+    reports = []
+    for year in sorted(set(years) if years is not None else set(changed)):
+        started = time.monotonic()
+        path = os.path.join(product_dir, f"{year}.zarr")
+        stored = None if full else read_grid(path)
+        footprints = changed.get(year, [])
+        if stored is None:
+            grid = pyramid_grid(_to_grid_bounds(INDONESIA_BBOX, crs), crs, resolution, levels, chunk)
+            create_pyramid(path, grid, product, year, measurements)
+            if since is not None:
+                # A new pyramid needs every dataset of its year, not only the changed ones
+                footprints = changed_footprints(connection, product, year=year)[1].get(year, [])
+        else:
+            grid = stored[0]
+        chunks: set[tuple[int, int]] = set()
+        for lonlat in footprints:
+            chunks |= grid.chunks_for_bounds(_to_grid_bounds(lonlat, crs))
+        rendered, with_data = build_year(path, grid, product, year, measurements, chunks, workers, env)
+        reports.append(BuildReport(product, year, len(footprints), rendered, with_data, time.monotonic() - started))
+    if years is None:
+        write_state(product_dir, cutoff)
+    return reports
+
+
+@click.command("overviews")
+@environment_option
+@pass_config
+@click.option("--output", type=click.Path(file_okay=False), envvar=OVERVIEW_DIR_ENV,
+              default=DEFAULT_OVERVIEW_DIR, show_default=True, help=f"Overview directory (also ${OVERVIEW_DIR_ENV}).")
+@click.option("--product", type=str, default=DEFAULT_PRODUCT, show_default=True, help="Annual product.")
+@click.option("--years", type=str, default=None, help="Comma separated years (default: those with changes).")
+@click.option("--full", is_flag=True, default=False, help="Rebuild the pyramids instead of refreshing them.")
+@click.option("--workers", type=int, default=4, show_default=True, help="Processes rendering chunks.")
+@click.option("--resolution", type=float, default=DEFAULT_RESOLUTION, show_default=True,
+              help="Level 0 resolution of new pyramids, in CRS units.")
+@click.option("--levels", type=int, default=DEFAULT_LEVELS, show_default=True, help="Levels of new pyramids.")
+def cli(cfg_env, output, product, years, full, workers, resolution, levels):
+    """
+    Build or refresh the Zarr overview pyramid of each year of an annual product.
+    """
+    connection = connect(cfg_env, application_name="piksel-overviews")
+    try:
+        selected = [int(y) for y in years.split(",") if y.strip()] if years else None
+        # The ODCEnvironment cannot be pickled for spawned workers; they look it up by name
+        for report in refresh_product(connection, output, product, selected, full, workers,
+                                      environment_name(cfg_env), resolution, levels):
+            print(report)
+    except ValueError as e:
+        raise click.ClickException(str(e)) from e
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    cli()
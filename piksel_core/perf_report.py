@@ -0,0 +1,203 @@
+"""
+``perf-report``: rank where indexing and query time goes.
+
+Reads the metric files and JSON events that piksel-core commands and
+notebooks write to ``$PIKSEL_TELEMETRY_DIR`` (see ``piksel_core.telemetry``),
+the statements ``pg_stat_statements`` spent most time in, and table and
+index statistics of the ``odc`` and ``piksel`` schemas, and prints one
+ranked report (see ``piksel_core.hotspots``). Index leaf density needs the
+``pgstattuple`` extension (created by ``make init-db``); without it only
+index sizes and scan counts are shown. ``--reset`` starts a new measurement
+window afterwards.
+"""
+
+import glob
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import click
+import psycopg2
+from datacube.ui.click import environment_option, pass_config
+
+from piksel_core.db import ODC_SCHEMA, PIKSEL_SCHEMA, connect
+from piksel_core.hotspots import (
+    REPORT_VERSION,
+    cache_summary,
+    format_report,
+    index_bloat,
+    rank_hotspots,
+    slowest_events,
+    stage_summary,
+    table_bloat,
+    throughput,
+)
+from piksel_core.telemetry import TELEMETRY_DIR_ENV, parse
+
+_SCHEMAS = [ODC_SCHEMA, PIKSEL_SCHEMA]
+
+
+def _metric_files(directory: str, since: float | None) -> list[str]:
+    paths = sorted(glob.glob(os.path.join(directory, "metrics", "*.prom")))
+    return [path for path in paths if since is None or os.path.getmtime(path) >= since]
+
+
+def _samples(paths: list[str]) -> list:
+    samples = []
+    for path in paths:
+        with open(path) as f:
+            samples += parse(f.read())
+    return samples
+
+
+def _events(directory: str, since: float | None) -> list[dict]:
+    events = []
+    try:
+        with open(os.path.join(directory, "events.jsonl")) as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if since is not None and datetime.fromisoformat(event["time"]).timestamp() < since:
+                    continue
+                events.append(event)
+    except FileNotFoundError:
+        pass
+    return events
+
+
+def _has_extension(cur, name: str) -> bool:
+    cur.execute("SELECT 1 FROM pg_extension WHERE extname = %s", (name,))
+    return cur.fetchone() is not None
+
+
+def _statements(cur, top: int) -> list[dict] | None:
+    if not _has_extension(cur, "pg_stat_statements"):
+        return None
+    try:
+        cur.execute(
+            "SELECT query, calls, total_exec_time, mean_exec_time, rows FROM pg_stat_statements "
+            "WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database()) "
+            "ORDER BY total_exec_time DESC LIMIT %s",
+            (top,),
+        )
+    except psycopg2.errors.ObjectNotInPrerequisiteState:
+        # Created but not in shared_preload_libraries
+        return None
+    return [
+        {"query": query, "calls": calls, "total_ms": total, "mean_ms": mean, "rows": rows}
+        for query, calls, total, mean, rows in cur.fetchall()
+    ]
+
+
+def _tables(cur) -> list[dict]:
+    cur.execute(
+        "SELECT schemaname || '.' || relname, pg_table_size(relid), n_live_tup, n_dead_tup, "
+        "greatest(last_vacuum, last_autovacuum) FROM pg_stat_user_tables WHERE schemaname = ANY(%s)",
+        (_SCHEMAS,),
+    )
+    return [
+        {"table": table, "bytes": size, "live": live, "dead": dead,
+         "vacuumed": vacuumed.isoformat() if vacuumed else None}
+        for table, size, live, dead, vacuumed in cur.fetchall()
+    ]
+
+
+def _indexes(cur, max_bytes: int) -> list[dict]:
+    cur.execute(
+        "SELECT quote_ident(s.schemaname) || '.' || quote_ident(s.indexrelname), "
+        "s.schemaname || '.' || s.relname, pg_relation_size(s.indexrelid), s.idx_scan, "
+        "am.amname = 'btree', i.indisunique "
+        "FROM pg_stat_user_indexes s JOIN pg_index i ON i.indexrelid = s.indexrelid "
+        "JOIN pg_class c ON c.oid = s.indexrelid JOIN pg_am am ON am.oid = c.relam "
+        "WHERE s.schemaname = ANY(%s)",
+        (_SCHEMAS,),
+    )
+    rows = cur.fetchall()
+    density = _has_extension(cur, "pgstattuple")
+    indexes = []
+    for name, table, size, scans, btree, unique in rows:
+        index = {"index": name, "table": table, "bytes": size, "unique": unique,
+                 # Unique indexes enforce constraints whether or not they are scanned
+                 "scans": None if unique else scans, "leaf_density": None}
+        if density and btree and 0 < size <= max_bytes:
+            cur.execute("SELECT avg_leaf_density FROM pgstatindex(%s::regclass)", (name,))
+            index["leaf_density"] = cur.fetchone()[0]
+        indexes.append(index)
+    return indexes
+
+
+def _reset(connection, directory: str | None, paths: list[str]) -> None:
+    with connection.cursor() as cur:
+        if _has_extension(cur, "pg_stat_statements"):
+            cur.execute("SELECT pg_stat_statements_reset()")
+    if directory:
+        for path in paths + [os.path.join(directory, "events.jsonl")]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+@click.command("perf-report")
+@environment_option
+@pass_config
+@click.option("--telemetry-dir", type=click.Path(file_okay=False), default=None,
+              help=f"Directory the commands write telemetry to (default: ${TELEMETRY_DIR_ENV}).")
+@click.option("--hours", type=float, default=None,
+              help="Only use telemetry written in the last N hours (default: all).")
+@click.option("--top", type=int, default=20, show_default=True, help="Entries per ranking.")
+@click.option("--max-index-mb", type=float, default=1024, show_default=True,
+              help="Largest B-tree whose leaf density is measured (pgstatindex reads the whole index).")
+@click.option("--reset", is_flag=True, default=False,
+              help="Afterwards reset pg_stat_statements and remove the telemetry read.")
+@click.option("--output", type=click.File("w"), default=None,
+              help="Also write the report as JSON to this file ('-' for stdout).")
+def cli(cfg_env, telemetry_dir, hours, top, max_index_mb, reset, output):
+    """
+    Rank indexing and query hot spots from telemetry, pg_stat_statements and ODC table/index bloat.
+    """
+    directory = telemetry_dir or os.environ.get(TELEMETRY_DIR_ENV)
+    since = time.time() - hours * 3600 if hours is not None else None
+    paths = _metric_files(directory, since) if directory else []
+    samples = _samples(paths)
+    events = _events(directory, since) if directory else []
+
+    connection = connect(cfg_env, application_name="piksel-perf-report")
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cur:
+            statements = _statements(cur, top)
+            tables = _tables(cur)
+            indexes = _indexes(cur, int(max_index_mb * 1024**2))
+        stages = stage_summary(samples)
+        report = {
+            "version": REPORT_VERSION,
+            "created": datetime.now(timezone.utc).isoformat(),
+            "metric_files": len(paths),
+            "hotspots": rank_hotspots(stages, statements or [], top),
+            "stages": stages,
+            "statements": statements,
+            "throughput": throughput(samples),
+            "caches": cache_summary(samples),
+            "slowest": slowest_events(events, min(top, 10)),
+            "tables": table_bloat(tables),
+            "indexes": index_bloat(indexes),
+        }
+        if not directory:
+            click.echo(f"${TELEMETRY_DIR_ENV} is not set, reporting database statistics only", err=True)
+        elif not paths:
+            click.echo(f"No telemetry in {directory}", err=True)
+        if statements is None:
+            click.echo("pg_stat_statements is not installed, statement times are not ranked", err=True)
+        for line in format_report(report, top):
+            click.echo(line)
+        if output:
+            json.dump(report, output, indent=2, default=str)
+            output.write("\n")
+        if reset:
+            _reset(connection, directory, paths)
+    finally:
+        connection.close()
@@ -0,0 +1,125 @@
+"""
+Result handling of the connection-pool load test.
+
+A run starts N simulated notebook kernels against one database target (the
+server itself, or the transaction-pooling proxy in front of it), samples the
+number of server connections while they query, and records query latency
+from the kernels' side. Results for the same kernel count are then compared
+target by target.
+"""
+
+import math
+from collections.abc import Iterable, Mapping, Sequence
+
+from piksel_core.querybench import latency_summary
+
+RESULTS_VERSION = 1
+
+MODES = ("direct", "pooled")
+
+
+def parse_target(target: str, default_port: int = 6432) -> tuple[str, int]:
+    """``host[:port]`` as a ``(host, port)`` pair."""
+    host, _, port = target.rpartition(":") if ":" in target else (target, "", "")
+    if not host:
+        raise ValueError(f"Invalid target {target!r}, expected host[:port]")
+    return host, int(port) if port else default_port
+
+
+def parse_counts(text: str) -> list[int]:
+    """A comma separated list of positive kernel counts, in ascending order."""
+    counts = sorted({int(part) for part in text.split(",") if part.strip()})
+    if not counts or counts[0] < 1:
+        raise ValueError(f"Invalid kernel counts {text!r}")
+    return counts
+
+
+def connection_summary(samples: Sequence[int], baseline: int) -> dict:
+    """
+    Server connections seen while the kernels ran.
+
+    Args:
+        samples (Sequence[int]): Client backends counted at each sample.
+        baseline (int): Client backends counted before the kernels started.
+
+    Returns:
+        dict: Peak and mean over the samples, with and without the baseline.
+    """
+    peak = max(samples, default=baseline)
+    mean = sum(samples) / len(samples) if samples else math.nan
+    return {
+        "samples": len(samples),
+        "baseline": baseline,
+        "peak": peak,
+        "mean": round(mean, 1),
+        "added_peak": peak - baseline,
+    }
+
+
+def run_summary(
+    mode: str,
+    target: str,
+    kernels: int,
+    threads: int,
+    seconds: float,
+    connects: Sequence[float],
+    timings: Sequence[float],
+    errors: Sequence[str],
+    connections: Mapping,
+) -> dict:
+    """
+    One result of the load test: a target under ``kernels`` concurrent kernels.
+
+    Args:
+        mode (str): ``direct`` or ``pooled``.
+        target (str): ``host:port`` the kernels connected to.
+        kernels (int): Concurrent kernel processes.
+        threads (int): Querying threads per kernel.
+        seconds (float): Wall time the kernels spent querying.
+        connects (Sequence[float]): Seconds from opening a ``Datacube`` to the first answer, per kernel.
+        timings (Sequence[float]): Seconds per successful query, over all kernels.
+        errors (Sequence[str]): Messages of the queries or connections that failed.
+        connections (Mapping): Output of :func:`connection_summary`.
+
+    Returns:
+        dict: A JSON-serialisable result.
+    """
+    return {
+        "mode": mode,
+        "target": target,
+        "kernels": kernels,
+        "threads": threads,
+        "queries": len(timings),
+        "queries_per_second": round(len(timings) / seconds, 1) if seconds else math.nan,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "connect": latency_summary(connects) if connects else None,
+        "latency": latency_summary(timings) if timings else None,
+        "connections": dict(connections),
+    }
+
+
+def _p95(result: Mapping) -> float:
+    return (result.get("latency") or {}).get("p95_ms", math.nan)
+
+
+def compare_modes(results: Iterable[Mapping]) -> list[str]:
+    """
+    One line per kernel count comparing the direct and pooled results.
+
+    Kernel counts measured in one mode only are left out.
+    """
+    by_kernels: dict[int, dict[str, Mapping]] = {}
+    for result in results:
+        by_kernels.setdefault(result["kernels"], {})[result["mode"]] = result
+    lines = []
+    for kernels, modes in sorted(by_kernels.items()):
+        if not all(mode in modes for mode in MODES):
+            continue
+        direct, pooled = modes["direct"], modes["pooled"]
+        lines.append(
+            f"{kernels} kernels: server connections {direct['connections']['added_peak']} -> "
+            f"{pooled['connections']['added_peak']}, p95 {_p95(direct):.1f} ms -> {_p95(pooled):.1f} ms, "
+            f"errors {direct['errors']} -> {pooled['errors']}"
+        )
+    return lines
@@ -0,0 +1,215 @@
+"""
+Export and import one product's rows of the ODC index (see ``piksel_core.archive``).
+
+Export copies every table in parallel, one connection per table, all reading
+the same exported snapshot so the streams are consistent with each other
+while indexing goes on. Import loads each stream into a temporary table and
+inserts from there in a single transaction: product and metadata type ids
+are remapped to the target index, datasets that already exist are kept, and
+search, lineage, home and spatial rows are only added for the datasets that
+were inserted. A failed import leaves the index unchanged.
+"""
+
+import concurrent.futures
+import os
+from typing import NamedTuple
+
+import psycopg2.extensions
+from datacube import Datacube
+from psycopg2 import sql
+
+from piksel_core.archive import default_suffix, open_stream, read_manifest, table_file, write_manifest
+from piksel_core.bulk_indexing import spatial_tables
+from piksel_core.db import ODC_SCHEMA, connect
+from piksel_core.delete_product import SEARCH_TABLES, delete_batch
+
+# Column of each dependent table that references odc.dataset
+_DATASET_REFS = {table: "dataset_ref" for table in SEARCH_TABLES} | {
+    "dataset_lineage": "derived_dataset_ref",
+    "dataset_home": "dataset_ref",
+}
+
+
+class ImportReport(NamedTuple):
+    """Rows inserted per table, and archived tables with no counterpart in the target index."""
+
+    product: str
+    deleted: int
+    inserted: dict[str, int]
+    skipped: list[str]
+
+
+def _product_row(cur, product: str) -> tuple | None:
+    cur.execute(
+        f"SELECT p.id, p.metadata_type_ref, p.definition, m.definition FROM {ODC_SCHEMA}.product p "
+        f"JOIN {ODC_SCHEMA}.metadata_type m ON m.id = p.metadata_type_ref WHERE p.name = %s",
+        (product,),
+    )
+    return cur.fetchone()
+
+
+def _select(table: str, product_id: int) -> sql.Composed:
+    """The rows of ``table`` belonging to the datasets of ``product_id``."""
+    if table == "dataset":
+        return sql.SQL("SELECT * FROM {} WHERE product_ref = {}").format(
+            sql.Identifier(ODC_SCHEMA, table), sql.Literal(product_id)
+        )
+    return sql.SQL("SELECT t.* FROM {} t JOIN {} d ON d.id = t.{} WHERE d.product_ref = {}").format(
+        sql.Identifier(ODC_SCHEMA, table),
+        sql.Identifier(ODC_SCHEMA, "dataset"),
+        sql.Identifier(_DATASET_REFS.get(table, "dataset_ref")),
+        sql.Literal(product_id),
+    )
+
+
+def _copy_out(env: str | None, snapshot: str, query: sql.Composed, path: str) -> int:
+    connection = connect(env, application_name="piksel-export-product")
+    try:
+        connection.set_session(isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ, readonly=True)
+        with connection.cursor() as cur, open_stream(path, "wb") as stream:
+            cur.execute("SET TRANSACTION SNAPSHOT %s", (snapshot,))
+            cur.copy_expert(sql.SQL("COPY ({}) TO STDOUT (FORMAT binary)").format(query).as_string(cur), stream)
+            rows = cur.rowcount
+        connection.rollback()
+    finally:
+        connection.close()
+    return rows
+
+
+def export_product(env: str | None, product: str, directory: str, jobs: int = 4) -> dict:
+    """
+    Write ``product``'s rows to an archive in ``directory``.
+
+    Args:
+        env (str | None): Datacube environment of the source index.
+        product (str): Product name.
+        directory (str): Archive directory, created if missing.
+        jobs (int): Tables copied concurrently.
+
+    Returns:
+        dict: The archive manifest.
+    """
+    leader = connect(env, application_name="piksel-export-product")
+    try:
+        spatial = [table.table for table in spatial_tables(leader)]
+        leader.set_session(isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ, readonly=True)
+        with leader.cursor() as cur:
+            cur.execute("SELECT pg_export_snapshot()")
+            snapshot = cur.fetchone()[0]
+            row = _product_row(cur, product)
+        if row is None:
+            raise ValueError(f"Product {product} does not exist")
+        product_id, _, definition, metadata_type = row
+
+        os.makedirs(directory, exist_ok=True)
+        suffix = default_suffix()
+        tables = ["dataset", *_DATASET_REFS, *spatial]
+        files = {table: table_file(table, suffix) for table in tables}
+        # The snapshot stays importable while the leader's transaction is open
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {
+                table: executor.submit(
+                    _copy_out, env, snapshot, _select(table, product_id), os.path.join(directory, files[table])
+                )
+                for table in tables
+            }
+            rows = {table: future.result() for table, future in futures.items()}
+        leader.rollback()
+    finally:
+        leader.close()
+    return write_manifest(directory, definition, metadata_type, files, rows)
+
+
+def _ensure_product(dc: Datacube, manifest: dict) -> None:
+    """Add the archived metadata type and product if the target index does not have them."""
+    metadata_type = manifest["metadata_type_definition"]
+    if dc.index.metadata_types.get_by_name(metadata_type["name"]) is None:
+        dc.index.metadata_types.add(dc.index.metadata_types.from_doc(metadata_type))
+    if dc.index.products.get_by_name(manifest["product"]) is None:
+        dc.index.products.add(dc.index.products.from_doc(manifest["product_definition"]))
+
+
+def _columns(cur, table: str) -> list[str]:
+    cur.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_schema = %s AND table_name = %s "
+        "ORDER BY ordinal_position",
+        (ODC_SCHEMA, table),
+    )
+    return [row[0] for row in cur.fetchall()]
+
+
+def _stage(cur, directory: str, table: str, file: str) -> sql.Identifier:
+    """Load a stream into a temporary copy of ``table``."""
+    staged = sql.Identifier(f"import_{table}")
+    cur.execute(
+        sql.SQL("CREATE TEMP TABLE {} (LIKE {}) ON COMMIT DROP").format(staged, sql.Identifier(ODC_SCHEMA, table))
+    )
+    with open_stream(os.path.join(directory, file), "rb") as stream:
+        cur.copy_expert(sql.SQL("COPY {} FROM STDIN (FORMAT binary)").format(staged).as_string(cur), stream)
+    return staged
+
+
+def import_product(dc: Datacube, connection, directory: str, replace: bool = False) -> ImportReport:
+    """
+    Load a product archive into the index in one transaction.
+
+    Args:
+        dc (Datacube): Index the product and metadata type are added to if missing.
+        connection: psycopg2 connection to the same database.
+        directory (str): Archive written by ``export_product``.
+        replace (bool): Delete the product's existing datasets first.
+
+    Returns:
+        ImportReport: Rows inserted per table.
+    """
+    manifest = read_manifest(directory)
+    product = manifest["product"]
+    _ensure_product(dc, manifest)
+    target_spatial = [table.table for table in spatial_tables(connection)]
+    inserted: dict[str, int] = {}
+    skipped = []
+    deleted = 0
+    with connection, connection.cursor() as cur:
+        product_id, metadata_type_id, _, _ = _product_row(cur, product)
+        if replace:
+            cur.execute(f"SELECT count(*) FROM {ODC_SCHEMA}.dataset WHERE product_ref = %s", (product_id,))
+            existing = cur.fetchone()[0]
+            if existing:
+                deleted = delete_batch(cur, product_id, target_spatial, existing)
+        cur.execute("CREATE TEMP TABLE imported_ids (id uuid PRIMARY KEY) ON COMMIT DROP")
+
+        staged = _stage(cur, directory, "dataset", manifest["tables"]["dataset"]["file"])
+        columns = _columns(cur, "dataset")
+        values = {"product_ref": sql.Literal(product_id), "metadata_type_ref": sql.Literal(metadata_type_id)}
+        cur.execute(
+            sql.SQL(
+                "WITH ins AS (INSERT INTO {target} ({columns}) SELECT {values} FROM {staged} "
+                "ON CONFLICT (id) DO NOTHING RETURNING id) INSERT INTO imported_ids SELECT id FROM ins"
+            ).format(
+                target=sql.Identifier(ODC_SCHEMA, "dataset"),
+                columns=sql.SQL(", ").join(map(sql.Identifier, columns)),
+                values=sql.SQL(", ").join(values.get(column, sql.Identifier(column)) for column in columns),
+                staged=staged,
+            )
+        )
+        inserted["dataset"] = cur.rowcount
+
+        for table, entry in manifest["tables"].items():
+            if table == "dataset":
+                continue
+            if table not in _DATASET_REFS and table not in target_spatial:
+                skipped.append(table)
+                continue
+            staged = _stage(cur, directory, table, entry["file"])
+            cur.execute(
+                sql.SQL(
+                    "INSERT INTO {target} SELECT s.* FROM {staged} s JOIN imported_ids i ON i.id = s.{ref} "
+                    "ON CONFLICT DO NOTHING"
+                ).format(
+                    target=sql.Identifier(ODC_SCHEMA, table),
+                    staged=staged,
+                    ref=sql.Identifier(_DATASET_REFS.get(table, "dataset_ref")),
+                )
+            )
+            inserted[table] = cur.rowcount
+    return ImportReport(product, deleted, inserted, skipped)
@@ -0,0 +1,160 @@
+"""
+The fixed query set and result handling of the query-latency benchmark.
+
+Every product is searched with the same spatial, temporal, cloud-cover and
+region-code queries over Jakarta, Java and the whole archipelago, so results
+from different index setups, datacube versions or spatial indexes can be
+compared line by line. Plans are reduced to a *shape* (node types, relations
+and indexes, without costs) so a changed plan shows up as a changed string.
+"""
+
+import math
+from collections.abc import Iterable, Mapping, Sequence
+from typing import NamedTuple
+
+from piksel_core.synthetic import footprint_at, sensor_for
+
+RESULTS_VERSION = 1
+
+JAKARTA = (106.85, -6.2)
+JAVA = (105.0, -8.8, 114.6, -5.8)
+INDONESIA = (95.0, -11.0, 141.0, 6.0)
+
+YEAR = ("2023-01-01", "2023-12-31")
+MONTH = ("2023-06-01", "2023-06-30")
+
+
+class BenchQuery(NamedTuple):
+    """One benchmark query: a name and ``dc.find_datasets`` keyword arguments."""
+
+    name: str
+    search: dict
+
+
+def _around(point: tuple[float, float], half_width: float) -> dict:
+    lon, lat = point
+    return {"lon": (lon - half_width, lon + half_width), "lat": (lat - half_width, lat + half_width)}
+
+
+def _within(bbox: tuple[float, float, float, float]) -> dict:
+    return {"lon": (bbox[0], bbox[2]), "lat": (bbox[1], bbox[3])}
+
+
+def queries_for(product: Mapping) -> list[BenchQuery]:
+    """
+    The benchmark queries for a product definition.
+
+    The cloud-cover query is only run for optical products, and the
+    region-code query uses the product's tile over Jakarta.
+    """
+    name = product["name"]
+    queries = [
+        BenchQuery("point_all_time", {"product": name, **_around(JAKARTA, 0.01)}),
+        BenchQuery("city_year", {"product": name, "time": YEAR, **_around(JAKARTA, 0.25)}),
+        BenchQuery("island_month", {"product": name, "time": MONTH, **_within(JAVA)}),
+        BenchQuery("archipelago_month", {"product": name, "time": MONTH, **_within(INDONESIA)}),
+    ]
+    if sensor_for(name).cloud_cover:
+        queries.append(BenchQuery(
+            "island_year_clear",
+            {"product": name, "time": YEAR, "cloud_cover": (0, 20), **_within(JAVA)},
+        ))
+    queries.append(BenchQuery(
+        "region_code_all_time", {"product": name, "region_code": footprint_at(product, *JAKARTA).code},
+    ))
+    return queries
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """The ``q``-th percentile (0-100) of ``values``, linearly interpolated."""
+    ordered = sorted(values)
+    if not ordered:
+        return math.nan
+    rank = (len(ordered) - 1) * q / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def latency_summary(seconds: Sequence[float]) -> dict:
+    """p50/p95/p99, mean and max of a list of timings, in milliseconds."""
+    ms = [s * 1000 for s in seconds]
+    return {
+        "runs": len(ms),
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "mean_ms": round(sum(ms) / len(ms), 3) if ms else math.nan,
+        "max_ms": round(max(ms), 3) if ms else math.nan,
+    }
+
+
+def _node_label(node: Mapping) -> str:
+    label = node["Node Type"]
+    if "Relation Name" in node:
+        label += f" on {node['Relation Name']}"
+    if "Index Name" in node:
+        label += f" using {node['Index Name']}"
+    return label
+
+
+def plan_shape(plan: Mapping) -> str:
+    """
+    Reduce an ``EXPLAIN (FORMAT JSON)`` plan node to its shape.
+
+    e.g. ``Nested Loop(Index Scan on dataset using dataset_pkey, Seq Scan on spatial_4326)``
+    """
+    children = plan.get("Plans") or []
+    label = _node_label(plan)
+    if not children:
+        return label
+    return f"{label}({', '.join(plan_shape(child) for child in children)})"
+
+
+def seq_scans(plan: Mapping) -> list[str]:
+    """The relations a plan reads with a sequential scan."""
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name", "?"))
+    for child in plan.get("Plans") or []:
+        found.extend(seq_scans(child))
+    return found
+
+
+def plan_summary(explained: Sequence[Mapping]) -> dict:
+    """Summarise the output of ``EXPLAIN (FORMAT JSON)`` for the results file."""
+    plan = explained[0]["Plan"]
+    return {
+        "shape": plan_shape(plan),
+        "seq_scans": seq_scans(plan),
+        "total_cost": plan.get("Total Cost"),
+        "estimated_rows": plan.get("Plan Rows"),
+    }
+
+
+def _key(result: Mapping) -> tuple[str, str, str]:
+    return result["product"], result["query"], result["mode"]
+
+
+def compare_results(baseline: Iterable[Mapping], current: Iterable[Mapping], threshold: float) -> list[str]:
+    """
+    Describe the regressions of ``current`` against ``baseline`` results.
+
+    A result regresses when its p95 latency grew by more than ``threshold``
+    times, or when its plan shape changed.
+    """
+    previous = {_key(result): result for result in baseline}
+    regressions = []
+    for result in current:
+        before = previous.get(_key(result))
+        if before is None:
+            continue
+        label = "/".join(_key(result))
+        if before["p95_ms"] and result["p95_ms"] > before["p95_ms"] * threshold:
+            regressions.append(
+                f"{label}: p95 {before['p95_ms']:.1f} ms -> {result['p95_ms']:.1f} ms"
+            )
+        old_shape = (before.get("plan") or {}).get("shape")
+        new_shape = (result.get("plan") or {}).get("shape")
+        if old_shape and new_shape and old_shape != new_shape:
+            regressions.append(f"{label}: plan changed from {old_shape} to {new_shape}")
+    return regressions
@@ -0,0 +1,104 @@
+"""
+Set-based reconciliation of a STAC search against the ODC index.
+
+The dataset URIs of the products are read from the index with one SQL query
+into a set. STAC pages are then streamed past it: every item is looked up in
+constant time, matches are moved aside and what is left over at the end exists
+only in the index. Both sides are normalised with the same URL rewrite used at
+indexing time (for Landsat, ``notebooks/utils.patch_usgs_landsat``), so
+datasets indexed with or without ``--url-string-replace`` still match.
+"""
+
+from collections.abc import Iterable, Iterator
+
+from pystac import Item
+
+from piksel_core.stac import rewrite_url
+from piksel_core.tiling import parse_datetime
+
+
+def index_uri_query(
+    products: Iterable[str],
+    bbox: Iterable[float] | None = None,
+    datetime: str | None = None,
+) -> tuple[str, list]:
+    """
+    Build the query for the URIs of active datasets of ``products``.
+
+    The bbox is matched against ``spatial_4326`` and the datetime interval
+    against the eo3 ``time`` search field, mirroring the STAC search filters.
+
+    Returns:
+        tuple[str, list]: The SQL and its parameters.
+    """
+    query = (
+        "SELECT d.uri_scheme || ':' || d.uri_body FROM odc.dataset d "
+        "JOIN odc.product p ON p.id = d.product_ref "
+        "WHERE p.name = ANY(%s) AND d.archived IS NULL AND d.uri_body IS NOT NULL"
+    )
+    params: list = [list(products)]
+    if bbox is not None:
+        query += (
+            " AND d.id IN (SELECT dataset_ref FROM odc.spatial_4326 "
+            "WHERE extent && ST_MakeEnvelope(%s, %s, %s, %s, 4326))"
+        )
+        params.extend(float(v) for v in bbox)
+    if datetime:
+        start, _, end = datetime.partition("/")
+        if not end:
+            end = start
+        query += (
+            " AND d.id IN (SELECT dataset_ref FROM odc.dataset_search_datetime "
+            "WHERE search_key = 'time' AND search_val && tstzrange(%s, %s, '[]'))"
+        )
+        params.append(parse_datetime(start) if start not in ("", "..") else None)
+        params.append(parse_datetime(end, end=True) if end not in ("", "..") else None)
+    return query, params
+
+
+class Reconciliation:
+    """
+    Running comparison of STAC items with the dataset URIs in the index.
+
+    Args:
+        index_uris (Iterable[str]): Dataset URIs from the index.
+        url_string_replace (tuple[str, str] | None): Rewrite applied to both sides.
+    """
+
+    def __init__(self, index_uris: Iterable[str], url_string_replace: tuple[str, str] | None = None):
+        self.url_string_replace = url_string_replace
+        self._unmatched = {self.normalise(uri) for uri in index_uris}
+        self._matched: set[str] = set()
+        self.index_count = len(self._unmatched)
+        self.stac_count = 0
+        self.only_in_stac: list[str] = []
+
+    def normalise(self, url: str) -> str:
+        return rewrite_url(url, self.url_string_replace)
+
+    def missing(self, items: Iterable[Item]) -> Iterator[Item]:
+        """Consume STAC items, yielding those that are not in the index."""
+        for item in items:
+            self.stac_count += 1
+            url = self.normalise(item.get_self_href() or "")
+            if url in self._unmatched:
+                self._unmatched.remove(url)
+                self._matched.add(url)
+            elif url not in self._matched:
+                self.only_in_stac.append(url)
+                yield item
+
+    @property
+    def matched(self) -> int:
+        return len(self._matched)
+
+    @property
+    def only_in_index(self) -> list[str]:
+        return sorted(self._unmatched)
+
+    def __str__(self) -> str:
+        return (
+            f"STAC {self.stac_count} items, index {self.index_count} datasets: "
+            f"{self.matched} matched, {len(self.only_in_stac)} only in STAC, "
+            f"{len(self._unmatched)} only in the index"
+        )
@@ -0,0 +1,121 @@
+"""
+``reconcile``: audit that a STAC search is fully indexed, optionally indexing
+the items that are missing.
+"""
+
+import json
+import sys
+from collections import Counter
+
+import click
+from datacube import Datacube
+from datacube.ui.click import environment_option, pass_config
+from odc.apps.dc_tools.utils import bbox, rename_product, url_string_replace
+
+from piksel_core.indexing import index_items, summarise
+from piksel_core.landsat import LANDSAT_URL_REWRITE, landsat_product
+from piksel_core.reconcile import Reconciliation
+from piksel_core.reconcile_index import load_index_uris
+from piksel_core.stac import rewrite_item_assets, search_items
+
+
+@click.command("reconcile")
+@environment_option
+@pass_config
+@click.option("--catalog-href", type=str, required=True, help="URL of the STAC API to search.")
+@click.option("--collections", type=str, required=True,
+              help="Comma separated list of collections to search.")
+@click.option("--products", type=str, required=True,
+              help="Comma separated ODC products the collections are indexed into.")
+@bbox
+@click.option("--datetime", type=str, default=None,
+              help="Date range to compare, e.g. 2024-01-01/2024-12-31.")
+@click.option("--query", type=str, default=None, help="STAC query extension filter as JSON.")
+@url_string_replace
+@click.option("--landsat", is_flag=True, default=False,
+              help="Normalise with the LandsatLook s3 rewrite and route missing items by platform.")
+@rename_product
+@click.option("--index-missing", is_flag=True, default=False,
+              help="Index the items that are only in STAC.")
+@click.option("--workers", type=int, default=16, show_default=True,
+              help="Concurrent index writers for --index-missing.")
+@click.option("--page-size", type=int, default=100, show_default=True,
+              help="Items requested per STAC page.")
+@click.option("--output", type=click.Path(dir_okay=False, writable=True), default=None,
+              help="Write the differences to this file as JSON.")
+@click.option("--show", type=int, default=20, show_default=True,
+              help="Print at most this many differing URLs per side.")
+def cli(
+    cfg_env,
+    catalog_href,
+    collections,
+    products,
+    bbox,
+    datetime,
+    query,
+    url_string_replace,
+    landsat,
+    rename_product,
+    index_missing,
+    workers,
+    page_size,
+    output,
+    show,
+):
+    """
+    Report STAC items missing from the index and datasets missing from STAC.
+    """
+    products = products.split(",")
+    if url_string_replace:
+        url_string_replace = tuple(url_string_replace.split(","))
+        if len(url_string_replace) != 2:
+            raise click.BadParameter("--url-string-replace must be two strings separated by a comma")
+    elif landsat:
+        url_string_replace = LANDSAT_URL_REWRITE
+    if index_missing and not landsat and not rename_product:
+        if len(products) != 1:
+            raise click.BadParameter("--index-missing needs --landsat or --rename-product "
+                                     "when comparing several products")
+        rename_product = products[0]
+    search_bbox = list(map(float, bbox.split(","))) if bbox else None
+
+    result = Reconciliation(load_index_uris(products, search_bbox, datetime, cfg_env),
+                            url_string_replace or None)
+    missing = result.missing(search_items(
+        catalog_href,
+        collections.split(","),
+        bbox=search_bbox,
+        datetime=datetime,
+        query=json.loads(query) if query else None,
+        page_size=page_size,
+    ))
+
+    counts: Counter = Counter()
+    if index_missing:
+        def _routed():
+            for item in missing:
+                product = landsat_product(item) if landsat else rename_product
+                if product is not None:
+                    yield product, rewrite_item_assets(item, url_string_replace or None)
+
+        dc = Datacube(env=cfg_env, app="piksel-reconcile")
+        counts = index_items(dc, _routed(), workers=workers)
+    else:
+        for _ in missing:
+            pass
+
+    print(result)
+    for label, urls in (("only in STAC", result.only_in_stac),
+                        ("only in the index", result.only_in_index)):
+        for url in urls[:show]:
+            print(f" {label}: {url}")
+        if len(urls) > show:
+            print(f" ... {len(urls) - show} more {label}")
+    if output:
+        with open(output, "w") as f:
+            json.dump({"only_in_stac": result.only_in_stac,
+                       "only_in_index": result.only_in_index}, f, indent=2)
+    if index_missing:
+        totals = summarise(counts)
+        if totals["failed"] > 0:
+            sys.exit(totals["failed"])
@@ -0,0 +1,71 @@
+"""
+Compare a STAC search with the datasets in the ODC index.
+
+``reconcile_index`` replaces the list comparisons in the ``Compare_*_STAC_ODC``
+notebooks: it streams STAC pages instead of loading the item collection, and
+diffs against the index with hashed sets, so it scales to a whole province or
+all of Indonesia. It needs only datacube and psycopg2, so it can be used from
+the Jupyter image as well as the ODC container.
+"""
+
+from collections.abc import Iterable
+
+from piksel_core.db import connect
+from piksel_core.reconcile import Reconciliation, index_uri_query
+from piksel_core.stac import search_items
+
+
+def load_index_uris(
+    products: Iterable[str],
+    bbox: Iterable[float] | None = None,
+    datetime: str | None = None,
+    env: str | None = None,
+) -> list[str]:
+    """Fetch the URIs of active datasets of ``products`` in one query."""
+    query, params = index_uri_query(products, bbox, datetime)
+    connection = connect(env, application_name="piksel-reconcile")
+    try:
+        with connection.cursor(name="piksel_reconcile") as cur:
+            cur.itersize = 50_000
+            cur.execute(query, params)
+            return [row[0] for row in cur]
+    finally:
+        connection.close()
+
+
+def reconcile_index(
+    catalog_href: str,
+    collections: Iterable[str],
+    products: Iterable[str],
+    bbox: Iterable[float] | None = None,
+    datetime: str | None = None,
+    query: dict | None = None,
+    url_string_replace: tuple[str, str] | None = None,
+    env: str | None = None,
+    page_size: int = 100,
+) -> Reconciliation:
+    """
+    Compare a STAC search with the datasets of ``products`` in the index.
+
+    Args:
+        catalog_href (str): URL of the STAC API.
+        collections (Iterable[str]): STAC collections to search.
+        products (Iterable[str]): ODC products the collections are indexed into.
+        bbox (Iterable[float] | None): Search bbox in EPSG:4326.
+        datetime (str | None): STAC datetime interval.
+        query (dict | None): STAC query extension filter.
+        url_string_replace (tuple[str, str] | None): URL rewrite applied to both sides,
+            e.g. ``LANDSAT_URL_REWRITE``.
+        env (str | None): Datacube environment.
+        page_size (int): Items requested per STAC page.
+
+    Returns:
+        Reconciliation: Counts plus the URLs only in STAC and only in the index.
+    """
+    bbox = list(bbox) if bbox is not None else None
+    result = Reconciliation(load_index_uris(products, bbox, datetime, env), url_string_replace)
+    items = search_items(catalog_href, collections, bbox=bbox, datetime=datetime,
+                         query=query, page_size=page_size)
+    for _ in result.missing(items):
+        pass
+    return result
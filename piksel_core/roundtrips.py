@@ -0,0 +1,104 @@
+"""
+Run an indexing tool and count the database round trips it makes.
+
+    python -m piksel_core.roundtrips stac-to-dc --catalog-href=... s2_l2a
+
+The first argument is a console script (``stac-to-dc``, ``s3-to-dc``,
+``datacube``, ...) or ``piksel_core`` for our own CLI; the rest is passed to
+it. ``psycopg2.connect`` is patched before the tool is imported, so every
+statement sent through SQLAlchemy (datacube) or raw psycopg2 (the bulk writer)
+is counted. When the tool exits the counts are written as JSON to
+``$PIKSEL_ROUNDTRIPS_FILE``. Processes the tool spawns itself are not counted.
+"""
+
+import atexit
+import json
+import os
+import sys
+import threading
+
+import psycopg2
+import psycopg2.extensions
+
+from piksel_core.server import console_command
+
+ROUNDTRIPS_FILE_ENV = "PIKSEL_ROUNDTRIPS_FILE"
+
+_LOCK = threading.Lock()
+_COUNTS = {"statements": 0, "commits": 0, "rollbacks": 0}
+
+
+def _count(key: str, n: int = 1) -> None:
+    with _LOCK:
+        _COUNTS[key] += n
+
+
+class _CountingCursor(psycopg2.extensions.cursor):
+    def execute(self, query, vars=None):  # noqa: A002 - psycopg2 API
+        _count("statements")
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        # executemany sends one statement per parameter set
+        vars_list = list(vars_list)
+        _count("statements", len(vars_list))
+        return super().executemany(query, vars_list)
+
+    def callproc(self, procname, parameters=None):
+        _count("statements")
+        return super().callproc(procname, parameters)
+
+    def copy_expert(self, sql, file, size=8192):
+        _count("statements")
+        return super().copy_expert(sql, file, size)
+
+
+class _CountingConnection(psycopg2.extensions.connection):
+    def cursor(self, *args, **kwargs):
+        kwargs.setdefault("cursor_factory", _CountingCursor)
+        return super().cursor(*args, **kwargs)
+
+    def commit(self):
+        _count("commits")
+        return super().commit()
+
+    def rollback(self):
+        _count("rollbacks")
+        return super().rollback()
+
+
+def install() -> None:
+    """Make every later ``psycopg2.connect`` return a counting connection."""
+    connect = psycopg2.connect
+
+    def counting_connect(*args, **kwargs):
+        kwargs.setdefault("connection_factory", _CountingConnection)
+        return connect(*args, **kwargs)
+
+    psycopg2.connect = counting_connect
+
+
+def counts() -> dict[str, int]:
+    """Statements, commits and rollbacks counted so far."""
+    with _LOCK:
+        return dict(_COUNTS)
+
+
+def _write_counts() -> None:
+    path = os.environ.get(ROUNDTRIPS_FILE_ENV)
+    if path:
+        with open(path, "w") as f:
+            json.dump(counts(), f)
+
+
+def main(argv: list[str]) -> None:
+    if not argv:
+        raise SystemExit(__doc__)
+    install()
+    atexit.register(_write_counts)
+    command = console_command(argv[0])
+    command.main(args=argv[1:], prog_name=argv[0])
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,179 @@
+"""
+Discover STAC item documents on S3 from a listing or manifest, skipping unchanged ones.
+
+``s3-to-dc 's3://bucket/prefix/**/*.stac-item.json'`` lists the prefix and
+then fetches and indexes every item document, so re-indexing an annual
+geomedian archive costs a GET and an index write per tile, every year. Here
+the keys come with their ETags, either from one ``ListObjectsV2`` pass (1000
+keys per request) or from a manifest file: an S3 Inventory CSV, a list of
+``s3://`` URLs, or the cached result of an earlier listing. Keys whose ETag is
+the one recorded in ``piksel.s3_item_etag`` when they were last indexed are
+skipped; the rest are fetched with a bounded pool of concurrent requests and
+indexed by concurrent writers, so a re-run costs about the number of new or
+changed tiles. A key whose ETag is unknown, on either side, cannot be shown to
+be unchanged and is fetched again; list the prefix rather than read a manifest
+of bare URLs to get the skipping.
+
+Manifest lines are CSV: ``s3://bucket/key[,etag]``, ``key[,etag]`` relative to
+the glob's bucket, or S3 Inventory rows (``bucket,key,...``, URL-encoded key,
+the ETag being the first later field that looks like one). Files ending in
+``.gz`` are read compressed.
+"""
+
+import csv
+import gzip
+import os
+import re
+from collections.abc import Iterable, Iterator, Mapping
+from fnmatch import fnmatchcase
+from typing import NamedTuple, TextIO
+from urllib.parse import unquote_plus
+
+from piksel_core.db import PIKSEL_SCHEMA, ensure_piksel_schema
+
+CREATE_ETAG_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {PIKSEL_SCHEMA}.s3_item_etag (
+    url text PRIMARY KEY,
+    etag text,
+    product text NOT NULL,
+    indexed timestamptz NOT NULL DEFAULT now()
+)
+"""
+
+_ETAG = re.compile(r"^[0-9a-f]{32}(-\d+)?$")
+
+
+class S3Object(NamedTuple):
+    """An item document's URL and ETag (None if the manifest does not have it)."""
+
+    url: str
+    etag: str | None
+
+
+def split_glob(url: str) -> tuple[str, str]:
+    """
+    The bucket and the listing prefix of an ``s3://`` glob.
+
+    The prefix ends at the last ``/`` before the first wildcard, so
+    ``s3://b/geomad_s2/1.0.0/**/*.json`` lists ``geomad_s2/1.0.0/``.
+    """
+    if not url.startswith("s3://"):
+        raise ValueError(f"Not an s3:// URL: {url}")
+    bucket, _, key = url[len("s3://"):].partition("/")
+    wildcard = min((i for i in (key.find(c) for c in "*?[") if i >= 0), default=len(key))
+    return bucket, key[:key.rfind("/", 0, wildcard) + 1]
+
+
+def normalise_etag(etag: str | None) -> str | None:
+    return etag.strip('"') if etag else None
+
+
+def matching(objects: Iterable[S3Object], pattern: str) -> Iterator[S3Object]:
+    """The objects whose URL matches the glob, with the same ``fnmatch`` rules as ``s3-to-dc``."""
+    for obj in objects:
+        if fnmatchcase(obj.url, pattern):
+            yield obj
+
+
+def parse_manifest(lines: TextIO, bucket: str) -> Iterator[S3Object]:
+    """The objects listed in a manifest (see the module docstring for the formats)."""
+    for row in csv.reader(lines):
+        if not row or not row[0].strip() or row[0].startswith("#"):
+            continue
+        first = row[0].strip()
+        if first.startswith("s3://"):
+            yield S3Object(first, normalise_etag(row[1]) if len(row) > 1 else None)
+        elif first == bucket and len(row) > 1:
+            etag = next((field for field in row[2:] if _ETAG.match(field.strip('"'))), None)
+            yield S3Object(f"s3://{bucket}/{unquote_plus(row[1])}", normalise_etag(etag))
+        else:
+            yield S3Object(f"s3://{bucket}/{first.lstrip('/')}", normalise_etag(row[1]) if len(row) > 1 else None)
+
+
+def read_manifest(path: str, bucket: str) -> list[S3Object]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", newline="") as f:
+        return list(parse_manifest(f, bucket))
+
+
+def write_manifest(path: str, objects: Iterable[S3Object]) -> None:
+    """Cache a listing as a manifest, replacing ``path`` atomically."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}")
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(tmp, "wt", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        for obj in objects:
+            writer.writerow([obj.url, obj.etag or ""])
+    os.replace(tmp, path)
+
+
+def list_objects(fetcher, bucket: str, prefix: str) -> list[S3Object]:
+    """Every object under ``prefix`` with its ETag, using an ``odc.aio.S3Fetcher``."""
+    return [S3Object(f.url, normalise_etag(f.etag)) for f in fetcher.find(f"s3://{bucket}/{prefix}")]
+
+
+def plan_fetch(objects: Iterable[S3Object], indexed: Mapping[str, str | None]) -> tuple[list[S3Object], int]:
+    """
+    The objects to fetch and index, and how many are unchanged.
+
+    An object is unchanged only if its URL was indexed with the same, known
+    ETag; without both ETags a changed document could not be told apart.
+
+    Args:
+        objects (Iterable[S3Object]): Listed or manifest objects.
+        indexed (Mapping[str, str | None]): ETag recorded per URL at indexing time.
+    """
+    fetch, unchanged = [], 0
+    for obj in objects:
+        if obj.etag is not None and indexed.get(obj.url) == obj.etag:
+            unchanged += 1
+        else:
+            fetch.append(obj)
+    return fetch, unchanged
+
+
+def ensure_etag_table(connection) -> None:
+    with connection, connection.cursor() as cur:
+        ensure_piksel_schema(cur)
+        cur.execute(CREATE_ETAG_TABLE)
+
+
+def indexed_etags(connection, product: str, url_prefix: str) -> dict[str, str | None]:
+    """The ETags recorded for ``product``'s documents under ``url_prefix``."""
+    with connection, connection.cursor() as cur:
+        cur.execute(
+            f"SELECT url, etag FROM {PIKSEL_SCHEMA}.s3_item_etag WHERE product = %s AND starts_with(url, %s)",
+            (product, url_prefix),
+        )
+        return dict(cur.fetchall())
+
+
+def record_etags(connection, product: str, objects: Iterable[S3Object]) -> None:
+    """Remember the ETags of documents that were indexed."""
+    rows = [(obj.url, obj.etag, product) for obj in objects]
+    if not rows:
+        return
+    with connection, connection.cursor() as cur:
+        cur.executemany(
+            f"""
+            INSERT INTO {PIKSEL_SCHEMA}.s3_item_etag (url, etag, product) VALUES (%s, %s, %s)
+            ON CONFLICT (url) DO UPDATE SET etag = EXCLUDED.etag, product = EXCLUDED.product, indexed = now()
+            """,
+            rows,
+        )
+
+
+def forget_etags(connection, url_prefix: str) -> int:
+    """Drop the ETags recorded under ``url_prefix``, so those documents are indexed again."""
+    with connection, connection.cursor() as cur:
+        cur.execute(f"DELETE FROM {PIKSEL_SCHEMA}.s3_item_etag WHERE starts_with(url, %s)", (url_prefix,))
+        return cur.rowcount
+
+
+def forget_product_etags(cur, product: str) -> None:
+    """Drop the ETags recorded for ``product``, once its datasets are deleted."""
+    cur.execute("SELECT to_regclass(%s)", (f"{PIKSEL_SCHEMA}.s3_item_etag",))
+    if cur.fetchone()[0] is not None:
+        cur.execute(f"DELETE FROM {PIKSEL_SCHEMA}.s3_item_etag WHERE product = %s", (product,))
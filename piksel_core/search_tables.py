@@ -0,0 +1,489 @@
+"""
+Opt-in denormalised search tables, one per product (``piksel.ds_<product>``).
+
+A product search through datacube reads every field from the JSONB documents
+or the ``odc.dataset_search_*`` tables, joined per query. A search table keeps
+one narrow, typed row per active dataset instead: id, acquisition year, time
+range, footprint in a spatial index's CRS, ``cloud_cover``, ``region_code``
+and ``platform``. It is partitioned by the year the time range starts in
+(datasets without one go to year 0), with a GiST index on the footprint and
+B-tree indexes on time, region code and cloud cover in every partition.
+
+Only products listed in ``piksel.search_table`` have one. Refreshes use the
+``odc.dataset.updated`` watermark of ``piksel_core.spindex``: the rows of
+datasets changed since the previous refresh are deleted and those still
+active inserted again, in one transaction, so readers never see a half
+applied refresh and are never blocked by one. Footprints come from the
+spatial index table, so refresh after ``spindex-update``.
+
+``search`` answers a product search from the table while no dataset of the
+product changed after the watermark, and returns None otherwise (or for
+search terms the table does not hold) so callers fall back to datacube.
+"""
+
+import time
+from collections.abc import Iterable, Sequence
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+from psycopg2 import sql
+
+from piksel_core.db import ODC_SCHEMA, PIKSEL_SCHEMA, ensure_piksel_schema, ensure_updated_index, transaction_cutoff
+
+STATE_TABLE = "search_table"
+
+CREATE_STATE_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {PIKSEL_SCHEMA}.{STATE_TABLE} (
+    product text PRIMARY KEY,
+    srid integer NOT NULL,
+    high_water timestamptz NOT NULL,
+    max_span integer NOT NULL DEFAULT 0,
+    datasets bigint NOT NULL DEFAULT 0,
+    updated timestamptz NOT NULL DEFAULT now()
+)
+"""
+
+# Partition of datasets without a time range
+NO_YEAR = 0
+
+# Search terms a search table can answer
+SEARCH_KEYS = frozenset({"product", "time", "lon", "lat", "cloud_cover", "region_code", "platform"})
+
+# Datasets deleted and inserted per statement
+_BATCH = 10000
+
+_YEAR = sql.SQL("COALESCE(extract(year FROM lower(t.search_val) AT TIME ZONE 'UTC')::integer, 0)")
+
+
+class SearchTableState(NamedTuple):
+    """A product's row in ``piksel.search_table``."""
+
+    product: str
+    srid: int
+    high_water: datetime
+    max_span: int
+    datasets: int
+
+
+class RefreshReport(NamedTuple):
+    """Outcome of refreshing one product's search table."""
+
+    product: str
+    datasets: int
+    changed: int
+    partitions: int
+    rebuilt: bool
+    seconds: float
+
+    def __str__(self) -> str:
+        what = "rebuilt" if self.rebuilt else f"{self.changed} changed datasets applied"
+        return (
+            f"{self.product}: {what}, {self.datasets} datasets, "
+            f"{self.partitions} new partitions in {self.seconds:.1f}s"
+        )
+
+
+def table_name(product: str) -> str:
+    """The search table of ``product`` in the ``piksel`` schema."""
+    name = f"ds_{product}"
+    # Partitions append _<year>, and PostgreSQL truncates identifiers at 63 bytes
+    if len(name.encode()) > 58:
+        raise ValueError(f"Product name {product} is too long for a search table")
+    return name
+
+
+def partition_name(product: str, year: int) -> str:
+    return f"{table_name(product)}_{year:04d}"
+
+
+def _utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def year_bounds(start: datetime, end: datetime, max_span: int) -> tuple[int, int]:
+    """
+    The partitions that can hold datasets overlapping ``start``-``end``.
+
+    Args:
+        start (datetime): Start of the searched time range (naive means UTC).
+        end (datetime): End of the searched time range.
+        max_span (int): Most years any dataset's time range crosses.
+
+    Returns:
+        tuple[int, int]: First and last partition year, inclusive.
+    """
+    return _utc(start).year - max_span, _utc(end).year
+
+
+def _pair(value) -> tuple:
+    """``(low, high)`` of a search value or range; either end of a range may be None."""
+    if not isinstance(value, (list, tuple)):
+        return value, value
+    low, high = value[0], value[-1]
+    if low is not None and high is not None and low > high:
+        return high, low
+    return low, high
+
+
+def search_query(
+    product: str,
+    srid: int,
+    max_span: int,
+    time: tuple[datetime, datetime] | None = None,
+    lon=None,
+    lat=None,
+    cloud_cover=None,
+    region_code: str | None = None,
+    platform: str | None = None,
+) -> tuple[sql.Composed, list]:
+    """
+    The query returning the ids of ``product``'s datasets matching a search.
+
+    Args:
+        product (str): Product name.
+        srid (int): SRID of the table's footprints.
+        max_span (int): Most years any dataset's time range crosses.
+        time (tuple[datetime, datetime] | None): Searched time range, matched by overlap.
+        lon, lat: Longitude and latitude, a value or a range, matched against footprints.
+        cloud_cover: A value or a ``(low, high)`` range.
+        region_code (str | None): Exact region code.
+        platform (str | None): Exact platform.
+
+    Returns:
+        tuple[sql.Composed, list]: The query and its parameters.
+    """
+    conditions, params = [], []
+    if time is not None:
+        start, end = time
+        conditions.append("year BETWEEN %s AND %s AND time_start <= %s AND time_end >= %s")
+        params += [*year_bounds(start, end, max_span), end, start]
+    if lon is not None or lat is not None:
+        west, east = _pair(lon) if lon is not None else (-180, 180)
+        south, north = _pair(lat) if lat is not None else (-90, 90)
+        conditions.append("ST_Intersects(footprint, ST_Transform(ST_MakeEnvelope(%s, %s, %s, %s, 4326), %s))")
+        params += [west, south, east, north, srid]
+    if cloud_cover is not None:
+        low, high = _pair(cloud_cover)
+        if low is not None:
+            conditions.append("cloud_cover >= %s")
+            params.append(low)
+        if high is not None:
+            conditions.append("cloud_cover <= %s")
+            params.append(high)
+    for field, value in (("region_code", region_code), ("platform", platform)):
+        if value is not None:
+            conditions.append(f"{field} = %s")
+            params.append(value)
+    query = sql.SQL("SELECT id::text FROM {} WHERE {}").format(
+        sql.Identifier(PIKSEL_SCHEMA, table_name(product)),
+        sql.SQL(" AND ".join(conditions) or "true"),
+    )
+    return query, params
+
+
+def ensure_tables(connection) -> None:
+    """Create the state table and the ``odc.dataset.updated`` index if missing."""
+    previous = connection.autocommit
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cur:
+            ensure_piksel_schema(cur)
+            cur.execute(CREATE_STATE_TABLE)
+            ensure_updated_index(cur)
+    finally:
+        connection.autocommit = previous
+
+
+def _has_state_table(cur) -> bool:
+    cur.execute("SELECT to_regclass(%s)", (f"{PIKSEL_SCHEMA}.{STATE_TABLE}",))
+    return cur.fetchone()[0] is not None
+
+
+def _state(cur, product: str) -> SearchTableState | None:
+    cur.execute(
+        f"SELECT product, srid, high_water, max_span, datasets FROM {PIKSEL_SCHEMA}.{STATE_TABLE} "
+        "WHERE product = %s",
+        (product,),
+    )
+    row = cur.fetchone()
+    return SearchTableState(*row) if row else None
+
+
+def products_with_tables(connection) -> list[str]:
+    """The products that have a search table."""
+    with connection, connection.cursor() as cur:
+        if not _has_state_table(cur):
+            return []
+        cur.execute(f"SELECT product FROM {PIKSEL_SCHEMA}.{STATE_TABLE} ORDER BY product")
+        return [row[0] for row in cur.fetchall()]
+
+
+def _product_id(cur, product: str) -> int:
+    cur.execute(f"SELECT id FROM {ODC_SCHEMA}.product WHERE name = %s", (product,))
+    row = cur.fetchone()
+    if row is None:
+        raise ValueError(f"Product {product} does not exist")
+    return row[0]
+
+
+def _default_srid(cur) -> int:
+    """EPSG:4326 if it has a spatial index, otherwise the lowest SRID with one (4326 without any)."""
+    cur.execute(f"SELECT srid FROM {ODC_SCHEMA}.spatial_indicies ORDER BY srid <> 4326, srid LIMIT 1")
+    row = cur.fetchone()
+    return row[0] if row else 4326
+
+
+def _spatial_table(cur, srid: int) -> str | None:
+    cur.execute(f"SELECT table_name FROM {ODC_SCHEMA}.spatial_indicies WHERE srid = %s", (srid,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _create_table(cur, product: str, srid: int) -> None:
+    table = sql.Identifier(PIKSEL_SCHEMA, table_name(product))
+    cur.execute(sql.SQL("DROP TABLE IF EXISTS {} CASCADE").format(table))
+    cur.execute(
+        sql.SQL(
+            """
+            CREATE TABLE {} (
+                id uuid NOT NULL,
+                year integer NOT NULL,
+                time_start timestamptz,
+                time_end timestamptz,
+                footprint geometry(Geometry, {}),
+                cloud_cover double precision,
+                region_code text,
+                platform text,
+                PRIMARY KEY (id, year)
+            ) PARTITION BY RANGE (year)
+            """
+        ).format(table, sql.Literal(srid))
+    )
+    cur.execute(sql.SQL("CREATE INDEX ON {} USING gist (footprint)").format(table))
+    cur.execute(sql.SQL("CREATE INDEX ON {} (time_start, time_end)").format(table))
+    cur.execute(sql.SQL("CREATE INDEX ON {} (region_code, time_start)").format(table))
+    cur.execute(sql.SQL("CREATE INDEX ON {} (cloud_cover)").format(table))
+
+
+def ensure_partitions(cur, product: str, years: Iterable[int]) -> int:
+    """Create the missing year partitions of ``product``'s table; returns how many were created."""
+    created = 0
+    for year in sorted(set(years)):
+        cur.execute("SELECT to_regclass(%s)", (f"{PIKSEL_SCHEMA}.{partition_name(product, year)}",))
+        if cur.fetchone()[0] is not None:
+            continue
+        cur.execute(
+            sql.SQL("CREATE TABLE {} PARTITION OF {} FOR VALUES FROM ({}) TO ({})").format(
+                sql.Identifier(PIKSEL_SCHEMA, partition_name(product, year)),
+                sql.Identifier(PIKSEL_SCHEMA, table_name(product)),
+                sql.Literal(year),
+                sql.Literal(year + 1),
+            )
+        )
+        created += 1
+    return created
+
+
+def _joins(spatial: str | None, srid: int) -> tuple[sql.Composable, sql.Composable]:
+    envelope = sql.SQL(
+        "ST_Transform(ST_MakeEnvelope((d.metadata #>> '{{extent,lon,begin}}')::float8, "
+        "(d.metadata #>> '{{extent,lat,begin}}')::float8, (d.metadata #>> '{{extent,lon,end}}')::float8, "
+        "(d.metadata #>> '{{extent,lat,end}}')::float8, 4326), {})"
+    ).format(sql.Literal(srid))
+    if spatial is None:
+        return sql.SQL(""), envelope
+    join = sql.SQL("LEFT JOIN {} s ON s.dataset_ref = d.id").format(sql.Identifier(ODC_SCHEMA, spatial))
+    return join, sql.SQL("COALESCE(s.extent, {})").format(envelope)
+
+
+def _where(by_id: bool) -> sql.Composable:
+    return sql.SQL("d.product_ref = %s AND d.archived IS NULL{}").format(
+        sql.SQL(" AND d.id = ANY(%s::uuid[])" if by_id else "")
+    )
+
+
+def _years_query(by_id: bool) -> sql.Composed:
+    return sql.SQL(
+        "SELECT DISTINCT {year} FROM {dataset} d "
+        "LEFT JOIN {datetime} t ON t.dataset_ref = d.id AND t.search_key = 'time' WHERE {where}"
+    ).format(
+        year=_YEAR,
+        dataset=sql.Identifier(ODC_SCHEMA, "dataset"),
+        datetime=sql.Identifier(ODC_SCHEMA, "dataset_search_datetime"),
+        where=_where(by_id),
+    )
+
+
+def _insert_query(product: str, spatial: str | None, srid: int, by_id: bool) -> sql.Composed:
+    """Insert the rows of active datasets; returns their count and the most years one spans."""
+    spatial_join, footprint = _joins(spatial, srid)
+    return sql.SQL(
+        """
+        WITH inserted AS (
+            INSERT INTO {table} (id, year, time_start, time_end, footprint, cloud_cover, region_code, platform)
+            SELECT d.id, {year}, lower(t.search_val), upper(t.search_val), {footprint},
+                   lower(c.search_val)::float8, r.search_val, p.search_val
+            FROM {dataset} d
+            {spatial_join}
+            LEFT JOIN {datetime} t ON t.dataset_ref = d.id AND t.search_key = 'time'
+            LEFT JOIN {num} c ON c.dataset_ref = d.id AND c.search_key = 'cloud_cover'
+            LEFT JOIN {string} r ON r.dataset_ref = d.id AND r.search_key = 'region_code'
+            LEFT JOIN {string} p ON p.dataset_ref = d.id AND p.search_key = 'platform'
+            WHERE {where}
+            RETURNING year, time_end
+        )
+        SELECT count(*), COALESCE(max(extract(year FROM time_end AT TIME ZONE 'UTC')::integer - year)
+                                  FILTER (WHERE year <> {no_year}), 0)
+        FROM inserted
+        """
+    ).format(
+        table=sql.Identifier(PIKSEL_SCHEMA, table_name(product)),
+        year=_YEAR,
+        footprint=footprint,
+        dataset=sql.Identifier(ODC_SCHEMA, "dataset"),
+        spatial_join=spatial_join,
+        datetime=sql.Identifier(ODC_SCHEMA, "dataset_search_datetime"),
+        num=sql.Identifier(ODC_SCHEMA, "dataset_search_num"),
+        string=sql.Identifier(ODC_SCHEMA, "dataset_search_string"),
+        where=_where(by_id),
+        no_year=sql.Literal(NO_YEAR),
+    )
+
+
+def _batched(ids: Sequence, size: int):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def refresh_product(connection, product: str, srid: int | None = None, full: bool = False) -> RefreshReport:
+    """
+    Create or bring up to date the search table of ``product``.
+
+    Args:
+        connection: psycopg2 connection to the ODC database.
+        product (str): Product name.
+        srid (int | None): CRS of the footprints, None to keep the table's
+            (or pick a spatial index for a new table). A different SRID rebuilds the table.
+        full (bool): Reload every dataset instead of applying changes.
+
+    Returns:
+        RefreshReport: What was applied.
+    """
+    started = time.monotonic()
+    ensure_tables(connection)
+    with connection, connection.cursor() as cur:
+        product_id = _product_id(cur, product)
+        state = _state(cur, product)
+        srid = srid or (state.srid if state else _default_srid(cur))
+        if state is None or state.srid != srid:
+            # A new (empty) table, committed before it is filled
+            _create_table(cur, product, srid)
+            state = None
+
+    with connection, connection.cursor() as cur:
+        cutoff = transaction_cutoff(cur)
+        spatial = _spatial_table(cur, srid)
+        if state is None or full:
+            ids = None
+        else:
+            cur.execute(
+                f"SELECT id::text FROM {ODC_SCHEMA}.dataset WHERE product_ref = %s AND updated >= %s",
+                (product_id, state.high_water),
+            )
+            ids = [row[0] for row in cur.fetchall()]
+        years = set()
+        for batch in [None] if ids is None else _batched(ids, _BATCH):
+            cur.execute(_years_query(batch is not None), (product_id,) if batch is None else (product_id, batch))
+            years.update(row[0] for row in cur.fetchall())
+        # New partitions are committed on their own, so readers are blocked only briefly
+        partitions = ensure_partitions(cur, product, years)
+
+    table = sql.Identifier(PIKSEL_SCHEMA, table_name(product))
+    with connection, connection.cursor() as cur:
+        if ids is None:
+            cur.execute(sql.SQL("DELETE FROM {}").format(table))
+            cur.execute(_insert_query(product, spatial, srid, by_id=False), (product_id,))
+            datasets, max_span = cur.fetchone()
+        else:
+            datasets, max_span = state.datasets, state.max_span
+            for batch in _batched(ids, _BATCH):
+                cur.execute(sql.SQL("DELETE FROM {} WHERE id = ANY(%s::uuid[])").format(table), (batch,))
+                datasets -= cur.rowcount
+                cur.execute(_insert_query(product, spatial, srid, by_id=True), (product_id, batch))
+                inserted, span = cur.fetchone()
+                datasets += inserted
+                max_span = max(max_span, span)
+            cur.execute(
+                f"SELECT count(*) FROM {ODC_SCHEMA}.dataset WHERE product_ref = %s AND archived IS NULL",
+                (product_id,),
+            )
+            active = cur.fetchone()[0]
+            if active != datasets:
+                # Datasets deleted outright never show up as updated
+                cur.execute(
+                    sql.SQL(
+                        "DELETE FROM {} t WHERE NOT EXISTS (SELECT 1 FROM {} d "
+                        "WHERE d.id = t.id AND d.archived IS NULL)"
+                    ).format(table, sql.Identifier(ODC_SCHEMA, "dataset"))
+                )
+                datasets -= cur.rowcount
+        cur.execute(
+            f"""
+            INSERT INTO {PIKSEL_SCHEMA}.{STATE_TABLE} (product, srid, high_water, max_span, datasets)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (product) DO UPDATE SET
+                srid = EXCLUDED.srid, high_water = EXCLUDED.high_water, max_span = EXCLUDED.max_span,
+                datasets = EXCLUDED.datasets, updated = now()
+            """,
+            (product, srid, cutoff, max_span, datasets),
+        )
+    return RefreshReport(
+        product, datasets, len(ids) if ids is not None else datasets, partitions, ids is None,
+        time.monotonic() - started,
+    )
+
+
+def drop_table(cursor, product: str) -> bool:
+    """Drop the search table of ``product`` and forget it; returns whether there was one."""
+    try:
+        name = table_name(product)
+    except ValueError:
+        # Too long a name to have been given a table
+        return False
+    if not _has_state_table(cursor):
+        return False
+    cursor.execute(sql.SQL("DROP TABLE IF EXISTS {} CASCADE").format(sql.Identifier(PIKSEL_SCHEMA, name)))
+    cursor.execute(f"DELETE FROM {PIKSEL_SCHEMA}.{STATE_TABLE} WHERE product = %s", (product,))
+    return cursor.rowcount > 0
+
+
+def search(cursor, product: str, **terms) -> list[str] | None:
+    """
+    Ids of ``product``'s datasets matching a search, from its search table.
+
+    Args:
+        cursor: psycopg2 cursor on the ODC database.
+        product (str): Product name.
+        **terms: ``time`` as a ``(start, end)`` pair of datetimes, and ``lon``,
+            ``lat``, ``cloud_cover``, ``region_code``, ``platform`` as for
+            ``dc.find_datasets``.
+
+    Returns:
+        list[str] | None: Dataset ids, or None when the product has no
+        current search table or the search uses other terms.
+    """
+    if set(terms) - SEARCH_KEYS or not _has_state_table(cursor):
+        return None
+    state = _state(cursor, product)
+    if state is None:
+        return None
+    cursor.execute(
+        f"SELECT EXISTS (SELECT 1 FROM {ODC_SCHEMA}.dataset WHERE updated >= %s "
+        f"AND product_ref = (SELECT id FROM {ODC_SCHEMA}.product WHERE name = %s))",
+        (state.high_water, product),
+    )
+    if cursor.fetchone()[0]:
+        return None
+    query, params = search_query(product, state.srid, state.max_span, **terms)
+    cursor.execute(query, params)
+    return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,52 @@
+"""
+Per-product search tables (see ``piksel_core.search_tables``).
+
+``--products`` creates the tables of products that have none yet and
+refreshes them; without it, every existing table is refreshed with the
+datasets changed since its previous refresh, which is what the Makefile runs
+after each indexing target. ``--drop`` removes tables again.
+"""
+
+import click
+from datacube.ui.click import environment_option, pass_config
+
+from piksel_core.db import connect
+from piksel_core.search_tables import drop_table, products_with_tables, refresh_product
+
+
+@click.command("search-tables")
+@environment_option
+@pass_config
+@click.option("--products", type=str, default=None,
+              help="Comma separated products to create or refresh (default: those with a table).")
+@click.option("--epsg", "srid", type=int, default=None,
+              help="Footprint CRS of new tables (default: the EPSG:4326 spatial index, or the lowest "
+                   "EPSG with one); a different EPSG rebuilds an existing table.")
+@click.option("--full", is_flag=True, default=False, help="Reload every dataset instead of applying changes.")
+@click.option("--drop", is_flag=True, default=False, help="Drop the tables of --products instead.")
+@click.option("--quiet", is_flag=True, default=False, help="Only report errors.")
+def cli(cfg_env, products, srid, full, drop, quiet):
+    """
+    Create, refresh or drop denormalised per-product search tables.
+    """
+    names = [p.strip() for p in products.split(",") if p.strip()] if products else []
+    if drop and not names:
+        raise click.UsageError("--drop needs --products")
+    connection = connect(cfg_env, application_name="piksel-search-tables")
+    try:
+        if drop:
+            for name in names:
+                with connection, connection.cursor() as cur:
+                    dropped = drop_table(cur, name)
+                if not quiet:
+                    print(f"{name}: {'dropped' if dropped else 'no search table'}")
+            return
+        for name in names or products_with_tables(connection):
+            try:
+                report = refresh_product(connection, name, srid, full)
+            except ValueError as e:
+                raise click.ClickException(str(e)) from e
+            if not quiet:
+                print(report)
+    finally:
+        connection.close()
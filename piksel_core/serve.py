@@ -0,0 +1,35 @@
+"""
+``serve``: the odc container's main process (see ``piksel_core.server``).
+
+Run commands through it with ``python -m piksel_core.client <command> ...``.
+"""
+
+import signal
+import sys
+
+import click
+from datacube.ui.click import environment_option, pass_config
+
+from piksel_core.client import DEFAULT_SOCKET, SOCKET_ENV
+from piksel_core.server import CommandServer, warm_up
+
+
+@click.command("serve")
+@environment_option
+@pass_config
+@click.option("--socket", "path", type=click.Path(dir_okay=False), envvar=SOCKET_ENV, default=DEFAULT_SOCKET,
+              show_default=True, help=f"Unix socket to listen on (also ${SOCKET_ENV}).")
+def cli(cfg_env, path):
+    """
+    Keep datacube and the indexing tools imported and run client commands in warm processes.
+    """
+    loaded = warm_up(cfg_env)
+    try:
+        server = CommandServer(path, env=cfg_env)
+    except RuntimeError as e:
+        raise click.ClickException(str(e)) from e
+    # As PID 1 the default SIGTERM action would be ignored
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"Serving {', '.join(loaded)} on {path}", flush=True)
+    with server:
+        server.serve_forever()
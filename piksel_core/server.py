@@ -0,0 +1,273 @@
+"""
+Warm command server for the odc container.
+
+Every ``docker compose exec odc datacube ...`` used to start a new Python
+process that spent seconds importing datacube, SQLAlchemy, GDAL/rasterio and
+the dc-tools before doing any work. The server does those imports once and
+constructs a ``Datacube`` (loading the index driver) at start-up, then listens
+on a Unix socket. Each job is handled in a process forked from that warm
+state: it receives the client's stdin, stdout and stderr (``SCM_RIGHTS``), its
+working directory and environment, runs the requested console script or
+``piksel_core`` command in-process and reports the exit status. Output
+streams straight to the client's terminal, child processes the command
+spawns inherit the same descriptors, and a job whose client disconnects is
+interrupted.
+
+Database connections are not shared between jobs: a pooled connection must
+not cross a ``fork``, so the warm ``Datacube`` is closed before serving and
+every job opens its own. ``ping`` (the container healthcheck) makes one round
+trip on a connection of its own.
+
+Protocol: one JSON line per message. Requests are ``{"op": "ping"}`` or
+``{"op": "run", "argv": [...], "cwd": ..., "env": {...}}`` with three file
+descriptors attached; a run is answered with ``{"pid": ...}`` and then
+``{"exit": ...}``.
+
+The dc-tools record no telemetry of their own, so a ``stac-to-dc`` or
+``s3-to-dc`` job is timed as a whole and its datasets are counted from the
+summary line it prints.
+"""
+
+import json
+import os
+import select
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from collections.abc import Callable
+from importlib.metadata import entry_points
+
+from piksel_core import telemetry
+from piksel_core.client import PIKSEL_CORE, send_message
+from piksel_core.indexbench import tool_counts
+
+# Console scripts imported before serving; missing ones are skipped
+WARM_COMMANDS = (PIKSEL_CORE, "datacube", "stac-to-dc", "s3-to-dc")
+
+# Indexers timed and counted by the server
+DC_TOOLS = ("stac-to-dc", "s3-to-dc")
+
+# Largest request read together with its file descriptors
+_FIRST_READ = 1 << 16
+
+# Trailing output of a dc-tools job kept to read its summary line from
+_TAIL = 1 << 14
+
+
+class _Tail:
+    """A text stream that also keeps the last characters written to it."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.text = ""
+
+    def write(self, s: str) -> int:
+        self.text = (self.text + s)[-_TAIL:]
+        return self._stream.write(s)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _renamed_product(argv: list[str]) -> str | None:
+    for i, arg in enumerate(argv):
+        if arg.startswith("--rename-product="):
+            return arg.partition("=")[2]
+        if arg == "--rename-product" and i + 1 < len(argv):
+            return argv[i + 1]
+    return None
+
+
+def console_command(name: str):
+    """The click command of console script ``name``, or of ``python -m piksel_core``."""
+    if name == PIKSEL_CORE:
+        from piksel_core.cli import cli
+
+        return cli
+    found = entry_points(group="console_scripts", name=name)
+    if not found:
+        raise SystemExit(f"No console script named {name}")
+    return next(iter(found)).load()
+
+
+def exit_status(code) -> int:
+    """The process exit status for a ``SystemExit`` code, as the interpreter would use it."""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def warm_up(env: str | None = None, commands=WARM_COMMANDS) -> list[str]:
+    """
+    Import the commands and load the datacube index driver.
+
+    Returns:
+        list[str]: The commands that could be imported.
+    """
+    loaded = []
+    for name in commands:
+        try:
+            console_command(name)
+        except (ImportError, SystemExit) as e:
+            print(f"Not preloading {name}: {e}", file=sys.stderr)
+            continue
+        loaded.append(name)
+    try:
+        from datacube import Datacube
+
+        Datacube(env=env, app="piksel-serve").close()
+    except Exception as e:  # noqa: BLE001 - the database may not be initialised yet
+        print(f"Datacube not preloaded: {e}", file=sys.stderr)
+    return loaded
+
+
+def _interrupt_when_closed(sock: socket.socket, stop: int) -> None:
+    """Send SIGINT to this process if the client hangs up before ``stop`` is readable."""
+    readable, _, _ = select.select([sock, stop], [], [])
+    if stop not in readable and not sock.recv(1, socket.MSG_PEEK):
+        os.kill(os.getpid(), signal.SIGINT)
+
+
+class _JobHandler(socketserver.BaseRequestHandler):
+    """Runs in the forked process; answers one request."""
+
+    def handle(self):
+        data, fds, _, _ = socket.recv_fds(self.request, _FIRST_READ, 3)
+        while data and not data.endswith(b"\n"):
+            chunk = self.request.recv(_FIRST_READ)
+            if not chunk:
+                break
+            data += chunk
+        if not data:
+            return
+        message = json.loads(data)
+        if message.get("op") == "ping":
+            send_message(self.request, self.server.status())
+        elif message.get("op") == "run" and len(fds) == 3:
+            send_message(self.request, {"pid": os.getpid()})
+            send_message(self.request, {"exit": self.server.run_job(self.request, message, fds)})
+        else:
+            send_message(self.request, {"exit": 2, "error": f"Bad request: {message.get('op')}"})
+        for fd in fds:
+            os.close(fd)
+
+
+class CommandServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    """
+    Forks a warm process per request on a Unix socket.
+
+    Args:
+        path (str): Socket path; a stale socket left by a previous server is replaced.
+        env (ODCEnvironment | str | None): Datacube environment used by ``ping``, as
+            ``serve`` receives it from ``pass_config``.
+        resolve (Callable): Maps a command name to an object with click's
+            ``main(args=, prog_name=)``.
+    """
+
+    block_on_close = False
+
+    def __init__(self, path: str, env: str | None = None, resolve: Callable = console_command):
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(path)
+            else:
+                raise RuntimeError(f"A server is already listening on {path}")
+            finally:
+                probe.close()
+        super().__init__(path, _JobHandler)
+        self.path = path
+        self.env = env
+        self.resolve = resolve
+        self.started = time.time()
+        self.requests = 0
+
+    def process_request(self, request, client_address):
+        self.requests += 1
+        sys.stdout.flush()
+        sys.stderr.flush()
+        super().process_request(request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def status(self) -> dict:
+        """Server uptime and request count, and whether the database answers."""
+        status = {
+            "ok": True,
+            "pid": os.getppid(),
+            "uptime": round(time.time() - self.started, 1),
+            "requests": self.requests,
+        }
+        try:
+            from piksel_core.db import connect
+
+            connection = connect(self.env, application_name="piksel-serve")
+            try:
+                with connection.cursor() as cur:
+                    cur.execute("SELECT 1")
+            finally:
+                connection.close()
+            status["database"] = "ok"
+        except Exception as e:  # noqa: BLE001 - reported to the healthcheck
+            status.update(ok=False, database=str(e).strip())
+        return status
+
+    def run_job(self, sock: socket.socket, message: dict, fds: list[int]) -> int:
+        """Run ``message["argv"]`` on the client's stdio; returns its exit status."""
+        os.chdir(message.get("cwd") or "/")
+        os.environ.clear()
+        os.environ.update(message.get("env") or {})
+        for target, fd in zip((0, 1, 2), fds):
+            os.dup2(fd, target)
+        # Line-buffered, whatever the server's own stdout was
+        sys.stdin = open(0, closefd=False)
+        sys.stdout = open(1, "w", buffering=1, closefd=False)
+        sys.stderr = open(2, "w", buffering=1, closefd=False)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+        stop_read, stop_write = os.pipe()
+        watcher = threading.Thread(target=_interrupt_when_closed, args=(sock, stop_read), daemon=True)
+        watcher.start()
+        argv = message["argv"]
+        command = os.path.basename(argv[0])
+        telemetry.start(command)
+        if command in DC_TOOLS:
+            sys.stdout = _Tail(sys.stdout)
+        started = time.perf_counter()
+        try:
+            self.resolve(argv[0]).main(args=argv[1:], prog_name=argv[0])
+            code = 0
+        except SystemExit as e:
+            code = exit_status(e.code)
+        except KeyboardInterrupt:
+            code = 130
+        except Exception:  # noqa: BLE001 - reported like an uncaught exception
+            traceback.print_exc()
+            code = 1
+        finally:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            if isinstance(sys.stdout, _Tail):
+                telemetry.observe("command", time.perf_counter() - started)
+                telemetry.count_by("datasets", {
+                    (_renamed_product(argv), status): n for status, n in tool_counts(sys.stdout.text).items()
+                }, "product", "status")
+            # The forked job exits without running atexit handlers
+            telemetry.flush()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.write(stop_write, b"x")
+            watcher.join()
+        return code
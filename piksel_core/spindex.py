@@ -0,0 +1,215 @@
+"""
+Incremental maintenance of the ODC spatial indexes (``odc.spatial_<srid>``).
+
+``datacube spindex update`` recomputes the extent of every dataset. Here only
+datasets changed since the previous run are considered: ``odc.dataset.updated``
+is set on insert and by datacube's update trigger on every later change
+(including archiving and restoring), so a per-SRID watermark in
+``piksel.spindex_watermark`` finds them through an index. Of those, datasets
+that have no row in the spatial table yet, or were modified after they were
+added, are re-extented with ``update_spatial_index(dataset_ids=...)`` in
+parallel batches; datasets indexed together with their spatial rows (as
+``datacube``, ``stac-to-dc`` and the bulk writer do) cost nothing.
+
+The new watermark is the start of the oldest transaction still open when the
+changes were read, so datasets committed later by a long-running indexer are
+never skipped. ``check`` audits a whole table instead, for rows that are
+missing or no longer overlap the dataset's own lat/lon extent.
+"""
+
+import concurrent.futures
+import time
+from collections.abc import Iterable, Iterator, Sequence
+from datetime import datetime
+from typing import NamedTuple
+
+from datacube import Datacube
+
+from piksel_core import telemetry
+from piksel_core.bulk_indexing import SpatialTable, spatial_tables
+from piksel_core.db import ODC_SCHEMA, PIKSEL_SCHEMA, ensure_piksel_schema, ensure_updated_index, transaction_cutoff
+
+CREATE_WATERMARK_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {PIKSEL_SCHEMA}.spindex_watermark (
+    srid integer PRIMARY KEY,
+    high_water timestamptz NOT NULL,
+    datasets_updated bigint NOT NULL DEFAULT 0,
+    updated timestamptz NOT NULL DEFAULT now()
+)
+"""
+
+_HAS_GRID = "d.metadata #> '{grid_spatial,projection}' IS NOT NULL"
+
+
+class SpindexReport(NamedTuple):
+    """Outcome of maintaining one spatial index."""
+
+    srid: int
+    changed: int
+    updated: int
+    seconds: float
+
+    def __str__(self) -> str:
+        return (
+            f"EPSG:{self.srid}: {self.changed} changed datasets need an extent, "
+            f"{self.updated} updated in {self.seconds:.1f}s"
+        )
+
+
+def batched(ids: Sequence, size: int) -> Iterator[Sequence]:
+    """Consecutive slices of at most ``size`` ids."""
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def ensure_watermarks(connection) -> None:
+    """Create the watermark table and the ``odc.dataset.updated`` index if missing."""
+    previous = connection.autocommit
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cur:
+            ensure_piksel_schema(cur)
+            cur.execute(CREATE_WATERMARK_TABLE)
+            ensure_updated_index(cur)
+    finally:
+        connection.autocommit = previous
+
+
+def get_watermark(connection, srid: int) -> datetime | None:
+    with connection, connection.cursor() as cur:
+        cur.execute(f"SELECT high_water FROM {PIKSEL_SCHEMA}.spindex_watermark WHERE srid = %s", (srid,))
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def set_watermark(connection, srid: int, high_water: datetime, datasets_updated: int) -> None:
+    """Advance the watermark of ``srid``; it never moves backwards."""
+    with connection, connection.cursor() as cur:
+        cur.execute(
+            f"""
+            INSERT INTO {PIKSEL_SCHEMA}.spindex_watermark (srid, high_water, datasets_updated)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (srid) DO UPDATE SET
+                high_water = GREATEST(spindex_watermark.high_water, EXCLUDED.high_water),
+                datasets_updated = spindex_watermark.datasets_updated + EXCLUDED.datasets_updated,
+                updated = now()
+            """,
+            (srid, high_water, datasets_updated),
+        )
+
+
+def reset_watermarks(connection, srids: Iterable[int]) -> None:
+    with connection, connection.cursor() as cur:
+        cur.execute(f"DELETE FROM {PIKSEL_SCHEMA}.spindex_watermark WHERE srid = ANY(%s)", (list(srids),))
+
+
+def changed_datasets(connection, spatial: SpatialTable, since: datetime | None) -> tuple[list, datetime]:
+    """
+    Datasets changed at or after ``since`` whose spatial row is missing or may be stale.
+
+    Returns:
+        tuple[list, datetime]: The dataset ids and the watermark to store once
+        they are processed.
+    """
+    with connection, connection.cursor() as cur:
+        cutoff = transaction_cutoff(cur)
+        query = (
+            f"SELECT d.id FROM {ODC_SCHEMA}.dataset d "
+            f"LEFT JOIN {ODC_SCHEMA}.{spatial.table} s ON s.dataset_ref = d.id "
+            f"WHERE {_HAS_GRID} AND (s.dataset_ref IS NULL OR d.updated > d.added)"
+        )
+        params: tuple = ()
+        if since is not None:
+            query += " AND d.updated >= %s"
+            params = (since,)
+        cur.execute(query, params)
+        ids = [row[0] for row in cur.fetchall()]
+    return ids, cutoff
+
+
+def check(connection, spatial: SpatialTable, product: str | None = None) -> tuple[list, list]:
+    """
+    Audit a spatial table against the datasets.
+
+    Returns:
+        tuple[list, list]: Ids of datasets with a grid but no spatial row, and
+        of datasets whose spatial row does not overlap their lat/lon extent.
+    """
+    product_filter = ""
+    params: tuple = ()
+    if product:
+        product_filter = f" AND d.product_ref = (SELECT id FROM {ODC_SCHEMA}.product WHERE name = %s)"
+        params = (product,)
+    with connection, connection.cursor() as cur:
+        cur.execute(
+            f"SELECT d.id FROM {ODC_SCHEMA}.dataset d "
+            f"LEFT JOIN {ODC_SCHEMA}.{spatial.table} s ON s.dataset_ref = d.id "
+            f"WHERE {_HAS_GRID} AND s.dataset_ref IS NULL{product_filter}",
+            params,
+        )
+        missing = [row[0] for row in cur.fetchall()]
+        cur.execute(
+            f"""
+            SELECT d.id FROM {ODC_SCHEMA}.dataset d
+            JOIN {ODC_SCHEMA}.{spatial.table} s ON s.dataset_ref = d.id
+            WHERE d.metadata #> '{{extent,lon}}' IS NOT NULL{product_filter}
+              AND NOT ST_Intersects(s.extent, ST_Transform(ST_Expand(ST_MakeEnvelope(
+                    (d.metadata #>> '{{extent,lon,begin}}')::float8,
+                    (d.metadata #>> '{{extent,lat,begin}}')::float8,
+                    (d.metadata #>> '{{extent,lon,end}}')::float8,
+                    (d.metadata #>> '{{extent,lat,end}}')::float8, 4326), 0.01), %s))
+            """,
+            (*params, spatial.srid),
+        )
+        stale = [row[0] for row in cur.fetchall()]
+    return missing, stale
+
+
+def update_extents(dc: Datacube, spatial: SpatialTable, ids: Sequence, batch_size: int, workers: int) -> int:
+    """Recompute the spatial rows of ``ids`` in parallel batches, one transaction each."""
+    if not ids:
+        return 0
+    updated = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(dc.index.update_spatial_index, crses=[spatial.crs], dataset_ids=list(batch))
+            for batch in batched(ids, batch_size)
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            updated += future.result()
+    return updated
+
+
+def update_changed(
+    dc: Datacube,
+    connection,
+    srids: Sequence[int] = (),
+    batch_size: int = 1000,
+    workers: int = 4,
+) -> list[SpindexReport]:
+    """
+    Bring every (or the given) spatial index up to date with the datasets changed since the last run.
+
+    Args:
+        dc (Datacube): Datacube whose index writes the spatial rows.
+        connection: psycopg2 connection to the same database.
+        srids (Sequence[int]): Spatial indexes to maintain, empty for all.
+        batch_size (int): Datasets per ``update_spatial_index`` transaction.
+        workers (int): Batches processed concurrently.
+
+    Returns:
+        list[SpindexReport]: One report per spatial index.
+    """
+    ensure_watermarks(connection)
+    reports = []
+    for spatial in spatial_tables(connection):
+        if srids and spatial.srid not in srids:
+            continue
+        started = time.monotonic()
+        with telemetry.timer("spindex", log=True, srid=spatial.srid):
+            ids, cutoff = changed_datasets(connection, spatial, get_watermark(connection, spatial.srid))
+            updated = update_extents(dc, spatial, ids, batch_size, workers)
+            set_watermark(connection, spatial.srid, cutoff, len(ids))
+        telemetry.count("rows", updated, table=f"{ODC_SCHEMA}.{spatial.table}")
+        reports.append(SpindexReport(spatial.srid, len(ids), updated, time.monotonic() - started))
+    return reports
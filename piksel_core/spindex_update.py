@@ -0,0 +1,75 @@
+"""
+Incremental spatial-index maintenance (see ``piksel_core.spindex``).
+
+Replaces ``datacube spindex update <EPSG>`` for routine runs: only datasets
+added, updated or archived since the previous run are looked at, and only
+those without a current spatial row are re-extented. ``--check`` audits whole
+tables for missing or stale rows instead and ``--fix`` repairs what it finds,
+without a full rebuild.
+"""
+
+import sys
+import time
+
+import click
+from datacube import Datacube
+from datacube.ui.click import environment_option, pass_config
+
+from piksel_core.bulk_indexing import spatial_tables
+from piksel_core.db import connect
+from piksel_core.spindex import check, ensure_watermarks, reset_watermarks, update_changed, update_extents
+
+
+@click.command("spindex-update")
+@environment_option
+@pass_config
+@click.option("--epsg", "srids", type=int, multiple=True,
+              help="Spatial index to maintain (repeatable, default: all).")
+@click.option("--batch-size", type=int, default=1000, show_default=True,
+              help="Datasets per update transaction.")
+@click.option("--workers", type=int, default=4, show_default=True,
+              help="Batches updated concurrently.")
+@click.option("--reset", is_flag=True, default=False,
+              help="Forget the watermarks and look at every dataset once.")
+@click.option("--check", "check_only", is_flag=True, default=False,
+              help="Audit the spatial tables for missing and stale rows instead.")
+@click.option("--product", type=str, default=None, help="Limit --check to one product.")
+@click.option("--fix", is_flag=True, default=False, help="With --check, update the rows found.")
+def cli(cfg_env, srids, batch_size, workers, reset, check_only, product, fix):
+    """
+    Update spatial indexes for datasets changed since the last run.
+    """
+    dc = Datacube(env=cfg_env, app="piksel-spindex-update")
+    connection = connect(cfg_env, application_name="piksel-spindex-update")
+    tables = spatial_tables(connection)
+    unknown = set(srids) - {spatial.srid for spatial in tables}
+    if unknown:
+        raise click.ClickException(
+            f"No spatial index for EPSG:{', '.join(map(str, sorted(unknown)))}, run `make spindex-create` first"
+        )
+
+    if not check_only:
+        if reset:
+            ensure_watermarks(connection)
+            reset_watermarks(connection, srids or [spatial.srid for spatial in tables])
+        for report in update_changed(dc, connection, srids, batch_size, workers):
+            print(report)
+        connection.close()
+        return
+
+    problems = 0
+    for spatial in tables:
+        if srids and spatial.srid not in srids:
+            continue
+        started = time.monotonic()
+        missing, stale = check(connection, spatial, product)
+        print(f"EPSG:{spatial.srid}: {len(missing)} missing, {len(stale)} stale rows "
+              f"({time.monotonic() - started:.1f}s)")
+        if fix and (missing or stale):
+            updated = update_extents(dc, spatial, missing + stale, batch_size, workers)
+            print(f"EPSG:{spatial.srid}: updated {updated} rows")
+        elif missing or stale:
+            problems += len(missing) + len(stale)
+    connection.close()
+    if problems:
+        sys.exit(1)
@@ -0,0 +1,114 @@
+"""
+STAC helpers shared by the piksel-core indexing commands.
+"""
+
+from collections.abc import Iterable, Iterator
+
+from pystac import Item
+from pystac_client import Client, ItemSearch
+
+from piksel_core import telemetry
+
+
+def rewrite_url(url: str, url_string_replace: tuple[str, str] | None) -> str:
+    """
+    Apply a ``(old, new)`` string replacement to a URL.
+
+    Args:
+        url (str): The original URL.
+        url_string_replace (tuple[str, str] | None): The replacement, or None.
+
+    Returns:
+        str: The rewritten URL.
+    """
+    if url_string_replace is None:
+        return url
+    old, new = url_string_replace
+    return url.replace(old, new)
+
+
+def rewrite_item_assets(item: Item, url_string_replace: tuple[str, str] | None) -> Item:
+    """
+    Rewrite the asset hrefs of a STAC item in place.
+
+    The self link is left untouched so the indexed dataset URI still points at
+    the STAC API, exactly as ``stac-to-dc --url-string-replace`` does.
+    """
+    if url_string_replace is not None:
+        for asset in item.assets.values():
+            asset.href = rewrite_url(asset.href, url_string_replace)
+    return item
+
+
+def item_platform(item: Item) -> str | None:
+    """Return the platform of a STAC item, normalised to e.g. ``LANDSAT_8``."""
+    platform = item.properties.get("platform") or item.properties.get("eo:platform")
+    if not platform:
+        return None
+    return platform.upper().replace("-", "_")
+
+
+def _search(
+    catalog_href: str,
+    collections: Iterable[str],
+    bbox: Iterable[float] | None = None,
+    datetime: str | None = None,
+    query: dict | None = None,
+    sortby: str | None = None,
+    page_size: int = 100,
+    max_items: int | None = None,
+) -> ItemSearch:
+    client = Client.open(catalog_href)
+    return client.search(
+        collections=list(collections),
+        bbox=list(bbox) if bbox is not None else None,
+        datetime=datetime,
+        query=query,
+        sortby=sortby,
+        limit=page_size,
+        max_items=max_items,
+    )
+
+
+def search_items(
+    catalog_href: str,
+    collections: Iterable[str],
+    bbox: Iterable[float] | None = None,
+    datetime: str | None = None,
+    query: dict | None = None,
+    sortby: str | None = None,
+    page_size: int = 100,
+    max_items: int | None = None,
+) -> Iterator[Item]:
+    """
+    Page through a STAC API search, yielding items as each page arrives.
+
+    Items are never collected into an ``ItemCollection``, so memory use is
+    bounded by the page size regardless of how many items match.
+    """
+    for page in search_pages(catalog_href, collections, bbox, datetime, query, sortby, page_size, max_items):
+        yield from page
+
+
+def search_pages(
+    catalog_href: str,
+    collections: Iterable[str],
+    bbox: Iterable[float] | None = None,
+    datetime: str | None = None,
+    query: dict | None = None,
+    sortby: str | None = None,
+    page_size: int = 100,
+    max_items: int | None = None,
+) -> Iterator[list[Item]]:
+    """
+    Like ``search_items`` but yield one list of items per API page.
+
+    The wait for each page is recorded as the ``stac_page`` telemetry stage.
+    """
+    collections = list(collections)
+    search = _search(catalog_href, collections, bbox, datetime, query, sortby, page_size, max_items)
+    collection = ",".join(collections)
+    for page in telemetry.timed(search.pages(), "stac_page", log=True, collection=collection):
+        items = list(page.items)
+        telemetry.count("stac_items", len(items), collection=collection)
+        yield items
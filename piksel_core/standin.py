@@ -0,0 +1,480 @@
+"""
+Local stand-in services for testing and benchmarking the indexers offline.
+
+``StacStandin`` serves a fixed list of STAC item dictionaries through a minimal
+STAC API (landing page + paginated ``/search``), which is enough for
+``pystac_client`` and therefore for ``stac-to-dc`` and the piksel-core indexers.
+
+    with StacStandin(items) as stac:
+        search_items(stac.url, ["landsat-c2l2-sr"], ...)
+
+``S3Standin`` serves objects from memory through the S3 calls ``s3-to-dc``
+makes (``ListObjectsV2``, ``GetObject``, ``HeadObject``), addressed path-style:
+
+    with S3Standin({"gm/x1y1.stac-item.json": body}, bucket="piksel-bench") as s3:
+        env = {**os.environ, **s3.environment()}   # for botocore/aiobotocore clients
+"""
+
+import email.utils
+import hashlib
+import json
+import threading
+from collections.abc import Iterable, Mapping
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlparse
+from xml.sax.saxutils import escape
+
+CONFORMS_TO = [
+    "https://api.stacspec.org/v1.0.0/core",
+    "https://api.stacspec.org/v1.0.0/item-search",
+    "https://api.stacspec.org/v1.0.0/item-search#query",
+    "https://api.stacspec.org/v1.0.0/item-search#sort",
+]
+
+
+def _parse_time(value: str) -> datetime | None:
+    if value in ("", ".."):
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _time_window(value: str | None) -> tuple[datetime | None, datetime | None]:
+    if not value:
+        return None, None
+    if "/" in value:
+        start, end = value.split("/", 1)
+        return _parse_time(start), _parse_time(end)
+    instant = _parse_time(value)
+    return instant, instant
+
+
+def _bbox_intersects(a: list[float], b: list[float]) -> bool:
+    return not (a[2] < b[0] or a[0] > b[2] or a[3] < b[1] or a[1] > b[3])
+
+
+_QUERY_OPS = {
+    "eq": lambda v, x: v == x,
+    "neq": lambda v, x: v != x,
+    "lt": lambda v, x: v is not None and v < x,
+    "lte": lambda v, x: v is not None and v <= x,
+    "gt": lambda v, x: v is not None and v > x,
+    "gte": lambda v, x: v is not None and v >= x,
+    "in": lambda v, x: v in x,
+}
+
+
+def _sort_items(items: list[dict], sortby) -> list[dict]:
+    if isinstance(sortby, str):
+        sortby = [
+            {"field": field.lstrip("+-"), "direction": "desc" if field.startswith("-") else "asc"}
+            for field in sortby.split(",")
+        ]
+    for key in reversed(sortby or []):
+        field = key["field"].removeprefix("properties.")
+        items = sorted(
+            items,
+            key=lambda item: item.get(field) or item.get("properties", {}).get(field) or "",
+            reverse=key.get("direction") == "desc",
+        )
+    return items
+
+
+def item_matches(item: dict, params: dict) -> bool:
+    """Apply the subset of STAC item-search filters the stand-in supports."""
+    collections = params.get("collections")
+    if collections and item.get("collection") not in collections:
+        return False
+    ids = params.get("ids")
+    if ids and item.get("id") not in ids:
+        return False
+    bbox = params.get("bbox")
+    if bbox and item.get("bbox") and not _bbox_intersects(item["bbox"], bbox):
+        return False
+    start, end = _time_window(params.get("datetime"))
+    if start or end:
+        props = item.get("properties", {})
+        when = _parse_time(props.get("datetime") or props.get("start_datetime"))
+        if start and when < start:
+            return False
+        if end and when > end:
+            return False
+    for prop, ops in (params.get("query") or {}).items():
+        value = item.get("properties", {}).get(prop)
+        for op, expected in ops.items():
+            if not _QUERY_OPS[op](value, expected):
+                return False
+    return True
+
+
+class _StacHandler(BaseHTTPRequestHandler):
+    server: "_StacServer"
+
+    def log_message(self, format, *args):  # noqa: A002 - BaseHTTPRequestHandler API
+        pass
+
+    def _send_json(self, doc: dict, status: int = 200):
+        body = json.dumps(doc).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):  # noqa: N802 - BaseHTTPRequestHandler API
+        url = urlparse(self.path)
+        if url.path in ("", "/"):
+            self._send_json(self.server.landing_page())
+        elif url.path == "/conformance":
+            self._send_json({"conformsTo": CONFORMS_TO})
+        elif url.path.startswith("/collections/") and "/items/" in url.path:
+            item = self.server.get_item(*url.path.split("/")[2::2])
+            if item is None:
+                self._send_json({"code": "NotFound"}, status=404)
+            else:
+                self._send_json(item)
+        elif url.path == "/search":
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            params = {}
+            for key in ("collections", "ids"):
+                if key in query:
+                    params[key] = query[key].split(",")
+            if "bbox" in query:
+                params["bbox"] = [float(v) for v in query["bbox"].split(",")]
+            for key in ("datetime", "limit", "token", "sortby"):
+                if key in query:
+                    params[key] = query[key]
+            if "query" in query:
+                params["query"] = json.loads(query["query"])
+            self._send_json(self.server.search_page(params, method="GET"))
+        else:
+            self._send_json({"code": "NotFound"}, status=404)
+
+    def do_POST(self):  # noqa: N802 - BaseHTTPRequestHandler API
+        if urlparse(self.path).path != "/search":
+            self._send_json({"code": "NotFound"}, status=404)
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        params = json.loads(self.rfile.read(length) or b"{}")
+        self._send_json(self.server.search_page(params, method="POST"))
+
+
+class _StacServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, items: list[dict], page_size: int, self_links: bool = False):
+        super().__init__(address, _StacHandler)
+        self.items = items
+        self.page_size = page_size
+        self.self_links = self_links
+        self.searches: list[dict] = []
+        self.pages_served = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def landing_page(self) -> dict:
+        return {
+            "type": "Catalog",
+            "stac_version": "1.0.0",
+            "id": "piksel-standin",
+            "description": "Local STAC stand-in",
+            "conformsTo": CONFORMS_TO,
+            "links": [
+                {"rel": "self", "href": self.url, "type": "application/json"},
+                {"rel": "root", "href": self.url, "type": "application/json"},
+                {"rel": "search", "href": f"{self.url}search", "method": "GET",
+                 "type": "application/geo+json"},
+                {"rel": "search", "href": f"{self.url}search", "method": "POST",
+                 "type": "application/geo+json"},
+            ],
+        }
+
+    def served(self, item: dict) -> dict:
+        """The item as served, with its self link pointing here if ``self_links`` is set."""
+        if not self.self_links:
+            return item
+        href = f"{self.url}collections/{item.get('collection')}/items/{item['id']}"
+        links = [link for link in item.get("links", []) if link.get("rel") != "self"]
+        return {**item, "links": [{"rel": "self", "href": href, "type": "application/geo+json"}, *links]}
+
+    def get_item(self, collection: str, item_id: str) -> dict | None:
+        for item in self.items:
+            if item.get("collection") == collection and item["id"] == item_id:
+                return self.served(item)
+        return None
+
+    def search_page(self, params: dict, method: str) -> dict:
+        token = int(params.get("token") or 0)
+        limit = min(int(params.get("limit") or self.page_size), self.page_size)
+        with self._lock:
+            self.pages_served += 1
+            if token == 0:
+                self.searches.append({k: v for k, v in params.items() if k != "token"})
+        matched = [item for item in self.items if item_matches(item, params)]
+        matched = _sort_items(matched, params.get("sortby"))
+        page = [self.served(item) for item in matched[token:token + limit]]
+        links = []
+        if token + limit < len(matched):
+            next_token = token + limit
+            if method == "POST":
+                links.append({
+                    "rel": "next", "href": f"{self.url}search", "method": "POST",
+                    "body": {**params, "token": next_token}, "merge": False,
+                })
+            else:
+                query = urlparse(self.path_for(params, next_token)).query
+                links.append({"rel": "next", "href": f"{self.url}search?{query}",
+                              "method": "GET"})
+        return {
+            "type": "FeatureCollection",
+            "features": page,
+            "links": links,
+            "numberMatched": len(matched),
+            "numberReturned": len(page),
+        }
+
+    def path_for(self, params: dict, token: int) -> str:
+        parts = []
+        for key, value in {**params, "token": token}.items():
+            if key in ("collections", "ids", "bbox"):
+                value = ",".join(str(v) for v in value)
+            elif key in ("query", "sortby") and not isinstance(value, str):
+                value = json.dumps(value)
+            parts.append(f"{key}={value}")
+        return "/search?" + "&".join(parts)
+
+
+class StacStandin:
+    """
+    Serve STAC items from a background thread on ``127.0.0.1``.
+
+    Args:
+        items (Iterable[dict]): STAC item documents to serve.
+        page_size (int): The maximum number of items returned per page.
+        port (int): Port to bind, 0 picks a free one.
+        self_links (bool): Serve items with a self link to the stand-in
+            (which ``stac-to-dc`` records as the dataset location).
+    """
+
+    def __init__(self, items: Iterable[dict], page_size: int = 100, port: int = 0,
+                 self_links: bool = False):
+        self._server = _StacServer(("127.0.0.1", port), list(items), page_size, self_links)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return self._server.url
+
+    @property
+    def searches(self) -> list[dict]:
+        """The parameters of every search started (first pages only)."""
+        return self._server.searches
+
+    @property
+    def pages_served(self) -> int:
+        return self._server.pages_served
+
+    def start(self) -> "StacStandin":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StacStandin":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _S3Handler(BaseHTTPRequestHandler):
+    server: "_S3Server"
+
+    def log_message(self, format, *args):  # noqa: A002 - BaseHTTPRequestHandler API
+        pass
+
+    def _send(self, body: bytes, status: int = 200, content_type: str = "application/xml",
+              headers: dict | None = None, head: bool = False):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _error(self, status: int, code: str, head: bool = False):
+        body = f"<?xml version=\"1.0\" encoding=\"UTF-8\"?><Error><Code>{code}</Code></Error>"
+        self._send(body.encode(), status=status, head=head)
+
+    def _handle(self, head: bool):
+        url = urlparse(self.path)
+        bucket, _, key = url.path.lstrip("/").partition("/")
+        query = {k: v[-1] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        with self.server.lock:
+            self.server.requests += 1
+        if bucket != self.server.bucket:
+            self._error(404, "NoSuchBucket", head)
+        elif not key:
+            if "location" in query:
+                body = ('<?xml version="1.0" encoding="UTF-8"?><LocationConstraint '
+                        'xmlns="http://s3.amazonaws.com/doc/2006-03-01/"/>')
+                self._send(body.encode(), head=head)
+            else:
+                self._send(self.server.list_objects(query).encode(), head=head)
+        else:
+            body = self.server.objects.get(unquote(key))
+            if body is None:
+                self._error(404, "NoSuchKey", head)
+                return
+            self._send(body, content_type="application/octet-stream", head=head, headers={
+                "ETag": f'"{hashlib.md5(body).hexdigest()}"',  # noqa: S324 - S3 ETag
+                "Last-Modified": email.utils.formatdate(self.server.modified, usegmt=True),
+            })
+
+    def do_GET(self):  # noqa: N802 - BaseHTTPRequestHandler API
+        self._handle(head=False)
+
+    def do_HEAD(self):  # noqa: N802 - BaseHTTPRequestHandler API
+        self._handle(head=True)
+
+
+class _S3Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, bucket: str, objects: dict[str, bytes]):
+        super().__init__(address, _S3Handler)
+        self.bucket = bucket
+        self.objects = objects
+        self.keys = sorted(objects)
+        self.modified = datetime.now(timezone.utc).timestamp()
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def list_objects(self, query: dict) -> str:
+        """A ``ListObjectsV2`` response page."""
+        prefix = query.get("prefix", "")
+        delimiter = query.get("delimiter", "")
+        max_keys = int(query.get("max-keys") or 1000)
+        start = int(query.get("continuation-token") or 0)
+        encode = quote if query.get("encoding-type") == "url" else (lambda value: value)
+
+        entries: list[tuple[str, bool]] = []
+        seen_prefixes = set()
+        for key in self.keys:
+            if not key.startswith(prefix):
+                continue
+            if delimiter:
+                cut = key.find(delimiter, len(prefix))
+                if cut >= 0:
+                    common = key[:cut + len(delimiter)]
+                    if common not in seen_prefixes:
+                        seen_prefixes.add(common)
+                        entries.append((common, True))
+                    continue
+            entries.append((key, False))
+
+        page = entries[start:start + max_keys]
+        truncated = start + max_keys < len(entries)
+        modified = datetime.fromtimestamp(self.modified, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        parts = [
+            '<?xml version="1.0" encoding="UTF-8"?>',
+            '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">',
+            f"<Name>{escape(self.bucket)}</Name><Prefix>{escape(encode(prefix))}</Prefix>",
+            f"<KeyCount>{len(page)}</KeyCount><MaxKeys>{max_keys}</MaxKeys>",
+            f"<IsTruncated>{'true' if truncated else 'false'}</IsTruncated>",
+        ]
+        if delimiter:
+            parts.append(f"<Delimiter>{escape(encode(delimiter))}</Delimiter>")
+        if query.get("encoding-type") == "url":
+            parts.append("<EncodingType>url</EncodingType>")
+        if truncated:
+            parts.append(f"<NextContinuationToken>{start + max_keys}</NextContinuationToken>")
+        for name, is_prefix in page:
+            if is_prefix:
+                parts.append(f"<CommonPrefixes><Prefix>{escape(encode(name))}</Prefix></CommonPrefixes>")
+            else:
+                body = self.objects[name]
+                parts.append(
+                    f"<Contents><Key>{escape(encode(name))}</Key><LastModified>{modified}</LastModified>"
+                    f'<ETag>"{hashlib.md5(body).hexdigest()}"</ETag>'  # noqa: S324 - S3 ETag
+                    f"<Size>{len(body)}</Size><StorageClass>STANDARD</StorageClass></Contents>"
+                )
+        parts.append("</ListBucketResult>")
+        return "".join(parts)
+
+
+class S3Standin:
+    """
+    Serve objects of one bucket from a background thread on ``127.0.0.1``.
+
+    Args:
+        objects (Mapping[str, bytes]): Object bodies by key.
+        bucket (str): The bucket name.
+        port (int): Port to bind, 0 picks a free one.
+    """
+
+    def __init__(self, objects: Mapping[str, bytes], bucket: str = "piksel-standin", port: int = 0):
+        self._server = _S3Server(("127.0.0.1", port), bucket, dict(objects))
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def endpoint_url(self) -> str:
+        return self._server.url
+
+    @property
+    def bucket(self) -> str:
+        return self._server.bucket
+
+    @property
+    def requests(self) -> int:
+        """The number of requests served so far."""
+        return self._server.requests
+
+    def put(self, key: str, body: bytes):
+        """Store ``body`` under ``key``; a changed body changes the object's ETag, as on S3."""
+        with self._server.lock:
+            self._server.objects[key] = body
+            self._server.keys = sorted(self._server.objects)
+
+    def environment(self) -> dict[str, str]:
+        """
+        Environment variables pointing unsigned botocore clients at the stand-in.
+
+        Service-specific endpoint variables are read by botocore >= 1.31, which
+        ``aiobotocore`` (used by ``s3-to-dc`` to list buckets) builds on too.
+        """
+        return {
+            "AWS_ENDPOINT_URL_S3": self.endpoint_url,
+            "AWS_DEFAULT_REGION": "us-east-1",
+            "AWS_NO_SIGN_REQUEST": "YES",
+        }
+
+    def start(self) -> "S3Standin":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "S3Standin":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
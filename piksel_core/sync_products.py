@@ -0,0 +1,104 @@
+"""
+Bring the index's metadata types and products in line with the repository.
+
+All of ``metadata/*.odc-type.yaml``, every document of ``products/*.yaml``
+and ``products.csv`` are loaded in one process and compared with the
+registered definitions through one ``Datacube``. Only what is missing is
+added and only what changed is updated; unchanged definitions cost one
+lookup. Replaces one ``datacube product add`` process per file, which paid the
+datacube import and connection each time and failed on existing products.
+"""
+
+import sys
+
+import click
+from datacube import Datacube
+from datacube.ui.click import environment_option, pass_config
+from datacube.utils import InvalidDocException, jsonify_document
+from datacube.utils.changes import get_doc_changes
+
+from piksel_core.definitions import (
+    METADATA_DIR,
+    PRODUCTS_CSV,
+    PRODUCTS_DIR,
+    Definition,
+    check_products_csv,
+    load_definitions,
+    read_products_csv,
+)
+
+
+def _changes(registered: dict, definition: Definition) -> list[str]:
+    """Offsets (e.g. ``measurements.0.nodata``) where the file differs from the index."""
+    changes = get_doc_changes(registered, jsonify_document(definition.doc))
+    return [".".join(map(str, offset)) for offset, _, _ in changes]
+
+
+def _sync(resource, definition: Definition, allow_unsafe: bool, dry_run: bool) -> str:
+    """Add or update one metadata type or product; returns what was (or would be) done."""
+    existing = resource.get_by_name(definition.name)
+    if existing is None:
+        if not dry_run:
+            resource.add(resource.from_doc(definition.doc))
+        return "added"
+    changed = _changes(existing.definition, definition)
+    if not changed:
+        return "unchanged"
+    if not dry_run:
+        resource.update(resource.from_doc(definition.doc), allow_unsafe_updates=allow_unsafe)
+    return f"updated ({', '.join(changed)})"
+
+
+@click.command("sync-products")
+@environment_option
+@pass_config
+@click.option("--metadata-dir", type=click.Path(exists=True, file_okay=False), default=METADATA_DIR,
+              show_default=True, help="Directory of *.odc-type.yaml metadata types.")
+@click.option("--products-dir", type=click.Path(exists=True, file_okay=False), default=PRODUCTS_DIR,
+              show_default=True, help="Directory of product definition YAMLs.")
+@click.option("--products-csv", type=click.Path(dir_okay=False), default=PRODUCTS_CSV,
+              show_default=True, help="Product listing checked against the definitions (skipped if missing).")
+@click.option("--metadata-only", is_flag=True, default=False, help="Only sync the metadata types.")
+@click.option("--allow-unsafe", is_flag=True, default=False,
+              help="Allow unsafe product changes (e.g. removed measurements).")
+@click.option("--allow-unsafe-metadata", is_flag=True, default=False,
+              help="Allow unsafe metadata type changes.")
+@click.option("--dry-run", is_flag=True, default=False, help="Only report what would change.")
+def cli(cfg_env, metadata_dir, products_dir, products_csv, metadata_only, allow_unsafe,
+        allow_unsafe_metadata, dry_run):
+    """
+    Add and update metadata types and products that differ from the repository definitions.
+    """
+    try:
+        metadata_types = load_definitions(metadata_dir, "*.odc-type.yaml")
+        products = {} if metadata_only else load_definitions(products_dir)
+    except ValueError as e:
+        raise click.ClickException(str(e)) from e
+
+    if products and products_csv:
+        try:
+            problems = check_products_csv(read_products_csv(products_csv), products)
+        except FileNotFoundError:
+            problems = []
+            print(f"{products_csv} not found, not checked")
+        if problems:
+            raise click.ClickException("products.csv does not match the definitions:\n  " + "\n  ".join(problems))
+
+    dc = Datacube(env=cfg_env, app="piksel-sync-products")
+    failed = 0
+    for resource, definitions, unsafe in (
+        (dc.index.metadata_types, metadata_types, allow_unsafe_metadata),
+        (dc.index.products, products, allow_unsafe),
+    ):
+        for name, definition in definitions.items():
+            try:
+                outcome = _sync(resource, definition, unsafe, dry_run)
+            except (ValueError, InvalidDocException) as e:
+                failed += 1
+                outcome = f"FAILED: {e}"
+            if dry_run and outcome.startswith(("added", "updated")):
+                outcome += " (dry run)"
+            print(f"{name}: {outcome}")
+    dc.close()
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,112 @@
+"""
+Load synthetic eo3 datasets into the index for benchmarking.
+
+Documents from ``piksel_core.synthetic`` are prepared like STAC-converted
+datasets (``prep_eo3``) and written with the bulk ``COPY`` writer, so the
+search, spatial and dataset tables look exactly as they would after indexing
+the same number of real scenes. Synthetic datasets live under
+``s3://piksel-synthetic/``; a rerun tops each product up to ``--datasets``
+and ``--purge`` removes them again. Run it against a local PostGIS only.
+"""
+
+import time
+
+import click
+from datacube import Datacube
+from datacube.index.eo3 import prep_eo3
+from datacube.model import Dataset
+from datacube.ui.click import environment_option, pass_config
+
+from piksel_core.bulk_indexing import bulk_index_datasets, spatial_tables
+from piksel_core.db import ODC_SCHEMA, connect
+from piksel_core.definitions import PRODUCTS_DIR, load_definitions
+from piksel_core.delete_product import delete_by_location
+from piksel_core.synthetic import SYNTHETIC_URI_PREFIX, sensor_for, synthetic_documents
+
+
+def load_product_definitions(products_dir: str) -> dict[str, dict]:
+    """Product definitions by name from every ``*.yaml`` in ``products_dir``."""
+    return {name: definition.doc for name, definition in load_definitions(products_dir).items()}
+
+
+def synthetic_count(connection, product_id: int) -> int:
+    """How many synthetic datasets a product already has."""
+    scheme, _, body = SYNTHETIC_URI_PREFIX.partition(":")
+    with connection, connection.cursor() as cur:
+        cur.execute(
+            f"SELECT count(*) FROM {ODC_SCHEMA}.dataset "
+            "WHERE product_ref = %s AND uri_scheme = %s AND uri_body LIKE %s",
+            (product_id, scheme, f"{body}%"),
+        )
+        return cur.fetchone()[0]
+
+
+def _analyze(connection) -> None:
+    tables = ["dataset", "dataset_search_string", "dataset_search_num", "dataset_search_datetime"]
+    tables += [spatial.table for spatial in spatial_tables(connection)]
+    with connection, connection.cursor() as cur:
+        for table in tables:
+            cur.execute(f"ANALYZE {ODC_SCHEMA}.{table}")
+
+
+@click.command("synth-datasets")
+@environment_option
+@pass_config
+@click.option("--products", type=str, default=None,
+              help="Comma separated products (default: every product in --products-dir).")
+@click.option("--products-dir", type=click.Path(exists=True, file_okay=False), default=PRODUCTS_DIR,
+              show_default=True, help="Directory of product definition YAMLs.")
+@click.option("--datasets", "n_datasets", type=int, default=100000, show_default=True,
+              help="Synthetic datasets per product.")
+@click.option("--datetime", type=str, default="2019-01-01/2024-12-31", show_default=True,
+              help="Date range the acquisitions are spread over.")
+@click.option("--seed", type=int, default=0, show_default=True, help="Random seed.")
+@click.option("--batch-size", type=int, default=5000, show_default=True,
+              help="Datasets per transaction.")
+@click.option("--purge", is_flag=True, default=False,
+              help="Delete the synthetic datasets of the products instead.")
+def cli(cfg_env, products, products_dir, n_datasets, datetime, seed, batch_size, purge):
+    """
+    Generate synthetic eo3 datasets for products/*.yaml into the (local) index.
+    """
+    definitions = load_product_definitions(products_dir)
+    names = products.split(",") if products else list(definitions)
+    dc = Datacube(env=cfg_env, app="piksel-synth-datasets")
+    connection = connect(cfg_env, application_name="piksel-synth-datasets")
+
+    for name in names:
+        if name not in definitions:
+            raise click.ClickException(f"No definition for {name} in {products_dir}")
+        try:
+            sensor_for(name)
+        except ValueError as e:
+            raise click.ClickException(str(e)) from e
+        product = dc.index.products.get_by_name(name)
+        if product is None:
+            raise click.ClickException(f"Product {name} is not in the index, run `make all-products`")
+
+        if purge:
+            purged = delete_by_location(connection, product.id, SYNTHETIC_URI_PREFIX, batch_size)
+            print(f"{name}: purged {purged} synthetic datasets")
+            continue
+
+        existing = synthetic_count(connection, product.id)
+        if existing >= n_datasets:
+            print(f"{name}: {existing} synthetic datasets already, nothing to add")
+            continue
+        started = time.monotonic()
+        datasets = (
+            (name, Dataset(product, prep_eo3(doc, remap_lineage=False), uri=uri), uri)
+            for uri, doc in synthetic_documents(definitions[name], datetime, n_datasets, existing, seed)
+        )
+        counts = bulk_index_datasets(dc, connection, datasets, batch_size=batch_size)
+        elapsed = time.monotonic() - started
+        print(
+            f"{name}: added {counts[name, 'added']}, failed {counts[name, 'failed']}, "
+            f"skipped {counts[name, 'skipped']} in {elapsed:.0f}s "
+            f"({counts[name, 'added'] / elapsed if elapsed else 0:.0f} datasets/s)"
+        )
+
+    # Fresh planner statistics, so the benchmark measures plans for this size
+    _analyze(connection)
+    connection.close()
@@ -0,0 +1,387 @@
+"""
+Synthetic eo3 datasets for benchmarking the index at archive scale.
+
+Documents are generated from the product definitions in ``products/*.yaml``:
+every measurement of the product gets a path, the native CRS is the product's
+storage CRS (UTM per tile otherwise), and footprints follow the grid the real
+data is published on over the main Indonesian island groups, with matching
+``odc:region_code`` values (MGRS tiles for Sentinel, WRS-2 path/row for
+Landsat, an EASE-Grid tile index for the annual geomedians).
+
+Projections use spherical approximations, which keep this module free of
+GDAL/PROJ; the documents are still self-consistent because the lon/lat
+extent is derived from the native footprint (``prep_eo3``) before indexing.
+Generation is deterministic: dataset ``i`` of a product is the same document
+on every run, so an interrupted load can resume where it stopped.
+"""
+
+import math
+import random
+import uuid
+from collections.abc import Iterator, Mapping
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+from piksel_core.tiling import parse_datetime
+
+# Datasets are "stored" under this bucket, which is how they are told apart
+# from real data (and purged).
+SYNTHETIC_BUCKET = "piksel-synthetic"
+SYNTHETIC_URI_PREFIX = f"s3://{SYNTHETIC_BUCKET}/"
+SYNTHETIC_NAMESPACE = uuid.UUID("0b5f3c0e-6a4c-4d5e-9a57-2f1f5b0c6e11")
+
+# (minx, miny, maxx, maxy) of the main island groups
+INDONESIA_REGIONS = {
+    "sumatra": (95.0, -6.0, 106.0, 6.0),
+    "java": (105.0, -8.8, 114.6, -5.8),
+    "kalimantan": (108.8, -4.2, 119.0, 4.4),
+    "sulawesi": (118.8, -5.8, 125.2, 1.8),
+    "nusa_tenggara": (114.4, -10.4, 125.0, -8.0),
+    "maluku": (124.0, -8.4, 135.0, 2.6),
+    "papua": (130.8, -9.2, 141.0, -0.6),
+}
+
+_EARTH_RADIUS = 6378137.0
+_UTM_K0 = 0.9996
+_MGRS_BANDS = "CDEFGHJKLMNPQRSTUVWX"
+_MGRS_COLUMNS = ("ABCDEFGH", "JKLMNPQR", "STUVWXYZ")
+_MGRS_ROWS = "ABCDEFGHJKLMNPQRSTUV"
+_MGRS_TILE = 109800.0
+_WRS2_PATH_SPACING = 360 / 233
+_WRS2_ROW_SPACING = 1.45
+_WRS2_SCENE = (184980.0, 180000.0)
+_EASE_TILE = 96000.0
+_EASE_ORIGIN = (90.0, -15.0)
+
+
+class Sensor(NamedTuple):
+    """How the datasets of a product are gridded and described."""
+
+    grid: str
+    family: str
+    platforms: tuple[str, ...]
+    instrument: str
+    resolution: float
+    cloud_cover: bool = True
+    annual: bool = False
+
+
+class Footprint(NamedTuple):
+    """One tile of a product grid in the product's native CRS."""
+
+    code: str
+    epsg: int
+    bounds: tuple[float, float, float, float]
+
+
+def sensor_for(product: str) -> Sensor:
+    """
+    Return the sensor profile of a piksel product name.
+
+    Raises:
+        ValueError: If the product is not one of ``products/*.yaml``.
+    """
+    if product == "s2_l2a":
+        return Sensor("mgrs", "ard", ("sentinel-2a", "sentinel-2b", "sentinel-2c"), "msi", 10)
+    if product == "s1_rtc":
+        return Sensor("mgrs", "rtc", ("sentinel-1a",), "c-sar", 0.0002, cloud_cover=False)
+    if product in ("geomad_s2_annual", "s2_geomad_annual"):
+        return Sensor("ease", "geomad", ("sentinel-2a", "sentinel-2b"), "msi", 10,
+                      cloud_cover=False, annual=True)
+    if len(product) > 3 and product.startswith("ls") and product[2] in "5789":
+        instrument = {"5": "tm", "7": "etm"}.get(product[2], "oli_tirs")
+        return Sensor("wrs2", "ard", (f"landsat-{product[2]}",), instrument, 30)
+    raise ValueError(f"No synthetic sensor profile for product {product}")
+
+
+def utm_zone(lon: float) -> int:
+    return int((lon + 180) // 6) + 1
+
+
+def _utm_forward(lon: float, lat: float, zone: int, false_northing: float) -> tuple[float, float]:
+    central = zone * 6 - 183
+    x = 500000 + math.radians(lon - central) * _EARTH_RADIUS * math.cos(math.radians(lat)) * _UTM_K0
+    y = math.radians(lat) * _EARTH_RADIUS * _UTM_K0 + false_northing
+    return x, y
+
+
+def _utm_inverse(x: float, y: float, zone: int, false_northing: float) -> tuple[float, float]:
+    lat = math.degrees((y - false_northing) / (_EARTH_RADIUS * _UTM_K0))
+    central = zone * 6 - 183
+    lon = central + math.degrees((x - 500000) / (_EARTH_RADIUS * math.cos(math.radians(lat)) * _UTM_K0))
+    return lon, lat
+
+
+def mgrs_code(lon: float, lat: float) -> str:
+    """The MGRS 100 km square (Sentinel-2 tile id) containing a point, e.g. ``48MYU``."""
+    zone = utm_zone(lon)
+    x, y = _utm_forward(lon, lat, zone, 10_000_000 if lat < 0 else 0)
+    band = _MGRS_BANDS[min(len(_MGRS_BANDS) - 1, int((lat + 80) // 8))]
+    column = _MGRS_COLUMNS[(zone - 1) % 3][int(x // 100000) - 1]
+    row = int(y // 100000) % 20
+    if zone % 2 == 0:
+        row = (row + 5) % 20
+    return f"{zone:02d}{band}{column}{_MGRS_ROWS[row]}"
+
+
+def wrs2_path_row(lon: float, lat: float) -> tuple[int, int]:
+    """An approximate WRS-2 descending path/row for a point."""
+    path = (round((-64.6 - lon) / _WRS2_PATH_SPACING) - 1) % 233 + 1
+    row = round(60 - lat / _WRS2_ROW_SPACING)
+    return path, row
+
+
+def _ease_forward(lon: float, lat: float) -> tuple[float, float]:
+    # EPSG:6933 (cylindrical equal-area, standard parallel 30) on a sphere
+    scale = math.cos(math.radians(30))
+    return (_EARTH_RADIUS * math.radians(lon) * scale,
+            _EARTH_RADIUS * math.sin(math.radians(lat)) / scale)
+
+
+def _ease_inverse(x: float, y: float) -> tuple[float, float]:
+    scale = math.cos(math.radians(30))
+    return (math.degrees(x / (_EARTH_RADIUS * scale)),
+            math.degrees(math.asin(max(-1.0, min(1.0, y * scale / _EARTH_RADIUS)))))
+
+
+def to_lonlat(epsg: int, x: float, y: float) -> tuple[float, float]:
+    """Approximate lon/lat of a point in one of the CRSs used by ``footprint_at``."""
+    if epsg == 4326:
+        return x, y
+    if epsg == 6933:
+        return _ease_inverse(x, y)
+    if 32601 <= epsg <= 32660:
+        return _utm_inverse(x, y, epsg - 32600, 0)
+    if 32701 <= epsg <= 32760:
+        return _utm_inverse(x, y, epsg - 32700, 10_000_000)
+    raise ValueError(f"Unsupported CRS EPSG:{epsg}")
+
+
+def footprint_at(product: Mapping, lon: float, lat: float) -> Footprint:
+    """
+    The tile of ``product``'s grid containing a lon/lat point.
+
+    Args:
+        product (Mapping): A product definition from ``products/*.yaml``.
+        lon (float): Longitude in degrees.
+        lat (float): Latitude in degrees.
+
+    Returns:
+        Footprint: Region code, EPSG code and native bounds of the tile.
+    """
+    sensor = sensor_for(product["name"])
+    storage_crs = product.get("storage", {}).get("crs")
+    storage_epsg = int(storage_crs.split(":")[1]) if storage_crs else None
+
+    if sensor.grid == "mgrs":
+        zone = utm_zone(lon)
+        false_northing = 10_000_000 if lat < 0 else 0
+        x, y = _utm_forward(lon, lat, zone, false_northing)
+        x0, y0 = x // 100000 * 100000, y // 100000 * 100000
+        code = mgrs_code(lon, lat)
+        if storage_epsg == 4326:
+            minx, miny = _utm_inverse(x0, y0, zone, false_northing)
+            maxx, maxy = _utm_inverse(x0 + _MGRS_TILE, y0 + _MGRS_TILE, zone, false_northing)
+            return Footprint(code, 4326, _snap((minx, miny, maxx, maxy), sensor.resolution))
+        epsg = (32700 if lat < 0 else 32600) + zone
+        return Footprint(code, storage_epsg or epsg, (x0, y0, x0 + _MGRS_TILE, y0 + _MGRS_TILE))
+
+    if sensor.grid == "wrs2":
+        path, row = wrs2_path_row(lon, lat)
+        centre_lon = (-64.6 - path * _WRS2_PATH_SPACING + 180) % 360 - 180
+        centre_lat = (60 - row) * _WRS2_ROW_SPACING
+        zone = utm_zone(centre_lon)
+        # Landsat Collection 2 uses northern UTM zones south of the equator too
+        x, y = _utm_forward(centre_lon, centre_lat, zone, 0)
+        width, height = _WRS2_SCENE
+        bounds = _snap((x - width / 2, y - height / 2, x + width / 2, y + height / 2), sensor.resolution)
+        return Footprint(f"{path:03d}{row:03d}", 32600 + zone, bounds)
+
+    if storage_epsg != 6933:
+        raise ValueError(f"EASE-Grid tiles need an EPSG:6933 product, got {storage_crs}")
+    origin_x, origin_y = _ease_forward(*_EASE_ORIGIN)
+    x, y = _ease_forward(lon, lat)
+    col, row = int((x - origin_x) // _EASE_TILE), int((y - origin_y) // _EASE_TILE)
+    x0, y0 = origin_x + col * _EASE_TILE, origin_y + row * _EASE_TILE
+    bounds = _snap((x0, y0, x0 + _EASE_TILE, y0 + _EASE_TILE), sensor.resolution)
+    return Footprint(f"x{col:03d}y{row:03d}", 6933, bounds)
+
+
+def _snap(bounds: tuple[float, float, float, float], resolution: float) -> tuple[float, float, float, float]:
+    minx, miny, maxx, maxy = (float(round(v / resolution) * resolution) for v in bounds)
+    return (minx, miny, maxx, maxy)
+
+
+def footprints(product: Mapping, regions: Mapping[str, tuple] = INDONESIA_REGIONS,
+               step: float = 0.25) -> list[Footprint]:
+    """Every tile of the product grid touched by ``regions``, sorted by region code."""
+    tiles: dict[str, Footprint] = {}
+    for minx, miny, maxx, maxy in regions.values():
+        lat = miny
+        while lat <= maxy:
+            lon = minx
+            while lon <= maxx:
+                tile = footprint_at(product, lon, lat)
+                tiles.setdefault(tile.code, tile)
+                lon += step
+            lat += step
+    return [tiles[code] for code in sorted(tiles)]
+
+
+def _iso(when: datetime) -> str:
+    return when.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def eo3_document(product: Mapping, tile: Footprint, when: datetime, dataset_id: uuid.UUID,
+                 rng: random.Random) -> dict:
+    """
+    Build one unprepared eo3 dataset document for ``product``.
+
+    Args:
+        product (Mapping): The product definition.
+        tile (Footprint): Where the dataset is.
+        when (datetime): The acquisition time (the year start for annual products).
+        dataset_id (uuid.UUID): The dataset id.
+        rng (random.Random): Source of the per-dataset random properties.
+
+    Returns:
+        dict: The document, as ``stac2ds`` would produce it before ``prep_eo3``.
+    """
+    sensor = sensor_for(product["name"])
+    minx, miny, maxx, maxy = tile.bounds
+    res = sensor.resolution
+    properties = {
+        "datetime": _iso(when),
+        "eo:platform": rng.choice(sensor.platforms),
+        "eo:instrument": sensor.instrument,
+        "odc:file_format": "GeoTIFF",
+        "odc:processing_datetime": _iso(when + timedelta(days=2)),
+        "odc:product_family": sensor.family,
+        "odc:region_code": tile.code,
+    }
+    if sensor.cloud_cover:
+        # Skewed towards cloudy scenes, as over the archipelago
+        properties["eo:cloud_cover"] = round(100 * rng.betavariate(0.8, 0.6), 2)
+    if sensor.annual:
+        properties["dtr:start_datetime"] = _iso(when)
+        properties["dtr:end_datetime"] = _iso(when.replace(year=when.year + 1) - timedelta(microseconds=1))
+    # Product-level properties (e.g. the s1_rtc platform) must match the product
+    properties.update(product.get("metadata", {}).get("properties", {}))
+
+    label = f"{product['name']}_{tile.code}_{when:%Y%m%d}_{str(dataset_id)[:8]}"
+    return {
+        "$schema": "https://schemas.opendatacube.org/dataset",
+        "id": str(dataset_id),
+        "label": label,
+        "product": {"name": product["name"]},
+        "crs": f"epsg:{tile.epsg}",
+        "geometry": {
+            "type": "Polygon",
+            "coordinates": [[[minx, maxy], [maxx, maxy], [maxx, miny], [minx, miny], [minx, maxy]]],
+        },
+        "grids": {
+            "default": {
+                "shape": [round((maxy - miny) / res), round((maxx - minx) / res)],
+                "transform": [res, 0.0, minx, 0.0, -res, maxy, 0.0, 0.0, 1.0],
+            }
+        },
+        "properties": properties,
+        "measurements": {
+            m["name"]: {"path": f"{label}_{m['name']}.tif"} for m in product["measurements"]
+        },
+        "lineage": {},
+    }
+
+
+def stac_item(doc: Mapping, uri: str) -> dict:
+    """
+    Render a synthetic eo3 document as the STAC item a STAC API would serve.
+
+    Asset hrefs are absolute, next to ``uri``, and the self link points at a
+    ``.stac-item.json`` beside it (the key layout ``s3-to-dc --stac`` expects).
+    """
+    epsg = int(doc["crs"].split(":")[1])
+    ring = [list(to_lonlat(epsg, x, y)) for x, y in doc["geometry"]["coordinates"][0]]
+    lons, lats = [p[0] for p in ring], [p[1] for p in ring]
+    props = doc["properties"]
+    grid = doc["grids"]["default"]
+    properties = {
+        "datetime": props["datetime"],
+        "platform": props["eo:platform"],
+        "instruments": [props["eo:instrument"]],
+        "proj:epsg": epsg,
+        "proj:shape": grid["shape"],
+        "proj:transform": grid["transform"][:6],
+        "odc:product": doc["product"]["name"],
+    }
+    properties.update({k: v for k, v in props.items() if k.startswith("odc:") or k == "eo:cloud_cover"})
+    if "dtr:start_datetime" in props:
+        properties["start_datetime"] = props["dtr:start_datetime"]
+        properties["end_datetime"] = props["dtr:end_datetime"]
+
+    base = uri.rsplit("/", 1)[0]
+    return {
+        "type": "Feature",
+        "stac_version": "1.0.0",
+        "stac_extensions": ["https://stac-extensions.github.io/projection/v1.1.0/schema.json"],
+        "id": doc["id"],
+        "collection": doc["product"]["name"],
+        "geometry": {"type": "Polygon", "coordinates": [ring]},
+        "bbox": [min(lons), min(lats), max(lons), max(lats)],
+        "properties": properties,
+        "assets": {
+            name: {
+                "href": f"{base}/{band['path']}",
+                "type": "image/tiff; application=geotiff; profile=cloud-optimized",
+                "roles": ["data"],
+            }
+            for name, band in doc["measurements"].items()
+        },
+        "links": [{"rel": "self", "href": uri.replace(".odc-metadata.yaml", ".stac-item.json"),
+                   "type": "application/geo+json"}],
+    }
+
+
+def synthetic_documents(
+    product: Mapping,
+    datetime_range: str,
+    count: int,
+    first: int = 0,
+    seed: int = 0,
+) -> Iterator[tuple[str, dict]]:
+    """
+    Yield ``(uri, document)`` for datasets ``first`` to ``count - 1`` of a product.
+
+    Datasets cycle through the product's tiles in a shuffled order, so any
+    prefix is spread over the whole archipelago, and each pass over the tiles
+    is placed evenly in ``datetime_range``. Annual products get one dataset per
+    tile per year from the start of the range on.
+
+    Args:
+        product (Mapping): The product definition.
+        datetime_range (str): A STAC interval, e.g. ``2019-01-01/2024-12-31``.
+        count (int): Total datasets for the product.
+        first (int): Index of the first dataset to yield (to resume a load).
+        seed (int): Changes every generated value.
+    """
+    name = product["name"]
+    sensor = sensor_for(name)
+    tiles = footprints(product)
+    random.Random(f"{name}:{seed}").shuffle(tiles)
+    start_str, _, end_str = datetime_range.partition("/")
+    start = parse_datetime(start_str)
+    end = parse_datetime(end_str or start_str, end=True)
+    step = (end - start) / max(1, math.ceil(count / len(tiles)))
+
+    for i in range(first, count):
+        tile = tiles[i % len(tiles)]
+        n_pass = i // len(tiles)
+        rng = random.Random(f"{name}:{seed}:{i}")
+        if sensor.annual:
+            when = datetime(start.year + n_pass, 1, 1, tzinfo=timezone.utc)
+        else:
+            when = start + step * (n_pass + rng.random())
+        dataset_id = uuid.uuid5(SYNTHETIC_NAMESPACE, f"{name}/{seed}/{i}")
+        doc = eo3_document(product, tile, when, dataset_id, rng)
+        uri = f"{SYNTHETIC_URI_PREFIX}{name}/{tile.code}/{when:%Y/%m/%d}/{doc['label']}.odc-metadata.yaml"
+        yield uri, doc
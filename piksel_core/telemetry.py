@@ -0,0 +1,307 @@
+"""
+Stage timers and counters of the indexing and query paths.
+
+Instrumented code records how long a stage took with ``timer`` (or, for the
+waits of an iterator such as STAC pages, ``timed``) and how much it handled
+with ``count``, labelled e.g. by product. Stages recorded by piksel-core:
+
+- ``stac_page``: waiting for a STAC API search page.
+- ``s3_fetch``: waiting for an S3 item document.
+- ``eo3_convert``: converting a STAC item to an eo3 dataset.
+- ``db_insert``: indexing one dataset through datacube.
+- ``db_insert_batch``: one ``COPY`` batch of the bulk writer.
+- ``spindex``: bringing one spatial index up to date.
+- ``find_datasets``: a notebook search, by ``source`` (index or search table).
+- ``cog_fetch``: a ranged read of a remote COG that missed the block cache.
+- ``command``: a whole ``stac-to-dc`` or ``s3-to-dc`` run in the warm command
+  server, which also counts its datasets from the tool's summary line; the
+  dc-tools record nothing themselves.
+
+Nothing leaves the process unless ``$PIKSEL_TELEMETRY_DIR`` is set. Then
+``flush`` writes the process's metrics in the OpenMetrics text format to
+``<dir>/metrics/<host>-<command>-<pid>.prom``, replacing its previous flush,
+where the Prometheus node exporter's textfile collector or Datadog's
+``openmetrics`` check can scrape them. Stages timed with ``log=True`` are
+also appended to ``<dir>/events.jsonl`` as one JSON object per line as they
+happen. ``flush`` runs at interpreter exit; the warm command server and the
+tiled indexer's workers, whose processes end without it, call it themselves,
+and long-lived notebook kernels call ``flush_if_due`` after every query.
+``python -m piksel_core perf-report`` reads both.
+"""
+
+import atexit
+import bisect
+import json
+import logging
+import math
+import os
+import re
+import socket
+import sys
+import threading
+import time
+from collections.abc import Iterable, Iterator, Mapping
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+TELEMETRY_DIR_ENV = "PIKSEL_TELEMETRY_DIR"
+
+PREFIX = "piksel_"
+STAGE_METRIC = "piksel_stage_seconds"
+START_METRIC = "piksel_process_start_time_seconds"
+ELAPSED_METRIC = "piksel_process_seconds"
+
+# Least seconds between the flushes of ``flush_if_due``
+FLUSH_INTERVAL = 10.0
+
+# Upper bounds in seconds: an eo3 conversion takes milliseconds, a STAC page or a COPY batch seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0,
+           math.inf)
+
+_HOST = socket.gethostname()
+
+_LOG = logging.getLogger(__name__)
+
+_SAMPLE = re.compile(r"^([A-Za-z_:][\w:]*)(?:\{(.*)\})?\s+(\S+)(?:\s+\S+)?$")
+_LABEL = re.compile(r'([A-Za-z_]\w*)="((?:[^"\\]|\\.)*)"')
+
+
+class Sample(NamedTuple):
+    """One sample line of an OpenMetrics exposition."""
+
+    name: str
+    labels: dict
+    value: float
+
+
+class _Histogram:
+    __slots__ = ("buckets", "total", "count")
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+def _default_command() -> str:
+    name = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else ""
+    return os.path.splitext(name)[0] or "python"
+
+
+_lock = threading.Lock()
+_counters: dict[tuple[str, tuple], float] = {}
+_histograms: dict[tuple, _Histogram] = {}
+_process = {"command": _default_command(), "started": time.time(), "flushed": 0.0}
+
+
+def _key(labels: Mapping) -> tuple:
+    return tuple(sorted((name, str(value)) for name, value in labels.items() if value is not None))
+
+
+def start(command: str | None = None) -> None:
+    """Forget everything recorded so far and attribute what follows to ``command``."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _process.update(command=command or _default_command(), started=time.time(), flushed=0.0)
+
+
+def observe(stage: str, seconds: float, **labels) -> None:
+    """Record that one ``stage`` took ``seconds``."""
+    key = _key({"stage": stage, **labels})
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = _Histogram()
+        histogram.observe(seconds)
+
+
+def count(name: str, n: float = 1, **labels) -> None:
+    """Add ``n`` to the counter ``piksel_<name>_total``."""
+    if not n:
+        return
+    key = (name, _key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+
+
+def count_by(name: str, counts: Mapping, *labels: str) -> None:
+    """Add a ``Counter`` keyed by tuples, e.g. ``(product, status)``, naming the tuple items ``labels``."""
+    for key, n in counts.items():
+        count(name, n, **dict(zip(labels, key if isinstance(key, tuple) else (key,))))
+
+
+@contextmanager
+def timer(stage: str, log: bool = False, **labels):
+    """
+    Time the body of a ``with`` block as one ``stage``.
+
+    Args:
+        stage (str): Stage name.
+        log (bool): Also append the timing to the JSON event log.
+        **labels: Label values, e.g. ``product=``; None values are left out.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        observe(stage, seconds, **labels)
+        if log:
+            event(stage, seconds=round(seconds, 6), **labels)
+
+
+def timed(iterable: Iterable, stage: str, log: bool = False, **labels) -> Iterator:
+    """Yield from ``iterable``, timing each wait for its next value (not the consumer's work) as ``stage``."""
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            value = next(iterator)
+        except StopIteration:
+            return
+        seconds = time.perf_counter() - started
+        observe(stage, seconds, **labels)
+        if log:
+            event(stage, seconds=round(seconds, 6), **labels)
+        yield value
+
+
+def _directory() -> str | None:
+    return os.environ.get(TELEMETRY_DIR_ENV) or None
+
+
+def event(name: str, **fields) -> None:
+    """Append one JSON line to ``events.jsonl`` when telemetry is enabled."""
+    directory = _directory()
+    if directory is None:
+        return
+    record = {
+        "time": datetime.now(timezone.utc).isoformat(),
+        "event": name,
+        "command": _process["command"],
+        "host": _HOST,
+        "pid": os.getpid(),
+        **{k: v for k, v in fields.items() if v is not None},
+    }
+    try:
+        os.makedirs(directory, exist_ok=True)
+        # One write per line in append mode, so concurrent processes do not interleave
+        with open(os.path.join(directory, "events.jsonl"), "a") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+    except OSError as e:
+        _LOG.warning("Telemetry event not written to %s: %s", directory, e)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Iterable[tuple[str, str]]) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer() and abs(value) < 2**53:
+        return str(int(value))
+    return repr(float(value))
+
+
+def render() -> str:
+    """The metrics recorded by this process in the OpenMetrics text format."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: (list(h.buckets), h.total, h.count) for key, h in _histograms.items()}
+        command, started = _process["command"], _process["started"]
+    common = (("command", command), ("host", _HOST), ("pid", str(os.getpid())))
+
+    def labels(key: tuple, *extra: tuple[str, str]) -> str:
+        return _labels(sorted(common + key) + list(extra))
+
+    lines = [
+        f"# TYPE {START_METRIC} gauge",
+        f"{START_METRIC}{labels(())} {_number(started)}",
+        f"# TYPE {ELAPSED_METRIC} gauge",
+        f"{ELAPSED_METRIC}{labels(())} {_number(round(time.time() - started, 3))}",
+    ]
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE {PREFIX}{name} counter")
+        for (counter, key), value in sorted(counters.items()):
+            if counter == name:
+                lines.append(f"{PREFIX}{name}_total{labels(key)} {_number(value)}")
+    if histograms:
+        lines.append(f"# TYPE {STAGE_METRIC} histogram")
+        lines.append(f"# HELP {STAGE_METRIC} Time spent per indexing or query stage.")
+        lines.append(f"# UNIT {STAGE_METRIC} seconds")
+        for key, (buckets, total, n) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS, buckets):
+                cumulative += bucket
+                lines.append(f"{STAGE_METRIC}_bucket{labels(key, ('le', _number(bound)))} {cumulative}")
+            lines.append(f"{STAGE_METRIC}_sum{labels(key)} {_number(total)}")
+            lines.append(f"{STAGE_METRIC}_count{labels(key)} {n}")
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def parse(text: str) -> list[Sample]:
+    """The samples of an OpenMetrics (or Prometheus) text exposition."""
+    samples = []
+    for line in text.splitlines():
+        match = _SAMPLE.match(line.strip())
+        if line.startswith("#") or match is None:
+            continue
+        name, labels, value = match.groups()
+        samples.append(Sample(
+            name,
+            {k: re.sub(r"\\(.)", lambda m: "\n" if m.group(1) == "n" else m.group(1), v)
+             for k, v in _LABEL.findall(labels or "")},
+            float(value),
+        ))
+    return samples
+
+
+def flush() -> str | None:
+    """
+    Write this process's metrics when ``$PIKSEL_TELEMETRY_DIR`` is set.
+
+    Returns:
+        str | None: The file written, None when disabled or nothing was recorded.
+    """
+    directory = _directory()
+    with _lock:
+        recorded = bool(_counters or _histograms)
+    if directory is None or not recorded:
+        return None
+    command = re.sub(r"[^\w.-]", "_", _process["command"])
+    path = os.path.join(directory, "metrics", f"{_HOST}-{command}-{os.getpid()}.prom")
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so a scraper never reads a partial file
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(render())
+        os.replace(tmp, path)
+    except OSError as e:
+        _LOG.warning("Telemetry not written to %s: %s", path, e)
+        return None
+    _process["flushed"] = time.monotonic()
+    return path
+
+
+def flush_if_due(interval: float = FLUSH_INTERVAL) -> str | None:
+    """``flush``, unless this process flushed less than ``interval`` seconds ago."""
+    if time.monotonic() - _process["flushed"] < interval:
+        return None
+    return flush()
+
+
+atexit.register(flush)
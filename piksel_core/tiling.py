@@ -0,0 +1,201 @@
+"""
+Split a bbox/datetime search into a grid of tiles and time windows.
+
+Neighbouring tiles and windows overlap on their edges, and a scene that
+straddles a tile boundary is returned by several tile searches. Each item is
+therefore *owned* by exactly one tile and window, and only the owner indexes
+it. Ownership needs nothing but the item itself, so parallel workers need no
+shared state to de-duplicate. Choosing the owner from an item's footprint
+(``owner_point``) needs shapely, which datacube installs.
+"""
+
+import math
+import re
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+BBox = tuple[float, float, float, float]
+
+
+class Tile(NamedTuple):
+    """One cell of the search grid."""
+
+    col: int
+    row: int
+    bbox: BBox
+
+    @property
+    def label(self) -> str:
+        return f"x{self.col:03d}y{self.row:03d}"
+
+
+class Window(NamedTuple):
+    """A half-open ``[start, end)`` time window."""
+
+    start: datetime
+    end: datetime
+
+    @property
+    def stac_datetime(self) -> str:
+        """The window as an (inclusive) STAC datetime interval."""
+        return f"{_iso(self.start)}/{_iso(self.end)}"
+
+    def __contains__(self, when: datetime) -> bool:
+        return self.start <= when < self.end
+
+
+def _iso(when: datetime) -> str:
+    return when.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def parse_datetime(value: str, end: bool = False) -> datetime:
+    """
+    Parse a STAC date or datetime string as a UTC datetime.
+
+    A bare date used as the end of a range means "the whole of that day", so
+    it is returned as midnight of the following day (exclusive).
+    """
+    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", value):
+        parsed = datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        return parsed + timedelta(days=1) if end else parsed
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def split_bbox(bbox: BBox, tile_size: float) -> list[Tile]:
+    """
+    Split ``(minx, miny, maxx, maxy)`` into a grid of at most ``tile_size`` degrees.
+
+    Edge tiles are clipped to the requested bbox.
+    """
+    minx, miny, maxx, maxy = bbox
+    if minx >= maxx or miny >= maxy:
+        raise ValueError(f"Invalid bbox: {bbox}")
+    cols = max(1, math.ceil((maxx - minx) / tile_size - 1e-9))
+    rows = max(1, math.ceil((maxy - miny) / tile_size - 1e-9))
+    tiles = []
+    for row in range(rows):
+        for col in range(cols):
+            tiles.append(Tile(col, row, (
+                minx + col * tile_size,
+                miny + row * tile_size,
+                min(maxx, minx + (col + 1) * tile_size),
+                min(maxy, miny + (row + 1) * tile_size),
+            )))
+    return tiles
+
+
+def _add_months(when: datetime, months: int) -> datetime:
+    month = when.month - 1 + months
+    return when.replace(year=when.year + month // 12, month=month % 12 + 1, day=1)
+
+
+def split_datetime(datetime_range: str, window: str) -> list[Window]:
+    """
+    Split ``start/end`` into consecutive windows.
+
+    Args:
+        datetime_range (str): A STAC interval, e.g. ``2020-01-01/2024-12-31``.
+        window (str): ``year``, ``month`` or a number of days such as ``10d``.
+
+    Returns:
+        list[Window]: Contiguous, non-overlapping windows covering the range.
+    """
+    start_str, _, end_str = datetime_range.partition("/")
+    start = parse_datetime(start_str)
+    end = parse_datetime(end_str or start_str, end=True)
+    if end <= start:
+        raise ValueError(f"Empty datetime range: {datetime_range}")
+
+    if window == "year":
+        def step(when):
+            return when.replace(year=when.year + 1, month=1, day=1, hour=0, minute=0,
+                                second=0, microsecond=0)
+    elif window == "month":
+        def step(when):
+            return _add_months(when.replace(hour=0, minute=0, second=0, microsecond=0), 1)
+    elif re.fullmatch(r"\d+d", window):
+        days = timedelta(days=int(window[:-1]))
+
+        def step(when):
+            return when + days
+    else:
+        raise ValueError(f"Unknown time window {window!r}, expected year, month or <N>d")
+
+    windows = []
+    current = start
+    while current < end:
+        nxt = min(step(current), end)
+        windows.append(Window(current, nxt))
+        current = nxt
+    return windows
+
+
+def owner_point(geometry: dict | None, item_bbox: BBox | None, search_bbox: BBox) -> tuple[float, float] | None:
+    """
+    A point of an item's footprint inside the search bbox, from which its owner tile is chosen.
+
+    A tile search returns every item whose footprint intersects the tile, so
+    the tile containing a point of the footprint always returns the item.
+    (The centre of a rotated or skewed footprint's bbox may lie outside the
+    footprint, in a tile whose search does not return it.) Items without a
+    geometry fall back to their bbox.
+
+    Returns:
+        tuple[float, float] | None: ``(x, y)``, None for an item with neither.
+    """
+    from shapely import make_valid
+    from shapely.geometry import box, shape
+
+    if geometry:
+        footprint = shape(geometry)
+    elif item_bbox is not None:
+        # A 3D STAC bbox is (minx, miny, minz, maxx, maxy, maxz)
+        footprint = box(*item_bbox[:2], *item_bbox[-3:-1]) if len(item_bbox) == 6 else box(*item_bbox)
+    else:
+        return None
+    if not footprint.is_valid:
+        footprint = make_valid(footprint)
+    clipped = footprint.intersection(box(*search_bbox))
+    # Empty only if the API matched an item outside the bbox; owner_tile clamps its point
+    point = (footprint if clipped.is_empty else clipped).representative_point()
+    return point.x, point.y
+
+
+def owner_tile(point: tuple[float, float], search_bbox: BBox, tile_size: float) -> tuple[int, int]:
+    """
+    Return the ``(col, row)`` of the tile that owns an item.
+
+    Args:
+        point (tuple[float, float]): The item's ``owner_point``.
+        search_bbox (BBox): The whole tiled request.
+        tile_size (float): Tile size in degrees.
+    """
+    x, y = point
+    cols = max(1, math.ceil((search_bbox[2] - search_bbox[0]) / tile_size - 1e-9))
+    rows = max(1, math.ceil((search_bbox[3] - search_bbox[1]) / tile_size - 1e-9))
+    col = min(cols - 1, max(0, int((x - search_bbox[0]) // tile_size)))
+    row = min(rows - 1, max(0, int((y - search_bbox[1]) // tile_size)))
+    return col, row
+
+
+def owns(
+    tile: Tile,
+    window: Window,
+    point: tuple[float, float],
+    item_datetime: datetime,
+    search_bbox: BBox,
+    tile_size: float,
+    last_window: bool = False,
+) -> bool:
+    """
+    Whether the ``tile``/``window`` pair is the single owner of an item.
+
+    ``point`` is the item's ``owner_point``. The final window also owns items
+    stamped exactly at its end, since the STAC search interval is inclusive.
+    """
+    if owner_tile(point, search_bbox, tile_size) != (tile.col, tile.row):
+        return False
+    return item_datetime in window or (last_window and item_datetime == window.end)
@@ -1,4 +1,10 @@
 #!/bin/bash
 
+# Clients connect to the database server unless ODC_DB_HOST/ODC_DB_PORT point at the pool
+export ODC_DB_HOST="${ODC_DB_HOST:-${POSTGRES_HOST}}"
+export ODC_DB_PORT="${ODC_DB_PORT:-${POSTGRES_PORT}}"
+# Seconds before SQLAlchemy recycles a pooled connection
+export ODC_DB_CONNECTION_TIMEOUT="${ODC_DB_CONNECTION_TIMEOUT:-60}"
+
 # Create datacube.conf from template
 envsubst < datacube.conf.template > datacube.conf
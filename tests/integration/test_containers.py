@@ -70,3 +70,22 @@ def test_all_containers_running(datacube_environment):
     )
     print(result.stdout)
     assert result.returncode == 0, "Failed to list containers"
+
+
+def test_odc_command_server(datacube_environment):
+    """The odc container's warm server answers pings and runs commands with their exit status."""
+    ping = subprocess.run(
+        ["docker", "exec", "piksel-test-odc-1", "python", "-m", "piksel_core.client", "--ping"],
+        capture_output=True,
+        text=True
+    )
+    assert ping.returncode == 0, f"Server ping failed: {ping.stdout}{ping.stderr}"
+
+    result = subprocess.run(
+        ["docker", "exec", "piksel-test-odc-1", "python", "-m", "piksel_core.client", "--no-fallback",
+         "datacube", "product", "show", "no_such_product"],
+        capture_output=True,
+        text=True
+    )
+    assert result.returncode != 0, "Exit status of the served command was not returned"
+    assert "no_such_product" in result.stdout + result.stderr
@@ -0,0 +1,88 @@
+# tests/integration/test_explorer.py
+import subprocess
+
+import pytest
+
+PRODUCT = "s2_l2a_explorer_test"
+ARCHIVE = f"/tmp/{PRODUCT}_archive"
+
+
+def _exec(container, *args):
+    return subprocess.run(["docker", "exec", f"piksel-test-{container}-1", *args], capture_output=True, text=True)
+
+
+def _piksel(*args):
+    return _exec("odc", "python", "-m", "piksel_core", *args)
+
+
+def _summary_count():
+    result = _exec(
+        "postgres", "bash", "-c",
+        f"psql -U \"$POSTGRES_USER\" -d \"$POSTGRES_DB\" -tAc "
+        f"\"SELECT dataset_count FROM cubedash.product WHERE name = '{PRODUCT}'\"",
+    )
+    assert result.returncode == 0, f"Reading the Explorer summary failed: {result.stderr}"
+    return int(result.stdout.strip())
+
+
+def _explorer_update():
+    """What `make explorer-update` does: claim, regenerate, release."""
+    result = _piksel("explorer-pending", "--claim")
+    assert result.returncode == 0, f"Claiming failed: {result.stderr}"
+    products, forced = (result.stdout.split("\n") + ["", ""])[:2]
+    for args, names in (([], products.split()), (["--force-refresh"], forced.split())):
+        if names:
+            gen = _exec("explorer", "cubedash-gen", *args, *names)
+            assert gen.returncode == 0, f"cubedash-gen failed: {gen.stderr}"
+    result = _piksel("explorer-pending", f"--release={products} {forced}")
+    assert result.returncode == 0, f"Releasing failed: {result.stderr}"
+    return products.split(), forced.split()
+
+
+@pytest.mark.dependency(name="test_imported_product_refreshes_explorer", depends=["test_datacube_init"],
+                        scope="session")
+def test_imported_product_refreshes_explorer(datacube_environment):
+    """Datasets imported with their original timestamps still change the Explorer summary."""
+    with open("products/s2_l2a.odc-product.yaml") as f:
+        definition = f.read().replace("name: s2_l2a", f"name: {PRODUCT}", 1)
+    subprocess.run(
+        ["docker", "exec", "-i", "piksel-test-odc-1", "bash", "-c", f"cat > /tmp/{PRODUCT}.yaml"],
+        input=definition, text=True, check=True,
+    )
+    result = _exec("odc", "datacube", "product", "add", f"/tmp/{PRODUCT}.yaml")
+    assert result.returncode == 0, f"Product addition failed: {result.stderr}"
+    result = _exec(
+        "odc",
+        "stac-to-dc",
+        "--catalog-href=https://earth-search.aws.element84.com/v1/",
+        "--bbox=115.1,-8.4,115.3,-8.2",
+        "--collections=sentinel-2-l2a",
+        "--datetime=2022-01-01/2022-01-15",
+        f"--rename-product={PRODUCT}",
+        "--limit=5",
+    )
+    assert result.returncode == 0, f"Indexing failed: {result.stderr}"
+    _exec("odc", "rm", "-rf", ARCHIVE)
+    result = _piksel("export-product", PRODUCT, f"--output={ARCHIVE}")
+    assert result.returncode == 0, f"Export failed: {result.stderr}"
+    indexed = int(next(line for line in result.stdout.splitlines() if line.startswith("dataset:")).split()[1])
+    assert indexed > 0
+
+    # Summarise the product while it is empty, and move the Explorer watermark past the export
+    result = _piksel("delete-product", PRODUCT)
+    assert result.returncode == 0, f"Product deletion failed: {result.stderr}"
+    result = _exec("odc", "datacube", "product", "add", f"/tmp/{PRODUCT}.yaml")
+    assert result.returncode == 0, f"Product addition failed: {result.stderr}"
+    result = _exec("explorer", "cubedash-gen", "--init", PRODUCT)
+    assert result.returncode == 0, f"cubedash-gen failed: {result.stderr}"
+    _explorer_update()
+    assert _summary_count() == 0
+
+    result = _piksel("import-product", ARCHIVE)
+    assert result.returncode == 0, f"Import failed: {result.stderr}"
+    products, forced = _explorer_update()
+    assert PRODUCT in forced and PRODUCT not in products
+    assert _summary_count() == indexed
+
+    result = _piksel("delete-product", PRODUCT)
+    assert result.returncode == 0, f"Product deletion failed: {result.stderr}"
@@ -0,0 +1,41 @@
+# tests/integration/test_product_delete.py
+import subprocess
+
+import pytest
+
+PRODUCT = "s2_l2a_delete_test"
+
+
+def _exec(*args):
+    return subprocess.run(["docker", "exec", "piksel-test-odc-1", *args], capture_output=True, text=True)
+
+
+@pytest.mark.dependency(name="test_delete_product_in_batches", depends=["test_datacube_init"], scope="session")
+def test_delete_product_in_batches(datacube_environment):
+    """Index a scratch copy of s2_l2a, then delete it in batches of two datasets."""
+    with open("products/s2_l2a.odc-product.yaml") as f:
+        definition = f.read().replace("name: s2_l2a", f"name: {PRODUCT}", 1)
+    subprocess.run(
+        ["docker", "exec", "-i", "piksel-test-odc-1", "bash", "-c", f"cat > /tmp/{PRODUCT}.yaml"],
+        input=definition, text=True, check=True,
+    )
+    result = _exec("datacube", "product", "add", f"/tmp/{PRODUCT}.yaml")
+    assert result.returncode == 0, f"Product addition failed: {result.stderr}"
+
+    result = _exec(
+        "stac-to-dc",
+        "--catalog-href=https://earth-search.aws.element84.com/v1/",
+        "--bbox=115.1,-8.4,115.3,-8.2",
+        "--collections=sentinel-2-l2a",
+        "--datetime=2022-01-01/2022-01-15",
+        f"--rename-product={PRODUCT}",
+        "--limit=5",
+    )
+    assert result.returncode == 0, f"Indexing failed: {result.stderr}"
+
+    result = _exec("python", "-m", "piksel_core", "delete-product", PRODUCT, "--batch-size=2")
+    assert result.returncode == 0, f"Product deletion failed: {result.stderr}"
+    assert f"Deleted product {PRODUCT}" in result.stdout
+
+    result = _exec("datacube", "product", "list")
+    assert PRODUCT not in result.stdout, "Product still registered after deletion"
@@ -80,3 +80,30 @@ def test_s2_geomad_annual_dataset_count(datacube_environment):
 
     assert result.returncode == 0, f"Dataset search failed: {result.stderr}"
     assert len(result.stdout.strip()) > 0, "No datasets found for s2_geomad_annual"
+
+
+@pytest.mark.dependency(name="test_s2_geomad_annual_export_import", depends=["test_s2_geomad_annual_dataset_count"], scope="session")
+def test_s2_geomad_annual_export_import(datacube_environment):
+    """Export the product and import it back over itself, replacing its datasets."""
+    archive = "/tmp/s2_geomad_annual_archive"
+    subprocess.run(["docker", "exec", CONTAINER, "rm", "-rf", archive], check=True)
+    result = subprocess.run(
+        ["docker", "exec", CONTAINER, "python", "-m", "piksel_core", "export-product", PRODUCT_NAME,
+         f"--output={archive}", "--jobs=2"],
+        capture_output=True,
+        text=True,
+    )
+    print(result.stdout)
+    assert result.returncode == 0, f"Export failed: {result.stderr}"
+    exported = next(line for line in result.stdout.splitlines() if line.startswith("dataset:"))
+
+    result = subprocess.run(
+        ["docker", "exec", CONTAINER, "python", "-m", "piksel_core", "import-product", archive, "--replace"],
+        capture_output=True,
+        text=True,
+    )
+    print(result.stdout)
+    assert result.returncode == 0, f"Import failed: {result.stderr}"
+    rows = exported.split()[1]
+    assert f"Deleted {rows} existing datasets" in result.stdout
+    assert f"dataset: {rows} rows inserted" in result.stdout
@@ -24,3 +24,34 @@ def test_spatial_index_creation(datacube_environment):
         
     except Exception as e:
         pytest.skip(f"Spatial index test skipped: {str(e)}")
+
+
+@pytest.mark.dependency(name="test_spatial_index_incremental", depends=["test_spatial_index_creation"], scope="session")
+def test_spatial_index_incremental(datacube_environment):
+    """Test that the incremental update and the consistency check leave nothing to fix."""
+    try:
+        result = subprocess.run(
+            ["docker", "exec", "piksel-test-odc-1", "python", "-m", "piksel_core", "spindex-update", "--epsg", "4326"],
+            capture_output=True,
+            text=True
+        )
+        assert result.returncode == 0, f"Incremental spatial index update failed: {result.stderr}"
+        assert "EPSG:4326" in result.stdout
+
+        # A second run only looks at datasets changed since the first
+        result = subprocess.run(
+            ["docker", "exec", "piksel-test-odc-1", "python", "-m", "piksel_core", "spindex-update", "--epsg", "4326"],
+            capture_output=True,
+            text=True
+        )
+        assert "EPSG:4326: 0 changed datasets" in result.stdout
+
+        result = subprocess.run(
+            ["docker", "exec", "piksel-test-odc-1", "python", "-m", "piksel_core", "spindex-update", "--check"],
+            capture_output=True,
+            text=True
+        )
+        assert result.returncode == 0, f"Spatial index check found problems: {result.stdout}"
+
+    except Exception as e:
+        pytest.skip(f"Spatial index test skipped: {str(e)}")
@@ -0,0 +1,91 @@
+# tests/integration/test_stac_index_s3.py
+import json
+import subprocess
+
+import pytest
+
+# Runs in the odc container: indexes synthetic s2_l2a items served by an S3 stand-in three times
+SCRIPT = """
+import json
+import os
+import subprocess
+
+from datacube import Datacube
+
+from piksel_core.db import connect
+from piksel_core.definitions import PRODUCTS_DIR
+from piksel_core.delete_product import delete_by_location
+from piksel_core.indexbench import relabel
+from piksel_core.s3_discovery import forget_etags
+from piksel_core.standin import S3Standin
+from piksel_core.synth_datasets import load_product_definitions
+from piksel_core.synthetic import stac_item, synthetic_documents
+
+PRODUCT = "s2_l2a"
+BUCKET = "piksel-test"
+RUN = "index-s3-test"
+LOCATION = f"s3://{BUCKET}/{RUN}/"
+
+definition = load_product_definitions(PRODUCTS_DIR)[PRODUCT]
+items = relabel(
+    [stac_item(doc, uri) for uri, doc in synthetic_documents(definition, "2023-01-01/2023-12-31", 5)],
+    RUN, PRODUCT,
+)
+objects = {f"{RUN}/{item['id']}.stac-item.json": json.dumps(item).encode() for item in items}
+observed = {"items": len(objects)}
+
+
+def index_s3(standin):
+    before = standin.requests
+    result = subprocess.run(
+        ["python", "-m", "piksel_core", "index-s3", "--no-sign-request", f"{LOCATION}**/*.stac-item.json", PRODUCT],
+        capture_output=True, text=True, env={**os.environ, **standin.environment()},
+    )
+    return {
+        "returncode": result.returncode,
+        "plan": next((line for line in result.stderr.splitlines() if "documents match" in line), result.stderr),
+        "requests": standin.requests - before,
+    }
+
+
+with S3Standin(objects, bucket=BUCKET) as standin:
+    try:
+        observed["first"] = index_s3(standin)
+        observed["second"] = index_s3(standin)
+        # Same document, new bytes: only its ETag tells it apart
+        key = sorted(objects)[0]
+        standin.put(key, objects[key] + b"\\n")
+        observed["changed"] = index_s3(standin)
+    finally:
+        dc = Datacube(app="piksel-test-index-s3")
+        connection = connect(application_name="piksel-test-index-s3")
+        observed["deleted"] = delete_by_location(connection, dc.index.products.get_by_name(PRODUCT).id, LOCATION)
+        forget_etags(connection, LOCATION)
+        connection.close()
+        dc.close()
+print(json.dumps(observed))
+"""
+
+
+@pytest.mark.dependency(name="test_index_s3_skips_unchanged_etags", depends=["test_add_sentinel2_product"],
+                        scope="session")
+def test_index_s3_skips_unchanged_etags(datacube_environment):
+    """A second index-s3 run fetches nothing, and a changed ETag fetches just that document again."""
+    result = subprocess.run(["docker", "exec", "-i", "piksel-test-odc-1", "python", "-"], input=SCRIPT,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, f"index-s3 script failed: {result.stderr}"
+    observed = json.loads(result.stdout.strip().splitlines()[-1])
+    n = observed["items"]
+    first, second, changed = observed["first"], observed["second"], observed["changed"]
+
+    assert first["returncode"] == 0, first["plan"]
+    assert first["plan"] == f"{n} documents match, 0 unchanged since indexed, fetching {n}"
+    assert second["returncode"] == 0, second["plan"]
+    assert second["plan"] == f"{n} documents match, {n} unchanged since indexed, fetching 0"
+    # Only the listing reached the bucket
+    assert second["requests"] == first["requests"] - n
+    assert changed["returncode"] == 0, changed["plan"]
+    assert changed["plan"] == f"{n} documents match, {n - 1} unchanged since indexed, fetching 1"
+    assert changed["requests"] == second["requests"] + 1
+
+    assert observed["deleted"] == n
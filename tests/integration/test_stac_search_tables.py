@@ -0,0 +1,104 @@
+# tests/integration/test_stac_search_tables.py
+import json
+import subprocess
+
+import pytest
+
+# Runs in the odc container against the s2_l2a datasets indexed by test_stac_index_s2_l2a.py
+SCRIPT = """
+import json
+from datetime import datetime, timezone
+
+from datacube import Datacube
+
+from piksel_core.db import PIKSEL_SCHEMA, connect
+from piksel_core.search_tables import drop_table, refresh_product, search, table_name
+
+PRODUCT = "s2_l2a"
+TERMS = {
+    "time": (datetime(2022, 1, 1, tzinfo=timezone.utc), datetime(2022, 1, 16, tzinfo=timezone.utc)),
+    "lon": (115.1, 115.3),
+    "lat": (-8.4, -8.2),
+}
+
+dc = Datacube(app="piksel-test-search-tables")
+connection = connect(application_name="piksel-test-search-tables")
+observed = {}
+
+
+def table_ids():
+    with connection, connection.cursor() as cur:
+        cur.execute(f"SELECT id::text FROM {PIKSEL_SCHEMA}.{table_name(PRODUCT)}")
+        return sorted(row[0] for row in cur.fetchall())
+
+
+def searched():
+    with connection, connection.cursor() as cur:
+        ids = search(cur, PRODUCT, **TERMS)
+    return sorted(ids) if ids is not None else None
+
+
+def found():
+    return sorted(str(ds.id) for ds in dc.find_datasets(product=PRODUCT, **TERMS))
+
+
+try:
+    report = refresh_product(connection, PRODUCT, srid=4326, full=True)
+    observed["created"] = {"report": report.datasets, "rows": len(table_ids()),
+                           "active": dc.index.datasets.count(product=PRODUCT)}
+    observed["search"] = {"table": searched(), "datacube": found()}
+
+    archived = observed["search"]["datacube"][0]
+    dc.index.datasets.archive([archived])
+    observed["search_after_change"] = searched()
+    report = refresh_product(connection, PRODUCT)
+    observed["archived"] = {"id": archived, "in_table": archived in table_ids(), "report": report.datasets,
+                            "incremental": not report.rebuilt}
+    observed["search_after_refresh"] = {"table": searched(), "datacube": found()}
+
+    dc.index.datasets.restore([archived])
+    refresh_product(connection, PRODUCT)
+    observed["restored"] = archived in table_ids()
+finally:
+    with connection, connection.cursor() as cur:
+        drop_table(cur, PRODUCT)
+    connection.close()
+    dc.close()
+print(json.dumps(observed))
+"""
+
+
+def _exec(*args, **kwargs):
+    return subprocess.run(["docker", "exec", "-i", "piksel-test-odc-1", *args], capture_output=True, text=True,
+                          **kwargs)
+
+
+@pytest.mark.dependency(
+    name="test_search_table_refresh_and_search",
+    depends=["test_stac_to_dc_sentinel2_indonesia", "test_spatial_index_creation"],
+    scope="session",
+)
+def test_search_table_refresh_and_search(datacube_environment):
+    """A search table follows archiving through incremental refreshes and answers like datacube."""
+    # Footprints come from the spatial index, so bring it up to date first
+    result = _exec("python", "-m", "piksel_core", "spindex-update", "--epsg", "4326")
+    assert result.returncode == 0, f"Spatial index update failed: {result.stderr}"
+
+    result = _exec("python", "-", input=SCRIPT)
+    assert result.returncode == 0, f"Search table script failed: {result.stderr}"
+    observed = json.loads(result.stdout.strip().splitlines()[-1])
+
+    created = observed["created"]
+    assert created["rows"] == created["report"] == created["active"] > 0
+    assert observed["search"]["table"] == observed["search"]["datacube"]
+    assert observed["search"]["table"]
+
+    # A dataset changed after the refresh: the table no longer answers
+    assert observed["search_after_change"] is None
+    archived = observed["archived"]
+    assert archived["incremental"] and not archived["in_table"]
+    assert archived["report"] == created["rows"] - 1
+    after = observed["search_after_refresh"]
+    assert after["table"] == after["datacube"] and archived["id"] not in after["table"]
+
+    assert observed["restored"]
@@ -0,0 +1,43 @@
+import os
+
+import yaml
+
+from piksel_core.advisor import field_usage, plan_partial_indexes, search_fields
+
+METADATA_TYPE = os.path.join("metadata", "custom_metadata.odc-type.yaml")
+
+# Shape of a datacube search as recorded by pg_stat_statements
+STATEMENT = (
+    'SELECT odc.dataset.id FROM odc.dataset JOIN odc.dataset_search_datetime AS "dataset_search_datetime-time" '
+    'ON odc.dataset.id = "dataset_search_datetime-time".dataset_ref AND "dataset_search_datetime-time".search_key = $1 '
+    'JOIN odc.dataset_search_num AS "dataset_search_num-cloud_cover" '
+    'ON odc.dataset.id = "dataset_search_num-cloud_cover".dataset_ref AND "dataset_search_num-cloud_cover".search_key = $2 '
+    'WHERE "dataset_search_num-cloud_cover".search_val && $3::NUMRANGE'
+)
+
+
+def test_search_fields_from_metadata_type():
+    with open(METADATA_TYPE) as f:
+        fields = search_fields(yaml.safe_load(f))
+    assert fields["cloud_cover"].kind == "numeric" and fields["cloud_cover"].indexed
+    assert fields["time"].kind == "datetime"
+    assert fields["region_code"].kind == "string"
+    assert not fields["sat_orbit_state"].indexed
+
+
+def test_plan_partial_indexes_from_query_mix():
+    with open(METADATA_TYPE) as f:
+        fields = search_fields(yaml.safe_load(f))
+    usage = field_usage([(STATEMENT, 120), ('SELECT 1 FROM "dataset_search_string-platform"', 2)])
+    assert usage == {"time": 120, "cloud_cover": 120, "platform": 2}
+
+    actions = plan_partial_indexes(fields, usage, existing={"pix_num_cloud_cover", "pix_str_wrs_old"},
+                                   min_calls=10, brin_fields=["time"], drop_unused=True)
+    assert [(a.action, a.name) for a in actions] == [
+        ("create", "pix_dat_time_brin"),
+        ("drop", "pix_str_wrs_old"),
+    ]
+    assert actions[0].sql == (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS pix_dat_time_brin ON odc.dataset_search_datetime "
+        "USING brin (search_val range_inclusion_ops) WHERE search_key = 'time'"
+    )
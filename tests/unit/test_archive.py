@@ -0,0 +1,43 @@
+import shutil
+
+import pytest
+
+from piksel_core.archive import (
+    GZIP_SUFFIX,
+    ZSTD_SUFFIX,
+    open_stream,
+    read_manifest,
+    table_file,
+    write_manifest,
+)
+
+PRODUCT = {"name": "s2_geomad_annual", "metadata_type": "eo3"}
+METADATA_TYPE = {"name": "eo3"}
+
+
+@pytest.mark.parametrize("suffix", [GZIP_SUFFIX, ZSTD_SUFFIX])
+def test_stream_round_trip(tmp_path, suffix):
+    if suffix == ZSTD_SUFFIX and not shutil.which("zstd"):
+        pytest.skip("zstd is not installed")
+    path = str(tmp_path / table_file("dataset", suffix))
+    data = b"PGCOPY\n\xff\r\n\x00" + bytes(range(256)) * 1000
+    with open_stream(path, "wb") as stream:
+        stream.write(data[:1000])
+        stream.write(data[1000:])
+    with open_stream(path, "rb") as stream:
+        assert stream.read() == data
+
+
+def test_manifest_lists_every_stream(tmp_path):
+    files = {"dataset": table_file("dataset", GZIP_SUFFIX), "spatial_4326": table_file("spatial_4326", GZIP_SUFFIX)}
+    (tmp_path / files["dataset"]).write_bytes(b"")
+    write_manifest(str(tmp_path), PRODUCT, METADATA_TYPE, files, {"dataset": 3, "spatial_4326": 3})
+    # The spatial stream is missing
+    with pytest.raises(ValueError, match="spatial_4326.copy.gz"):
+        read_manifest(str(tmp_path))
+
+    (tmp_path / files["spatial_4326"]).write_bytes(b"")
+    manifest = read_manifest(str(tmp_path))
+    assert manifest["product"] == "s2_geomad_annual"
+    assert manifest["metadata_type_definition"] == METADATA_TYPE
+    assert manifest["tables"]["dataset"] == {"file": "dataset.copy.gz", "rows": 3}
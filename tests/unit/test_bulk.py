@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+
+from piksel_core.bulk import copy_buffer, range_literal, search_rows, search_value
+
+
+class _Field:
+    def __init__(self, type_name, path):
+        self.type_name = type_name
+        self.path = path
+
+    def extract(self, doc):
+        for key in self.path:
+            doc = doc.get(key, {})
+        return doc or None
+
+
+def test_search_values_match_driver_storage():
+    assert search_value("string", "s2_l2a") == ("string", "s2_l2a")
+    assert search_value("double", 12.5) == ("numeric", '["12.5","12.5"]')
+    assert search_value("boolean", True) == ("numeric", '["1","1"]')
+    assert search_value("double", float("nan")) is None
+    assert search_value("double-range", (-8.0, -5.0)) == ("numeric", '["-8.0","-5.0"]')
+    assert search_value("double-range", None) is None
+    assert search_value("datetime", datetime(2024, 1, 1, 3)) == \
+        ("datetime", '["2024-01-01T03:00:00+00:00","2024-01-01T03:00:00+00:00"]')
+    assert range_literal(None, datetime(2024, 1, 1, tzinfo=timezone.utc)) == \
+        '[,"2024-01-01T00:00:00+00:00"]'
+
+
+def test_search_rows_and_copy_buffer():
+    doc = {"properties": {"platform": "sentinel-2a", "eo:cloud_cover": 3.5,
+                          "datetime": "2024-01-01T03:00:00Z"}}
+    fields = {
+        "platform": _Field("string", ("properties", "platform")),
+        "cloud_cover": _Field("double", ("properties", "eo:cloud_cover")),
+        "time": _Field("datetime-range", ("properties", "datetime")),
+    }
+    fields["time"].extract = lambda d: (d["properties"]["datetime"],) * 2
+    rows = list(search_rows("ds-1", doc, fields))
+    assert rows == [
+        ("string", "ds-1", "platform", "sentinel-2a"),
+        ("numeric", "ds-1", "cloud_cover", '["3.5","3.5"]'),
+        ("datetime", "ds-1", "time", '["2024-01-01T03:00:00Z","2024-01-01T03:00:00Z"]'),
+    ]
+
+    buffer = copy_buffer([("ds-1", {"id": 1}, "tab\there", None)])
+    assert buffer.read() == 'ds-1\t{"id":1}\ttab\\there\t\\N\n'
@@ -0,0 +1,57 @@
+import json
+import struct
+from datetime import datetime, timezone
+
+import pytest
+
+pq = pytest.importorskip("pyarrow.parquet")
+pytest.importorskip("datacube")
+
+from piksel_core.catalogue import plan_refresh, read_partitions, rows_table, write_partition  # noqa: E402
+
+
+def _row(id, year, x, cloud):
+    start = datetime(year, 3, 1, tzinfo=timezone.utc)
+    # A 1 x 1 degree square as WKB, little-endian
+    ring = [(x, -7.0), (x + 1, -7.0), (x + 1, -6.0), (x, -6.0), (x, -7.0)]
+    wkb = struct.pack("<BII", 1, 3, 1) + struct.pack("<I", len(ring)) + b"".join(struct.pack("<dd", *p) for p in ring)
+    return (id, f"s3://bucket/{id}.json", start, start, cloud, "T48MYT", "sentinel-2a", start,
+            x, -7.0, x + 1, -6.0, wkb)
+
+
+def test_plan_refresh():
+    snapshot = {"a", "b", "c"}
+    active = {"b", "c", "d"}
+    changed = {"c", "e"}
+    fetch, drop = plan_refresh(snapshot, active, changed)
+    # d is new, c was updated; a was archived or deleted, e changed but is not active
+    assert fetch == {"c", "d"}
+    assert drop == {"a", "c"}
+
+
+def test_partitions_round_trip_and_search(tmp_path):
+    pandas = pytest.importorskip("pandas")
+    from notebooks.utils import CatalogueSnapshot
+
+    product_dir = tmp_path / "product=s2_l2a"
+    write_partition(
+        str(product_dir / "year=2023"), rows_table([_row("b", 2023, 107.0, 50.0), _row("a", 2023, 106.0, 5.0)])
+    )
+    write_partition(str(product_dir / "year=2024"), rows_table([_row("c", 2024, 106.0, 10.0)]))
+    partitions = read_partitions(str(product_dir))
+    assert sorted(partitions) == [2023, 2024]
+    assert partitions[2023].column("id").to_pylist() == ["a", "b"]
+    geo = json.loads(pq.read_schema(str(product_dir / "year=2023" / "part-0.parquet")).metadata[b"geo"])
+    assert geo["columns"]["geometry"]["bbox"] == [106.0, -7.0, 108.0, -6.0]
+
+    catalogue = CatalogueSnapshot(str(tmp_path))
+    assert catalogue.products() == ["s2_l2a"]
+    frame = catalogue.search(product="s2_l2a", lon=(106.2, 106.5), lat=(-6.5, -6.4))
+    assert list(frame["id"]) == ["a", "c"]
+    frame = catalogue.search(product="s2_l2a", time="2023", cloud_cover=20)
+    assert list(frame["id"]) == ["a"]
+    assert isinstance(frame, pandas.DataFrame)
+
+    # An emptied partition is removed
+    write_partition(str(product_dir / "year=2024"), rows_table([]))
+    assert sorted(read_partitions(str(product_dir))) == [2023]
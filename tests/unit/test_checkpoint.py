@@ -0,0 +1,87 @@
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("pystac_client")
+
+from piksel_core.checkpoint import checkpoint_key, checkpointed_pages, incremental_search
+from piksel_core.stac import search_pages
+from piksel_core.standin import StacStandin
+
+
+def _s2_item(day, hour=3):
+    item_id = f"S2A_48MYT_202401{day:02d}_{hour}"
+    return {
+        "type": "Feature",
+        "stac_version": "1.0.0",
+        "id": item_id,
+        "collection": "sentinel-2-l2a",
+        "bbox": [105.1, -6.4, 106.1, -5.4],
+        "geometry": {
+            "type": "Polygon",
+            "coordinates": [[[105.1, -6.4], [106.1, -6.4], [106.1, -5.4], [105.1, -5.4], [105.1, -6.4]]],
+        },
+        "properties": {
+            "datetime": f"2024-01-{day:02d}T{hour:02d}:00:00Z",
+            "updated": f"2024-02-{day:02d}T00:00:00Z",
+        },
+        "assets": {},
+        "links": [],
+    }
+
+
+def test_checkpoint_key_normalises_bbox_and_range():
+    assert checkpoint_key("s2_l2a", "sentinel-2-l2a", [105, -8, 106, -5.0], "2024-01-01/2024-05-31", "datetime") == \
+        checkpoint_key("s2_l2a", "sentinel-2-l2a", ["105.0", "-8", "106", "-5"],
+                       "2024-01-01T00:00:00Z/2024-06-01T00:00:00Z", "datetime")
+    key = checkpoint_key("s2_l2a", "sentinel-2-l2a", None, None, "datetime")
+    assert key.bbox == "*" and key.datetime_range == "*"
+    assert checkpoint_key("s2_l2a", "sentinel-2-l2a", None, "../..", "datetime") == key
+    assert checkpoint_key("s2_l2a", "sentinel-2-l2a", None, "2024-03-01", "datetime").datetime_range == \
+        "2024-03-01T00:00:00Z/2024-03-02T00:00:00Z"
+
+
+def test_backfill_does_not_share_the_nightly_checkpoint():
+    nightly = checkpoint_key("s2_l2a", "sentinel-2-l2a", None, "2017-01-01/..", "datetime")
+    backfill = checkpoint_key("s2_l2a", "sentinel-2-l2a", None, "2015-01-01/2016-12-31", "datetime")
+    assert nightly != backfill
+
+
+def test_incremental_search_narrows_from_high_water():
+    high_water = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    assert incremental_search("2024-01-01/2024-05-31", "datetime", None) == ("2024-01-01/2024-05-31", None)
+    assert incremental_search("2024-01-01/2024-05-31", "datetime", high_water) == \
+        ("2024-03-01T00:00:00Z/2024-05-31", None)
+    assert incremental_search(None, "datetime", high_water) == ("2024-03-01T00:00:00Z/..", None)
+    assert incremental_search("2024-04-01/..", "datetime", high_water) == ("2024-04-01/..", None)
+    assert incremental_search("2024-01-01/..", "updated", high_water) == \
+        ("2024-01-01/..", {"updated": {"gte": "2024-03-01T00:00:00Z"}})
+
+
+@pytest.mark.parametrize("field", ["datetime", "updated"])
+def test_resume_from_last_committed_page(field):
+    items = [_s2_item(day) for day in range(1, 11)]
+    with StacStandin(items, page_size=3) as stac:
+        def run(high_water, stop_after=None):
+            window, query = incremental_search("2024-01-01/2024-12-31", field, high_water)
+            pages = search_pages(stac.url, ["sentinel-2-l2a"], datetime=window, query=query,
+                                 sortby=f"+properties.{field}", page_size=3)
+            seen = []
+            for n, (page, page_high_water) in enumerate(checkpointed_pages(pages, field), 1):
+                seen.extend(item.id for item in page)
+                high_water = page_high_water
+                if n == stop_after:
+                    break
+            return seen, high_water
+
+        # Interrupted after two pages: six items indexed, checkpoint at the sixth.
+        first, high_water = run(None, stop_after=2)
+        assert first == [item["id"] for item in items[:6]]
+
+        # The resumed run refetches only the boundary item, which the indexer skips.
+        resumed, high_water = run(high_water)
+        assert resumed == [item["id"] for item in items[5:]]
+
+        # Nothing new upstream: only the last indexed item comes back.
+        again, _ = run(high_water)
+        assert again == [items[-1]["id"]]
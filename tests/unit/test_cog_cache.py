@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from piksel_core.cog_cache import ObjectInfo, RangeCache, is_cacheable, parse_size
+
+URL = "s3://bucket/x10/y20/red.tif"
+
+
+class Objects:
+    """Fetcher serving in-memory objects and counting ranged requests."""
+
+    def __init__(self, **objects):
+        self.objects = {f"s3://bucket/{name}.tif": data for name, data in objects.items()}
+        self.etags = dict.fromkeys(self.objects, "v1")
+        self.requests = []
+
+    def head(self, url):
+        if url not in self.objects:
+            raise FileNotFoundError(url)
+        return ObjectInfo(self.etags[url], len(self.objects[url]))
+
+    def get(self, url, start, end):
+        self.requests.append((url, start, end))
+        return self.objects[url][start:end]
+
+
+def test_reads_are_served_from_disk_until_the_etag_changes(tmp_path):
+    data = os.urandom(1000)
+    fetcher = Objects(**{"x10/y20/red": data})
+    cache = RangeCache(str(tmp_path), max_bytes=10_000, block_size=100, fetcher=fetcher)
+
+    with cache.open(URL) as f:
+        f.seek(150)
+        assert f.read(300) == data[150:450]
+        f.seek(-10, os.SEEK_END)
+        assert f.read() == data[-10:]
+    # Consecutive missing blocks are fetched together
+    assert fetcher.requests == [(URL, 100, 500), (URL, 900, 1000)]
+
+    # Another kernel sharing the directory
+    other = RangeCache(str(tmp_path), max_bytes=10_000, block_size=100, fetcher=fetcher)
+    assert other.read(URL, 120, 360) == data[120:480]
+    assert len(fetcher.requests) == 2
+    stats = other.stats()
+    assert (stats.hits, stats.misses, stats.blocks, stats.size) == (4, 5, 5, 500)
+
+    fetcher.etags[URL] = "v2"
+    fresh = RangeCache(str(tmp_path), max_bytes=10_000, block_size=100, metadata_ttl=0, fetcher=fetcher)
+    assert fresh.read(URL, 120, 10) == data[120:130]
+    assert fetcher.requests[-1] == (URL, 100, 200)
+
+    with pytest.raises(FileNotFoundError):
+        cache.open(URL + ".aux.xml")
+
+
+def test_least_recently_used_blocks_are_evicted(tmp_path):
+    fetcher = Objects(a=b"a" * 400, b=b"b" * 400)
+    cache = RangeCache(str(tmp_path), max_bytes=500, block_size=100, fetcher=fetcher)
+    cache.read("s3://bucket/a.tif", 0, 400)
+    cache.read("s3://bucket/a.tif", 0, 100)
+    cache.read("s3://bucket/b.tif", 0, 200)
+    # Over 500 bytes: evicted down to 450, oldest first, keeping a's first block
+    stats = cache.stats()
+    assert (stats.evicted, stats.size) == (2, 400)
+    fetcher.requests.clear()
+    cache.read("s3://bucket/a.tif", 0, 100)
+    assert fetcher.requests == []
+
+    cache.clear()
+    assert cache.stats().blocks == 0
+
+
+def test_size_and_url_helpers():
+    assert parse_size("20G") == 20 * 1024**3
+    assert parse_size("512MiB") == 512 * 1024**2
+    assert parse_size(1024) == 1024
+    assert is_cacheable("https://sentinel-cogs.s3.us-west-2.amazonaws.com/x/B04.tif")
+    assert not is_cacheable("s3://bucket/x/B04.tif.aux.xml")
+    assert not is_cacheable("/data/x/B04.tif")
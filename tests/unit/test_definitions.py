@@ -0,0 +1,21 @@
+from piksel_core.definitions import check_products_csv, load_definitions, read_products_csv
+
+
+def test_products_csv_matches_definitions():
+    products = load_definitions("products")
+    # Multi-document files contribute one definition per product
+    assert {"ls5_c2l2_sr", "ls7_c2l2_sr", "ls8_c2l2_sr", "ls9_c2l2_sr"} <= set(products)
+    assert check_products_csv(read_products_csv("products.csv"), products) == []
+
+
+def test_check_products_csv_reports_drift():
+    products = load_definitions("products")
+    listing = read_products_csv("products.csv")
+    listing.pop("ls9_c2l2_sr")
+    listing["ls10_c2l2_sr"] = "lsX_c2l2_sr.odc-product.yaml"
+    listing["s2_l2a"] = "other.yaml"
+    assert check_products_csv(listing, products) == [
+        "ls10_c2l2_sr is listed in products.csv but not defined",
+        f"s2_l2a is listed with other.yaml but defined in {products['s2_l2a'].path.split('/')[-1]}",
+        "ls9_c2l2_sr is defined in lsX_c2l2_sr.odc-product.yaml but not in products.csv",
+    ]
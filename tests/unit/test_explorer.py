@@ -0,0 +1,25 @@
+from datetime import date
+
+import pytest
+
+pytest.importorskip("datacube")
+
+from piksel_core.explorer import PendingPeriod, month_ranges, summarise
+
+
+def test_month_ranges_collapse_consecutive_months():
+    periods = [date(2023, 3, 1), date(2023, 1, 1), date(2023, 2, 1), date(2023, 7, 1), date(2023, 12, 1),
+               date(2024, 1, 1)]
+    assert month_ranges(periods) == "2023-01..2023-03, 2023-07, 2023-12..2024-01"
+
+
+def test_summarise_per_product():
+    lines = summarise([
+        PendingPeriod("s2_l2a", date(2024, 5, 1), 120),
+        PendingPeriod("ls9_c2l2_sr", date(2024, 5, 1), 3),
+        PendingPeriod("s2_l2a", date(2024, 6, 1), 30),
+    ])
+    assert lines == [
+        "ls9_c2l2_sr: 3 changed datasets in 2024-05",
+        "s2_l2a: 150 changed datasets in 2024-05..2024-06",
+    ]
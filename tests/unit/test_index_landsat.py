@@ -0,0 +1,78 @@
+import pytest
+
+pytest.importorskip("pystac_client")
+
+from piksel_core.landsat import plan_scans, scan_landsat
+from piksel_core.standin import StacStandin
+
+
+def _landsat_item(collection, platform, day, scene):
+    item_id = f"{scene}_{platform}_{day}"
+    return {
+        "type": "Feature",
+        "stac_version": "1.0.0",
+        "id": item_id,
+        "collection": collection,
+        "bbox": [105.2, -7.1, 107.3, -5.0],
+        "geometry": {
+            "type": "Polygon",
+            "coordinates": [[[105.2, -7.1], [107.3, -7.1], [107.3, -5.0], [105.2, -5.0], [105.2, -7.1]]],
+        },
+        "properties": {"datetime": f"2024-01-{day:02d}T02:50:00Z", "platform": platform},
+        "assets": {
+            "red": {"href": f"https://landsatlook.usgs.gov/data/collection02/level-2/{item_id}_SR_B4.TIF"},
+        },
+        "links": [
+            {"rel": "self", "href": f"https://landsatlook.usgs.gov/stac-server/collections/{collection}/items/{item_id}"},
+        ],
+    }
+
+
+@pytest.fixture
+def landsat_items():
+    items = []
+    for collection, scene in (("landsat-c2l2-sr", "SR"), ("landsat-c2l2-st", "ST")):
+        for platform in ("LANDSAT_7", "LANDSAT_8", "LANDSAT_9"):
+            for day in range(1, 6):
+                items.append(_landsat_item(collection, platform, day, scene))
+    return items
+
+
+def test_plan_scans_groups_platforms_by_date_window():
+    scans = plan_scans(
+        ["landsat-c2l2-sr", "landsat-c2l2-st"],
+        ["LANDSAT_5", "LANDSAT_7", "LANDSAT_8", "LANDSAT_9"],
+        "2024-01-01/2024-05-31",
+    )
+    assert len(scans) == 2, "One scan per collection when all platforms share a date window"
+
+    scans = plan_scans(
+        ["landsat-c2l2-sr", "landsat-c2l2-st"],
+        ["LANDSAT_5", "LANDSAT_7", "LANDSAT_8", "LANDSAT_9"],
+        "2024-01-01/2024-05-31",
+        {"LANDSAT_5": "2000-01-01/2000-07-31", "LANDSAT_7": "2000-01-01/2000-07-31"},
+    )
+    assert len(scans) == 4
+    assert {s.platforms for s in scans} == {("LANDSAT_5", "LANDSAT_7"), ("LANDSAT_8", "LANDSAT_9")}
+
+
+def test_scan_landsat_routes_and_rewrites_in_one_pass(landsat_items):
+    scans = plan_scans(
+        ["landsat-c2l2-sr", "landsat-c2l2-st"],
+        ["LANDSAT_8", "LANDSAT_9"],
+        "2024-01-01/2024-01-31",
+    )
+    with StacStandin(landsat_items, page_size=4) as stac:
+        routed = list(scan_landsat(stac.url, scans, bbox=[105, -8, 106, -5], page_size=4))
+        searches = stac.searches
+
+    assert len(searches) == 2, f"Expected one search per collection, got {searches}"
+    assert len(routed) == 20, "LANDSAT_7 items should be excluded by the platform filter"
+
+    products = {product for product, _ in routed}
+    assert products == {"ls8_c2l2_sr", "ls9_c2l2_sr", "ls8_c2l2_st", "ls9_c2l2_st"}
+    for product, item in routed:
+        platform_number = item.properties["platform"][-1]
+        assert product.startswith(f"ls{platform_number}_c2l2_")
+        assert item.assets["red"].href.startswith("s3://usgs-landsat/collection02/")
+        assert item.get_self_href().startswith("https://landsatlook.usgs.gov/stac-server/")
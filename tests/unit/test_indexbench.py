@@ -0,0 +1,76 @@
+import io
+import json
+import os
+import urllib.request
+from urllib.parse import quote
+from xml.etree import ElementTree
+
+import yaml
+
+from piksel_core.indexbench import read_items, relabel, tool_counts
+from piksel_core.standin import S3Standin
+from piksel_core.synthetic import stac_item, synthetic_documents
+
+S3_NS = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+
+
+def _s2_items(n):
+    with open(os.path.join("products", "s2_l2a.odc-product.yaml")) as f:
+        product = yaml.safe_load(f)
+    return [stac_item(doc, uri) for uri, doc in synthetic_documents(product, "2023-01-01/2023-12-31", n)]
+
+
+def test_synthetic_stac_items_are_relabelled_per_run():
+    items = _s2_items(3)
+    item = items[0]
+    lon_min, lat_min, lon_max, lat_max = item["bbox"]
+    assert 95 < lon_min < lon_max < 141 and -11 < lat_min < lat_max < 6
+    assert item["properties"]["proj:epsg"] in (32647, 32648, 32649, 32650, 32651, 32652, 32653, 32654)
+    assert all(asset["href"].startswith("s3://piksel-synthetic/s2_l2a/") for asset in item["assets"].values())
+
+    first = relabel(items, "run-1", "s2_l2a_bench")
+    assert [i["id"] for i in relabel(items, "run-1", "s2_l2a_bench")] == [i["id"] for i in first]
+    assert not {i["id"] for i in first} & {i["id"] for i in relabel(items, "run-2", "s2_l2a_bench")}
+    assert {i["properties"]["odc:product"] for i in first} == {"s2_l2a_bench"}
+    assert not [link for i in first for link in i["links"] if link["rel"] == "self"]
+    assert items[0]["collection"] == "s2_l2a"
+
+    ndjson = io.StringIO("\n".join(json.dumps(i) for i in items))
+    assert [i["id"] for i in read_items(ndjson)] == [i["id"] for i in items]
+
+
+def test_tool_counts_from_either_summary_line():
+    assert tool_counts("Added 10 datasets...\rAdded 98 Datasets, failed 1 Datasets, skipped 1 Datasets") == {
+        "added": 98, "failed": 1, "skipped": 1,
+    }
+    assert tool_counts("Added 5 datasets, skipped 2 datasets and failed 0 datasets.") == {
+        "added": 5, "failed": 0, "skipped": 2,
+    }
+
+
+def test_s3_standin_lists_in_pages_and_serves_objects():
+    objects = {f"run/s2/{i:03d}.stac-item.json": b"{}" for i in range(250)}
+    objects["run/readme.txt"] = b"hello"
+    with S3Standin(objects, bucket="piksel-bench") as s3:
+        keys, token = [], None
+        while True:
+            url = f"{s3.endpoint_url}/piksel-bench?list-type=2&prefix=run/s2/&max-keys=100"
+            if token:
+                url += f"&continuation-token={quote(token)}"
+            page = ElementTree.fromstring(urllib.request.urlopen(url).read())
+            keys += [e.text for e in page.iter(f"{S3_NS}Key")]
+            token = page.findtext(f"{S3_NS}NextContinuationToken")
+            if not token:
+                break
+        assert keys == sorted(k for k in objects if k.startswith("run/s2/"))
+
+        listing = ElementTree.fromstring(urllib.request.urlopen(
+            f"{s3.endpoint_url}/piksel-bench?list-type=2&prefix=run/&delimiter=/").read())
+        assert [e.text for e in listing.iter(f"{S3_NS}Prefix") if e.text != "run/"] == ["run/s2/"]
+        assert urllib.request.urlopen(f"{s3.endpoint_url}/piksel-bench/run/readme.txt").read() == b"hello"
+        assert s3.requests == 5
+
+        etag = urllib.request.urlopen(f"{s3.endpoint_url}/piksel-bench/run/readme.txt").headers["ETag"]
+        s3.put("run/readme.txt", b"hello again")
+        changed = urllib.request.urlopen(f"{s3.endpoint_url}/piksel-bench/run/readme.txt")
+        assert changed.read() == b"hello again" and changed.headers["ETag"] != etag
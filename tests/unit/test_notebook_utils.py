@@ -0,0 +1,72 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from notebooks.utils import LANDSAT_PRODUCTS, QueryCache, landsat_bands, search_key, stream
+
+PRODUCT_DIR = "products"
+
+
+def test_search_key_is_canonical():
+    a = search_key("find_datasets", {"product": "s2_l2a", "lon": (106.7, 107.0), "time": datetime(2023, 1, 1)})
+    b = search_key("find_datasets", {"time": datetime(2023, 1, 1), "lon": [106.7, 107.0], "product": "s2_l2a"})
+    assert a == b
+    assert a != search_key("find_datasets", {"product": "s2_l2a", "lon": (106.7, 107.1)})
+    assert a != search_key("list_products", {"product": "s2_l2a", "lon": (106.7, 107.0)})
+
+
+def test_query_cache_tiers_and_stamp_invalidation(tmp_path):
+    cache = QueryCache(maxsize=2, cache_dir=str(tmp_path))
+    cache.put("a", ("1", "t0"), ["ds1"])
+    assert cache.get("a", ("1", "t0")) == ["ds1"]
+    # Something was indexed since: the entry is stale
+    assert cache.get("a", ("2", "t1")) is None
+
+    cache.put("b", 1, "b")
+    cache.put("c", 1, "c")
+    assert "a" not in cache._memory
+    # Another kernel sharing the directory reads it from disk
+    other = QueryCache(cache_dir=str(tmp_path))
+    assert other.get("a", ("1", "t0")) == ["ds1"]
+    assert (other.hits, other.misses) == (1, 0)
+
+    other.clear()
+    assert cache.get("a", ("1", "t0")) is None
+
+
+def _product_measurements(path):
+    import yaml
+
+    with open(path) as f:
+        return {d["name"]: d["measurements"] for d in yaml.safe_load_all(f)}
+
+
+def test_landsat_bands_are_harmonised_across_sensors():
+    pytest.importorskip("yaml")
+    sr = _product_measurements(os.path.join(PRODUCT_DIR, "lsX_c2l2_sr.odc-product.yaml"))
+    bands = landsat_bands({p: sr[p] for p in LANDSAT_PRODUCTS["sr"]})
+    # Landsat 5 and 7 have no coastal band, so it is not loaded by default
+    assert list(bands["ls5_c2l2_sr"].values()) == ["blue", "green", "red", "nir08", "swir16", "swir22",
+                                                   "qa_pixel", "qa_radsat"]
+    assert bands["ls7_c2l2_sr"]["nir08"] == "nir08"
+    with pytest.raises(ValueError, match="ls5_c2l2_sr has no band 'coastal'"):
+        landsat_bands({p: sr[p] for p in LANDSAT_PRODUCTS["sr"]}, ["red", "coastal"])
+
+    st = _product_measurements(os.path.join(PRODUCT_DIR, "lsX_c2l2_st.odc-product.yaml"))
+    bands = landsat_bands({p: st[p] for p in LANDSAT_PRODUCTS["st"]}, ["surface_temperature", "qa_pixel"])
+    assert bands["ls5_c2l2_st"] == {"lwir": "surface_temperature", "qa_pixel": "qa_pixel"}
+    assert bands["ls9_c2l2_st"] == {"lwir11": "surface_temperature", "qa_pixel": "qa_pixel"}
+    assert "lwir11" in landsat_bands({p: st[p] for p in LANDSAT_PRODUCTS["st"]})["ls7_c2l2_st"].values()
+
+
+def test_stream_computes_one_chunk_at_a_time():
+    xr = pytest.importorskip("xarray")
+    pytest.importorskip("dask")
+    import numpy as np
+
+    data = xr.Dataset({"red": (("time", "y", "x"), np.arange(5 * 4).reshape(5, 2, 2))}).chunk({"time": 2})
+    blocks = list(stream(data))
+    assert [b.sizes["time"] for b in blocks] == [2, 2, 1]
+    assert all(not b.chunks for b in blocks)
+    assert [b.sizes["time"] for b in stream(data.red, size=3)] == [3, 2]
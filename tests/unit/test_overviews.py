@@ -0,0 +1,84 @@
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("psycopg2")
+pytest.importorskip("datacube")
+pytest.importorskip("dask")
+xr = pytest.importorskip("xarray")
+pytest.importorskip("zarr")
+
+from piksel_core.overviews import (  # noqa: E402
+    _render_level,
+    _write_chunk,
+    create_pyramid,
+    downsample,
+    parents,
+    product_measurements,
+    pyramid_grid,
+    read_grid,
+)
+
+
+def test_grid_chunks_nest_between_levels():
+    grid = pyramid_grid((9_070_000.0, -1_400_000.0, 13_660_000.0, 800_000.0), "EPSG:6933",
+                        resolution=80, levels=6, chunk=512)
+    coarsest = 512 * 80 * 2**5
+    assert grid.left % coarsest == 0 and grid.top % coarsest == 0
+    for level in range(grid.levels):
+        rows, cols = grid.level_chunks(level)
+        assert (rows * 512, cols * 512) == grid.level_shape(level)
+    assert grid.level_chunks(5) == (3, 5)
+    # A footprint inside one level 0 chunk, and one straddling a chunk corner
+    left, bottom, right, top = grid.chunk_bounds(0, 10, 20)
+    assert grid.chunks_for_bounds((left + 1, bottom + 1, right - 1, top - 1)) == {(10, 20)}
+    assert grid.chunks_for_bounds((right - 1, bottom - 1, right + 1, bottom + 1)) == {
+        (10, 20), (11, 20), (10, 21), (11, 21)}
+    assert parents({(10, 20), (11, 21), (12, 20)}) == {(5, 10), (6, 10)}
+
+
+def test_downsample_ignores_nodata():
+    data = np.array([[0, 4, 8, 8], [0, 0, 8, 9], [0, 0, 1, 2], [0, 0, 3, 4]], dtype="uint16")
+    assert downsample(data, 0).tolist() == [[4, 8], [0, 2]]
+    smad = np.array([[np.nan, 1.0], [3.0, np.nan]], dtype="float32")
+    assert downsample(smad, math.nan).tolist() == [[2.0]]
+    assert np.isnan(downsample(np.full((2, 2), np.nan, dtype="float32"), math.nan)).all()
+
+
+def test_coarser_levels_are_built_from_the_chunks_below(tmp_path):
+    grid = pyramid_grid((0.0, 0.0, 1280.0, 1280.0), "EPSG:6933", resolution=10, levels=2, chunk=64)
+    measurements = {"red": {"dtype": "uint16", "nodata": 0}}
+    path = str(tmp_path / "2023.zarr")
+    create_pyramid(path, grid, "s2_geomad_annual", 2023, measurements)
+    assert read_grid(path)[0] == grid
+
+    _write_chunk(path, grid, 0, 1, 0, {"red": np.full((64, 64), 100, dtype="uint16")})
+    _render_level((path, grid, 1, measurements, 0, 0))
+    level = xr.open_zarr(path, group="1", consolidated=False, mask_and_scale=False)
+    assert level.attrs["resolution"] == 20
+    red = level.red.values
+    assert (red[:32, 32:64] == 100).all()
+    assert (red[:32, :32] == 0).all() and (red[32:] == 0).all()
+
+
+def test_nan_nodata_as_datacube_stores_it(tmp_path):
+    # products/s2_geomad_annual.odc-product.yaml's ``nodata: .nan``, as read back from the index
+    stored = {"measurements": [
+        {"name": "red", "dtype": "uint16", "nodata": 0},
+        {"name": "SMAD", "dtype": "float32", "nodata": "NaN"},
+        {"name": "COUNT", "dtype": "uint16"},
+    ]}
+    measurements = product_measurements(stored)
+    assert measurements["red"] == {"dtype": "uint16", "nodata": 0}
+    assert math.isnan(measurements["SMAD"]["nodata"]) and measurements["COUNT"]["nodata"] == 0
+
+    grid = pyramid_grid((0.0, 0.0, 1280.0, 1280.0), "EPSG:6933", resolution=10, levels=2, chunk=64)
+    path = str(tmp_path / "2023.zarr")
+    create_pyramid(path, grid, "s2_geomad_annual", 2023, measurements)
+    _write_chunk(path, grid, 0, 0, 0, {"red": np.full((64, 64), 100, dtype="uint16"),
+                                       "SMAD": np.full((64, 64), 0.5, dtype="float32"),
+                                       "COUNT": np.full((64, 64), 3, dtype="uint16")})
+    _render_level((path, grid, 1, measurements, 0, 0))
+    smad = xr.open_zarr(path, group="1", consolidated=False, mask_and_scale=False).SMAD.values
+    assert (smad[:32, :32] == 0.5).all() and np.isnan(smad[32:]).all()
@@ -0,0 +1,34 @@
+from piksel_core.querybench import compare_results, latency_summary, plan_summary, queries_for
+
+EXPLAINED = [{
+    "Plan": {
+        "Node Type": "Nested Loop", "Total Cost": 1234.5, "Plan Rows": 40,
+        "Plans": [
+            {"Node Type": "Index Scan", "Relation Name": "dataset_search_datetime",
+             "Index Name": "pix_dat_time"},
+            {"Node Type": "Seq Scan", "Relation Name": "spatial_4326"},
+        ],
+    }
+}]
+
+
+def test_queries_skip_cloud_cover_for_radar():
+    optical = [q.name for q in queries_for({"name": "s2_l2a"})]
+    radar = [q.name for q in queries_for({"name": "s1_rtc", "storage": {"crs": "EPSG:4326"}})]
+    assert "island_year_clear" in optical and "island_year_clear" not in radar
+    assert queries_for({"name": "s2_l2a"})[-1].search["region_code"] == "48MYU"
+
+
+def test_summaries_and_regressions():
+    summary = latency_summary([i / 1000 for i in range(1, 101)])
+    assert (summary["p50_ms"], summary["p95_ms"], summary["p99_ms"]) == (50.5, 95.05, 99.01)
+
+    plan = plan_summary(EXPLAINED)
+    assert plan["shape"] == ("Nested Loop(Index Scan on dataset_search_datetime using pix_dat_time, "
+                             "Seq Scan on spatial_4326)")
+    assert plan["seq_scans"] == ["spatial_4326"]
+
+    before = {"product": "s2_l2a", "query": "city_year", "mode": "find", "p95_ms": 10.0, "plan": plan}
+    after = dict(before, p95_ms=20.0, plan=dict(plan, shape="Seq Scan on dataset"))
+    assert len(compare_results([before], [after], threshold=1.25)) == 2
+    assert compare_results([before], [dict(before, p95_ms=12.0)], threshold=1.25) == []
@@ -0,0 +1,54 @@
+import pytest
+
+pytest.importorskip("pystac_client")
+
+from piksel_core.landsat import LANDSAT_URL_REWRITE
+from piksel_core.reconcile import Reconciliation, index_uri_query
+from piksel_core.stac import search_items
+from piksel_core.standin import StacStandin
+
+
+def _item(n):
+    item_id = f"LC09_L2SP_116066_202401{n:02d}_SR"
+    return {
+        "type": "Feature",
+        "stac_version": "1.0.0",
+        "id": item_id,
+        "collection": "landsat-c2l2-sr",
+        "bbox": [115.1, -8.7, 115.5, -8.3],
+        "geometry": {
+            "type": "Polygon",
+            "coordinates": [[[115.1, -8.7], [115.5, -8.7], [115.5, -8.3], [115.1, -8.3], [115.1, -8.7]]],
+        },
+        "properties": {"datetime": f"2024-01-{n:02d}T02:20:00Z"},
+        "assets": {},
+        "links": [{"rel": "self", "href": f"https://landsatlook.usgs.gov/data/items/{item_id}.json"}],
+    }
+
+
+def test_index_uri_query_filters():
+    query, params = index_uri_query(["s2_l2a"])
+    assert "spatial_4326" not in query and params == [["s2_l2a"]]
+
+    query, params = index_uri_query(["s2_l2a"], [115.1, -8.7, 115.5, -8.3], "2024-01-01/..")
+    assert "ST_MakeEnvelope" in query and "tstzrange" in query
+    assert params[1:5] == [115.1, -8.7, 115.5, -8.3]
+    assert params[5].isoformat() == "2024-01-01T00:00:00+00:00" and params[6] is None
+
+
+def test_reconciliation_streams_stac_against_index_set():
+    items = [_item(n) for n in range(1, 11)]
+    index_uris = (
+        # Indexed with the s3 rewrite, and without it: both match after normalising
+        [f"s3://usgs-landsat/items/{i['id']}.json" for i in items[:4]]
+        + [i["links"][0]["href"] for i in items[4:7]]
+        + ["s3://usgs-landsat/items/LC08_deleted_upstream.json"]
+    )
+    with StacStandin(items, page_size=3) as stac:
+        result = Reconciliation(index_uris, LANDSAT_URL_REWRITE)
+        missing = [item.id for item in result.missing(search_items(stac.url, ["landsat-c2l2-sr"]))]
+
+    assert missing == [i["id"] for i in items[7:]]
+    assert (result.stac_count, result.index_count, result.matched) == (10, 8, 7)
+    assert result.only_in_index == ["s3://usgs-landsat/items/LC08_deleted_upstream.json"]
+    assert str(result) == "STAC 10 items, index 8 datasets: 7 matched, 3 only in STAC, 1 only in the index"
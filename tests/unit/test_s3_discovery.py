@@ -0,0 +1,62 @@
+import io
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("datacube")
+
+from piksel_core.s3_discovery import (
+    S3Object,
+    matching,
+    parse_manifest,
+    plan_fetch,
+    read_manifest,
+    split_glob,
+    write_manifest,
+)
+
+GLOB = "s3://piksel-staging-public-data/geomad_s2/1.0.0/**/*.stac-item.json"
+
+
+def test_split_glob_and_matching():
+    assert split_glob(GLOB) == ("piksel-staging-public-data", "geomad_s2/1.0.0/")
+    assert split_glob("s3://b/a/x?/y.json") == ("b", "a/")
+    objects = [
+        S3Object("s3://piksel-staging-public-data/geomad_s2/1.0.0/x10/y20/2024/x10y20.stac-item.json", "a"),
+        S3Object("s3://piksel-staging-public-data/geomad_s2/1.0.0/x10/y20/2024/x10y20_red.tif", "b"),
+    ]
+    assert [obj.etag for obj in matching(objects, GLOB)] == ["a"]
+
+
+def test_manifest_formats_and_round_trip(tmp_path):
+    lines = io.StringIO(
+        "s3://bucket/a.stac-item.json,\"0123456789abcdef0123456789abcdef\"\n"
+        "b.stac-item.json\n"
+        "\"bucket\",\"c%2Bd.stac-item.json\",\"512\",\"2024-01-01T00:00:00.000Z\",\"fedcba9876543210fedcba9876543210-2\"\n"
+    )
+    objects = list(parse_manifest(lines, "bucket"))
+    assert objects == [
+        S3Object("s3://bucket/a.stac-item.json", "0123456789abcdef0123456789abcdef"),
+        S3Object("s3://bucket/b.stac-item.json", None),
+        S3Object("s3://bucket/c+d.stac-item.json", "fedcba9876543210fedcba9876543210-2"),
+    ]
+    path = str(tmp_path / "manifest.csv.gz")
+    write_manifest(path, objects)
+    assert read_manifest(path, "bucket") == objects
+
+
+def test_plan_fetch_skips_unchanged_etags():
+    objects = [
+        S3Object("s3://b/new.json", "1"),
+        S3Object("s3://b/same.json", "2"),
+        S3Object("s3://b/changed.json", "4"),
+        S3Object("s3://b/no-etag.json", None),
+        S3Object("s3://b/no-recorded-etag.json", "6"),
+    ]
+    indexed = {"s3://b/same.json": "2", "s3://b/changed.json": "3", "s3://b/no-etag.json": "5",
+               "s3://b/no-recorded-etag.json": None}
+    fetch, unchanged = plan_fetch(objects, indexed)
+    # Without both ETags a changed document looks unchanged, so it is fetched again
+    assert [obj.url for obj in fetch] == [
+        "s3://b/new.json", "s3://b/changed.json", "s3://b/no-etag.json", "s3://b/no-recorded-etag.json"]
+    assert unchanged == 1
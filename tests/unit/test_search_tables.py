@@ -0,0 +1,39 @@
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("datacube")
+
+from piksel_core.search_tables import drop_table, partition_name, search_query, table_name, year_bounds
+
+
+def test_table_and_partition_names():
+    assert table_name("s2_l2a") == "ds_s2_l2a"
+    assert partition_name("ls8_c2l2_sr", 2023) == "ds_ls8_c2l2_sr_2023"
+    assert partition_name("s2_l2a", 0) == "ds_s2_l2a_0000"
+    with pytest.raises(ValueError):
+        table_name("x" * 60)
+    # Deleting a product too long-named for a table finds none to drop, without touching the database
+    assert drop_table(None, "x" * 60) is False
+
+
+def test_year_bounds_reach_back_over_the_longest_dataset():
+    start = datetime(2023, 1, 1, 3, tzinfo=timezone.utc)
+    end = datetime(2023, 12, 31, 23, 59)
+    assert year_bounds(start, end, max_span=0) == (2023, 2023)
+    assert year_bounds(start, end, max_span=1) == (2022, 2023)
+    # 07:00 on 1 January in Jakarta is still the previous year in UTC
+    jakarta = datetime.fromisoformat("2024-01-01T06:00:00+07:00")
+    assert year_bounds(jakarta, jakarta, max_span=0) == (2023, 2023)
+
+
+def test_search_parameters():
+    start, end = datetime(2023, 6, 1), datetime(2023, 6, 30)
+    query, params = search_query(
+        "s2_l2a", 9468, 0, time=(start, end), lon=(107.0, 106.7), lat=-6.2, cloud_cover=(None, 20),
+        region_code="48MYU",
+    )
+    assert params == [2023, 2023, end, start, 106.7, -6.2, 107.0, -6.2, 9468, 20, "48MYU"]
+    assert "cloud_cover >= %s" not in repr(query) and "cloud_cover <= %s" in repr(query)
+    assert search_query("s2_l2a", 4326, 0)[1] == []
@@ -0,0 +1,52 @@
+import os
+
+import yaml
+
+from piksel_core.synthetic import (
+    SYNTHETIC_URI_PREFIX,
+    footprint_at,
+    mgrs_code,
+    synthetic_documents,
+    wrs2_path_row,
+)
+
+PRODUCT_DIR = "products"
+JAKARTA = (106.85, -6.2)
+
+
+def _product(filename, name=None):
+    with open(os.path.join(PRODUCT_DIR, filename)) as f:
+        docs = [doc for doc in yaml.safe_load_all(f) if doc]
+    return next(doc for doc in docs if name is None or doc["name"] == name)
+
+
+def test_region_codes_over_jakarta():
+    assert mgrs_code(*JAKARTA) == "48MYU"
+    assert wrs2_path_row(*JAKARTA) == (122, 64)
+    assert footprint_at(_product("s2_l2a.odc-product.yaml"), *JAKARTA).epsg == 32748
+    assert footprint_at(_product("lsX_c2l2_sr.odc-product.yaml", "ls8_c2l2_sr"), *JAKARTA).epsg == 32648
+    assert footprint_at(_product("s1_rtc.odc-product.yaml"), *JAKARTA).epsg == 4326
+
+
+def test_documents_follow_product_definition_and_are_deterministic():
+    product = _product("s1_rtc.odc-product.yaml")
+    first = list(synthetic_documents(product, "2023-01-01/2023-12-31", 50))
+    resumed = list(synthetic_documents(product, "2023-01-01/2023-12-31", 50, first=40))
+    assert resumed == first[40:]
+
+    uri, doc = first[0]
+    assert uri.startswith(SYNTHETIC_URI_PREFIX + "s1_rtc/")
+    assert doc["crs"] == "epsg:4326"
+    assert set(doc["measurements"]) == {m["name"] for m in product["measurements"]}
+    assert doc["properties"]["eo:platform"] == "Sentinel-1A/1B"
+    assert "eo:cloud_cover" not in doc["properties"]
+    assert len({doc["id"] for _, doc in first}) == 50
+    assert all("2023-01-01" <= doc["properties"]["datetime"] < "2024-01-01" for _, doc in first)
+
+
+def test_annual_products_get_one_dataset_per_tile_and_year():
+    product = _product("s2_geomad_annual.odc-product.yaml")
+    docs = [doc for _, doc in synthetic_documents(product, "2019-01-01/2024-12-31", 2000)]
+    years = {(doc["properties"]["odc:region_code"], doc["properties"]["datetime"][:4]) for doc in docs}
+    assert len(years) == len(docs)
+    assert docs[0]["properties"]["dtr:end_datetime"].startswith(docs[0]["properties"]["datetime"][:4] + "-12-31")
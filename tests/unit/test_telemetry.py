@@ -0,0 +1,71 @@
+import math
+
+import pytest
+
+from piksel_core import telemetry
+from piksel_core.hotspots import cache_summary, histogram_quantile, rank_hotspots, stage_summary, throughput
+
+
+@pytest.fixture
+def recorded(monkeypatch, tmp_path):
+    monkeypatch.setenv(telemetry.TELEMETRY_DIR_ENV, str(tmp_path))
+    telemetry.start("index-s3")
+    yield tmp_path
+    telemetry.start()
+
+
+def test_metrics_round_trip_through_openmetrics(recorded):
+    for seconds in (0.02, 0.03, 0.2, 4.0):
+        telemetry.observe("stac_page", seconds, collection="sentinel-2-l2a")
+    assert list(telemetry.timed(iter([1, 2]), "s3_fetch", product='s2 "l2a"')) == [1, 2]
+    telemetry.count_by("datasets", {("s2_l2a", "added"): 9, ("s2_l2a", "failed"): 1}, "product", "status")
+    telemetry.count("query_cache", 3, result="hit")
+    telemetry.count("query_cache", result="miss")
+    with telemetry.timer("db_insert_batch", log=True, datasets=500):
+        pass
+
+    path = telemetry.flush()
+    text = open(path).read()
+    assert text.endswith("# EOF\n") and "# TYPE piksel_stage_seconds histogram" in text
+    samples = telemetry.parse(text)
+    stages = {stage["stage"]: stage for stage in stage_summary(samples)}
+    assert stages["stac_page"]["calls"] == 4 and stages["stac_page"]["seconds"] == 4.25
+    assert stages["s3_fetch"]["calls"] == 2
+    assert {s.labels["product"] for s in samples if s.labels.get("stage") == "s3_fetch"} == {'s2 "l2a"'}
+    [command] = throughput(samples)
+    assert command["command"] == "index-s3" and command["datasets"] == {"added": 9, "failed": 1}
+    assert cache_summary(samples) == [{"cache": "query_cache", "hits": 3, "misses": 1, "hit_ratio": 0.75}]
+    assert '"event": "db_insert_batch"' in (recorded / "events.jsonl").read_text()
+
+
+def test_nothing_written_without_a_directory(monkeypatch):
+    monkeypatch.delenv(telemetry.TELEMETRY_DIR_ENV, raising=False)
+    telemetry.start()
+    telemetry.count("datasets")
+    assert telemetry.flush() is None
+    telemetry.start()
+
+
+def test_quantiles_and_ranking():
+    buckets = [(0.1, 50), (1.0, 90), (10.0, 100), (math.inf, 100)]
+    assert histogram_quantile(buckets, 0.5) == pytest.approx(0.1)
+    assert histogram_quantile(buckets, 0.95) == pytest.approx(5.5)
+    assert histogram_quantile([(1.0, 0), (math.inf, 0)], 0.95) is None
+    assert histogram_quantile([(1.0, 1), (math.inf, 10)], 0.95) == 1.0
+
+    stages = [{"command": "index-s3", "stage": "db_insert", "seconds": 30.0, "calls": 600, "mean_ms": 50.0}]
+    statements = [{"query": "INSERT  INTO odc.dataset\n VALUES ($1)", "calls": 600, "total_ms": 45000.0,
+                   "mean_ms": 75.0}]
+    spots = rank_hotspots(stages, statements, top=5)
+    assert [(spot["kind"], spot["name"]) for spot in spots] == [
+        ("sql", "INSERT INTO odc.dataset VALUES ($1)"), ("stage", "index-s3 db_insert")]
+
+
+def test_flush_if_due_throttles_long_lived_processes(recorded):
+    telemetry.count("query_cache", result="hit")
+    path = telemetry.flush_if_due(interval=3600)
+    assert path is not None and "query_cache" in open(path).read()
+    telemetry.count("query_cache", result="miss")
+    assert telemetry.flush_if_due(interval=3600) is None
+    assert telemetry.flush_if_due(interval=0) == path
+    assert 'result="miss"' in open(path).read()
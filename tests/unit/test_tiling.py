@@ -0,0 +1,74 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from piksel_core.tiling import owner_point, owner_tile, owns, split_bbox, split_datetime
+
+INDONESIA = (95.0, -11.0, 141.0, 6.0)
+
+
+def test_split_bbox_covers_request_with_clipped_edges():
+    tiles = split_bbox((105, -8, 106.5, -5), 1.0)
+    assert len(tiles) == 2 * 3
+    assert tiles[0].bbox == (105, -8, 106, -7)
+    assert tiles[-1].bbox == (106, -6, 106.5, -5)
+    assert len({t.label for t in tiles}) == len(tiles)
+
+
+def test_split_datetime_month_windows_are_contiguous():
+    windows = split_datetime("2024-01-15/2024-05-31", "month")
+    assert len(windows) == 5
+    assert windows[0].start == datetime(2024, 1, 15, tzinfo=timezone.utc)
+    assert windows[-1].end == datetime(2024, 6, 1, tzinfo=timezone.utc)
+    for previous, current in zip(windows, windows[1:]):
+        assert previous.end == current.start
+
+
+def test_split_datetime_rejects_unknown_window():
+    with pytest.raises(ValueError):
+        split_datetime("2024-01-01/2024-12-31", "fortnight")
+
+
+def test_each_item_has_exactly_one_owner():
+    tile_size = 2.0
+    tiles = split_bbox(INDONESIA, tile_size)
+    windows = split_datetime("2024-01-01/2024-03-31", "month")
+    # A scene straddling four tiles, stamped exactly on a window boundary
+    point = (105.0, -6.0)
+    when = datetime(2024, 2, 1, tzinfo=timezone.utc)
+
+    owners = [
+        (tile.label, window.stac_datetime)
+        for tile in tiles
+        for i, window in enumerate(windows)
+        if owns(tile, window, point, when, INDONESIA, tile_size, i == len(windows) - 1)
+    ]
+    assert len(owners) == 1, owners
+    assert owners[0][1].startswith("2024-02-01")
+
+
+def test_owner_tile_clamps_items_outside_search_bbox():
+    assert owner_tile((141.5, 6.5), INDONESIA, 1.0) == (45, 16)
+
+
+def test_owner_is_a_tile_whose_search_returns_the_footprint():
+    shapely = pytest.importorskip("shapely")
+    from shapely.geometry import box, shape
+
+    search_bbox = (0.0, 0.0, 3.0, 3.0)
+    # An L-shaped footprint: the centre of its bbox, (1.5, 1.5), is outside it
+    geometry = {
+        "type": "Polygon",
+        "coordinates": [[(0, 0), (3, 0), (3, 0.5), (0.5, 0.5), (0.5, 3), (0, 3), (0, 0)]],
+    }
+    returned_by = {
+        (tile.col, tile.row) for tile in split_bbox(search_bbox, 1.0)
+        if shapely.intersects(shape(geometry), box(*tile.bbox))
+    }
+    assert (1, 1) not in returned_by
+    point = owner_point(geometry, (0.0, 0.0, 3.0, 3.0), search_bbox)
+    assert owner_tile(point, search_bbox, 1.0) in returned_by
+
+    # Without a geometry the bbox stands in for it; with neither there is no owner
+    assert owner_tile(owner_point(None, (2.2, 0.2, 2.8, 0.8), search_bbox), search_bbox, 1.0) == (2, 0)
+    assert owner_point(None, None, search_bbox) is None